@@ -6,10 +6,11 @@ import asyncio
 from langgraph.graph import StateGraph, END
 from supabase_connect import get_supabase_manager 
 import logging
-from langchain_litellm import ChatLiteLLM
 import re
 from .prompt import TRIAGE_PROMPT, GENERAL_ANSWER_PROMPT
 from .retry_utils import retry_with_backoff, RetryConfig, retry_llm_call
+from .rate_limiter import get_rate_limiter
+from .model_registry import get_llm
 
 # ✨ NEW: Import hierarchical retriever
 from services.hierarchical_retriever import HierarchicalRetriever
@@ -64,6 +65,7 @@ class WorkflowState(TypedDict):
     # ✨ NEW: Hierarchical retrieval results
     retrieval_results: Optional[dict]  # Results from tree + vector search
     retrieval_strategy: Optional[str]  # Which strategy was used
+    query_embedding: Optional[List[float]]  # Reused by the internal analyst's search tool
     
     # Existing fields
     internal_sources: Optional[List[str]]
@@ -131,11 +133,8 @@ def call_llm_with_retry(model: str, api_key: str, prompt: str, temperature: floa
     """
     Wrapper for LLM calls with automatic retry.
     """
-    llm = ChatLiteLLM(
-        model=model,
-        api_key=api_key,
-        temperature=temperature
-    )
+    llm = get_llm(model, api_key, temperature)
+    get_rate_limiter(model, api_key).acquire()
     response = llm.invoke(prompt)
     return response.content.strip()
 
@@ -308,6 +307,7 @@ async def node_hierarchical_retrieval(state: WorkflowState) -> dict:
             strategy=strategy
         )
         
+        query_embedding = retrieval_result.pop('query_embedding', None)
         results = retrieval_result.get('results', [])
         
         print(f"   ✓ Retrieved {len(results)} results")
@@ -324,7 +324,8 @@ async def node_hierarchical_retrieval(state: WorkflowState) -> dict:
         
         return {
             "retrieval_results": retrieval_result,
-            "retrieval_strategy": strategy
+            "retrieval_strategy": strategy,
+            "query_embedding": query_embedding
         }
         
     except Exception as e:
@@ -345,7 +346,8 @@ def _run_internal_analyst_with_tree(
     organization_id: str,
     user_query: str,
     chat_history_str: str,
-    retrieval_results: dict
+    retrieval_results: dict,
+    query_embedding: Optional[List[float]] = None
 ):
     """
     Enhanced internal analyst that uses hierarchical retrieval results and KPI queries.
@@ -367,7 +369,9 @@ CONVERSATION HISTORY:
     internal_analyst_crew = create_internal_analyst_crew(
         gemini_api_key=google_key,
         user_id=user_id,
-        organization_id=organization_id
+        organization_id=organization_id,
+        user_query=user_query,
+        query_embedding=query_embedding
     )
 
     inputs = {
@@ -483,7 +487,8 @@ Recent concerns:
             organization_id=organization_id,
             user_query=state['user_query'],
             chat_history_str=chat_history_str,
-            retrieval_results=retrieval_results
+            retrieval_results=retrieval_results,
+            query_embedding=state.get("query_embedding")
         )
 
         print(f"--- [Node] Internal Analyst finished ---")
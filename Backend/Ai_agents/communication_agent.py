@@ -5,7 +5,7 @@ from crewai import Agent, Task, Crew, Process
 # from supabase_connect import get_supabase_manager # Not needed
 from dotenv import load_dotenv
 from typing import List, Optional
-from langchain_litellm import ChatLiteLLM
+from .model_registry import get_llm
 
 # --- NEW: Import prompts ---
 from .prompt import (
@@ -33,11 +33,7 @@ def create_communication_crew(
     Creates and configures the Communications Crew using prompts from prompts.py.
     """
 
-    llm = ChatLiteLLM(
-        model="gemini/gemini-2.0-flash",
-        temperature=0.2, # Low temp for factual formatting
-        api_key=google_api_key
-    )
+    llm = get_llm("gemini/gemini-2.0-flash", google_api_key, temperature=0.2)  # Low temp for factual formatting
 
     communications_agent = Agent(
         role=COMMUNICATOR_ROLE,                     # <-- Use variable
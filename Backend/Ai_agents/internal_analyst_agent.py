@@ -17,7 +17,8 @@ from crewai.tools import BaseTool
 from supabase_connect import get_supabase_manager
 from dotenv import load_dotenv
 from langchain_litellm import ChatLiteLLM
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from .model_registry import get_llm
+from services.query_embedding_cache import embed_query, normalize_query
 
 # Import custom tools
 try:
@@ -84,15 +85,40 @@ class NotesFirstSearchTool(BaseTool):
     
     llm: ChatLiteLLM = None
     supabase_client: any = None
-    embeddings_model: any = None
     user_id: str = ""
-
-    def __init__(self, llm: ChatLiteLLM, supabase_client: any, embeddings_model: any, user_id: str):
+    # Vectors already computed upstream this turn: {normalized query: embedding}
+    precomputed_embeddings: dict = {}
+
+    def __init__(
+        self,
+        llm: ChatLiteLLM,
+        supabase_client: any,
+        user_id: str,
+        precomputed_embeddings: dict = None
+    ):
         super().__init__()
         self.llm = llm
         self.supabase_client = supabase_client
-        self.embeddings_model = embeddings_model
         self.user_id = user_id
+        self.precomputed_embeddings = {
+            normalize_query(text): embedding
+            for text, embedding in (precomputed_embeddings or {}).items()
+            if embedding
+        }
+
+    def _embed_query(self, query: str, enhanced_query: str):
+        """
+        Reuse the Orchestrator's vector when the agent searches for the user's
+        own question unchanged; otherwise embed the (context-enhanced) query
+        through the shared query-embedding cache.
+        """
+        precomputed = None
+        if enhanced_query == query:
+            precomputed = self.precomputed_embeddings.get(normalize_query(query))
+        if precomputed is not None:
+            print(f"--- [Layer 2] Reusing query embedding from retrieval")
+            return precomputed
+        return embed_query(enhanced_query)
 
     def _run(self, query: str) -> str:
         """
@@ -104,7 +130,7 @@ class NotesFirstSearchTool(BaseTool):
         """
         print(f"\n--- [Smart Search] Query: '{query}' for user {self.user_id} ---")
 
-        if not self.supabase_client or not self.embeddings_model:
+        if not self.supabase_client:
             return "Error: Search tool is not initialized."
 
         try:
@@ -154,7 +180,7 @@ Prioritize information related to their concerns.
                 print(f"--- [Layer 2] Searching without user context")
             
             print(f"--- [Layer 2] Searching intelligent notes...")
-            query_embedding = self.embeddings_model.embed_query(enhanced_query)
+            query_embedding = self._embed_query(query, enhanced_query)
 
             # Search document notes (fast!)
             notes_response = self.supabase_client.rpc(
@@ -392,7 +418,13 @@ USER CONTEXT (From Past Conversations)
 # AGENT CREATION (Updated to use Three-Layer Intelligence)
 # ============================================================================
 
-def create_internal_analyst_crew(gemini_api_key: str, user_id: str, organization_id: str):
+def create_internal_analyst_crew(
+    gemini_api_key: str,
+    user_id: str,
+    organization_id: str,
+    user_query: str = None,
+    query_embedding: list = None
+):
     """
     Creates the Internal Data Analyst Crew using three-layer intelligence:
     
@@ -408,33 +440,29 @@ def create_internal_analyst_crew(gemini_api_key: str, user_id: str, organization
         gemini_api_key: Google Gemini API key
         user_id: User UUID
         organization_id: Organization UUID
+        user_query: The user's question (optional)
+        query_embedding: Its embedding from hierarchical retrieval (optional),
+            reused by the search tool instead of embedding the question again
     """
     if not supabase:
         raise ConnectionError("Cannot create internal analyst crew: Supabase client failed to initialize.")
 
-    # 1. Initialize the LLM for the Agent
-    llm = ChatLiteLLM(
-        model="gemini/gemini-2.0-flash",
-        temperature=0.1,
-        api_key=gemini_api_key
-    )
+    # 1. Shared LLM client (built once per process, pooled HTTP connections);
+    #    the tool / agent / crew below are cheap per-request objects bound to user_id
+    llm = get_llm("gemini/gemini-2.0-flash", gemini_api_key, temperature=0.1)
 
-    # 2. Initialize the Embedding Model for the RAG Tool
-    try:
-        embeddings_model = GoogleGenerativeAIEmbeddings(
-            model="models/embedding-001",
-            google_api_key=gemini_api_key
-        )
-    except Exception as e:
-        print(f"CRITICAL ERROR: Could not initialize embedding model in agent: {e}")
-        raise ConnectionError(f"Failed to initialize embedding model: {e}")
+    # 2. Query embeddings come from the shared cache (services/query_embedding_cache.py);
+    #    the retrieval vector for this turn is handed straight to the tool
+    precomputed_embeddings = {}
+    if user_query and query_embedding:
+        precomputed_embeddings[user_query] = query_embedding
 
     # 3. Create the Three-Layer Intelligent Search Tool
     notes_search_tool = NotesFirstSearchTool(
         llm=llm,
         supabase_client=supabase,
-        embeddings_model=embeddings_model,
-        user_id=user_id
+        user_id=user_id,
+        precomputed_embeddings=precomputed_embeddings
     )
 
     # 4. Create the KPI Query Tool (if available)
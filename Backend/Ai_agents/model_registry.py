@@ -0,0 +1,99 @@
+"""
+Process-wide registry of LLM and embedding clients.
+
+ChatLiteLLM and GoogleGenerativeAIEmbeddings objects are stateless request
+wrappers around long-lived HTTP clients. Building them per request (or per
+loop iteration) costs setup time and, for embeddings, a fresh connection
+and TLS handshake. They are built once per (model, key, settings) here and
+shared across threads; per-request objects (CrewAI agents, tools) stay
+cheap and only bind the user.
+
+Sync LiteLLM calls share one keep-alive httpx connection pool, sized by
+MODEL_HTTP_MAX_CONNECTIONS / MODEL_HTTP_KEEPALIVE_CONNECTIONS. Async calls
+keep LiteLLM's own clients: an httpx.AsyncClient is bound to the event loop
+that first uses it, and the chat path runs nodes on fresh loops.
+
+Usage:
+    llm = get_llm("gemini/gemini-2.0-flash", temperature=0.1)
+    embeddings = get_embeddings_model()
+"""
+
+import os
+import threading
+from typing import Dict, Optional
+
+import httpx
+import litellm
+from langchain_litellm import ChatLiteLLM
+from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+DEFAULT_EMBEDDING_MODEL = "models/embedding-001"
+
+MODEL_HTTP_MAX_CONNECTIONS = int(os.getenv("MODEL_HTTP_MAX_CONNECTIONS", "100"))
+MODEL_HTTP_KEEPALIVE_CONNECTIONS = int(os.getenv("MODEL_HTTP_KEEPALIVE_CONNECTIONS", "20"))
+MODEL_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("MODEL_HTTP_KEEPALIVE_EXPIRY", "60"))
+MODEL_HTTP_TIMEOUT = float(os.getenv("MODEL_HTTP_TIMEOUT", "120"))
+
+_llms: Dict[tuple, ChatLiteLLM] = {}
+_embeddings: Dict[tuple, GoogleGenerativeAIEmbeddings] = {}
+_lock = threading.Lock()
+
+
+def _configure_http_sessions():
+    """Give sync LiteLLM calls one pooled keep-alive client instead of per-call clients."""
+    limits = httpx.Limits(
+        max_connections=MODEL_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=MODEL_HTTP_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=MODEL_HTTP_KEEPALIVE_EXPIRY
+    )
+    if litellm.client_session is None:
+        litellm.client_session = httpx.Client(limits=limits, timeout=MODEL_HTTP_TIMEOUT)
+
+
+def get_llm(
+    model: str,
+    api_key: Optional[str] = None,
+    temperature: float = 0.0
+) -> ChatLiteLLM:
+    """
+    Return the shared ChatLiteLLM for (model, api_key, temperature).
+
+    api_key defaults to GOOGLE_API_KEY.
+    """
+    api_key = api_key or os.getenv("GOOGLE_API_KEY")
+    key = (model, api_key, temperature)
+    llm = _llms.get(key)
+    if llm is None:
+        with _lock:
+            llm = _llms.get(key)
+            if llm is None:
+                _configure_http_sessions()
+                llm = ChatLiteLLM(model=model, api_key=api_key, temperature=temperature)
+                _llms[key] = llm
+    return llm
+
+
+def get_embeddings_model(
+    model: str = DEFAULT_EMBEDDING_MODEL,
+    api_key: Optional[str] = None
+) -> GoogleGenerativeAIEmbeddings:
+    """
+    Return the shared embeddings client for (model, api_key).
+
+    api_key defaults to GOOGLE_API_KEY.
+    """
+    api_key = api_key or os.getenv("GOOGLE_API_KEY")
+    key = (model, api_key)
+    embeddings = _embeddings.get(key)
+    if embeddings is None:
+        with _lock:
+            embeddings = _embeddings.get(key)
+            if embeddings is None:
+                embeddings = GoogleGenerativeAIEmbeddings(model=model, google_api_key=api_key)
+                _embeddings[key] = embeddings
+    return embeddings
+
+
+def get_model_registry_stats() -> Dict:
+    """Number of shared clients built so far (for health/metrics endpoints)."""
+    return {'llms': len(_llms), 'embedding_models': len(_embeddings)}
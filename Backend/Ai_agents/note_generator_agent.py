@@ -9,8 +9,12 @@ import json
 import os
 from dotenv import load_dotenv
 
+from Ai_agents.rate_limiter import get_rate_limiter
+
 load_dotenv()
 
+NOTE_MODEL = "gemini/gemini-2.0-flash"
+
 class DocumentNoteGenerator:
     """
     AI agent that generates structured notes from documents.
@@ -20,13 +24,23 @@ class DocumentNoteGenerator:
     def __init__(self):
         # Initialize Gemini model using ChatLiteLLM (same as orchestrator)
         self.llm = ChatLiteLLM(
-            model="gemini/gemini-2.0-flash",
+            model=NOTE_MODEL,
             api_key=os.getenv("GOOGLE_API_KEY"),
             temperature=0.3  # Lower temp for factual extraction
         )
+        self.rate_limiter = get_rate_limiter(NOTE_MODEL, os.getenv("GOOGLE_API_KEY"))
         
         # Create the note generator agent
-        self.note_generator = Agent(
+        self.note_generator = self._create_agent()
+    
+    def _create_agent(self) -> Agent:
+        """
+        Build the note-writing agent.
+
+        generate_note() builds a fresh agent per call so several groups of
+        the same file can be summarized concurrently from worker threads.
+        """
+        return Agent(
             role="Document Intelligence Analyst",
             goal="Extract key information and generate structured notes from documents",
             backstory="""You are an expert at analyzing documents and creating 
@@ -62,6 +76,8 @@ class DocumentNoteGenerator:
         # Extract filename from path for better title generation
         filename = file_path.split('/')[-1]
         
+        agent = self._create_agent()
+
         # Create the task
         task = Task(
             description=f"""
@@ -115,17 +131,18 @@ class DocumentNoteGenerator:
             
             Return your response as pure JSON.
             """,
-            agent=self.note_generator,
+            agent=agent,
             expected_output="Valid JSON object with title, summary, key_facts, action_items, and entities"
         )
         
         # Execute the task
         crew = Crew(
-            agents=[self.note_generator],
+            agents=[agent],
             tasks=[task],
             verbose=True
         )
         
+        self.rate_limiter.acquire()
         result = crew.kickoff()
         
         # Parse the JSON result
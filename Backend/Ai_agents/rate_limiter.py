@@ -0,0 +1,200 @@
+"""
+Token-bucket rate limiting for Gemini embedding and generation calls.
+
+Replaces fixed sleeps between API calls: callers acquire a token before
+each request and only wait when the bucket for that (model, API key) is
+actually empty, so we run at the quota ceiling instead of below it.
+
+Buckets are process-wide. If RATE_LIMIT_REDIS_URL is set (and the
+`redis` package is installed) buckets are shared across workers through
+an atomic Redis script, falling back to the local bucket on Redis errors.
+
+Usage:
+    from Ai_agents.rate_limiter import get_rate_limiter
+
+    limiter = get_rate_limiter("models/embedding-001", api_key)
+    limiter.acquire()                 # in sync code / worker threads
+    await limiter.acquire_async()     # in async code
+"""
+import os
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+# Requests per minute per (model, API key)
+GEMINI_EMBEDDING_RPM = float(os.getenv("GEMINI_EMBEDDING_RPM", "1500"))
+GEMINI_GENERATION_RPM = float(os.getenv("GEMINI_GENERATION_RPM", "1000"))
+
+# Burst size, expressed as seconds of refill
+RATE_LIMIT_BURST_SECONDS = float(os.getenv("RATE_LIMIT_BURST_SECONDS", "5"))
+
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL")
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket.
+
+    Acquiring reserves tokens immediately (the balance may go negative) and
+    returns how long the caller must wait, so concurrent callers are served
+    in arrival order without polling.
+    """
+
+    def __init__(self, name: str, rate_per_minute: float, capacity: Optional[float] = None):
+        """
+        Args:
+            name: Bucket identifier (used for logging and Redis keys)
+            rate_per_minute: Sustained requests per minute
+            capacity: Maximum burst (default: RATE_LIMIT_BURST_SECONDS of refill)
+        """
+        self.name = name
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or max(1.0, self.rate * RATE_LIMIT_BURST_SECONDS)
+
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+        self.acquired = 0
+        self.throttled = 0
+        self.total_wait_seconds = 0.0
+
+    def _reserve(self, tokens: float) -> float:
+        """Reserve tokens and return seconds to wait before using them."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            return max(0.0, -self._tokens / self.rate)
+
+    def _record(self, wait: float):
+        self.acquired += 1
+        if wait > 0:
+            self.throttled += 1
+            self.total_wait_seconds += wait
+            logger.debug(f"Rate limit '{self.name}': waiting {wait:.2f}s")
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Block the current thread until `tokens` are available. Returns seconds waited."""
+        wait = self._reserve(tokens)
+        self._record(wait)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, tokens: float = 1.0) -> float:
+        """Wait (without blocking the event loop) until `tokens` are available."""
+        wait = self._reserve(tokens)
+        self._record(wait)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def stats(self) -> Dict:
+        return {
+            'name': self.name,
+            'rate_per_minute': self.rate * 60,
+            'capacity': self.capacity,
+            'acquired': self.acquired,
+            'throttled': self.throttled,
+            'total_wait_seconds': round(self.total_wait_seconds, 3),
+        }
+
+
+# Atomic token bucket: refill, reserve, and return wait time in seconds.
+_REDIS_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate) - requested
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate) + 60)
+if tokens >= 0 then return '0' end
+return tostring(-tokens / rate)
+"""
+
+
+class RedisTokenBucket(TokenBucket):
+    """Token bucket whose state lives in Redis, shared by every worker process."""
+
+    def __init__(self, name: str, rate_per_minute: float, client, capacity: Optional[float] = None):
+        super().__init__(name, rate_per_minute, capacity)
+        self._script = client.register_script(_REDIS_BUCKET_SCRIPT)
+        self._key = f"kogna:ratelimit:{name}"
+
+    def _reserve(self, tokens: float) -> float:
+        try:
+            return float(self._script(keys=[self._key], args=[self.rate, self.capacity, tokens]))
+        except Exception as e:
+            logger.warning(f"Redis rate limiter unavailable ({e}), using local bucket")
+            return super()._reserve(tokens)
+
+
+_limiters: Dict[Tuple[str, str], TokenBucket] = {}
+_limiters_lock = threading.Lock()
+_redis_client = None
+
+
+def _get_redis_client():
+    global _redis_client
+    if _redis_client is None and RATE_LIMIT_REDIS_URL:
+        if not REDIS_AVAILABLE:
+            logger.warning("RATE_LIMIT_REDIS_URL set but redis is not installed - using per-process limits")
+            return None
+        _redis_client = redis.Redis.from_url(RATE_LIMIT_REDIS_URL)
+    return _redis_client
+
+
+def default_rate_per_minute(model: str) -> float:
+    """Quota for a model: embedding models and generation models have separate limits."""
+    return GEMINI_EMBEDDING_RPM if "embedding" in model else GEMINI_GENERATION_RPM
+
+
+def get_rate_limiter(model: str, api_key: Optional[str] = None) -> TokenBucket:
+    """
+    Return the shared bucket for a (model, API key) pair, creating it on first use.
+
+    The API key is hashed so it never appears in logs or Redis keys.
+    """
+    key_id = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:12]
+    cache_key = (model, key_id)
+
+    limiter = _limiters.get(cache_key)
+    if limiter is not None:
+        return limiter
+
+    with _limiters_lock:
+        limiter = _limiters.get(cache_key)
+        if limiter is None:
+            name = f"{model}:{key_id}"
+            rate = default_rate_per_minute(model)
+            client = _get_redis_client()
+            if client is not None:
+                limiter = RedisTokenBucket(name, rate, client)
+            else:
+                limiter = TokenBucket(name, rate)
+            _limiters[cache_key] = limiter
+            logger.info(f"Rate limiter '{model}' created: {rate:.0f} req/min")
+    return limiter
+
+
+def get_rate_limiter_stats() -> list:
+    """Snapshot of every bucket's counters (for health/metrics endpoints)."""
+    return [limiter.stats() for limiter in list(_limiters.values())]
@@ -1,7 +1,7 @@
 # Backend/Ai_agents/research_agent.py
 from crewai import Agent, Task, Crew
 from crewai_tools import SerpApiGoogleSearchTool
-from langchain_litellm import ChatLiteLLM
+from .model_registry import get_llm
 from dotenv import load_dotenv
 import logging
 import re
@@ -109,11 +109,7 @@ def create_research_crew(
     logging.info(f"[Research] Creating crew for query: '{user_query}'")
     
     # --- Agent Configuration ---
-    llm = ChatLiteLLM(
-        model="gemini/gemini-2.0-flash",
-        temperature=0.4,  # Lower temperature for more precise research
-        api_key=google_api_key
-    )
+    llm = get_llm("gemini/gemini-2.0-flash", google_api_key, temperature=0.4)  # Lower temperature for more precise research
     
     search_tool = SerpApiGoogleSearchTool(api_key=serper_api_key)
     
@@ -7,8 +7,12 @@ import json
 import logging
 from typing import List, Dict, Optional
 
+from Ai_agents.rate_limiter import get_rate_limiter
+
 logging.basicConfig(level=logging.INFO)
 
+SUPER_NOTE_MODEL = "gemini/gemini-2.0-flash-exp"
+
 
 class SuperNoteGenerator:
     """
@@ -27,10 +31,11 @@ class SuperNoteGenerator:
         # Configure ChatLiteLLM
         # Supports: OpenAI, Anthropic, Gemini, etc.
         self.llm = ChatLiteLLM(
-            model="gemini/gemini-2.0-flash-exp",  # or "gpt-4", "claude-3-sonnet", etc.
+            model=SUPER_NOTE_MODEL,  # or "gpt-4", "claude-3-sonnet", etc.
             temperature=0.4,  # Slightly higher for creative synthesis
             api_key=os.getenv("GOOGLE_API_KEY")  # or OPENAI_API_KEY, ANTHROPIC_API_KEY
         )
+        self.rate_limiter = get_rate_limiter(SUPER_NOTE_MODEL, os.getenv("GOOGLE_API_KEY"))
         
         logging.info(f"✓ SuperNoteGenerator initialized with ChatLiteLLM")
     
@@ -131,6 +136,7 @@ Return ONLY valid JSON, no markdown formatting, no code blocks.
             # Call LLM
             from langchain_core.messages import HumanMessage
             
+            self.rate_limiter.acquire()
             response = self.llm.invoke([HumanMessage(content=prompt)])
             result_text = response.content
             
@@ -210,6 +216,7 @@ Return ONLY valid JSON, no markdown formatting, no code blocks.
         try:
             from langchain_core.messages import HumanMessage
             
+            self.rate_limiter.acquire()
             response = self.llm.invoke([HumanMessage(content=prompt)])
             result_text = response.content
             
@@ -290,6 +297,7 @@ Return ONLY valid JSON, no markdown formatting, no code blocks.
         try:
             from langchain_core.messages import HumanMessage
             
+            self.rate_limiter.acquire()
             response = self.llm.invoke([HumanMessage(content=prompt)])
             result_text = response.content
             
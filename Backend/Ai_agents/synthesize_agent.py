@@ -5,7 +5,7 @@ from datetime import datetime
 # from supabase_connect import get_supabase_manager # Not needed if agent doesn't directly access DB
 from dotenv import load_dotenv
 from typing import List, Optional
-from langchain_litellm import ChatLiteLLM
+from .model_registry import get_llm
 
 # --- NEW: Import prompts ---
 from .prompt import (
@@ -36,11 +36,7 @@ def create_synthesis_crew(
     current_time = datetime.now().strftime("%I:%M %p %Z on %A, %B %d, %Y")
     current_date = datetime.now().strftime("%Y-%m-%d")
 
-    llm = ChatLiteLLM(
-        model="gemini/gemini-2.0-flash",
-        temperature=0.6, # Keep some creativity for synthesis
-        api_key=google_api_key
-    )
+    llm = get_llm("gemini/gemini-2.0-flash", google_api_key, temperature=0.6)  # Keep some creativity for synthesis
 
     synthesizer_agent = Agent(
         role=SYNTHESIZER_ROLE,          # <-- Use variable
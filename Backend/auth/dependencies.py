@@ -1,9 +1,8 @@
 from fastapi import Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
-from psycopg2.extras import RealDictCursor
 
 from core.security import decode_access_token
-from core.database import get_db
+from core.executors import run_blocking
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
@@ -22,38 +21,30 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
 
 
 async def get_backend_user_id(
-    user = Depends(get_current_user),
-    db = Depends(get_db)
+    user = Depends(get_current_user)
 ):
     """
     Returns user_id, organization_id, and team context from JWT and database.
-    Fetches user's team memberships to enable team-level RBAC filtering.
+    Team memberships (primary team first) come from the cached UserContext,
+    so warm requests do not touch the connection pool at all. A JWT user
+    with no users row gets no teams rather than a 404.
     """
+    from core.permissions import get_cached_user_context
+
     user_id = str(user["id"])
     organization_id = str(user["organization_id"])
 
-    # Fetch user's team memberships
-    with db as conn:
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-        cursor.execute("""
-            SELECT tm.team_id, tm.is_primary
-            FROM team_members tm
-            WHERE tm.user_id = %s
-            ORDER BY tm.is_primary DESC, tm.joined_at ASC
-        """, (user_id,))
-
-        team_memberships = cursor.fetchall()
-
-    team_ids = [str(tm["team_id"]) for tm in team_memberships]
-    primary_team = next(
-        (tm for tm in team_memberships if tm["is_primary"]),
-        team_memberships[0] if team_memberships else None
-    )
+    try:
+        user_ctx = await run_blocking(get_cached_user_context, user)
+        team_ids = list(user_ctx.team_ids)
+    except HTTPException as e:
+        if e.status_code != 404:
+            raise
+        team_ids = []
 
     return {
         "user_id": user_id,
         "organization_id": organization_id,
-        "team_id": str(primary_team["team_id"]) if primary_team else None,
+        "team_id": team_ids[0] if team_ids else None,
         "team_ids": team_ids
     }
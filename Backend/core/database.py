@@ -1,19 +1,285 @@
 import os
+import logging
+import threading
+from collections import deque
+from time import monotonic
+from typing import Dict, Optional
+
 import psycopg2
+from psycopg2 import extensions
 from psycopg2.extras import RealDictCursor
 from dotenv import load_dotenv
 from contextlib import contextmanager
 
+from core.executors import BLOCKING_POOL_SIZE
+
 load_dotenv()
 
+# Threads FastAPI runs sync endpoints / dependencies on (anyio's default is 40;
+# main.py applies this value at startup)
+REQUEST_THREADPOOL_SIZE = int(os.getenv("REQUEST_THREADPOOL_SIZE", "40"))
+
+# Bounded pool shared by get_db / get_db_context (one process = one pool).
+# Sized so every request thread plus every blocking-pool worker can hold a
+# connection at once: long sync endpoints never starve the rest of the API.
+# The limits are PER WORKER PROCESS: with gunicorn's --workers N, Postgres
+# may see up to N * DB_POOL_MAX_SIZE connections at peak, so keep that under
+# max_connections. Idle connections beyond DB_POOL_MIN_SIZE are closed after
+# DB_POOL_MAX_IDLE_SECONDS, so a burst does not pin them open.
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", str(REQUEST_THREADPOOL_SIZE + BLOCKING_POOL_SIZE)))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))  # seconds to wait for a free connection
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+DB_POOL_HEALTH_CHECK_SECONDS = float(os.getenv("DB_POOL_HEALTH_CHECK_SECONDS", "30"))  # ping connections idle longer
+DB_POOL_MAX_LIFETIME_SECONDS = float(os.getenv("DB_POOL_MAX_LIFETIME_SECONDS", "1800"))
+DB_POOL_MAX_IDLE_SECONDS = float(os.getenv("DB_POOL_MAX_IDLE_SECONDS", "300"))
+
+
+class PoolTimeout(psycopg2.OperationalError):
+    """No connection became free within DB_POOL_TIMEOUT."""
+
+
+class ConnectionPool:
+    """
+    Thread-safe bounded psycopg2 pool.
+
+    - at most `max_size` connections; callers wait (up to `timeout`) for one
+    - connections idle longer than `health_check_seconds` are pinged first
+    - connections are recycled after `max_lifetime_seconds`
+    - idle connections beyond `min_size` are closed after `max_idle_seconds`
+    - returned connections are rolled back if left inside a transaction
+    """
+
+    def __init__(
+        self,
+        dsn: Optional[str],
+        min_size: int = DB_POOL_MIN_SIZE,
+        max_size: int = DB_POOL_MAX_SIZE,
+        timeout: float = DB_POOL_TIMEOUT,
+        statement_timeout_ms: int = DB_STATEMENT_TIMEOUT_MS,
+        health_check_seconds: float = DB_POOL_HEALTH_CHECK_SECONDS,
+        max_lifetime_seconds: float = DB_POOL_MAX_LIFETIME_SECONDS,
+        max_idle_seconds: float = DB_POOL_MAX_IDLE_SECONDS
+    ):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.statement_timeout_ms = statement_timeout_ms
+        self.health_check_seconds = health_check_seconds
+        self.max_lifetime_seconds = max_lifetime_seconds
+        self.max_idle_seconds = max_idle_seconds
+
+        self._idle = deque()           # (conn, created_at, returned_at), oldest return first
+        self._created_at: Dict[int, float] = {}  # id(conn) -> created_at
+        self._size = 0                 # open + being-opened connections
+        self._cond = threading.Condition()
+        self._closed = False
+
+        self.checkouts = 0
+        self.waiters = 0
+        self.timeouts = 0
+        self.discarded = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    # ------------------------------------------------------------------
+    # Connections
+    # ------------------------------------------------------------------
+
+    def _connect(self):
+        options = '-c client_encoding=UTF8'
+        if self.statement_timeout_ms:
+            options += f' -c statement_timeout={self.statement_timeout_ms}'
+        return psycopg2.connect(self.dsn, cursor_factory=RealDictCursor, options=options)
+
+    def _healthy(self, conn, created_at: float, returned_at: float) -> bool:
+        now = monotonic()
+        if conn.closed:
+            return False
+        if self.max_lifetime_seconds and now - created_at > self.max_lifetime_seconds:
+            return False
+        if now - returned_at > self.health_check_seconds:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                conn.rollback()
+            except psycopg2.Error:
+                return False
+        return True
+
+    def _take_expired_idle(self) -> list:
+        """
+        Pop idle connections unused for `max_idle_seconds`, keeping `min_size`.
+
+        Checkout is LIFO, so the front of `_idle` holds the connections that
+        have been unused longest. Call with `_cond` held; close the returned
+        connections with _discard() after releasing it.
+        """
+        expired = []
+        now = monotonic()
+        while (
+            len(self._idle) > self.min_size
+            and now - self._idle[0][2] > self.max_idle_seconds
+        ):
+            expired.append(self._idle.popleft()[0])
+        return expired
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._created_at.pop(id(conn), None)
+            self._size -= 1
+            self.discarded += 1
+            self._cond.notify()
+
+    # ------------------------------------------------------------------
+    # Checkout / return
+    # ------------------------------------------------------------------
+
+    def getconn(self):
+        """Borrow a connection, waiting up to `timeout` when the pool is full."""
+        start = monotonic()
+        while True:
+            entry = None
+            with self._cond:
+                expired = self._take_expired_idle()
+            for stale in expired:
+                self._discard(stale)
+
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise psycopg2.OperationalError("Connection pool is closed")
+                    if self._idle:
+                        entry = self._idle.pop()  # LIFO: warmest connection first
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1  # Reserve a slot, connect outside the lock
+                        break
+                    remaining = self.timeout - (monotonic() - start)
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise PoolTimeout(
+                            f"No database connection available within {self.timeout}s "
+                            f"(pool size {self.max_size})"
+                        )
+                    self.waiters += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self.waiters -= 1
+
+            if entry is not None:
+                conn, created_at, returned_at = entry
+                if not self._healthy(conn, created_at, returned_at):
+                    self._discard(conn)
+                    continue
+            else:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._created_at[id(conn)] = monotonic()
+
+            waited = monotonic() - start
+            with self._cond:
+                self.checkouts += 1
+                self.total_wait += waited
+                self.max_wait = max(self.max_wait, waited)
+            return conn
+
+    def putconn(self, conn, discard: bool = False):
+        """Return a borrowed connection (closed / broken ones are replaced)."""
+        if not discard and not conn.closed:
+            try:
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+        if discard or conn.closed or self._closed:
+            self._discard(conn)
+            return
+        with self._cond:
+            created_at = self._created_at.get(id(conn), monotonic())
+            self._idle.append((conn, created_at, monotonic()))
+            expired = self._take_expired_idle()
+            self._cond.notify()
+        for stale in expired:
+            self._discard(stale)
+
+    def close_all(self):
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+        for conn, _, _ in idle:
+            self._discard(conn)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            idle = len(self._idle)
+            return {
+                'size': self._size,
+                'max_size': self.max_size,
+                'in_use': self._size - idle,
+                'idle': idle,
+                'waiters': self.waiters,
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'discarded': self.discarded,
+                'avg_wait_ms': round(self.total_wait / self.checkouts * 1000, 2) if self.checkouts else 0.0,
+                'max_wait_ms': round(self.max_wait * 1000, 2),
+            }
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Return the process-wide connection pool (created on first use)."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(os.getenv("DATABASE_URL"))
+                logging.info(
+                    f"Database pool created (max {_pool.max_size} connections, "
+                    f"statement_timeout {_pool.statement_timeout_ms}ms)"
+                )
+    return _pool
+
+
+def get_pool_stats() -> Optional[Dict]:
+    """Pool metrics for health/metrics endpoints (None before first use)."""
+    return _pool.stats() if _pool is not None else None
+
+
+def close_pool():
+    """Close every pooled connection (call on shutdown)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close_all()
+            _pool = None
+
+
 # For FastAPI Depends() - NO decorator
+# The connection is held until the response is sent, so only endpoints that
+# query Postgres depend on it; auth/RBAC dependencies borrow one briefly via
+# get_db_context() on a cache miss instead.
 def get_db():
     """Database dependency for FastAPI endpoints"""
-    conn = psycopg2.connect(
-        os.getenv("DATABASE_URL"),
-        cursor_factory=RealDictCursor,
-        options='-c client_encoding=UTF8'
-    )
+    pool = get_pool()
+    conn = pool.getconn()
     try:
         yield conn
         conn.commit()
@@ -21,17 +287,14 @@ def get_db():
         conn.rollback()
         raise
     finally:
-        conn.close()
+        pool.putconn(conn)
 
 # For manual usage with "with" statement - HAS decorator
 @contextmanager
 def get_db_context():
     """Database context manager for manual usage"""
-    conn = psycopg2.connect(
-        os.getenv("DATABASE_URL"),
-        cursor_factory=RealDictCursor,
-        options='-c client_encoding=UTF8'
-    )
+    pool = get_pool()
+    conn = pool.getconn()
     try:
         yield conn
         conn.commit()
@@ -39,4 +302,4 @@ def get_db_context():
         conn.rollback()
         raise
     finally:
-        conn.close()
\ No newline at end of file
+        pool.putconn(conn)
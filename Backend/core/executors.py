@@ -0,0 +1,129 @@
+"""
+Thread pool for blocking work called from async code.
+
+The Supabase client, LangChain embedding models and CrewAI/LiteLLM
+generators are all synchronous. Calling them directly inside an
+`async def` stalls the FastAPI event loop for the whole call, so every
+other request waits behind an ETL run.
+
+run_blocking() moves such calls onto a dedicated, bounded thread pool
+(separate from the loop's default executor) and awaits the result.
+
+Pure-Python CPU work (PDF/OCR text extraction, spreadsheet parsing) holds
+the GIL, so threads don't help; run_cpu_bound() runs it in a process pool
+instead. The callable and its arguments must be picklable (module-level
+functions, bytes/str/dict arguments).
+
+Usage:
+    from core.executors import run_blocking, run_cpu_bound
+
+    vectors = await run_blocking(embeddings_model.embed_documents, chunks)
+    result = await run_blocking(supabase.table("x").insert(rows).execute)
+    text = await run_cpu_bound(extract_pdf_text, pdf_bytes)
+"""
+
+import os
+import asyncio
+import functools
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+BLOCKING_POOL_SIZE = int(os.getenv("BLOCKING_POOL_SIZE", "16"))
+CPU_POOL_SIZE = int(os.getenv("CPU_POOL_SIZE", str(os.cpu_count() or 2)))  # 0 = use the thread pool
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+_cpu_executor: Optional[ProcessPoolExecutor] = None
+_cpu_executor_lock = threading.Lock()
+
+
+def get_blocking_executor() -> ThreadPoolExecutor:
+    """Return the process-wide executor for blocking I/O and model calls."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=BLOCKING_POOL_SIZE,
+                    thread_name_prefix="kogna-blocking"
+                )
+    return _executor
+
+
+async def run_blocking(func: Callable[..., T], *args, **kwargs) -> T:
+    """
+    Run a blocking callable in the shared thread pool without blocking the event loop.
+
+    Args:
+        func: Synchronous callable
+        *args, **kwargs: Arguments passed to func
+
+    Returns:
+        Whatever func returns (exceptions are re-raised in the caller)
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_blocking_executor(),
+        functools.partial(func, *args, **kwargs)
+    )
+
+
+def shutdown_blocking_executor(wait: bool = True):
+    """Shut down the shared executor (called on application shutdown)."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait)
+            _executor = None
+
+
+def get_cpu_executor() -> ProcessPoolExecutor:
+    """Return the process-wide pool for CPU-bound work."""
+    global _cpu_executor
+    if _cpu_executor is None:
+        with _cpu_executor_lock:
+            if _cpu_executor is None:
+                # spawn: forking a process that runs threads (event loop,
+                # thread pool, HTTP clients) can deadlock the child
+                _cpu_executor = ProcessPoolExecutor(
+                    max_workers=CPU_POOL_SIZE,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+    return _cpu_executor
+
+
+async def run_cpu_bound(func: Callable[..., T], *args) -> T:
+    """
+    Run a picklable CPU-bound callable in the process pool.
+
+    Falls back to run_blocking() when CPU_POOL_SIZE is 0. If a worker
+    process dies, the pool is replaced and the call is retried once.
+    """
+    if CPU_POOL_SIZE <= 0:
+        return await run_blocking(func, *args)
+
+    global _cpu_executor
+    loop = asyncio.get_running_loop()
+    executor = get_cpu_executor()
+    try:
+        return await loop.run_in_executor(executor, func, *args)
+    except BrokenProcessPool:
+        with _cpu_executor_lock:
+            if _cpu_executor is executor:
+                _cpu_executor = None
+        return await loop.run_in_executor(get_cpu_executor(), func, *args)
+
+
+def shutdown_cpu_executor(wait: bool = True):
+    """Shut down the process pool (called on application shutdown)."""
+    global _cpu_executor
+    with _cpu_executor_lock:
+        if _cpu_executor is not None:
+            _cpu_executor.shutdown(wait=wait, cancel_futures=True)
+            _cpu_executor = None
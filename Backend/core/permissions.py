@@ -4,14 +4,18 @@ Connects user_id with roles/permissions to secure AI agents and data access.
 """
 
 import os
-from typing import List, Optional, Dict, Any
+import threading
+from contextlib import contextmanager
+from time import monotonic
+from typing import List, Optional, Dict, Any, Tuple
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials
 from auth.dependencies import get_current_user
-from core.database import get_db, get_db_context
+from core.database import get_db_context
 from supabase import create_client, Client
 from dotenv import load_dotenv
 from core.database import get_db_context
+from core.executors import run_blocking
 
 load_dotenv()
 
@@ -20,6 +24,9 @@ SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
+# Resolved UserContext per user id; invalidated on team / role / profile changes
+USER_CONTEXT_TTL_SECONDS = int(os.getenv("USER_CONTEXT_TTL_SECONDS", "60"))
+
 
 # ============================================
 # USER CONTEXT CLASS
@@ -104,6 +111,16 @@ class UserContext:
 # CORE PERMISSION FUNCTIONS
 # ============================================
 
+# Reuse the caller's connection (e.g. the request's get_db connection) when given,
+# otherwise borrow one from the pool for this lookup.
+@contextmanager
+def _connection(conn=None):
+    if conn is not None:
+        yield conn
+    else:
+        with get_db_context() as pooled_conn:
+            yield pooled_conn
+
 #this fetch user from users table by their Supabase auth ID.
 def get_user_from_supabase_id(supabase_id: str) -> Optional[Dict[str, Any]]:
     """
@@ -123,15 +140,16 @@ def get_user_from_supabase_id(supabase_id: str) -> Optional[Dict[str, Any]]:
         return cursor.fetchone()
 
 #this function will fetch user's role, role level, and all permissions.
-def get_user_role_and_permissions(user_id: str) -> Dict[str, Any]:
+def get_user_role_and_permissions(user_id: str, conn=None) -> Dict[str, Any]:
     """
     Args:
         user_id: Internal user ID from users table
+        conn: Existing database connection to reuse (optional)
 
     Returns:
         Dict with role_name, role_level, and permissions list
     """
-    with get_db_context() as conn:
+    with _connection(conn) as conn:
         cursor = conn.cursor()
 
         # Get role information
@@ -176,15 +194,16 @@ def get_user_role_and_permissions(user_id: str) -> Dict[str, Any]:
 
 
 #this will set list of team IDs the user belongs to.
-def get_user_teams(user_id: str) -> List[str]:
+def get_user_teams(user_id: str, conn=None) -> List[str]:
     """
     Args:
         user_id: Internal user ID from users table
+        conn: Existing database connection to reuse (optional)
 
     Returns:
         List of team IDs
     """
-    with get_db_context() as conn:
+    with _connection(conn) as conn:
         cursor = conn.cursor()
         cursor.execute("""
             SELECT team_id
@@ -194,28 +213,56 @@ def get_user_teams(user_id: str) -> List[str]:
         teams = cursor.fetchall()
         return [str(team['team_id']) for team in teams]
 
+# User row, role, permissions and teams in one round-trip (teams ordered primary first)
+USER_CONTEXT_QUERY = """
+    SELECT
+        u.id, u.organization_id, u.first_name, u.second_name, u.email,
+        r.name AS role_name,
+        r.level AS role_level,
+        COALESCE((
+            SELECT json_agg(json_build_object(
+                'resource', p.resource, 'action', p.action, 'scope', p.scope
+            ))
+            FROM user_roles ur
+            JOIN role_permissions rp ON ur.role_id = rp.role_id
+            JOIN permissions p ON rp.permission_id = p.id
+            WHERE ur.user_id = u.id
+        ), '[]'::json) AS permissions,
+        COALESCE((
+            SELECT array_agg(tm.team_id::text ORDER BY tm.is_primary DESC, tm.joined_at ASC)
+            FROM team_members tm
+            WHERE tm.user_id = u.id
+        ), '{}') AS team_ids
+    FROM users u
+    LEFT JOIN LATERAL (
+        SELECT r.name, r.level
+        FROM user_roles ur
+        JOIN roles r ON ur.role_id = r.id
+        WHERE ur.user_id = u.id
+        LIMIT 1
+    ) r ON TRUE
+    WHERE u.id = %s
+"""
+
 #Build complete UserContext from JWT user data. This is the main function that connects authentication with RBAC.
-def build_user_context(jwt_user: dict) -> UserContext:
+def build_user_context(jwt_user: dict, conn=None) -> UserContext:
     """
     Args:
         jwt_user: User dict from JWT token with 'id', 'email', 'organization_id'
+        conn: Existing database connection to reuse (optional)
 
     Returns:
         UserContext with full role and permission information
+        (team_ids ordered primary team first)
 
     Raises:
         HTTPException: If user not found in database
     """
     user_id = jwt_user["id"]
-    
-    # Get user from database
-    with get_db_context() as conn:
+
+    with _connection(conn) as conn:
         cursor = conn.cursor()
-        cursor.execute("""
-            SELECT id, organization_id, first_name, second_name, email
-            FROM users
-            WHERE id = %s
-        """, (user_id,))
+        cursor.execute(USER_CONTEXT_QUERY, (user_id,))
         db_user = cursor.fetchone()
 
     if not db_user:
@@ -224,11 +271,17 @@ def build_user_context(jwt_user: dict) -> UserContext:
             detail=f"User with ID {user_id} not found in database."
         )
 
-    # Get role and permissions
-    role_data = get_user_role_and_permissions(user_id)
-
-    # Get teams
-    team_ids = get_user_teams(user_id)
+    if db_user['role_name']:
+        role_name = db_user['role_name']
+        role_level = db_user['role_level']
+        # Format permissions as 'resource:action:scope'
+        permissions = [
+            f"{perm['resource']}:{perm['action']}:{perm['scope']}"
+            for perm in db_user['permissions'] or []
+        ]
+    else:
+        # Default to viewer if no role assigned
+        role_name, role_level, permissions = "viewer", 1, []
 
     # Build context
     return UserContext(
@@ -238,13 +291,49 @@ def build_user_context(jwt_user: dict) -> UserContext:
         organization_id=str(db_user['organization_id']) if db_user['organization_id'] else None,
         first_name=db_user.get('first_name'),
         second_name=db_user.get('second_name'),
-        role_name=role_data['role_name'],
-        role_level=role_data['role_level'],
-        permissions=role_data['permissions'],
-        team_ids=team_ids
+        role_name=role_name,
+        role_level=role_level,
+        permissions=permissions,
+        team_ids=[str(team_id) for team_id in db_user['team_ids'] or []]
     )
 
 
+# ============================================
+# USER CONTEXT CACHE
+# ============================================
+
+# {user_id: (resolved_at, UserContext)}
+_user_context_cache: Dict[str, Tuple[float, UserContext]] = {}
+_user_context_lock = threading.Lock()
+
+
+def get_cached_user_context(jwt_user: dict, conn=None) -> UserContext:
+    """
+    build_user_context() with a per-user TTL cache (USER_CONTEXT_TTL_SECONDS).
+
+    Call invalidate_user_context() after changing a user's teams, role or profile.
+    """
+    user_id = str(jwt_user["id"])
+    with _user_context_lock:
+        entry = _user_context_cache.get(user_id)
+    if entry is not None and monotonic() - entry[0] < USER_CONTEXT_TTL_SECONDS:
+        return entry[1]
+
+    user_ctx = build_user_context(jwt_user, conn)
+    with _user_context_lock:
+        _user_context_cache[user_id] = (monotonic(), user_ctx)
+    return user_ctx
+
+
+def invalidate_user_context(*user_ids) -> None:
+    """Drop cached contexts for the given users (all users if none given)."""
+    with _user_context_lock:
+        if not user_ids:
+            _user_context_cache.clear()
+        for user_id in user_ids:
+            _user_context_cache.pop(str(user_id), None)
+
+
 # ============================================
 # FASTAPI DEPENDENCY FUNCTIONS
 # ============================================
@@ -260,8 +349,12 @@ async def get_user_context(user = Depends(get_current_user)) -> UserContext:
                 # Return all data
             else:
                 # Return filtered data
+
+    Served from the per-user cache; on a miss it borrows a pooled
+    connection for that one query only, so the request does not hold a
+    connection while the endpoint runs.
     """
-    return build_user_context(user)
+    return await run_blocking(get_cached_user_context, user)
 
 
 #this factory function to create a dependency that requires a specific permission.
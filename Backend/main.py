@@ -100,12 +100,19 @@ async def detailed_health_check():
     
     # Check database connectivity
     try:
-        from core.database import SessionLocal
-        db = SessionLocal()
-        # Simple query to verify DB connection
-        db.execute("SELECT 1")
-        db.close()
+        from core.database import get_db_context, get_pool_stats
+        from core.executors import run_blocking
+        from services.trace_writer import get_trace_writer_stats
+
+        def ping():
+            # Simple query to verify DB connection (through the shared pool)
+            with get_db_context() as conn:
+                conn.cursor().execute("SELECT 1")
+
+        await run_blocking(ping)
         checks["database"] = "healthy"
+        checks["database_pool"] = get_pool_stats()
+        checks["agent_trace_writer"] = get_trace_writer_stats()
         logger.info("Database health check: healthy")
     except Exception as e:
         checks["database"] = f"unhealthy: {str(e)}"
@@ -125,6 +132,14 @@ async def startup_event():
     logger.info("Environment: Production-ready with AWS support")
     logger.info("=" * 50)
 
+    # Match the request threadpool to the size the DB pool was computed from
+    try:
+        import anyio.to_thread
+        from core.database import REQUEST_THREADPOOL_SIZE
+        anyio.to_thread.current_default_thread_limiter().total_tokens = REQUEST_THREADPOOL_SIZE
+    except Exception as e:
+        logger.error(f"Failed to size request threadpool: {e}")
+
     # Start KPI Scheduler (Phase 5)
     try:
         from services.kpi_scheduler import run_kpi_scheduler
@@ -148,6 +163,34 @@ async def shutdown_event():
     except Exception as e:
         logger.error(f"Error stopping KPI Scheduler: {e}")
 
+    # Flush agent traces still waiting to be written
+    try:
+        from services.trace_writer import shutdown_trace_writer
+        shutdown_trace_writer()
+    except Exception as e:
+        logger.error(f"Error flushing agent traces: {e}")
+
+    # Close pooled Postgres connections
+    try:
+        from core.database import close_pool
+        close_pool()
+    except Exception as e:
+        logger.error(f"Error closing database pool: {e}")
+
+    # Release threads used for blocking Supabase / model calls
+    try:
+        from core.executors import shutdown_blocking_executor
+        shutdown_blocking_executor(wait=False)
+    except Exception as e:
+        logger.error(f"Error shutting down blocking executor: {e}")
+
+    # Stop worker processes used for PDF / spreadsheet extraction
+    try:
+        from core.executors import shutdown_cpu_executor
+        shutdown_cpu_executor(wait=False)
+    except Exception as e:
+        logger.error(f"Error shutting down CPU executor: {e}")
+
 # ==================== GLOBAL EXCEPTION HANDLER ====================
 
 @app.exception_handler(Exception)
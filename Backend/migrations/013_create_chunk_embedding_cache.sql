@@ -0,0 +1,30 @@
+-- ============================================================================
+-- Create chunk_embedding_cache Table
+-- ============================================================================
+-- Content-addressed cache of chunk embeddings, keyed by embedding model and
+-- sha256(chunk_text) (the same hash stored in document_chunks.chunk_hash).
+--
+-- Used by services/embedding_cache.py so that re-processing a modified file
+-- only sends the chunks whose text actually changed to the embedding API.
+--
+-- Retention:
+-- - Rows not read for 90 days are deleted by cleanup_old_metrics()
+--   in services/kpi_scheduler.py (keyed on last_used_at)
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS chunk_embedding_cache (
+    id BIGSERIAL PRIMARY KEY,
+    model TEXT NOT NULL,
+    chunk_hash TEXT NOT NULL,
+    embedding REAL[] NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    last_used_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    CONSTRAINT chunk_embedding_cache_model_hash_key UNIQUE (model, chunk_hash)
+);
+
+-- Retention job scans by recency
+CREATE INDEX IF NOT EXISTS idx_chunk_embedding_cache_last_used
+    ON chunk_embedding_cache (last_used_at);
+
+COMMENT ON TABLE chunk_embedding_cache IS
+    'Embeddings keyed by (model, sha256(chunk_text)); pruned by last_used_at';
@@ -0,0 +1,23 @@
+-- ============================================================================
+-- Add source_chunk_hashes to document_notes
+-- ============================================================================
+-- Records which chunks (by chunk_hash) each note was generated from, so that
+-- a modified file only regenerates the notes whose source chunks changed
+-- (see _apply_incremental_update in services/embedding_service.py).
+--
+-- Notes created before this migration have NULL source_chunk_hashes and are
+-- regenerated the next time their file changes.
+--
+-- Columns Added to document_notes:
+-- - source_chunk_hashes TEXT[]: sha256 hashes of the note's source chunks
+-- ============================================================================
+
+ALTER TABLE document_notes
+    ADD COLUMN IF NOT EXISTS source_chunk_hashes TEXT[];
+
+-- Diffing looks up a file version's chunks and notes by (user_id, file_hash)
+CREATE INDEX IF NOT EXISTS idx_document_chunks_user_file_hash
+    ON document_chunks (user_id, file_hash);
+
+CREATE INDEX IF NOT EXISTS idx_document_notes_user_file_hash
+    ON document_notes (user_id, file_hash);
@@ -0,0 +1,23 @@
+-- ============================================================================
+-- Create retention_cleanup_state Table
+-- ============================================================================
+-- Progress of the batched retention cleanup (services/retention_cleanup.py,
+-- run by cleanup_old_metrics() in services/kpi_scheduler.py).
+--
+-- When a run stops at its time budget, the last primary key it deleted is
+-- stored here so the next run resumes from that key instead of re-scanning
+-- from the start. A finished pass resets last_key to NULL.
+--
+-- Columns:
+-- - table_name: table being cleaned
+-- - last_key: last deleted primary key (as text), NULL when no pass is pending
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS retention_cleanup_state (
+    table_name TEXT PRIMARY KEY,
+    last_key TEXT,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+COMMENT ON TABLE retention_cleanup_state IS
+    'Resume point (last deleted key) per table for batched retention cleanup';
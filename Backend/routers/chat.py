@@ -10,6 +10,7 @@ from typing import List, Dict, Any, Optional
 # --- Supabase & Auth Dependencies ---
 from supabase_connect import get_supabase_manager 
 from auth.dependencies import get_current_user, get_backend_user_id
+from services.trace_writer import get_trace_writer
 
 # --- LangGraph Orchestrator ---
 # Update this import path to match your project structure
@@ -78,7 +79,7 @@ def save_message(session_id: str, user_id: str, sender: str, content: str) -> st
         raise HTTPException(status_code=500, detail=f"Database error during message save: {str(e)}")
 
 
-def save_agent_trace(
+def build_agent_trace(
     user_id: str,
     message_id: str, 
     output_data: str,
@@ -86,24 +87,17 @@ def save_agent_trace(
     tool_used: str = "",
     prompt_used: str = "",
     llm_model: str = ""
-):
-    """Saves a record of the agent's internal thought process/trace."""
-    try:
-        # This function is now correct (removed session_id)
-        supabase.table("agent_traces") \
-            .insert({
-                "user_id": user_id,
-                "message_id": message_id,
-                "step_number": step_number,
-                "prompt_used": prompt_used[:1000] if prompt_used else None,
-                "tool_used": tool_used,
-                "llm_model": llm_model,
-                "output_data": output_data,
-            }) \
-            .execute()
-    except Exception as e:
-        logging.error(f"Failed to save agent trace: {e}")
-        pass # Don't fail the whole request if tracing fails
+) -> Dict[str, Any]:
+    """Builds an agent_traces row recording one step of the agent's thought process."""
+    return {
+        "user_id": user_id,
+        "message_id": message_id,
+        "step_number": step_number,
+        "prompt_used": prompt_used[:1000] if prompt_used else None,
+        "tool_used": tool_used,
+        "llm_model": llm_model,
+        "output_data": output_data,
+    }
 
 
 # =================================================================
@@ -268,7 +262,10 @@ def run_chat_agent(
         # We MUST do this *before* saving traces to get the ID
         assistant_message_id = save_message(session_id, user_id, "assistant", final_report)
         
-        # --- 4. Save STEP-BY-STEP Agent Traces ---
+        # --- 4. Queue STEP-BY-STEP Agent Traces ---
+        # Written in one bulk insert by the background trace writer, so the
+        # response does not wait on them (and tracing never fails the request)
+        traces = []
         for i, step_data in enumerate(agent_steps):
             # `step_data` is like {"triage_node": {...}}
             node_name = list(step_data.keys())[0]
@@ -279,14 +276,15 @@ def run_chat_agent(
             if node_name == "triage_node":
                 prompt = final_state.get('query_classification', 'N/A')
 
-            save_agent_trace(
+            traces.append(build_agent_trace(
                 user_id=user_id,
                 message_id=assistant_message_id, # Link all steps to the same final message
                 step_number=i + 1,
                 tool_used=node_name, # e.g., "triage_node", "researcher_node"
                 output_data=json.dumps(node_output, default=str),
                 prompt_used=prompt
-            )
+            ))
+        get_trace_writer().enqueue(traces)
         # =================================================================
         # ===== NEW TRACING LOGIC ENDS HERE =====
         # =================================================================
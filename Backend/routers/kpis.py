@@ -10,7 +10,7 @@ This module provides REST API endpoints for accessing KPI metrics, including:
 - Data export capabilities
 """
 
-from fastapi import APIRouter, HTTPException, status, Depends, Query, Response
+from fastapi import APIRouter, HTTPException, status, Depends, Query
 from fastapi.responses import StreamingResponse
 from typing import Optional, List, Dict, Any
 from datetime import datetime, timedelta, date
@@ -18,6 +18,7 @@ from decimal import Decimal
 import json
 import csv
 import io
+from uuid import uuid4
 
 from core.database import get_db
 from core.kpi_models import (
@@ -35,6 +36,7 @@ from core.kpi_models import (
 )
 from auth.dependencies import get_backend_user_id
 from psycopg2.extras import RealDictCursor
+from services import kpi_dashboard_cache as dashboard_cache
 
 router = APIRouter(prefix="/api/kpis", tags=["KPIs"])
 
@@ -94,6 +96,96 @@ def serialize_decimal(obj):
 # Endpoint 1: GET /api/kpis/dashboard
 # ============================================================================
 
+# {team_filter} is "" or " AND team_id = %(team_id)s"
+DASHBOARD_QUERY = """
+    WITH agent_rows AS (
+        SELECT agent_name, execution_count, avg_response_time_ms,
+               total_cost_usd, success_rate_percent
+        FROM mv_agent_performance_summary
+        WHERE organization_id = %(organization_id)s
+            AND period_start >= %(start_time)s
+            AND period_end <= %(end_time)s
+            {team_filter}
+    ),
+    agent_totals AS (
+        SELECT
+            COALESCE(AVG(avg_response_time_ms), 0) as avg_response_time_ms,
+            COALESCE(SUM(execution_count), 0) as total_queries,
+            COALESCE(SUM(total_cost_usd), 0) as total_cost_usd,
+            COALESCE(AVG(success_rate_percent), 0) as success_rate
+        FROM agent_rows
+    ),
+    by_agent AS (
+        SELECT
+            agent_name,
+            SUM(execution_count) as queries,
+            AVG(avg_response_time_ms) as avg_response_time_ms,
+            SUM(total_cost_usd) as cost_usd,
+            AVG(success_rate_percent) as success_rate
+        FROM agent_rows
+        GROUP BY agent_name
+    ),
+    connector_rows AS (
+        SELECT connector_type, kpi_category, source_id, last_extraction
+        FROM mv_connector_kpi_trends
+        WHERE organization_id = %(organization_id)s
+            AND date >= %(start_time)s::date
+            {team_filter}
+    ),
+    connector_categories AS (
+        SELECT connector_type, json_object_agg(kpi_category, category_count) as kpis_by_category
+        FROM (
+            SELECT connector_type, kpi_category, COUNT(*) as category_count
+            FROM connector_rows
+            WHERE kpi_category IS NOT NULL
+            GROUP BY connector_type, kpi_category
+        ) categories
+        GROUP BY connector_type
+    ),
+    connectors AS (
+        SELECT
+            connector_type,
+            COUNT(DISTINCT source_id) as total_syncs,
+            COUNT(*) as total_kpis_extracted,
+            MAX(last_extraction) as last_sync
+        FROM connector_rows
+        GROUP BY connector_type
+    ),
+    engagement AS (
+        SELECT
+            COUNT(DISTINCT user_id) as active_users,
+            AVG(avg_satisfaction_score) as avg_satisfaction,
+            SUM(session_count) as total_sessions,
+            SUM(query_count) as engagement_queries,
+            AVG(total_session_duration_seconds::float / NULLIF(session_count, 0)) as avg_session_duration
+        FROM user_engagement_metrics
+        WHERE organization_id = %(organization_id)s
+            AND date >= %(start_time)s::date
+            AND date <= %(end_time)s::date
+            {team_filter}
+    )
+    SELECT
+        agent_totals.*,
+        engagement.*,
+        COALESCE(
+            (SELECT json_agg(a ORDER BY a.queries DESC) FROM by_agent a),
+            '[]'::json
+        ) as by_agent,
+        COALESCE(
+            (SELECT json_agg(json_build_object(
+                'connector_type', c.connector_type,
+                'total_syncs', c.total_syncs,
+                'total_kpis_extracted', c.total_kpis_extracted,
+                'last_sync', c.last_sync,
+                'kpis_by_category', COALESCE(cc.kpis_by_category, '{{}}'::json)
+            ))
+            FROM connectors c
+            LEFT JOIN connector_categories cc USING (connector_type)),
+            '[]'::json
+        ) as connectors
+    FROM agent_totals, engagement
+"""
+
 @router.get("/dashboard", response_model=KPIDashboard)
 def get_kpi_dashboard(
     days: int = Query(default=7, ge=1, le=365, description="Number of days to look back"),
@@ -109,7 +201,8 @@ def get_kpi_dashboard(
     - **organization_id**: Optional filter (defaults to user's organization)
     - **team_id**: Optional filter by team (requires team membership)
 
-    Uses materialized views for fast response times.
+    Uses materialized views for fast response times; responses are cached per
+    (organization, team, days) until the next materialized view refresh.
     """
     # Use user's organization if not specified
     target_org_id = organization_id or user["organization_id"]
@@ -125,150 +218,61 @@ def get_kpi_dashboard(
     if team_id:
         verify_user_team_access(user["user_id"], team_id, user.get("team_ids", []), db)
 
+    # Views only change on the scheduler's refresh, so serve the cached copy
+    key = dashboard_cache.cache_key(target_org_id, team_id, days)
+    cached = dashboard_cache.get_dashboard(key)
+    if cached is not None:
+        return cached
+    generation = dashboard_cache.current_generation()
+
     start_time, end_time = calculate_date_range(days)
 
     with db as conn:
         cursor = conn.cursor(cursor_factory=RealDictCursor)
 
-        # Build team filter clause
-        team_filter = ""
-        base_params = [target_org_id, start_time, end_time]
-        if team_id:
-            team_filter = " AND team_id = %s"
-            base_params.append(team_id)
-
-        # ===== Agent Performance KPIs =====
-        cursor.execute(f"""
-            SELECT
-                COALESCE(AVG(avg_response_time_ms), 0) as avg_response_time_ms,
-                COALESCE(SUM(execution_count), 0) as total_queries,
-                COALESCE(SUM(total_cost_usd), 0) as total_cost_usd,
-                COALESCE(AVG(success_rate_percent), 0) as success_rate
-            FROM mv_agent_performance_summary
-            WHERE organization_id = %s
-                AND period_start >= %s
-                AND period_end <= %s
-                {team_filter}
-        """, base_params)
-
-        agent_agg = cursor.fetchone()
-
-        # Get per-agent breakdown
-        cursor.execute(f"""
-            SELECT
-                agent_name,
-                SUM(execution_count) as queries,
-                AVG(avg_response_time_ms) as avg_response_time_ms,
-                SUM(total_cost_usd) as cost_usd,
-                AVG(success_rate_percent) as success_rate
-            FROM mv_agent_performance_summary
-            WHERE organization_id = %s
-                AND period_start >= %s
-                AND period_end <= %s
-                {team_filter}
-            GROUP BY agent_name
-            ORDER BY queries DESC
-        """, base_params)
-
-        by_agent = cursor.fetchall()
-
-        agent_performance = AgentPerformanceKPI(
-            avg_response_time_ms=float(agent_agg["avg_response_time_ms"] or 0),
-            total_queries=int(agent_agg["total_queries"] or 0),
-            total_cost_usd=Decimal(str(agent_agg["total_cost_usd"] or 0)),
-            success_rate=float(agent_agg["success_rate"] or 0),
-            by_agent=[dict(row) for row in by_agent]
-        )
-
-        # ===== Connector KPIs =====
-        connector_params = [target_org_id, start_time]
-        connector_team_filter = ""
-        if team_id:
-            connector_team_filter = " AND team_id = %s"
-            connector_params.append(team_id)
-
-        cursor.execute(f"""
-            SELECT
-                connector_type,
-                COUNT(DISTINCT source_id) as total_syncs,
-                COUNT(*) as total_kpis_extracted,
-                MAX(last_extraction) as last_sync
-            FROM mv_connector_kpi_trends
-            WHERE organization_id = %s
-                AND date >= %s::date
-                {connector_team_filter}
-            GROUP BY connector_type
-        """, connector_params)
-
-        connector_rows = cursor.fetchall()
-        connector_kpis = {}
-
-        for row in connector_rows:
-            connector_type = row["connector_type"]
-
-            # Get KPIs by category for this connector
-            category_params = [target_org_id, connector_type, start_time]
-            if team_id:
-                category_params.append(team_id)
-
-            cursor.execute(f"""
-                SELECT kpi_category, COUNT(*) as count
-                FROM mv_connector_kpi_trends
-                WHERE organization_id = %s
-                    AND connector_type = %s
-                    AND date >= %s::date
-                    {connector_team_filter}
-                GROUP BY kpi_category
-            """, category_params)
-
-            kpis_by_category = {cat["kpi_category"]: cat["count"] for cat in cursor.fetchall()}
-
-            connector_kpis[connector_type] = ConnectorKPI(
-                connector_type=connector_type,
-                total_syncs=row["total_syncs"],
-                total_kpis_extracted=row["total_kpis_extracted"],
-                last_sync=row["last_sync"],
-                kpis_by_category=kpis_by_category
-            )
-
-        # ===== User Engagement KPIs =====
-        engagement_params = [target_org_id, start_time, end_time]
-        engagement_team_filter = ""
-        if team_id:
-            engagement_team_filter = " AND team_id = %s"
-            engagement_params.append(team_id)
-
-        cursor.execute(f"""
-            SELECT
-                COUNT(DISTINCT user_id) as active_users,
-                AVG(avg_satisfaction_score) as avg_satisfaction,
-                SUM(session_count) as total_sessions,
-                SUM(query_count) as total_queries,
-                AVG(total_session_duration_seconds::float / NULLIF(session_count, 0)) as avg_session_duration
-            FROM user_engagement_metrics
-            WHERE organization_id = %s
-                AND date >= %s::date
-                AND date <= %s::date
-                {engagement_team_filter}
-        """, engagement_params)
-
-        engagement = cursor.fetchone()
-
-        user_engagement = UserEngagementKPI(
-            active_users=int(engagement["active_users"] or 0),
-            avg_satisfaction=Decimal(str(engagement["avg_satisfaction"] or 0)) if engagement["avg_satisfaction"] else None,
-            total_sessions=int(engagement["total_sessions"] or 0),
-            total_queries=int(engagement["total_queries"] or 0),
-            avg_session_duration_seconds=float(engagement["avg_session_duration"] or 0)
-        )
-
-        return KPIDashboard(
-            agent_performance=agent_performance,
-            connector_kpis=connector_kpis,
-            user_engagement=user_engagement,
-            period_start=start_time,
-            period_end=end_time
-        )
+        # Agent, connector and engagement KPIs in one round-trip
+        team_filter = " AND team_id = %(team_id)s" if team_id else ""
+        cursor.execute(DASHBOARD_QUERY.format(team_filter=team_filter), {
+            "organization_id": target_org_id,
+            "team_id": team_id,
+            "start_time": start_time,
+            "end_time": end_time
+        })
+        row = cursor.fetchone()
+
+    # ===== Agent Performance KPIs =====
+    agent_performance = AgentPerformanceKPI(
+        avg_response_time_ms=float(row["avg_response_time_ms"] or 0),
+        total_queries=int(row["total_queries"] or 0),
+        total_cost_usd=Decimal(str(row["total_cost_usd"] or 0)),
+        success_rate=float(row["success_rate"] or 0),
+        by_agent=row["by_agent"] or []
+    )
+
+    # ===== Connector KPIs =====
+    connector_kpis = {
+        connector["connector_type"]: ConnectorKPI(**connector)
+        for connector in row["connectors"] or []
+    }
+
+    # ===== User Engagement KPIs =====
+    user_engagement = UserEngagementKPI(
+        active_users=int(row["active_users"] or 0),
+        avg_satisfaction=Decimal(str(row["avg_satisfaction"])) if row["avg_satisfaction"] else None,
+        total_sessions=int(row["total_sessions"] or 0),
+        total_queries=int(row["engagement_queries"] or 0),
+        avg_session_duration_seconds=float(row["avg_session_duration"] or 0)
+    )
+
+    dashboard = KPIDashboard(
+        agent_performance=agent_performance,
+        connector_kpis=connector_kpis,
+        user_engagement=user_engagement,
+        period_start=start_time,
+        period_end=end_time
+    )
+    dashboard_cache.put_dashboard(key, dashboard, generation)
+    return dashboard
 
 
 # ============================================================================
@@ -735,25 +739,92 @@ def submit_feedback(
 # Endpoint 6: GET /api/kpis/export
 # ============================================================================
 
+# Server-side cursor batch size and output buffer size for streamed exports
+EXPORT_FETCH_SIZE = 2000
+EXPORT_FLUSH_BYTES = 64 * 1024
+
+# kpi_type -> (export section, query); {team_filter} is "" or " AND team_id = %s"
+EXPORT_QUERIES = {
+    "agent": ("agent_performance", """
+        SELECT *
+        FROM mv_agent_performance_summary
+        WHERE organization_id = %s
+            AND period_start >= %s
+            AND period_end <= %s
+            {team_filter}
+        ORDER BY date DESC, hour DESC
+    """),
+    "connector": ("connector_kpis", """
+        SELECT *
+        FROM mv_connector_kpi_trends
+        WHERE organization_id = %s
+            AND date >= %s::date
+            AND date <= %s::date
+            {team_filter}
+        ORDER BY date DESC
+    """),
+    "engagement": ("user_engagement", """
+        SELECT *
+        FROM user_engagement_metrics
+        WHERE organization_id = %s
+            AND date >= %s::date
+            AND date <= %s::date
+            {team_filter}
+        ORDER BY date DESC
+    """),
+}
+
+
+def export_default(obj):
+    """JSON serializer for exported rows (Decimal, dates, UUIDs)"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    return str(obj)
+
+
+def stream_export_rows(conn, query: str, params: list, max_rows: int):
+    """
+    Yield rows from a server-side (named) cursor, EXPORT_FETCH_SIZE at a time,
+    so memory stays flat however many rows the export covers.
+    """
+    if max_rows:
+        query += " LIMIT %s"
+        params = params + [max_rows]
+
+    cursor = conn.cursor(name=f"kpi_export_{uuid4().hex}", cursor_factory=RealDictCursor)
+    cursor.itersize = EXPORT_FETCH_SIZE
+    try:
+        cursor.execute(query, params)
+        for row in cursor:
+            yield row
+    finally:
+        cursor.close()
+
+
 @router.get("/export")
 def export_kpis(
-    format: str = Query(default="json", regex="^(json|csv)$", description="Export format"),
+    format: str = Query(default="json", regex="^(json|csv|ndjson)$", description="Export format"),
     kpi_types: Optional[str] = Query(None, description="Comma-separated list: agent,connector,engagement"),
     date_range_start: Optional[datetime] = Query(None, description="Start date for export"),
     date_range_end: Optional[datetime] = Query(None, description="End date for export"),
     team_id: Optional[str] = Query(None, description="Filter by team ID"),
+    max_rows: int = Query(default=10000, ge=0, description="Max rows per KPI type (0 = no limit)"),
     user=Depends(get_backend_user_id),
     db=Depends(get_db)
 ):
     """
-    Export KPIs as CSV or JSON for reporting and BI integration.
+    Export KPIs as CSV, JSON or NDJSON for reporting and BI integration.
 
-    - **format**: Output format (json or csv)
+    - **format**: Output format (json, csv or ndjson - one record per line)
     - **kpi_types**: Which KPIs to include (agent, connector, engagement)
     - **date_range_start**: Start date (defaults to 30 days ago)
     - **date_range_end**: End date (defaults to now)
     - **team_id**: Optional filter by team (requires team membership)
+    - **max_rows**: Row cap per KPI type (default 10,000; 0 removes the cap)
 
+    Rows are streamed from server-side cursors as they are fetched.
     Rate limited to prevent abuse.
     """
     organization_id = user["organization_id"]
@@ -771,118 +842,107 @@ def export_kpis(
     # Parse KPI types
     requested_types = set(kpi_types.split(",")) if kpi_types else {"agent", "connector", "engagement"}
 
-    export_data = {}
-
-    with db as conn:
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
+    # Build team filter
+    team_filter = " AND team_id = %s" if team_id else ""
+    params = [organization_id, date_range_start, date_range_end]
+    if team_id:
+        params.append(team_id)
 
-        # Build team filter
-        team_filter = ""
-        if team_id:
-            team_filter = " AND team_id = %s"
+    sections = [
+        (section, query.format(team_filter=team_filter))
+        for kpi_type, (section, query) in EXPORT_QUERIES.items()
+        if kpi_type in requested_types
+    ]
+    exported_at = datetime.utcnow()
 
-        # Export Agent Performance
-        if "agent" in requested_types:
-            agent_params = [organization_id, date_range_start, date_range_end]
-            if team_id:
-                agent_params.append(team_id)
-
-            cursor.execute(f"""
-                SELECT *
-                FROM mv_agent_performance_summary
-                WHERE organization_id = %s
-                    AND period_start >= %s
-                    AND period_end <= %s
-                    {team_filter}
-                ORDER BY date DESC, hour DESC
-                LIMIT 10000
-            """, agent_params)
-
-            export_data["agent_performance"] = [dict(row) for row in cursor.fetchall()]
-
-        # Export Connector KPIs
-        if "connector" in requested_types:
-            connector_params = [organization_id, date_range_start, date_range_end]
-            if team_id:
-                connector_params.append(team_id)
-
-            cursor.execute(f"""
-                SELECT *
-                FROM mv_connector_kpi_trends
-                WHERE organization_id = %s
-                    AND date >= %s::date
-                    AND date <= %s::date
-                    {team_filter}
-                ORDER BY date DESC
-                LIMIT 10000
-            """, connector_params)
-
-            export_data["connector_kpis"] = [dict(row) for row in cursor.fetchall()]
-
-        # Export User Engagement
-        if "engagement" in requested_types:
-            engagement_params = [organization_id, date_range_start, date_range_end]
-            if team_id:
-                engagement_params.append(team_id)
-
-            cursor.execute(f"""
-                SELECT *
-                FROM user_engagement_metrics
-                WHERE organization_id = %s
-                    AND date >= %s::date
-                    AND date <= %s::date
-                    {team_filter}
-                ORDER BY date DESC
-                LIMIT 10000
-            """, engagement_params)
-
-            export_data["user_engagement"] = [dict(row) for row in cursor.fetchall()]
+    # The request's connection stays open until the response has been sent
+    def rows(query):
+        return stream_export_rows(db, query, params, max_rows)
 
-    # Format response based on requested format
-    if format == "csv":
-        # Create CSV output
+    def generate_csv():
         output = io.StringIO()
 
         # Write each KPI type to separate sections
-        for kpi_type, records in export_data.items():
-            if not records:
-                continue
-
-            output.write(f"\n# {kpi_type.upper()}\n")
-
-            if records:
-                writer = csv.DictWriter(output, fieldnames=records[0].keys())
-                writer.writeheader()
-                writer.writerows(records)
+        for section, query in sections:
+            writer = None
+            for row in rows(query):
+                if writer is None:
+                    output.write(f"\n# {section.upper()}\n")
+                    writer = csv.DictWriter(output, fieldnames=row.keys())
+                    writer.writeheader()
+                writer.writerow(row)
+                if output.tell() >= EXPORT_FLUSH_BYTES:
+                    yield output.getvalue()
+                    output.seek(0)
+                    output.truncate()
+            if writer is not None:
+                output.write("\n")
+
+        yield output.getvalue()
+
+    def generate_ndjson():
+        output = io.StringIO()
+        for section, query in sections:
+            for row in rows(query):
+                output.write(json.dumps({"kpi_type": section, "record": row}, default=export_default))
+                output.write("\n")
+                if output.tell() >= EXPORT_FLUSH_BYTES:
+                    yield output.getvalue()
+                    output.seek(0)
+                    output.truncate()
+        yield output.getvalue()
+
+    def generate_json():
+        # Same document as before; metadata goes last so record counts are known
+        output = io.StringIO()
+        output.write('{"success": true, "data": {')
+        record_counts = {}
+        for i, (section, query) in enumerate(sections):
+            output.write(f'{", " if i else ""}{json.dumps(section)}: [')
+            count = 0
+            for row in rows(query):
+                if count:
+                    output.write(", ")
+                output.write(json.dumps(row, default=export_default))
+                count += 1
+                if output.tell() >= EXPORT_FLUSH_BYTES:
+                    yield output.getvalue()
+                    output.seek(0)
+                    output.truncate()
+            output.write("]")
+            record_counts[section] = count
+
+        export_metadata = {
+            "organization_id": organization_id,
+            "team_id": team_id,
+            "date_range_start": date_range_start.isoformat(),
+            "date_range_end": date_range_end.isoformat(),
+            "kpi_types": list(requested_types),
+            "exported_at": exported_at.isoformat(),
+            "record_counts": record_counts
+        }
+        output.write(f'}}, "export_metadata": {json.dumps(export_metadata)}}}')
+        yield output.getvalue()
 
-            output.write("\n")
+    filename = f"kpi_export_{exported_at.strftime('%Y%m%d_%H%M%S')}"
 
+    # Format response based on requested format
+    if format == "csv":
         # Return as downloadable file
-        csv_content = output.getvalue()
-        output.close()
-
-        return Response(
-            content=csv_content,
+        return StreamingResponse(
+            generate_csv(),
             media_type="text/csv",
-            headers={
-                "Content-Disposition": f"attachment; filename=kpi_export_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.csv"
-            }
+            headers={"Content-Disposition": f"attachment; filename={filename}.csv"}
         )
 
-    else:  # JSON format
-        return {
-            "success": True,
-            "export_metadata": {
-                "organization_id": organization_id,
-                "team_id": team_id,
-                "date_range_start": date_range_start.isoformat(),
-                "date_range_end": date_range_end.isoformat(),
-                "kpi_types": list(requested_types),
-                "exported_at": datetime.utcnow().isoformat(),
-                "record_counts": {k: len(v) for k, v in export_data.items()}
-            },
-            "data": export_data
-        }
+    if format == "ndjson":
+        return StreamingResponse(
+            generate_ndjson(),
+            media_type="application/x-ndjson",
+            headers={"Content-Disposition": f"attachment; filename={filename}.ndjson"}
+        )
+
+    return StreamingResponse(generate_json(), media_type="application/json")
 
 
 # ============================================================================
@@ -12,7 +12,7 @@ from psycopg2.extras import RealDictCursor
 from uuid import UUID, uuid4
 from datetime import datetime
 
-from core.permissions import UserContext, get_user_context
+from core.permissions import UserContext, get_user_context, invalidate_user_context
 from routers.auth import _validate_password_strength, ph
 
 router = APIRouter(prefix="/api/teams", tags=["Teams"])
@@ -49,6 +49,8 @@ def add_team_member(member: TeamMemberAdd, db=Depends(get_db)):
                 (member.team_id, member.user_id, member.role, member.performance, member.capacity),
             )
             result = cursor.fetchone()
+            conn.commit()
+            invalidate_user_context(member.user_id)
             return {"success": True, "data": result}
         except psycopg2.IntegrityError:
             raise HTTPException(status_code=400, detail="User already in team")
@@ -123,6 +125,7 @@ def remove_team_member(
             (membership["id"],),
         )
         conn.commit()
+    invalidate_user_context(user_id)
 
     return {"success": True}
 
@@ -1057,6 +1060,7 @@ def accept_team_invitation(
         )
 
         conn.commit()
+    invalidate_user_context(user_id)
 
     return {
         "success": True,
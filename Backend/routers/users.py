@@ -10,7 +10,8 @@ from core.permissions import (
     get_user_context,
     UserContext,
     require_role_level,
-    require_organization_access
+    require_organization_access,
+    invalidate_user_context
 )
 import psycopg2
 from psycopg2.extras import RealDictCursor
@@ -512,6 +513,7 @@ async def update_user(
             cursor.execute(query, params)
             updated_user = cursor.fetchone()
             conn.commit()
+            invalidate_user_context(user_id)
 
             return {
                 "success": True,
@@ -578,6 +580,7 @@ async def delete_user(
         # cursor.execute("DELETE FROM users WHERE id = %s", (user_id,))
 
         conn.commit()
+        invalidate_user_context(user_id)
 
         return {
             "success": True,
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for cluster_and_split_chunks on synthetic embeddings.
+
+Generates topic-structured random vectors (768-d, like models/embedding-001)
+and times the clustering engine per document size and backend.
+
+Usage:
+    # Default: auto backend at 1k / 5k / 20k chunks
+    python Backend/scripts/benchmark_clustering.py
+
+    # Compare backends (exact is O(n²) - slow beyond a few thousand chunks)
+    python Backend/scripts/benchmark_clustering.py --sizes 1000,5000 --backends exact,minibatch
+
+    # Check determinism (same input → same groups)
+    python Backend/scripts/benchmark_clustering.py --sizes 2000 --repeat 2
+"""
+
+import os
+import io
+import sys
+import time
+import argparse
+import contextlib
+
+import numpy as np
+
+# Add Backend to path for imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from services.clustering import cluster_and_split_chunks
+
+
+def make_embeddings(n_chunks: int, dim: int, n_topics: int, seed: int = 0) -> np.ndarray:
+    """Random unit vectors scattered around `n_topics` centers."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_topics, dim))
+    assignments = rng.integers(0, n_topics, size=n_chunks)
+    return centers[assignments] + rng.normal(scale=0.8, size=(n_chunks, dim))
+
+
+def run(n_chunks: int, backend: str, dim: int, n_topics: int) -> tuple:
+    embeddings = make_embeddings(n_chunks, dim, n_topics)
+    chunks = [f"chunk {i}" for i in range(n_chunks)]
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        groups = cluster_and_split_chunks(
+            chunks,
+            embeddings,
+            backend=None if backend == "auto" else backend
+        )
+    elapsed = time.perf_counter() - start
+
+    signature = tuple(tuple(g['chunk_ids']) for g in groups)
+    return elapsed, len(groups), signature
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chunk clustering backends")
+    parser.add_argument("--sizes", default="1000,5000,20000",
+                        help="Comma-separated chunk counts (default: 1000,5000,20000)")
+    parser.add_argument("--backends", default="auto",
+                        help="Comma-separated backends: auto, exact, minibatch (default: auto)")
+    parser.add_argument("--dim", type=int, default=768, help="Embedding dimension (default: 768)")
+    parser.add_argument("--topics", type=int, default=5, help="Synthetic topics (default: 5)")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per size (default: 1)")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    backends = [b.strip() for b in args.backends.split(",")]
+
+    print(f"{'chunks':>8}  {'backend':>10}  {'seconds':>8}  {'ms/1k chunks':>12}  {'notes':>6}  deterministic")
+    print("-" * 70)
+
+    for n_chunks in sizes:
+        for backend in backends:
+            timings, signatures, n_groups = [], set(), 0
+            for _ in range(args.repeat):
+                elapsed, n_groups, signature = run(n_chunks, backend, args.dim, args.topics)
+                timings.append(elapsed)
+                signatures.add(signature)
+
+            best = min(timings)
+            deterministic = "yes" if len(signatures) == 1 else "NO"
+            if args.repeat == 1:
+                deterministic = "-"
+            print(f"{n_chunks:>8}  {backend:>10}  {best:>8.2f}  "
+                  f"{best / n_chunks * 1e6:>12.1f}  {n_groups:>6}  {deterministic}")
+
+
+if __name__ == "__main__":
+    main()
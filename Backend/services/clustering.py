@@ -0,0 +1,365 @@
+# services/clustering.py
+"""
+Clustering engine for grouping chunks into notes.
+
+cluster_and_split_chunks() does two-stage topic clustering (see its
+docstring). The k-means / silhouette work behind it is pluggable:
+
+    exact      KMeans(n_init=10) + full cosine silhouette  (small documents)
+    minibatch  MiniBatchKMeans + sampled silhouette        (large documents)
+
+get_clustering_backend() picks `minibatch` once a document reaches
+CLUSTERING_FAST_PATH_THRESHOLD chunks, unless CLUSTERING_BACKEND forces one.
+Inputs are converted to float32 and L2-normalized, so Euclidean k-means
+groups by cosine similarity. Every backend uses a fixed random_state, and
+labels are renumbered by first occurrence, so the same input always yields
+the same groups.
+
+Benchmark: python scripts/benchmark_clustering.py
+"""
+
+import os
+from typing import Dict, Optional
+
+import numpy as np
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics import silhouette_score
+
+CLUSTERING_BACKEND = os.getenv("CLUSTERING_BACKEND", "auto")  # auto | exact | minibatch
+CLUSTERING_FAST_PATH_THRESHOLD = int(os.getenv("CLUSTERING_FAST_PATH_THRESHOLD", "1000"))
+CLUSTERING_MINIBATCH_SIZE = int(os.getenv("CLUSTERING_MINIBATCH_SIZE", "1024"))
+SILHOUETTE_SAMPLE_SIZE = int(os.getenv("SILHOUETTE_SAMPLE_SIZE", "2000"))
+
+# Above this k, mini-batches leave most centroids empty; use single-init KMeans
+MINIBATCH_MAX_CLUSTERS = 32
+CLUSTERING_RANDOM_STATE = 42
+
+
+def normalize_embeddings(embeddings) -> np.ndarray:
+    """float32, row-wise L2-normalized copy of the embeddings."""
+    array = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(array, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return array / norms
+
+
+def _relabel_by_first_occurrence(labels) -> np.ndarray:
+    """Renumber cluster ids in order of first appearance (stable topic ids)."""
+    mapping: Dict[int, int] = {}
+    for label in labels:
+        if label not in mapping:
+            mapping[label] = len(mapping)
+    return np.array([mapping[label] for label in labels])
+
+
+class ClusteringBackend:
+    """Base class: subclasses implement _fit_predict() and score()."""
+
+    name = "base"
+
+    def fit_predict(self, embeddings: np.ndarray, n_clusters: int) -> np.ndarray:
+        return _relabel_by_first_occurrence(self._fit_predict(embeddings, n_clusters))
+
+    def _fit_predict(self, embeddings: np.ndarray, n_clusters: int) -> np.ndarray:
+        raise NotImplementedError
+
+    def score(self, embeddings: np.ndarray, labels: np.ndarray) -> float:
+        raise NotImplementedError
+
+
+class ExactKMeansBackend(ClusteringBackend):
+    """Full KMeans with exact O(n²) silhouette - best quality for small inputs."""
+
+    name = "exact"
+
+    def _fit_predict(self, embeddings, n_clusters):
+        return KMeans(
+            n_clusters=n_clusters, random_state=CLUSTERING_RANDOM_STATE, n_init=10
+        ).fit_predict(embeddings)
+
+    def score(self, embeddings, labels):
+        return silhouette_score(embeddings, labels, metric='cosine')
+
+
+class MiniBatchKMeansBackend(ClusteringBackend):
+    """
+    MiniBatchKMeans with silhouette on a fixed random sample.
+
+    Size-based sub-splitting asks for many small clusters, where mini-batch
+    updates collapse into a few huge ones; those calls use KMeans with a
+    single k-means++ init instead (same groups as n_init=10 at ~1/10 cost).
+    """
+
+    name = "minibatch"
+
+    def __init__(
+        self,
+        batch_size: int = CLUSTERING_MINIBATCH_SIZE,
+        sample_size: int = SILHOUETTE_SAMPLE_SIZE
+    ):
+        self.batch_size = batch_size
+        self.sample_size = sample_size
+
+    def _fit_predict(self, embeddings, n_clusters):
+        if n_clusters > MINIBATCH_MAX_CLUSTERS:
+            return KMeans(
+                n_clusters=n_clusters, random_state=CLUSTERING_RANDOM_STATE, n_init=1
+            ).fit_predict(embeddings)
+        return MiniBatchKMeans(
+            n_clusters=n_clusters,
+            random_state=CLUSTERING_RANDOM_STATE,
+            batch_size=self.batch_size,
+            n_init=3
+        ).fit_predict(embeddings)
+
+    def score(self, embeddings, labels):
+        # Inputs are unit vectors, so Euclidean ranks like cosine but is cheaper
+        sample_size = self.sample_size if len(embeddings) > self.sample_size else None
+        return silhouette_score(
+            embeddings,
+            labels,
+            metric='euclidean',
+            sample_size=sample_size,
+            random_state=CLUSTERING_RANDOM_STATE
+        )
+
+
+CLUSTERING_BACKENDS: Dict[str, ClusteringBackend] = {
+    "exact": ExactKMeansBackend(),
+    "minibatch": MiniBatchKMeansBackend(),
+}
+
+
+def get_clustering_backend(n_samples: int, name: Optional[str] = None) -> ClusteringBackend:
+    """
+    Pick the backend for `n_samples` vectors.
+
+    Args:
+        n_samples: Number of vectors to cluster
+        name: Explicit backend name (overrides CLUSTERING_BACKEND)
+    """
+    name = name or CLUSTERING_BACKEND
+    if name == "auto":
+        name = "minibatch" if n_samples >= CLUSTERING_FAST_PATH_THRESHOLD else "exact"
+    if name not in CLUSTERING_BACKENDS:
+        raise ValueError(f"Unknown clustering backend: {name}")
+    return CLUSTERING_BACKENDS[name]
+
+
+# =============================================================================
+#  HYBRID CLUSTERING FUNCTION (Two-Stage)
+# =============================================================================
+
+def cluster_and_split_chunks(chunks, chunk_embeddings, 
+                             min_chunks_per_note=5, 
+                             max_chunks_per_note=12,
+                             backend: Optional[str] = None):
+    """
+    Two-stage intelligent grouping for optimal note generation.
+    
+    Stage 1: Cluster by TOPIC (semantic similarity)
+        - Groups semantically related chunks together
+        - Creates topic-focused clusters (e.g., Finance, HR, Product)
+    
+    Stage 2: Split large clusters into sub-groups
+        - Ensures no note exceeds max_chunks_per_note
+        - Maintains topic coherence within sub-groups
+    
+    Example with 50 chunks:
+        Stage 1 → 3 topics:
+            Topic 0 (Revenue): 25 chunks
+            Topic 1 (Team): 15 chunks
+            Topic 2 (Product): 10 chunks
+        
+        Stage 2 → Split large topics:
+            Topic 0 → 3 sub-notes (9, 8, 8 chunks)
+            Topic 1 → 2 sub-notes (8, 7 chunks)
+            Topic 2 → 1 note (10 chunks)
+        
+        Result: 6 focused notes, each 7-10 chunks
+    
+    Args:
+        chunks: List of text chunks
+        chunk_embeddings: List of embeddings (vectors)
+        min_chunks_per_note: Minimum chunks for a note (default: 5)
+        max_chunks_per_note: Maximum chunks per note (default: 12)
+        backend: Force a clustering backend ('exact' | 'minibatch'),
+                 default picks by size (see get_clustering_backend)
+        
+    Returns:
+        List of note groups: [{chunks, chunk_ids, topic_cluster, sub_group, ...}, ...]
+    """
+    
+    print(f"\n Hybrid Clustering: {len(chunks)} chunks")
+    
+    # Handle edge cases
+    if len(chunks) < min_chunks_per_note:
+        print(f"   ⚠ Too few chunks ({len(chunks)}), creating single group")
+        return [{
+            'chunks': chunks,
+            'chunk_ids': list(range(len(chunks))),
+            'topic_cluster': 0,
+            'sub_group': 0,
+            'chunk_count': len(chunks),
+            'description': 'complete_document'
+        }]
+    
+    embeddings_array = normalize_embeddings(chunk_embeddings)
+    clusterer = get_clustering_backend(len(chunks), backend)
+    
+    # =========================================================================
+    # STAGE 1: TOPIC CLUSTERING
+    # =========================================================================
+    
+    print(f"\n Stage 1: Identifying main topics ({clusterer.name} backend)...")
+    
+    # Determine number of topic clusters
+    # Goal: Separate by high-level topic (Finance, HR, Product, etc.)
+    n_topics = max(2, min(6, len(chunks) // 15))  # 2-6 topics max
+    
+    print(f"   Testing {n_topics-1} to {n_topics+1} topic configurations...")
+    
+    # Find best topic clustering using silhouette score
+    best_score = -1
+    best_labels = None
+    best_n_topics = n_topics
+    
+    for n in range(max(2, n_topics-1), min(n_topics+2, len(chunks)//min_chunks_per_note)):
+        try:
+            labels = clusterer.fit_predict(embeddings_array, n)
+            score = clusterer.score(embeddings_array, labels)
+            
+            print(f"    • {n} topics: quality = {score:.3f}")
+            
+            if score > best_score:
+                best_score = score
+                best_labels = labels
+                best_n_topics = n
+        except Exception as e:
+            print(f"    ✗ {n} topics failed: {e}")
+            continue
+    
+    if best_labels is None:
+        print(f"   ⚠ Clustering failed, using default {n_topics} topics")
+        best_labels = clusterer.fit_predict(embeddings_array, n_topics)
+        best_n_topics = n_topics
+    
+    topic_labels = best_labels
+    
+    print(f"  ✓ Selected {best_n_topics} topics (quality: {best_score:.3f})")
+    
+    # Group chunks by topic
+    topic_clusters = {}
+    for idx, topic_id in enumerate(topic_labels):
+        if topic_id not in topic_clusters:
+            topic_clusters[topic_id] = {
+                'chunks': [],
+                'chunk_ids': [],
+                'embeddings': []
+            }
+        topic_clusters[topic_id]['chunks'].append(chunks[idx])
+        topic_clusters[topic_id]['chunk_ids'].append(idx)
+        topic_clusters[topic_id]['embeddings'].append(embeddings_array[idx])
+    
+    # =========================================================================
+    # STAGE 2: SPLIT LARGE TOPIC CLUSTERS
+    # =========================================================================
+    
+    print("\n Stage 2: Splitting large topic clusters...")
+    print(f"   Target: {min_chunks_per_note}-{max_chunks_per_note} chunks per note")
+    
+    final_groups = []
+    
+    for topic_id in sorted(topic_clusters.keys()):
+        topic_data = topic_clusters[topic_id]
+        topic_size = len(topic_data['chunks'])
+        
+        print(f"\n   Topic {topic_id}: {topic_size} chunks", end=" ")
+        
+        # If cluster is already optimal size, keep as single note
+        if topic_size <= max_chunks_per_note:
+            print("→ 1 note ✓")
+            final_groups.append({
+                'chunks': topic_data['chunks'],
+                'chunk_ids': topic_data['chunk_ids'],
+                'topic_cluster': topic_id,
+                'sub_group': 0,
+                'chunk_count': topic_size,
+                'description': f'topic_{topic_id}_complete'
+            })
+        
+        # If cluster is large, split into sub-groups
+        else:
+            # Calculate number of sub-groups needed
+            n_subgroups = max(2, (topic_size + max_chunks_per_note - 1) // max_chunks_per_note)
+            
+            print(f"→ {n_subgroups} sub-notes")
+            
+            # Use K-Means again within this topic to create semantic sub-groups
+            try:
+                topic_embeddings = np.array(topic_data['embeddings'])
+                sub_labels = clusterer.fit_predict(topic_embeddings, n_subgroups)
+                
+                # Create sub-groups
+                sub_groups = {}
+                for i, sub_label in enumerate(sub_labels):
+                    if sub_label not in sub_groups:
+                        sub_groups[sub_label] = {
+                            'chunks': [],
+                            'chunk_ids': []
+                        }
+                    sub_groups[sub_label]['chunks'].append(topic_data['chunks'][i])
+                    sub_groups[sub_label]['chunk_ids'].append(topic_data['chunk_ids'][i])
+                
+                # Add sub-groups to final list
+                for sub_id in sorted(sub_groups.keys()):
+                    sub_data = sub_groups[sub_id]
+                    if len(sub_data['chunks']) >= min_chunks_per_note:
+                        final_groups.append({
+                            'chunks': sub_data['chunks'],
+                            'chunk_ids': sorted(sub_data['chunk_ids']),
+                            'topic_cluster': topic_id,
+                            'sub_group': sub_id,
+                            'chunk_count': len(sub_data['chunks']),
+                            'description': f'topic_{topic_id}_part_{sub_id}'
+                        })
+                        print(f"    • Sub-group {sub_id}: {len(sub_data['chunks'])} chunks")
+                
+            except Exception as e:
+                print(f"\n       Sub-clustering failed ({e}), using sequential split")
+                # Fallback: simple sequential split
+                for i in range(0, topic_size, max_chunks_per_note):
+                    sub_chunks = topic_data['chunks'][i:i+max_chunks_per_note]
+                    sub_ids = topic_data['chunk_ids'][i:i+max_chunks_per_note]
+                    
+                    if len(sub_chunks) >= min_chunks_per_note:
+                        final_groups.append({
+                            'chunks': sub_chunks,
+                            'chunk_ids': sub_ids,
+                            'topic_cluster': topic_id,
+                            'sub_group': i // max_chunks_per_note,
+                            'chunk_count': len(sub_chunks),
+                            'description': f'topic_{topic_id}_sequential_{i}'
+                        })
+                        print(f"    • Part {i//max_chunks_per_note + 1}: {len(sub_chunks)} chunks")
+    
+    # Sort by topic, then sub-group for logical order
+    final_groups.sort(key=lambda x: (x['topic_cluster'], x['sub_group']))
+    
+    # Print summary
+    print(f"\n   Final result: {len(final_groups)} focused notes")
+    
+    # Group by topic for summary
+    topic_summary = {}
+    for group in final_groups:
+        topic_id = group['topic_cluster']
+        if topic_id not in topic_summary:
+            topic_summary[topic_id] = 0
+        topic_summary[topic_id] += 1
+    
+    print("   Distribution:")
+    for topic_id in sorted(topic_summary.keys()):
+        count = topic_summary[topic_id]
+        print(f"    Topic {topic_id}: {count} note(s)")
+    
+    return final_groups
@@ -0,0 +1,257 @@
+# services/embedding_cache.py
+"""
+Content-addressed cache for chunk embeddings.
+
+Chunks are keyed by (embedding model, sha256(chunk_text)), the same hash
+FileChangeDetector.compute_chunk_hash() stores in document_chunks.chunk_hash.
+When a large document changes by one paragraph, only the chunks whose
+text actually changed are sent to the embedding API.
+
+Two tiers:
+    1. In-process LRU (bounded by EMBEDDING_CACHE_MAX_ENTRIES, TTL-checked)
+    2. Supabase table `chunk_embedding_cache` (see migration 013), shared by
+       every worker and pruned by the weekly retention job in kpi_scheduler
+
+Usage:
+    cache = get_embedding_cache()
+    cached = await cache.get_many(model, chunk_hashes)   # {hash: vector}
+    ... embed the misses ...
+    await cache.put_many(model, {hash: vector, ...})
+"""
+
+import os
+import json
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from time import monotonic
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from supabase_connect import get_supabase_manager
+from core.executors import run_blocking
+
+logging.basicConfig(level=logging.INFO)
+
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "20000"))
+EMBEDDING_CACHE_TTL_DAYS = int(os.getenv("EMBEDDING_CACHE_TTL_DAYS", "90"))
+EMBEDDING_CACHE_PERSIST = os.getenv("EMBEDDING_CACHE_PERSIST", "true").lower() == "true"
+EMBEDDING_CACHE_RETRY_SECONDS = int(os.getenv("EMBEDDING_CACHE_RETRY_SECONDS", "60"))
+
+CACHE_TABLE = "chunk_embedding_cache"
+LOOKUP_BATCH_SIZE = 200  # Hashes per in_() query (keeps request URLs short)
+MISSING_TABLE_CODES = {"PGRST205", "42P01"}  # PostgREST / Postgres undefined table
+
+
+class EmbeddingCache:
+    """
+    Two-tier (memory + Supabase) embedding cache with hit/miss counters.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES,
+        ttl_days: int = EMBEDDING_CACHE_TTL_DAYS,
+        persist: bool = EMBEDDING_CACHE_PERSIST,
+        client=None
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_days * 86400
+        self.persist = persist
+        self._client = client
+        self._persist_retry_at = 0.0  # monotonic time the persistent tier is retried
+
+        # (model, chunk_hash) -> (float32 vector, stored_at monotonic)
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = get_supabase_manager().client
+        return self._client
+
+    # ------------------------------------------------------------------
+    # Memory tier
+    # ------------------------------------------------------------------
+
+    def _memory_get(self, model: str, chunk_hash: str) -> Optional[List[float]]:
+        key = (model, chunk_hash)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            vector, stored_at = entry
+            if monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self.evictions += 1
+                return None
+            self._entries.move_to_end(key)
+            return vector.tolist()
+
+    def _memory_put(self, model: str, chunk_hash: str, embedding: List[float]):
+        key = (model, chunk_hash)
+        with self._lock:
+            self._entries[key] = (np.asarray(embedding, dtype=np.float32), monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    # ------------------------------------------------------------------
+    # Persistent tier
+    # ------------------------------------------------------------------
+
+    def _persistent_available(self) -> bool:
+        return self.persist and monotonic() >= self._persist_retry_at
+
+    def _handle_persistent_error(self, error: Exception):
+        """
+        Disable the persistent tier only when its table does not exist
+        (migration 013 not applied); other errors back off and retry later.
+        """
+        if getattr(error, 'code', None) in MISSING_TABLE_CODES or getattr(error, 'pgcode', None) == "42P01":
+            logging.warning(f"Embedding cache: persistent tier disabled ({error})")
+            self.persist = False
+            return
+        logging.warning(
+            f"Embedding cache: persistent tier error, retrying in "
+            f"{EMBEDDING_CACHE_RETRY_SECONDS}s ({error})"
+        )
+        self._persist_retry_at = monotonic() + EMBEDDING_CACHE_RETRY_SECONDS
+
+    async def _persistent_get(self, model: str, chunk_hashes: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        cutoff = (datetime.utcnow() - timedelta(seconds=self.ttl_seconds)).isoformat()
+
+        for i in range(0, len(chunk_hashes), LOOKUP_BATCH_SIZE):
+            batch = chunk_hashes[i:i + LOOKUP_BATCH_SIZE]
+            result = await run_blocking(
+                self.client.table(CACHE_TABLE)
+                    .select('chunk_hash, embedding')
+                    .eq('model', model)
+                    .in_('chunk_hash', batch)
+                    .gte('last_used_at', cutoff)
+                    .execute
+            )
+            for row in result.data or []:
+                embedding = row['embedding']
+                if isinstance(embedding, str):
+                    embedding = json.loads(embedding)
+                found[row['chunk_hash']] = embedding
+
+        if found:
+            # Refresh recency so the retention job keeps hot entries
+            hit_hashes = list(found.keys())
+            now = datetime.utcnow().isoformat()
+            for i in range(0, len(hit_hashes), LOOKUP_BATCH_SIZE):
+                await run_blocking(
+                    self.client.table(CACHE_TABLE)
+                        .update({'last_used_at': now})
+                        .eq('model', model)
+                        .in_('chunk_hash', hit_hashes[i:i + LOOKUP_BATCH_SIZE])
+                        .execute
+                )
+        return found
+
+    async def _persistent_put(self, model: str, embeddings: Dict[str, List[float]]):
+        now = datetime.utcnow().isoformat()
+        rows = [
+            {
+                'model': model,
+                'chunk_hash': chunk_hash,
+                'embedding': [float(x) for x in embedding],
+                'last_used_at': now
+            }
+            for chunk_hash, embedding in embeddings.items()
+        ]
+        for i in range(0, len(rows), LOOKUP_BATCH_SIZE):
+            await run_blocking(
+                self.client.table(CACHE_TABLE)
+                    .upsert(rows[i:i + LOOKUP_BATCH_SIZE], on_conflict='model,chunk_hash')
+                    .execute
+            )
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    async def get_many(self, model: str, chunk_hashes: List[str]) -> Dict[str, List[float]]:
+        """
+        Look up embeddings for chunk hashes.
+
+        Returns:
+            Dict of chunk_hash -> embedding for every hash found (misses are absent)
+        """
+        unique_hashes = list(dict.fromkeys(chunk_hashes))
+        found = {}
+        missing = []
+        for chunk_hash in unique_hashes:
+            embedding = self._memory_get(model, chunk_hash)
+            if embedding is not None:
+                found[chunk_hash] = embedding
+            else:
+                missing.append(chunk_hash)
+        self.memory_hits += len(found)
+
+        if missing and self._persistent_available():
+            try:
+                stored = await self._persistent_get(model, missing)
+            except Exception as e:
+                self._handle_persistent_error(e)
+                stored = {}
+            for chunk_hash, embedding in stored.items():
+                self._memory_put(model, chunk_hash, embedding)
+            found.update(stored)
+            self.persistent_hits += len(stored)
+
+        self.misses += len(unique_hashes) - len(found)
+        return found
+
+    async def put_many(self, model: str, embeddings: Dict[str, List[float]]):
+        """Store freshly computed embeddings in both tiers."""
+        if not embeddings:
+            return
+        for chunk_hash, embedding in embeddings.items():
+            self._memory_put(model, chunk_hash, embedding)
+        if self._persistent_available():
+            try:
+                await self._persistent_put(model, embeddings)
+            except Exception as e:
+                self._handle_persistent_error(e)
+
+    def clear(self):
+        """Drop the in-memory tier (persistent rows are left to retention)."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        hits = self.memory_hits + self.persistent_hits
+        lookups = hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'memory_hits': self.memory_hits,
+            'persistent_hits': self.persistent_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(hits / lookups, 3) if lookups else 0.0,
+            'persistent': self.persist,
+        }
+
+
+_embedding_cache: Optional[EmbeddingCache] = None
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Return the process-wide embedding cache."""
+    global _embedding_cache
+    if _embedding_cache is None:
+        _embedding_cache = EmbeddingCache()
+    return _embedding_cache
@@ -5,28 +5,49 @@
 
 import os
 import io
-import time
+import asyncio
 import logging
 import fitz  # PDF extraction
-from typing import Optional, Dict
+from typing import Optional, Dict, Tuple
 from supabase_connect import get_supabase_manager
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-import numpy as np
-from sklearn.cluster import KMeans
-from sklearn.metrics import silhouette_score
 
 # === IMPORT: Note Generator ===
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 from Ai_agents.note_generator_agent import DocumentNoteGenerator
+from Ai_agents.rate_limiter import get_rate_limiter
+from Ai_agents.model_registry import get_embeddings_model
 
 # === NEW IMPORT: File Change Detector ===
 from services.file_change_detector import FileChangeDetector
 
+# Blocking SDK calls (Supabase, Gemini, CrewAI) run off the event loop
+from core.executors import run_blocking
+
+# Content-addressed chunk embedding cache
+from services.embedding_cache import get_embedding_cache
+
+# Hybrid topic clustering of chunks into note groups
+from services.clustering import cluster_and_split_chunks
+
+# Keep in-process retrieval indexes in sync with note writes
+from services import vector_index
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 
+EMBEDDING_MODEL = "models/embedding-001"
+
+# Note groups of one file summarized in parallel (each is one LLM call)
+NOTE_GENERATION_CONCURRENCY = int(os.getenv("NOTE_GENERATION_CONCURRENCY", "4"))
+
+# Modified files: diff chunks by hash instead of delete-and-rebuild
+INCREMENTAL_CHUNK_DIFF = os.getenv("INCREMENTAL_CHUNK_DIFF", "true").lower() == "true"
+
+# Shared token bucket for every embedding request (replaces fixed sleeps)
+embedding_rate_limiter = get_rate_limiter(EMBEDDING_MODEL, os.getenv("GOOGLE_API_KEY"))
+
 # Initialize clients
 try:
     supabase = get_supabase_manager().client
@@ -39,10 +60,7 @@ try:
     if not gemini_api_key:
         raise ValueError("GEMINI_API_KEY not found in environment variables.")
 
-    embeddings_model = GoogleGenerativeAIEmbeddings(
-        model="models/embedding-001", 
-        google_api_key=gemini_api_key
-    )
+    embeddings_model = get_embeddings_model(EMBEDDING_MODEL, gemini_api_key)
     print("✓ Embedding model initialized successfully.")
 
 except Exception as e:
@@ -69,224 +87,100 @@ json_splitter = RecursiveCharacterTextSplitter(
     separators=["\n", "},", "{", "}"]
 )
 
+def _extract_pdf_text(content: bytes) -> Tuple[str, int]:
+    """Extract text from PDF bytes. CPU-bound - call via run_blocking()."""
+    with fitz.open(stream=io.BytesIO(content)) as doc:
+        full_pdf_text = ""
+        for page in doc:
+            full_pdf_text += page.get_text() + "\n\n"
+        return full_pdf_text, len(doc)
+
+
+def _note_text_for_embedding(note_data: Dict) -> str:
+    """Text embedded for a note: title, summary, key facts and topics."""
+    topics_list = note_data.get('entities', {}).get('topics', [])
+    return f"""
+{note_data['title']}
+
+{note_data['summary']}
+
+Key Facts:
+{chr(10).join(f"- {fact}" for fact in note_data.get('key_facts', []))}
+
+Topics: {', '.join(topics_list)}
+    """.strip()
+
+
+# Per-user locks guarding tree build/update (see STEP 8)
+_tree_update_locks: Dict[str, asyncio.Lock] = {}
+
+
+def _get_tree_update_lock(user_id: str) -> asyncio.Lock:
+    """Return the lock serializing tree updates for a user."""
+    lock = _tree_update_locks.get(user_id)
+    if lock is None:
+        lock = _tree_update_locks[user_id] = asyncio.Lock()
+    return lock
+
 
 # =============================================================================
-#  HYBRID CLUSTERING FUNCTION (Two-Stage)
+#  INCREMENTAL UPDATE PLAN (modified files)
 # =============================================================================
 
-def cluster_and_split_chunks(chunks, chunk_embeddings, 
-                             min_chunks_per_note=5, 
-                             max_chunks_per_note=12):
+async def _apply_incremental_update(
+    detector: FileChangeDetector,
+    user_id: str,
+    previous_hash: str,
+    file_hash: str,
+    chunk_hashes: list
+) -> Optional[Dict]:
     """
-    Two-stage intelligent grouping for optimal note generation.
-    
-    Stage 1: Cluster by TOPIC (semantic similarity)
-        - Groups semantically related chunks together
-        - Creates topic-focused clusters (e.g., Finance, HR, Product)
-    
-    Stage 2: Split large clusters into sub-groups
-        - Ensures no note exceeds max_chunks_per_note
-        - Maintains topic coherence within sub-groups
-    
-    Example with 50 chunks:
-        Stage 1 → 3 topics:
-            Topic 0 (Revenue): 25 chunks
-            Topic 1 (Team): 15 chunks
-            Topic 2 (Product): 10 chunks
-        
-        Stage 2 → Split large topics:
-            Topic 0 → 3 sub-notes (9, 8, 8 chunks)
-            Topic 1 → 2 sub-notes (8, 7 chunks)
-            Topic 2 → 1 note (10 chunks)
-        
-        Result: 6 focused notes, each 7-10 chunks
-    
-    Args:
-        chunks: List of text chunks
-        chunk_embeddings: List of embeddings (vectors)
-        min_chunks_per_note: Minimum chunks for a note (default: 5)
-        max_chunks_per_note: Maximum chunks per note (default: 12)
-        
+    Diff a modified file against its stored version and apply the deletions.
+
+    - Chunks whose hash disappeared are deleted, surviving chunks are relinked
+      to the new file_hash, and only added chunks need inserting.
+    - Notes whose source chunks all survived are kept; the rest are deleted
+      and their chunks (plus added chunks) are regrouped into new notes.
+
     Returns:
-        List of note groups: [{chunks, chunk_ids, topic_cluster, sub_group, ...}, ...]
+        {'insert_positions', 'note_positions', 'chunks_kept', 'chunks_removed',
+         'notes_kept', 'notes_removed'}, or None if there is no stored version
+        to diff against (caller falls back to a full rebuild).
     """
-    
-    print(f"\n Hybrid Clustering: {len(chunks)} chunks")
-    
-    # Handle edge cases
-    if len(chunks) < min_chunks_per_note:
-        print(f"   ⚠ Too few chunks ({len(chunks)}), creating single group")
-        return [{
-            'chunks': chunks,
-            'chunk_ids': list(range(len(chunks))),
-            'topic_cluster': 0,
-            'sub_group': 0,
-            'chunk_count': len(chunks),
-            'description': 'complete_document'
-        }]
-    
-    embeddings_array = np.array(chunk_embeddings)
-    
-    # =========================================================================
-    # STAGE 1: TOPIC CLUSTERING
-    # =========================================================================
-    
-    print(f"\n Stage 1: Identifying main topics...")
-    
-    # Determine number of topic clusters
-    # Goal: Separate by high-level topic (Finance, HR, Product, etc.)
-    n_topics = max(2, min(6, len(chunks) // 15))  # 2-6 topics max
-    
-    print(f"   Testing {n_topics-1} to {n_topics+1} topic configurations...")
-    
-    # Find best topic clustering using silhouette score
-    best_score = -1
-    best_kmeans = None
-    best_n_topics = n_topics
-    
-    for n in range(max(2, n_topics-1), min(n_topics+2, len(chunks)//min_chunks_per_note)):
-        try:
-            kmeans = KMeans(n_clusters=n, random_state=42, n_init=10)
-            labels = kmeans.fit_predict(embeddings_array)
-            score = silhouette_score(embeddings_array, labels, metric='cosine')
-            
-            print(f"    • {n} topics: quality = {score:.3f}")
-            
-            if score > best_score:
-                best_score = score
-                best_kmeans = kmeans
-                best_n_topics = n
-        except Exception as e:
-            print(f"    ✗ {n} topics failed: {e}")
-            continue
-    
-    if best_kmeans is None:
-        print(f"   ⚠ Clustering failed, using default {n_topics} topics")
-        best_kmeans = KMeans(n_clusters=n_topics, random_state=42)
-        best_kmeans.fit(embeddings_array)
-        best_n_topics = n_topics
-    
-    topic_labels = best_kmeans.labels_
-    n_topics_found = len(set(topic_labels))
-    
-    print(f"  ✓ Selected {best_n_topics} topics (quality: {best_score:.3f})")
-    
-    # Group chunks by topic
-    topic_clusters = {}
-    for idx, topic_id in enumerate(topic_labels):
-        if topic_id not in topic_clusters:
-            topic_clusters[topic_id] = {
-                'chunks': [],
-                'chunk_ids': [],
-                'embeddings': []
-            }
-        topic_clusters[topic_id]['chunks'].append(chunks[idx])
-        topic_clusters[topic_id]['chunk_ids'].append(idx)
-        topic_clusters[topic_id]['embeddings'].append(chunk_embeddings[idx])
-    
-    # =========================================================================
-    # STAGE 2: SPLIT LARGE TOPIC CLUSTERS
-    # =========================================================================
-    
-    print(f"\n Stage 2: Splitting large topic clusters...")
-    print(f"   Target: {min_chunks_per_note}-{max_chunks_per_note} chunks per note")
-    
-    final_groups = []
-    
-    for topic_id in sorted(topic_clusters.keys()):
-        topic_data = topic_clusters[topic_id]
-        topic_size = len(topic_data['chunks'])
-        
-        print(f"\n   Topic {topic_id}: {topic_size} chunks", end=" ")
-        
-        # If cluster is already optimal size, keep as single note
-        if topic_size <= max_chunks_per_note:
-            print(f"→ 1 note ✓")
-            final_groups.append({
-                'chunks': topic_data['chunks'],
-                'chunk_ids': topic_data['chunk_ids'],
-                'topic_cluster': topic_id,
-                'sub_group': 0,
-                'chunk_count': topic_size,
-                'description': f'topic_{topic_id}_complete'
-            })
-        
-        # If cluster is large, split into sub-groups
-        else:
-            # Calculate number of sub-groups needed
-            n_subgroups = max(2, (topic_size + max_chunks_per_note - 1) // max_chunks_per_note)
-            
-            print(f"→ {n_subgroups} sub-notes")
-            
-            # Use K-Means again within this topic to create semantic sub-groups
-            try:
-                topic_embeddings = np.array(topic_data['embeddings'])
-                sub_kmeans = KMeans(n_clusters=n_subgroups, random_state=42, n_init=10)
-                sub_labels = sub_kmeans.fit_predict(topic_embeddings)
-                
-                # Create sub-groups
-                sub_groups = {}
-                for i, sub_label in enumerate(sub_labels):
-                    if sub_label not in sub_groups:
-                        sub_groups[sub_label] = {
-                            'chunks': [],
-                            'chunk_ids': []
-                        }
-                    sub_groups[sub_label]['chunks'].append(topic_data['chunks'][i])
-                    sub_groups[sub_label]['chunk_ids'].append(topic_data['chunk_ids'][i])
-                
-                # Add sub-groups to final list
-                for sub_id in sorted(sub_groups.keys()):
-                    sub_data = sub_groups[sub_id]
-                    if len(sub_data['chunks']) >= min_chunks_per_note:
-                        final_groups.append({
-                            'chunks': sub_data['chunks'],
-                            'chunk_ids': sorted(sub_data['chunk_ids']),
-                            'topic_cluster': topic_id,
-                            'sub_group': sub_id,
-                            'chunk_count': len(sub_data['chunks']),
-                            'description': f'topic_{topic_id}_part_{sub_id}'
-                        })
-                        print(f"    • Sub-group {sub_id}: {len(sub_data['chunks'])} chunks")
-                
-            except Exception as e:
-                print(f"\n       Sub-clustering failed ({e}), using sequential split")
-                # Fallback: simple sequential split
-                for i in range(0, topic_size, max_chunks_per_note):
-                    sub_chunks = topic_data['chunks'][i:i+max_chunks_per_note]
-                    sub_ids = topic_data['chunk_ids'][i:i+max_chunks_per_note]
-                    
-                    if len(sub_chunks) >= min_chunks_per_note:
-                        final_groups.append({
-                            'chunks': sub_chunks,
-                            'chunk_ids': sub_ids,
-                            'topic_cluster': topic_id,
-                            'sub_group': i // max_chunks_per_note,
-                            'chunk_count': len(sub_chunks),
-                            'description': f'topic_{topic_id}_sequential_{i}'
-                        })
-                        print(f"    • Part {i//max_chunks_per_note + 1}: {len(sub_chunks)} chunks")
-    
-    # Sort by topic, then sub-group for logical order
-    final_groups.sort(key=lambda x: (x['topic_cluster'], x['sub_group']))
-    
-    # Print summary
-    print(f"\n   Final result: {len(final_groups)} focused notes")
-    
-    # Group by topic for summary
-    topic_summary = {}
-    for group in final_groups:
-        topic_id = group['topic_cluster']
-        if topic_id not in topic_summary:
-            topic_summary[topic_id] = 0
-        topic_summary[topic_id] += 1
-    
-    print(f"   Distribution:")
-    for topic_id in sorted(topic_summary.keys()):
-        count = topic_summary[topic_id]
-        print(f"    Topic {topic_id}: {count} note(s)")
-    
-    return final_groups
+    old_chunks = await detector.get_file_chunks(user_id, previous_hash)
+    if not old_chunks:
+        return None
+
+    old_notes = await detector.get_file_notes(user_id, previous_hash)
+    if old_notes is None:
+        return None
+
+    chunk_diff = detector.diff_chunks(old_chunks, chunk_hashes)
+    kept_notes, stale_notes = detector.split_notes_by_validity(old_notes, chunk_hashes)
+
+    await detector.delete_rows_by_ids('document_chunks', chunk_diff['removed_ids'])
+    await detector.delete_rows_by_ids('document_notes', [n['id'] for n in stale_notes])
+    vector_index.remove_from_index(user_id, [n['id'] for n in stale_notes])
+    await detector.relink_rows_to_file_hash('document_chunks', chunk_diff['kept_ids'], file_hash)
+    await detector.relink_rows_to_file_hash('document_notes', [n['id'] for n in kept_notes], file_hash)
+
+    # Chunks still covered by a surviving note don't need a new note
+    covered = set()
+    for note in kept_notes:
+        covered.update(note['source_chunk_hashes'])
+    note_positions = [
+        position for position, chunk_hash in enumerate(chunk_hashes)
+        if chunk_hash not in covered
+    ]
+
+    return {
+        'insert_positions': chunk_diff['added_positions'],
+        'note_positions': note_positions,
+        'chunks_kept': len(chunk_diff['kept_ids']),
+        'chunks_removed': len(chunk_diff['removed_ids']),
+        'notes_kept': len(kept_notes),
+        'notes_removed': len(stale_notes)
+    }
 
 
 # =============================================================================
@@ -300,7 +194,9 @@ async def embed_and_store_file(
     source_id: Optional[str] = None,
     source_metadata: Optional[Dict] = None,
     force_reprocess: bool = False,
-    file_content: Optional[bytes] = None  # NEW: Pass content directly to skip download
+    file_content: Optional[bytes] = None,  # NEW: Pass content directly to skip download
+    file_hash: Optional[str] = None,  # SHA-256 of file_content, if already computed
+    file_status: Optional[Dict] = None  # check_files_status() entry for file_hash
 ):
     """
     Downloads a file from Supabase Storage, extracts text,
@@ -310,12 +206,22 @@ async def embed_and_store_file(
     NOW WITH INTELLIGENT FILE CHANGE DETECTION:
     - Computes file hash and checks if file changed
     - Skips processing if file is unchanged (95% faster!)
-    - Deletes old chunks/notes before re-processing modified files
+    - Modified files are diffed by chunk hash: only removed chunks are
+      deleted, only new chunks are embedded/inserted, and only notes whose
+      source chunks changed are regenerated (INCREMENTAL_CHUNK_DIFF)
     - Tracks file metadata in registry
     
     TWO MODES:
     - file_content=None (default): Download from storage
-    - file_content=bytes: Use provided content (skip download, faster!)
+    - file_content=bytes: Use provided content (skip download, faster!);
+      pass file_hash too if the caller already hashed it
+
+    Batch callers (process_embedding_queue_batch) can also pass the
+    file_status they got from FileChangeDetector.check_files_status() for
+    that file_hash; it replaces the per-file registry lookup, and if it
+    carries 'registered': True the file was already registered in bulk.
+    A registered status is kept even when the content has to be downloaded
+    (re-checking would compare against the hash just registered and skip).
     
     Hybrid Clustering:
     - Stage 1: Group by topic (semantic similarity)
@@ -336,6 +242,7 @@ async def embed_and_store_file(
 
     detector = FileChangeDetector()
     file_id = None
+    previous_hash = None
 
     try:
         # =====================================================================
@@ -345,7 +252,10 @@ async def embed_and_store_file(
         if file_content is None:
             # Download from storage
             bucket_name = "Kogna"
-            file_content_bytes = supabase.storage.from_(bucket_name).download(file_path_in_bucket)
+            file_content_bytes = await run_blocking(
+                supabase.storage.from_(bucket_name).download,
+                file_path_in_bucket
+            )
 
             if not file_content_bytes:
                 print(f" Failed to download {file_path_in_bucket} or file is empty.")
@@ -358,8 +268,15 @@ async def embed_and_store_file(
             print(f" Using provided content (skipping download)")
             file_content_bytes = file_content
 
-        # Compute file hash for change detection
-        file_hash = detector.compute_file_hash(file_content_bytes)
+        # Compute file hash for change detection (unless handed over with the content)
+        if file_content is None or not file_hash:
+            computed_hash = detector.compute_file_hash(file_content_bytes)
+            if not (file_status and file_status.get('registered')):
+                file_status = None  # A precomputed status only holds for the handed-over hash
+            elif computed_hash != file_hash:
+                # Registered in bulk under the queued hash; re-register the downloaded bytes
+                file_status = {**file_status, 'registered': False}
+            file_hash = computed_hash
         file_size = len(file_content_bytes)
         file_name = file_path_in_bucket.split('/')[-1]
         
@@ -371,7 +288,7 @@ async def embed_and_store_file(
         # =====================================================================
         
         if not force_reprocess:
-            status_check = await detector.check_file_status(
+            status_check = file_status or await detector.check_file_status(
                 user_id=user_id,
                 file_path=file_path_in_bucket,
                 current_hash=file_hash,
@@ -393,29 +310,29 @@ async def embed_and_store_file(
                     'message': 'File unchanged'
                 }
             
-            # If modified, delete old chunks/notes
+            # If modified, old chunks/notes are diffed (or deleted) after chunking
             if status_check['status'] == 'modified':
                 print(f"\n MODIFIED FILE DETECTED")
-                await detector.delete_file_chunks_and_notes(
-                    user_id=user_id,
-                    old_file_hash=status_check['previous_hash']
-                )
+                previous_hash = status_check['previous_hash']
         
         # =====================================================================
         # STEP 3: REGISTER FILE IN REGISTRY
         # =====================================================================
         
-        file_id = await detector.register_file(
-            user_id=user_id,
-            file_path=file_path_in_bucket,
-            file_name=file_name,
-            file_hash=file_hash,
-            file_size=file_size,
-            source_type=source_type,
-            source_id=source_id,
-            source_metadata=source_metadata,
-            last_modified_at=source_metadata.get('modified_time') if source_metadata else None
-        )
+        if file_status and file_status.get('registered'):
+            file_id = file_status['file_id']
+        else:
+            file_id = await detector.register_file(
+                user_id=user_id,
+                file_path=file_path_in_bucket,
+                file_name=file_name,
+                file_hash=file_hash,
+                file_size=file_size,
+                source_type=source_type,
+                source_id=source_id,
+                source_metadata=source_metadata,
+                last_modified_at=source_metadata.get('modified_time') if source_metadata else None
+            )
 
         # =====================================================================
         # STEP 4: EXTRACT TEXT
@@ -428,13 +345,11 @@ async def embed_and_store_file(
         if file_path_in_bucket.lower().endswith(".pdf"):
             print(f" Extracting text from PDF...")
             try:
-                with fitz.open(stream=io.BytesIO(file_content_bytes)) as doc:
-                    full_pdf_text = ""
-                    for page in doc:
-                        full_pdf_text += page.get_text() + "\n\n"
-                file_content_str = full_pdf_text
-                chunks = text_splitter.split_text(file_content_str)
-                print(f"✓ Extracted text from {len(doc)} pages → {len(chunks)} chunks")
+                file_content_str, page_count = await run_blocking(
+                    _extract_pdf_text, file_content_bytes
+                )
+                chunks = await run_blocking(text_splitter.split_text, file_content_str)
+                print(f"✓ Extracted text from {page_count} pages → {len(chunks)} chunks")
             except Exception as pdf_e:
                 print(f" Could not extract text from PDF: {pdf_e}")
                 await detector.update_file_processing_status(file_id, 'failed', 0, 0)
@@ -446,20 +361,20 @@ async def embed_and_store_file(
         # --- Handle JSON ---
         elif file_path_in_bucket.endswith(".json"):
             file_content_str = file_content_bytes.decode('utf-8')
-            chunks = json_splitter.split_text(file_content_str)
+            chunks = await run_blocking(json_splitter.split_text, file_content_str)
             print(f" Processed JSON → {len(chunks)} chunks")
 
         # --- Handle TXT/CSV ---
         elif file_path_in_bucket.endswith(".txt") or file_path_in_bucket.endswith(".csv"):
             file_content_str = file_content_bytes.decode('utf-8')
-            chunks = text_splitter.split_text(file_content_str)
+            chunks = await run_blocking(text_splitter.split_text, file_content_str)
             print(f" Processed text file → {len(chunks)} chunks")
 
         # --- Try to decode as text for unknown types ---
         else:
             try:
                 file_content_str = file_content_bytes.decode('utf-8')
-                chunks = text_splitter.split_text(file_content_str)
+                chunks = await run_blocking(text_splitter.split_text, file_content_str)
                 print(f"⚠ Unknown type, attempting text embedding → {len(chunks)} chunks")
             except UnicodeDecodeError:
                 print(f" Skipping unsupported/binary file: {file_path_in_bucket}")
@@ -477,33 +392,90 @@ async def embed_and_store_file(
                 'message': 'No chunks generated'
             }
 
+        chunk_hashes = [detector.compute_chunk_hash(chunk) for chunk in chunks]
+
+        # =====================================================================
+        # STEP 4b: DIFF AGAINST PREVIOUS VERSION (modified files only)
+        # =====================================================================
+
+        insert_positions = list(range(len(chunks)))
+        note_positions = list(range(len(chunks)))
+        notes_kept = 0
+        incremental = None
+
+        if previous_hash:
+            if INCREMENTAL_CHUNK_DIFF:
+                incremental = await _apply_incremental_update(
+                    detector, user_id, previous_hash, file_hash, chunk_hashes
+                )
+
+            if incremental:
+                insert_positions = incremental['insert_positions']
+                note_positions = incremental['note_positions']
+                notes_kept = incremental['notes_kept']
+                print(f" Incremental update: {incremental['chunks_kept']} chunks kept, "
+                      f"{incremental['chunks_removed']} removed, {len(insert_positions)} added")
+                print(f"   Notes: {notes_kept} kept, {incremental['notes_removed']} to regenerate "
+                      f"({len(note_positions)} chunks to regroup)")
+            else:
+                await detector.delete_file_chunks_and_notes(
+                    user_id=user_id,
+                    old_file_hash=previous_hash
+                )
+                vector_index.invalidate_user_index(user_id)
+
         # =====================================================================
         # STEP 5: EMBED CHUNKS
         # =====================================================================
         
-        print(f" Embedding {len(chunks)} chunks...")
+        # Only chunks being inserted or regrouped into notes need vectors
+        embed_positions = sorted(set(insert_positions) | set(note_positions))
+        embed_hashes = [chunk_hashes[p] for p in embed_positions]
+
+        # Content-addressed cache: only chunks whose text is new get embedded
+        embedding_cache = get_embedding_cache()
+        vectors_by_hash = await embedding_cache.get_many(EMBEDDING_MODEL, embed_hashes)
+
+        texts_to_embed = {}
+        for position, chunk_hash in zip(embed_positions, embed_hashes):
+            if chunk_hash not in vectors_by_hash:
+                texts_to_embed.setdefault(chunk_hash, chunks[position])
+        hashes_to_embed = list(texts_to_embed.keys())
+
+        print(f" Embedding {len(embed_positions)} chunks "
+              f"({len(embed_positions) - len(hashes_to_embed)} cached, {len(hashes_to_embed)} new)...")
         batch_size = 90
-        chunk_embeddings = []
+        new_vectors = {}
 
-        for i in range(0, len(chunks), batch_size):
-            batch_chunks = chunks[i:i + batch_size]
+        for i in range(0, len(hashes_to_embed), batch_size):
+            batch_hashes = hashes_to_embed[i:i + batch_size]
+            batch_chunks = [texts_to_embed[h] for h in batch_hashes]
             batch_num = int(i/batch_size) + 1
-            total_batches = int(len(chunks)/batch_size) + 1
+            total_batches = int(len(hashes_to_embed)/batch_size) + 1
             
             print(f"   Batch {batch_num}/{total_batches}...", end=" ")
             
             try:
-                batch_embeddings = embeddings_model.embed_documents(batch_chunks)
-                chunk_embeddings.extend(batch_embeddings)
+                await embedding_rate_limiter.acquire_async()
+                batch_embeddings = await run_blocking(
+                    embeddings_model.embed_documents, batch_chunks
+                )
+                new_vectors.update(zip(batch_hashes, batch_embeddings))
                 print("✓")
-                time.sleep(1)
 
             except Exception as batch_e:
                 print(f" Error: {batch_e}")
                 await detector.update_file_processing_status(file_id, 'failed', 0, 0)
                 raise batch_e
 
-        if not chunk_embeddings or len(chunk_embeddings) != len(chunks):
+        await embedding_cache.put_many(EMBEDDING_MODEL, new_vectors)
+        vectors_by_hash.update(new_vectors)
+        embeddings_by_position = {
+            p: vectors_by_hash[h] for p, h in zip(embed_positions, embed_hashes)
+            if h in vectors_by_hash
+        }
+
+        if len(embeddings_by_position) != len(embed_positions):
             print(" Embedding process failed or returned mismatched count.")
             await detector.update_file_processing_status(file_id, 'failed', 0, 0)
             return {
@@ -516,20 +488,24 @@ async def embed_and_store_file(
         # =====================================================================
         
         documents_to_insert = []
-        for chunk, embedding in zip(chunks, chunk_embeddings):
-            chunk_hash = detector.compute_chunk_hash(chunk)
+        for position in insert_positions:
             documents_to_insert.append({
                 "user_id": user_id,
                 "file_path": file_path_in_bucket,
-                "content": chunk,
-                "embedding": embedding,
+                "content": chunks[position],
+                "embedding": embeddings_by_position[position],
                 "file_hash": file_hash,      #  NEW: Link to file version
-                "chunk_hash": chunk_hash      #  NEW: Chunk-level deduplication
+                "chunk_hash": chunk_hashes[position]      #  NEW: Chunk-level deduplication
             })
 
-        print(f" Inserting {len(documents_to_insert)} chunks...")
-        supabase.table("document_chunks").insert(documents_to_insert).execute()
-        print(f"✓ Chunks stored successfully!")
+        if documents_to_insert:
+            print(f" Inserting {len(documents_to_insert)} chunks...")
+            await run_blocking(
+                supabase.table("document_chunks").insert(documents_to_insert).execute
+            )
+            print(f"✓ Chunks stored successfully!")
+        else:
+            print(f"✓ No new chunks to store")
 
         # =====================================================================
         # STEP 7: INTELLIGENT NOTE GENERATION WITH HYBRID CLUSTERING
@@ -538,104 +514,113 @@ async def embed_and_store_file(
         notes_generated = 0
         generated_note_ids = [] 
 
-        if note_generator and chunks and len(chunks) >= 3:
+        if note_generator and note_positions and len(chunks) >= 3:
             print(f"\n Generating intelligent notes with hybrid clustering...")
             
             #  HYBRID CLUSTERING: Topic-based + Size-based splitting
-            note_groups = cluster_and_split_chunks(
-                chunks, 
-                chunk_embeddings,
+            # (group chunk_ids index into note_positions)
+            note_groups = await run_blocking(
+                cluster_and_split_chunks,
+                [chunks[p] for p in note_positions],
+                [embeddings_by_position[p] for p in note_positions],
                 min_chunks_per_note=5,     # Minimum chunks for a note
                 max_chunks_per_note=12     # Maximum chunks per note
             )
             
-            print(f"\n  Generating {len(note_groups)} notes...")
-            
-            # Generate note for each hybrid group
-            for group_idx, group in enumerate(note_groups, 1):
-                try:
-                    topic_id = group['topic_cluster']
-                    sub_id = group['sub_group']
-                    chunk_count = group['chunk_count']
-                    
-                    print(f"   Note {group_idx}/{len(note_groups)} (Topic {topic_id}.{sub_id}, {chunk_count} chunks)...", end=" ")
-                    
-                    # Combine chunks in this group
-                    group_text = "\n\n".join(group['chunks'])
-                    
-                    # Generate note for this group
-                    note_data = note_generator.generate_note(
-                        document_text=group_text,
+            print(f"\n  Generating {len(note_groups)} notes "
+                  f"({NOTE_GENERATION_CONCURRENCY} at a time)...")
+
+            note_slots = asyncio.Semaphore(NOTE_GENERATION_CONCURRENCY)
+
+            async def generate_group_note(group_idx, group):
+                topic_id = group['topic_cluster']
+                sub_id = group['sub_group']
+                async with note_slots:
+                    note_data = await run_blocking(
+                        note_generator.generate_note,
+                        document_text="\n\n".join(group['chunks']),
                         file_path=f"{file_path_in_bucket}#topic{topic_id}_sub{sub_id}"
                     )
-                    
-                    # Extract topics from entities
-                    topics_list = note_data.get('entities', {}).get('topics', [])
-                    
-                    # Create embedding for the note
-                    note_text_for_embedding = f"""
-{note_data['title']}
-
-{note_data['summary']}
+                print(f"   Note {group_idx}/{len(note_groups)} (Topic {topic_id}.{sub_id}, "
+                      f"{group['chunk_count']} chunks) ✓")
+                return note_data
+
+            # Fan out LLM calls for every group (bounded by note_slots)
+            note_results = await asyncio.gather(
+                *(generate_group_note(idx, group) for idx, group in enumerate(note_groups, 1)),
+                return_exceptions=True
+            )
 
-Key Facts:
-{chr(10).join(f"- {fact}" for fact in note_data.get('key_facts', []))}
+            generated = []
+            for group_idx, (group, note_data) in enumerate(zip(note_groups, note_results), 1):
+                if isinstance(note_data, Exception):
+                    print(f"   Note {group_idx}/{len(note_groups)} ✗ ({note_data})")
+                    logging.error(f"Note generation failed: {note_data}")
+                    continue
+                generated.append((group_idx, group, note_data))
 
-Topics: {', '.join(topics_list)}
-                    """.strip()
-                    
-                    try:
-                        note_embedding = embeddings_model.embed_query(note_text_for_embedding)
-                        print("", end=" ")
-                    except Exception as embed_error:
-                        logging.warning(f"Failed to embed note: {embed_error}")
-                        note_embedding = None
-                    
-                    # Store note with hybrid cluster metadata + file_hash
-                    note_record = {
-                        'user_id': user_id,
-                        'file_path': file_path_in_bucket,
-                        'title': f"{note_data['title']} (Part {group_idx}/{len(note_groups)})",
-                        'summary': note_data['summary'],
-                        'key_facts': note_data.get('key_facts', []),
-                        'action_items': note_data.get('action_items', []),
-                        'entities': note_data.get('entities', {}),
-                        'chunk_group': int(topic_id * 100 + sub_id),
-                        'chunk_start': int(min(group['chunk_ids'])),
-                        'chunk_end': int(max(group['chunk_ids'])),
-                        'note_embedding': note_embedding,
-                        'file_hash': file_hash  #  NEW: Link to file version
-                    }
-                    
-                    # Capture the insert result
-                    insert_result = supabase.table('document_notes').insert(note_record).execute()
-                    
-                    # Capture note ID if insert succeeded
-                    if insert_result.data and len(insert_result.data) > 0:
-                        generated_note_ids.append(insert_result.data[0]['id'])
-                    
-                    notes_generated += 1
-                    print("✓")
-                    time.sleep(1)
-                    
-                except Exception as note_error:
-                    print(f"✗ ({note_error})")
-                    logging.error(f"Note generation failed: {note_error}")
+            # One embedding request for all notes of this file
+            note_embeddings = [None] * len(generated)
+            if generated:
+                try:
+                    await embedding_rate_limiter.acquire_async()
+                    note_embeddings = await run_blocking(
+                        embeddings_model.embed_documents,
+                        [_note_text_for_embedding(note_data) for _, _, note_data in generated]
+                    )
+                except Exception as embed_error:
+                    logging.warning(f"Failed to embed notes: {embed_error}")
+
+            # Store notes with hybrid cluster metadata + file_hash
+            note_records = []
+            for (group_idx, group, note_data), note_embedding in zip(generated, note_embeddings):
+                topic_id = group['topic_cluster']
+                sub_id = group['sub_group']
+                group_positions = [note_positions[i] for i in group['chunk_ids']]
+                note_records.append({
+                    'user_id': user_id,
+                    'file_path': file_path_in_bucket,
+                    'title': f"{note_data['title']} (Part {group_idx}/{len(note_groups)})",
+                    'summary': note_data['summary'],
+                    'key_facts': note_data.get('key_facts', []),
+                    'action_items': note_data.get('action_items', []),
+                    'entities': note_data.get('entities', {}),
+                    'chunk_group': int(topic_id * 100 + sub_id),
+                    'chunk_start': int(min(group_positions)),
+                    'chunk_end': int(max(group_positions)),
+                    'note_embedding': note_embedding,
+                    'file_hash': file_hash,  #  NEW: Link to file version
+                    'source_chunk_hashes': [chunk_hashes[p] for p in group_positions]
+                })
+
+            if note_records:
+                try:
+                    insert_result = await run_blocking(
+                        supabase.table('document_notes').insert(note_records).execute
+                    )
+                    generated_note_ids = [row['id'] for row in insert_result.data or []]
+                    notes_generated = len(note_records)
+                    vector_index.add_document_notes(user_id, [
+                        {**record, 'id': note_id}
+                        for record, note_id in zip(note_records, generated_note_ids)
+                    ])
+                except Exception as insert_error:
+                    print(f" Note insert failed: {insert_error}")
+                    logging.error(f"Note insert failed: {insert_error}")
                     import traceback
                     traceback.print_exc()
-                    continue
             
-            print(f"\n Generated {notes_generated} hybrid-clustered notes for {len(chunks)} chunks")
+            print(f"\n Generated {notes_generated} hybrid-clustered notes for {len(note_positions)} chunks")
             if notes_generated > 0:
-                avg_chunks = len(chunks) // notes_generated
+                avg_chunks = len(note_positions) // notes_generated
                 print(f"   Average: {avg_chunks} chunks per note")
                 print(f"   Target range: 5-12 chunks per note")
             
         else:
             if not note_generator:
                 print(f"⚠ Note generator not available, skipping note creation")
-            elif not chunks:
-                print(f"⚠ No chunks available, skipping note creation")
+            elif not note_positions:
+                print(f"✓ All notes still current, skipping note creation")
             else:
                 print(f"⚠ Too few chunks ({len(chunks)}), skipping clustering")
 
@@ -646,59 +631,67 @@ Topics: {', '.join(topics_list)}
         if notes_generated > 0:
             print(f"\n🌳 Smart tree update for user {user_id}...")
             
-            try:
-                from services.tree_updater import TreeUpdater
-                from services.tree_builder import build_tree_for_user
+            # Queue workers may finish several files for the same user at once;
+            # serialize tree updates per user so the tree is built only once.
+            async with _get_tree_update_lock(user_id):
+                try:
+                    from services.tree_updater import TreeUpdater
+                    from services.tree_builder import build_tree_for_user
                 
-                # Check if tree exists
-                tree_check = supabase.table('super_notes').select('id').eq(
-                    'user_id', user_id
-                ).eq('is_root', True).execute()
+                    # Check if tree exists
+                    tree_check = await run_blocking(
+                        supabase.table('super_notes').select('id').eq(
+                            'user_id', user_id
+                        ).eq('is_root', True).execute
+                    )
                 
-                tree_exists = bool(tree_check.data)
+                    tree_exists = bool(tree_check.data)
                 
-                if not tree_exists:
-                    # NO TREE - BUILD INITIAL
-                    print("    Building initial tree...")
-                    tree_result = await build_tree_for_user(user_id)
-                    print(f"    Initial tree built!")
-                    print(f"      • Levels: {tree_result['levels']}")
-                    print(f"      • Super-notes: {tree_result['nodes_created']}")
+                    if not tree_exists:
+                        # NO TREE - BUILD INITIAL
+                        print("    Building initial tree...")
+                        tree_result = await build_tree_for_user(user_id)
+                        print(f"    Initial tree built!")
+                        print(f"      • Levels: {tree_result['levels']}")
+                        print(f"      • Super-notes: {tree_result['nodes_created']}")
                 
-                else:
-                    # TREE EXISTS - SMART UPDATE
-                    print("    Using smart update...")
-                    
-                    if not generated_note_ids:
-                        print("    No note IDs - skipping update")
                     else:
-                        updater = TreeUpdater(user_id)
+                        # TREE EXISTS - SMART UPDATE
+                        print("    Using smart update...")
+                    
+                        if not generated_note_ids:
+                            print("    No note IDs - skipping update")
+                        else:
+                            updater = TreeUpdater(user_id)
                         
-                        # Mark affected branches
-                        update_result = await updater.on_new_notes(
-                            new_note_ids=generated_note_ids,
-                            file_hash=file_hash
-                        )
+                            # Mark affected branches
+                            update_result = await updater.on_new_notes(
+                                new_note_ids=generated_note_ids,
+                                file_hash=file_hash
+                            )
                         
-                        if update_result['status'] == 'success':
-                            print(f"    Smart update complete!")
-                            print(f"      • Branches marked: {update_result['branches_marked']}")
-                            print(f"      • Nodes marked: {update_result['nodes_marked']}")
-                            print(f"     Nodes will regenerate in background")
+                            if update_result['status'] == 'success':
+                                print(f"    Smart update complete!")
+                                print(f"      • Branches marked: {update_result['branches_marked']}")
+                                print(f"      • Nodes marked: {update_result['nodes_marked']}")
+                                print(f"     Nodes will regenerate in background")
                         
-                        elif update_result['status'] == 'full_rebuild_needed':
-                            print("     New topics - full rebuild needed")
-                            supabase.table('super_notes').delete().eq(
-                                'user_id', user_id
-                            ).execute()
-                            tree_result = await build_tree_for_user(user_id)
-                            print(f"    Tree rebuilt!")
+                            elif update_result['status'] == 'full_rebuild_needed':
+                                print("     New topics - full rebuild needed")
+                                await run_blocking(
+                                    supabase.table('super_notes').delete().eq(
+                                        'user_id', user_id
+                                    ).execute
+                                )
+                                vector_index.invalidate_user_index(user_id)
+                                tree_result = await build_tree_for_user(user_id)
+                                print(f"    Tree rebuilt!")
             
-            except Exception as tree_error:
-                logging.error(f" Tree update failed: {tree_error}")
-                import traceback
-                traceback.print_exc()
-                print("    Tree update failed, but document processing succeeded")
+                except Exception as tree_error:
+                    logging.error(f" Tree update failed: {tree_error}")
+                    import traceback
+                    traceback.print_exc()
+                    print("    Tree update failed, but document processing succeeded")
         
         # =====================================================================
         # STEP 9: UPDATE FILE REGISTRY WITH FINAL STATUS
@@ -708,12 +701,12 @@ Topics: {', '.join(topics_list)}
             file_id=file_id,
             status='completed',
             chunk_count=len(chunks),
-            note_count=notes_generated
+            note_count=notes_kept + notes_generated
         )
 
         print(f"\n{'='*60}")
         print(f" COMPLETE: {file_path_in_bucket}")
-        print(f"   • Chunks: {len(documents_to_insert)}")
+        print(f"   • Chunks: {len(documents_to_insert)} inserted, {len(chunks)} total")
         print(f"   • Notes: {notes_generated} (hybrid clusters)")
         print(f"   • File hash: {file_hash[:16]}...")
         print(f"{'='*60}\n")
@@ -723,7 +716,10 @@ Topics: {', '.join(topics_list)}
             'file_id': file_id,
             'file_hash': file_hash,
             'chunks_processed': len(chunks),
+            'chunks_inserted': len(documents_to_insert),
             'notes_generated': notes_generated,
+            'notes_kept': notes_kept,
+            'incremental': incremental is not None,
             'message': f'Successfully processed {len(chunks)} chunks'
         }
 
@@ -823,19 +819,20 @@ async def embed_and_store_kpi_summary(
 
         # Generate embedding for the summary
         print(f"  Generating embedding...")
-        embedding = embeddings_model.embed_query(summary_text)
+        await embedding_rate_limiter.acquire_async()
+        embedding = await run_blocking(embeddings_model.embed_query, summary_text)
         print(f" Embedding generated ({len(embedding)} dimensions)")
 
         # AUTOMATIC VERSION CONTROL: Delete old embedding first
         # This ensures only the latest version exists
         print(f"  Deleting old versions...")
-        delete_result = (
+        delete_result = await run_blocking(
             supabase.table("document_chunks")
             .delete()
             .eq("file_path", file_path)
             .eq("user_id", user_id)
             .filter("metadata->>organization_id", "eq", organization_id)
-            .execute()
+            .execute
         )
 
         old_count = len(delete_result.data) if delete_result.data else 0
@@ -865,7 +862,7 @@ async def embed_and_store_kpi_summary(
         }
 
         print(f"  Inserting new embedding...")
-        supabase.table("document_chunks").insert(document).execute()
+        await run_blocking(supabase.table("document_chunks").insert(document).execute)
         print(f"KPI embedding stored successfully")
         print(f"--- [KPI Embedding Complete] ---\n")
 
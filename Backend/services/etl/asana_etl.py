@@ -571,6 +571,9 @@ async def run_asana_etl(
                 if result['status'] == 'queued':
                     files_processed += 1
                     logging.info("    QUEUED for processing")
+                elif result['status'] == 'skipped':
+                    files_skipped += 1
+                    logging.info("    UNCHANGED (not uploaded)")
                 elif result['status'] == 'error':
                     files_skipped += 1  # Count errors as skipped for this single-file ETL
                     logging.error(f"    FAILED: {result.get('message', 'Unknown error')}")
@@ -22,10 +22,12 @@ import asyncio
 import httpx
 import logging
 import hashlib
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Tuple
 from collections import deque
 
 from supabase_connect import get_supabase_manager
+from core.executors import run_blocking
+from services.etl.content_store import ContentHandle, get_content_store
 
 supabase = get_supabase_manager().client
 logging.basicConfig(level=logging.INFO)
@@ -166,6 +168,11 @@ MAX_FILE_SIZE = 50_000_000  # 50MB max file size
 RATE_LIMIT_DELAY = 0.1  # 100ms between requests
 TOKEN_REFRESH_BUFFER = 300  # Refresh if expiring within 5 minutes
 
+# Embedding queue worker pool
+EMBEDDING_QUEUE_WORKERS = int(os.getenv("EMBEDDING_QUEUE_WORKERS", "4"))  # Concurrent workers per batch
+EMBEDDING_MAX_IN_FLIGHT = int(os.getenv("EMBEDDING_MAX_IN_FLIGHT", "8"))  # Global cap across all batches
+EMBEDDING_FILE_TIMEOUT = float(os.getenv("EMBEDDING_FILE_TIMEOUT", "900"))  # Seconds per file
+
 
 # =================================================================
 # EMBEDDING QUEUE (GLOBAL)
@@ -174,7 +181,15 @@ TOKEN_REFRESH_BUFFER = 300  # Refresh if expiring within 5 minutes
 embedding_queue = deque()
 
 
-def queue_embedding(user_id: str, file_path: str, source_type: str = "upload", source_id: Optional[str] = None, source_metadata: Optional[Dict] = None):
+def queue_embedding(
+    user_id: str,
+    file_path: str,
+    source_type: str = "upload",
+    source_id: Optional[str] = None,
+    source_metadata: Optional[Dict] = None,
+    file_hash: Optional[str] = None,
+    content: Optional[ContentHandle] = None
+):
     """
     Add file to embedding queue.
     
@@ -184,75 +199,361 @@ def queue_embedding(user_id: str, file_path: str, source_type: str = "upload", s
         source_type: 'google_drive', 'jira', 'asana', 'upload', etc.
         source_id: External ID (optional)
         source_metadata: Connector-specific metadata (optional)
+        file_hash: SHA-256 of the uploaded bytes (optional)
+        content: Handle to the uploaded bytes, so the embedding stage does
+            not download them again (optional)
     """
     embedding_queue.append({
         'user_id': user_id, 
         'file_path': file_path,
         'source_type': source_type,
         'source_id': source_id,
-        'source_metadata': source_metadata
+        'source_metadata': source_metadata,
+        'file_hash': file_hash,
+        'content': content
     })
     logging.info(f"Queued for embedding: {file_path}")
 
 
-async def process_embedding_queue_batch():
+def _drain_queue_round_robin() -> deque:
+    """
+    Drain the global embedding queue into a per-user round-robin order.
+
+    A single large sync (e.g. 2,000 Drive files for one user) would otherwise
+    sit in front of every other user's files. Interleaving by user keeps
+    small syncs moving while a large one is in progress.
+
+    A path queued more than once (e.g. two Drive files that share a name and
+    so a storage path) is merged into its last queued item; the earlier
+    items' content is released. Embedding both at once would let the second
+    delete the first's chunks and notes before they are inserted.
+    """
+    latest: Dict[Tuple[str, str], Dict] = {}
+    while embedding_queue:
+        item = embedding_queue.popleft()
+        key = (item['user_id'], item['file_path'])
+        earlier = latest.pop(key, None)
+        if earlier and earlier.get('content'):
+            earlier['content'].release()
+        latest[key] = item
+
+    per_user: Dict[str, deque] = {}
+    for item in latest.values():
+        per_user.setdefault(item['user_id'], deque()).append(item)
+
+    ordered = deque()
+    while per_user:
+        for user_id in list(per_user.keys()):
+            ordered.append(per_user[user_id].popleft())
+            if not per_user[user_id]:
+                del per_user[user_id]
+    return ordered
+
+
+async def _check_queued_files(items: deque, detector, stats: Dict) -> deque:
+    """
+    Decide skip/process for drained queue items in bulk.
+
+    Items with handed-over content are checked against the registry with
+    FileChangeDetector.check_files_status() (a few in_() selects per user
+    instead of one per file). Unchanged files are dropped here and counted
+    as skipped; the rest are registered with one bulk upsert and carry their
+    file_status into embed_and_store_file(). Items without a content handle
+    keep the per-file checks.
+    """
+    per_user: Dict[str, Dict[str, Dict]] = {}
+    for item in items:
+        if item.get('file_hash') and item.get('content'):
+            per_user.setdefault(item['user_id'], {}).setdefault(item['file_path'], item)
+
+    dropped = set()
+    for user_id, by_path in per_user.items():
+        statuses = await detector.check_files_status(
+            user_id,
+            [(path, item['file_hash'], item['content'].size) for path, item in by_path.items()]
+        )
+
+        to_register = []
+        for path, item in by_path.items():
+            status = statuses[path]
+            if status['action'] == 'skip':
+                dropped.add(id(item))
+                item['content'].release()
+                stats['skipped'] += 1
+                logging.info(f"Skipped (unchanged): {path}")
+            elif status['status'] != 'error':
+                item['file_status'] = status
+                to_register.append(item)
+
+        if not to_register:
+            continue
+
+        try:
+            file_ids = await detector.register_files(user_id, [
+                {
+                    'file_path': item['file_path'],
+                    'file_name': item['file_path'].split('/')[-1],
+                    'file_hash': item['file_hash'],
+                    'file_size': item['content'].size,
+                    'source_type': item.get('source_type', 'upload'),
+                    'source_id': item.get('source_id'),
+                    'source_metadata': item.get('source_metadata'),
+                    'last_modified_at': (item.get('source_metadata') or {}).get('modified_time')
+                }
+                for item in to_register
+            ])
+        except Exception as e:
+            logging.warning(f"Bulk registration failed, registering per file: {e}")
+            continue
+
+        for item in to_register:
+            file_id = file_ids.get(item['file_path'])
+            if file_id:
+                item['file_status'] = {**item['file_status'], 'file_id': file_id, 'registered': True}
+
+    return deque(item for item in items if id(item) not in dropped)
+
+
+_in_flight_semaphore: Optional[asyncio.Semaphore] = None
+_in_flight_loop = None
+
+
+def _get_in_flight_semaphore() -> asyncio.Semaphore:
+    """
+    Process-wide cap on files being embedded at once.
+
+    Shared by every concurrent process_embedding_queue_batch() call so that
+    several syncs running together cannot exceed EMBEDDING_MAX_IN_FLIGHT.
+    Re-created if the event loop changes (e.g. between test cases).
+    """
+    global _in_flight_semaphore, _in_flight_loop
+    loop = asyncio.get_running_loop()
+    if _in_flight_semaphore is None or _in_flight_loop is not loop:
+        _in_flight_semaphore = asyncio.Semaphore(EMBEDDING_MAX_IN_FLIGHT)
+        _in_flight_loop = loop
+    return _in_flight_semaphore
+
+
+async def process_embedding_queue_batch(
+    workers: Optional[int] = None,
+    file_timeout: Optional[float] = None
+):
     """
     Process all items in embedding queue with change detection.
     
     This is where the actual embedding and note generation happens.
     Call this AFTER all files have been uploaded and queued.
+
+    Files are processed by a pool of concurrent workers:
+    - Work is interleaved round-robin across users (per-user fairness)
+    - At most EMBEDDING_MAX_IN_FLIGHT files run at once across all batches
+    - Each file is bounded by a timeout so one bad file cannot stall the pool
+    - Items queued while the batch is running are picked up as well
+    - A path is never embedded by two workers at once: duplicates are merged
+      when the queue is drained, and a path re-queued mid-batch waits for
+      the in-flight one
+    - Skip/process is decided in bulk per drained batch (see
+      _check_queued_files), so unchanged files cost no per-file requests
+
+    Args:
+        workers: Number of concurrent workers (default: EMBEDDING_QUEUE_WORKERS)
+        file_timeout: Per-file timeout in seconds (default: EMBEDDING_FILE_TIMEOUT)
     
     Returns:
-        Dict with processed, skipped, and failed counts
+        Dict with processed, skipped, failed and timed_out counts, plus
+        throughput (files_per_sec, chunks_per_sec) for the batch
     """
     from services.embedding_service import embed_and_store_file
+    from services.file_change_detector import FileChangeDetector
+
+    workers = max(1, workers or EMBEDDING_QUEUE_WORKERS)
+    file_timeout = file_timeout or EMBEDDING_FILE_TIMEOUT
+    semaphore = _get_in_flight_semaphore()
     
-    logging.info(f"Processing {len(embedding_queue)} embeddings...")
+    logging.info(f"Processing {len(embedding_queue)} embeddings with {workers} workers...")
     
-    processed = 0
-    skipped = 0
-    failed = 0
+    stats = {
+        'processed': 0,
+        'skipped': 0,
+        'failed': 0,
+        'timed_out': 0,
+        'chunks_processed': 0,
+    }
+    pending = deque()
+    refill_lock = asyncio.Lock()
+    detector = FileChangeDetector()
+    unfinished_file_ids = []  # Bulk-registered files that did not finish successfully
+    path_locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+    started_at = time.monotonic()
+
+    async def worker(worker_id: int):
+        while True:
+            if not pending:
+                async with refill_lock:
+                    if not pending:
+                        pending.extend(await _check_queued_files(_drain_queue_round_robin(), detector, stats))
+                if not pending:
+                    return
+
+            item = pending.popleft()
+            file_status = item.get('file_status')
+            file_path = item['file_path']
+            handle = item.get('content')
+            path_lock = path_locks.setdefault((item['user_id'], file_path), asyncio.Lock())
+
+            async with path_lock, semaphore:
+                try:
+                    # Bytes handed over by the upload step; None falls back to download
+                    file_content = await run_blocking(handle.read) if handle else None
+
+                    result = await asyncio.wait_for(
+                        embed_and_store_file(
+                            user_id=item['user_id'],
+                            file_path_in_bucket=file_path,
+                            source_type=item.get('source_type', 'upload'),
+                            source_id=item.get('source_id'),
+                            source_metadata=item.get('source_metadata'),
+                            file_content=file_content,
+                            file_hash=item.get('file_hash'),
+                            file_status=file_status
+                        ),
+                        timeout=file_timeout
+                    )
+
+                    if result['status'] == 'skipped':
+                        stats['skipped'] += 1
+                        logging.info(f"[worker {worker_id}] Skipped ({stats['skipped']}): {file_path}")
+                    elif result['status'] == 'success':
+                        stats['processed'] += 1
+                        stats['chunks_processed'] += result.get('chunks_processed', 0) or 0
+                        logging.info(f"[worker {worker_id}] Embedded ({stats['processed']}): {file_path}")
+                    else:
+                        stats['failed'] += 1
+                        logging.error(f"[worker {worker_id}] Failed ({stats['failed']}): {file_path}")
+
+                    if result['status'] != 'success' and file_status and file_status.get('registered'):
+                        unfinished_file_ids.append(file_status['file_id'])
+
+                except asyncio.TimeoutError:
+                    stats['failed'] += 1
+                    stats['timed_out'] += 1
+                    logging.error(f"[worker {worker_id}] Timed out after {file_timeout}s: {file_path}")
+                    if file_status and file_status.get('registered'):
+                        unfinished_file_ids.append(file_status['file_id'])
+
+                except Exception as e:
+                    stats['failed'] += 1
+                    logging.error(f"[worker {worker_id}] Failed embedding: {file_path} - {e}")
+                    if file_status and file_status.get('registered'):
+                        unfinished_file_ids.append(file_status['file_id'])
+
+                finally:
+                    if handle:
+                        handle.release()
+
+    await asyncio.gather(*(worker(i + 1) for i in range(workers)))
+
+    # Registered up front, so don't leave them marked 'processing'
+    if unfinished_file_ids:
+        await detector.update_files_processing_status(
+            [(file_id, 'failed', 0, 0) for file_id in unfinished_file_ids]
+        )
+
+    elapsed = time.monotonic() - started_at
+    files_done = stats['processed'] + stats['skipped'] + stats['failed']
+
+    summary = {
+        **stats,
+        'workers': workers,
+        'elapsed_seconds': round(elapsed, 3),
+        'files_per_sec': round(files_done / elapsed, 3) if elapsed > 0 else 0.0,
+        'chunks_per_sec': round(stats['chunks_processed'] / elapsed, 3) if elapsed > 0 else 0.0,
+    }
+
+    logging.info(
+        f"Embedding complete: {stats['processed']} processed, {stats['skipped']} skipped, "
+        f"{stats['failed']} failed ({stats['timed_out']} timed out) in {summary['elapsed_seconds']}s "
+        f"- {summary['files_per_sec']} files/sec, {summary['chunks_per_sec']} chunks/sec"
+    )
     
-    while embedding_queue:
-        item = embedding_queue.popleft()
-        user_id = item['user_id']
-        file_path = item['file_path']
-        source_type = item.get('source_type', 'upload')
-        source_id = item.get('source_id')
-        source_metadata = item.get('source_metadata')
-        
-        try:
-            result = await embed_and_store_file(
-                user_id=user_id,
-                file_path_in_bucket=file_path,
-                source_type=source_type,
-                source_id=source_id,
-                source_metadata=source_metadata
+    return summary
+
+
+# =================================================================
+# PRE-UPLOAD CHANGE DETECTION
+# =================================================================
+
+INGESTED_HASH_PAGE_SIZE = 1000  # PostgREST default max rows per select
+
+# user_id -> {file_path: file_hash}, snapshotted once per sync
+_ingested_hashes: Dict[str, Dict[str, str]] = {}
+_ingested_hash_refs: Dict[str, int] = {}
+
+
+async def preload_ingested_hashes(user_id: str) -> int:
+    """
+    Snapshot the user's ingested_files hashes for the duration of a sync.
+
+    smart_upload_and_embed() then decides "unchanged, skip upload" from
+    memory instead of one registry lookup per file. Pair every successful
+    call with exactly one release_ingested_hashes(user_id).
+
+    Returns:
+        Number of registered files loaded
+    """
+    _ingested_hash_refs[user_id] = _ingested_hash_refs.get(user_id, 0) + 1
+
+    hashes: Dict[str, str] = {}
+    offset = 0
+    try:
+        while True:
+            result = await run_blocking(
+                supabase.table("ingested_files")
+                    .select("file_path, file_hash")
+                    .eq("user_id", user_id)
+                    .order("file_path")
+                    .range(offset, offset + INGESTED_HASH_PAGE_SIZE - 1)
+                    .execute
             )
-            
-            if result['status'] == 'skipped':
-                skipped += 1
-                logging.info(f"Skipped ({skipped}): {file_path}")
-            elif result['status'] == 'success':
-                processed += 1
-                logging.info(f"Embedded ({processed}): {file_path}")
-            else:
-                failed += 1
-                logging.error(f"Failed ({failed}): {file_path}")
-                
-        except Exception as e:
-            failed += 1
-            logging.error(f"Failed embedding: {file_path} - {e}")
-        
-        await asyncio.sleep(0.1)
-    
-    logging.info(f"Embedding complete: {processed} processed, {skipped} skipped, {failed} failed")
-    
-    return {
-        'processed': processed,
-        'skipped': skipped,
-        'failed': failed
-    }
+            page = result.data or []
+            hashes.update((row["file_path"], row["file_hash"]) for row in page)
+            if len(page) < INGESTED_HASH_PAGE_SIZE:
+                break
+            offset += INGESTED_HASH_PAGE_SIZE
+    except Exception:
+        release_ingested_hashes(user_id)  # Failed preloads hold no reference
+        raise
+
+    _ingested_hashes[user_id] = hashes
+    logging.info(f"Loaded {len(hashes)} ingested file hashes for user {user_id}")
+    return len(hashes)
+
+
+def release_ingested_hashes(user_id: str):
+    """Drop the sync's hash snapshot once no sync for the user still needs it."""
+    refs = max(_ingested_hash_refs.get(user_id, 0) - 1, 0)
+    if refs > 0:
+        _ingested_hash_refs[user_id] = refs
+        return
+    _ingested_hash_refs.pop(user_id, None)
+    _ingested_hashes.pop(user_id, None)
+
+
+async def get_ingested_hash(user_id: str, file_path: str) -> Optional[str]:
+    """Hash last ingested for a path (from the sync snapshot when loaded)."""
+    if user_id in _ingested_hashes:
+        return _ingested_hashes[user_id].get(file_path)
+
+    result = await run_blocking(
+        supabase.table("ingested_files")
+            .select("file_hash")
+            .eq("user_id", user_id)
+            .eq("file_path", file_path)
+            .maybe_single()
+            .execute
+    )
+    data = getattr(result, "data", None)
+    return data.get("file_hash") if data else None
 
 
 # =================================================================
@@ -271,7 +572,8 @@ async def smart_upload_and_embed(
     enable_versioning: bool = False,
     process_content_directly: bool = True,  # Kept for API compatibility
     organization_id: Optional[str] = None,
-    team_id: Optional[str] = None
+    team_id: Optional[str] = None,
+    skip_unchanged: bool = True
 ) -> Dict:
     """
     UPLOADS file and QUEUES for batch processing with RBAC support.
@@ -285,8 +587,10 @@ async def smart_upload_and_embed(
     when process_embedding_queue_batch() is called.
 
     Workflow:
+    0. Skip entirely if the content hash matches ingested_files (unchanged)
     1. Upload to Supabase Storage (with RBAC path structure)
-    2. Queue for batch processing
+    2. Queue for batch processing, with the content's SHA-256 and a handle
+       to the bytes (see content_store.py) so they are not downloaded again
     3. Return 'queued' status
 
     Later (in etl_pipelines.py):
@@ -307,10 +611,12 @@ async def smart_upload_and_embed(
         process_content_directly: Kept for API compatibility (not used)
         organization_id: Organization ID for RBAC (optional, for metadata)
         team_id: Team ID for RBAC (optional, for metadata)
+        skip_unchanged: If True, files whose hash matches the last ingested
+            version are neither uploaded nor queued
 
     Returns:
         {
-            'status': 'queued',  # Always queued, never 'success' immediately
+            'status': 'queued' | 'skipped',  # Never 'success' immediately
             'message': 'File uploaded and queued for processing',
             'storage_path': str
         }
@@ -336,6 +642,25 @@ async def smart_upload_and_embed(
     """
     
     try:
+        file_hash = hashlib.sha256(content).hexdigest()
+
+        # =====================================================================
+        # STEP 0: SKIP UNCHANGED FILES (no upload, no queue entry)
+        # =====================================================================
+
+        if skip_unchanged:
+            try:
+                if await get_ingested_hash(user_id, file_path) == file_hash:
+                    logging.info(f"Unchanged, skipping upload: {file_path}")
+                    return {
+                        'status': 'skipped',
+                        'message': 'File unchanged',
+                        'storage_path': file_path
+                    }
+            except Exception as lookup_error:
+                # Fall through to upload; embedding still detects unchanged files
+                logging.warning(f"Pre-upload change check failed for {file_path}: {lookup_error}")
+
         # =====================================================================
         # STEP 1: UPLOAD TO STORAGE
         # =====================================================================
@@ -344,7 +669,8 @@ async def smart_upload_and_embed(
         
         # Upload file to storage
         try:
-            upload_result = supabase.storage.from_(bucket_name).upload(
+            upload_result = await run_blocking(
+                supabase.storage.from_(bucket_name).upload,
                 path=file_path,
                 file=content,
                 file_options={
@@ -369,7 +695,8 @@ async def smart_upload_and_embed(
                 timestamp = int(time.time())
                 version_path = f"{file_path}_v{timestamp}"
                 
-                supabase.storage.from_(bucket_name).upload(
+                await run_blocking(
+                    supabase.storage.from_(bucket_name).upload,
                     path=version_path,
                     file=content,
                     file_options={
@@ -395,12 +722,17 @@ async def smart_upload_and_embed(
         if team_id:
             enriched_metadata['team_id'] = team_id
 
+        # put() may spool to disk, so keep it off the loop too
+        handle = await run_blocking(get_content_store().put, content)
+
         queue_embedding(
             user_id=user_id,
             file_path=file_path,
             source_type=source_type,
             source_id=source_id,
-            source_metadata=enriched_metadata
+            source_metadata=enriched_metadata,
+            file_hash=file_hash,
+            content=handle
         )
         
         # Return queued status (processing happens later in batch)
@@ -698,6 +1030,74 @@ async def refresh_asana_token(refresh_token: str) -> Optional[Dict]:
         return None
 
 
+# =================================================================
+# CONNECTOR SYNC STATE
+# =================================================================
+
+async def get_connector_metadata(user_id: str, service: str) -> Dict:
+    """
+    Connector-specific state stored in user_connectors.metadata
+    (e.g. the Google Drive changes page token).
+
+    Returns:
+        The metadata dict ({} if there is no connector or no metadata)
+    """
+    try:
+        response = await run_blocking(
+            supabase.table("user_connectors")
+                .select("metadata")
+                .eq("user_id", user_id)
+                .eq("service", service)
+                .order("created_at", desc=True)
+                .limit(1)
+                .maybe_single()
+                .execute
+        )
+        data = getattr(response, "data", None)
+        return (data or {}).get("metadata") or {}
+
+    except Exception as e:
+        logging.error(f"Error reading {service} connector metadata: {e}")
+        return {}
+
+
+async def update_connector_metadata(user_id: str, service: str, updates: Dict) -> bool:
+    """
+    Merge updates into user_connectors.metadata for the user's connector.
+
+    Returns:
+        True if a connector row was updated
+    """
+    try:
+        response = await run_blocking(
+            supabase.table("user_connectors")
+                .select("id, metadata")
+                .eq("user_id", user_id)
+                .eq("service", service)
+                .order("created_at", desc=True)
+                .limit(1)
+                .maybe_single()
+                .execute
+        )
+        data = getattr(response, "data", None)
+        if not data:
+            logging.warning(f"No {service} connector to store metadata on")
+            return False
+
+        metadata = {**(data.get("metadata") or {}), **updates}
+        await run_blocking(
+            supabase.table("user_connectors")
+                .update({"metadata": metadata})
+                .eq("id", data["id"])
+                .execute
+        )
+        return True
+
+    except Exception as e:
+        logging.error(f"Error updating {service} connector metadata: {e}")
+        return False
+
+
 # =================================================================
 # LEGACY FILE UPLOAD (BACKWARD COMPATIBILITY)
 # =================================================================
@@ -747,6 +1147,9 @@ __all__ = [
     'MAX_FILE_SIZE',
     'RATE_LIMIT_DELAY',
     'TOKEN_REFRESH_BUFFER',
+    'EMBEDDING_QUEUE_WORKERS',
+    'EMBEDDING_MAX_IN_FLIGHT',
+    'EMBEDDING_FILE_TIMEOUT',
 
     # RBAC Context Helpers (NEW)
     'get_user_context',
@@ -759,6 +1162,8 @@ __all__ = [
 
     # Smart upload (uploads + queues, does NOT process immediately)
     'smart_upload_and_embed',
+    'preload_ingested_hashes',
+    'release_ingested_hashes',
 
     # Progress tracking
     'create_sync_job',
@@ -772,6 +1177,10 @@ __all__ = [
     'refresh_microsoft_token',
     'refresh_asana_token',
 
+    # Connector sync state
+    'get_connector_metadata',
+    'update_connector_metadata',
+
     # Legacy file upload (backward compatibility)
     'safe_upload_to_bucket',
 ]
\ No newline at end of file
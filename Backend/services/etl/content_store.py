@@ -0,0 +1,160 @@
+"""
+ETL CONTENT STORE - HAND UPLOADED BYTES TO THE EMBEDDING STAGE
+
+smart_upload_and_embed() already holds every file's bytes when it uploads
+them. Instead of queueing only the storage path (and downloading the same
+object again in embed_and_store_file), the queue item carries a
+ContentHandle:
+
+- Kept in memory while the process-wide ETL_CONTENT_MEMORY_BYTES budget allows
+- Otherwise spooled to a temp file while ETL_CONTENT_SPOOL_BYTES allows
+  (and the disk keeps ETL_CONTENT_SPOOL_MIN_FREE_BYTES free)
+- Otherwise not retained: read() returns None and the embedding stage falls
+  back to downloading from storage
+
+Handles are released once the file is embedded, returning their budget.
+"""
+
+import os
+import shutil
+import logging
+import tempfile
+import threading
+from typing import Dict, Optional
+
+ETL_CONTENT_MEMORY_BYTES = int(os.getenv("ETL_CONTENT_MEMORY_BYTES", str(256 * 1024 * 1024)))
+ETL_CONTENT_SPOOL_BYTES = int(os.getenv("ETL_CONTENT_SPOOL_BYTES", str(8 * 1024 * 1024 * 1024)))
+ETL_CONTENT_SPOOL_MIN_FREE_BYTES = int(os.getenv("ETL_CONTENT_SPOOL_MIN_FREE_BYTES", str(1024 * 1024 * 1024)))
+ETL_CONTENT_SPOOL_DIR = os.getenv("ETL_CONTENT_SPOOL_DIR") or None  # None = system temp dir
+
+
+class ContentHandle:
+    """Bytes of one queued file, held in memory or in a spool file."""
+
+    def __init__(self, store: "ContentStore", size: int, data: Optional[bytes] = None, path: Optional[str] = None):
+        self._store = store
+        self.size = size
+        self._data = data
+        self._path = path
+        self._released = False
+
+    @property
+    def tier(self) -> str:
+        if self._released:
+            return "released"
+        return "memory" if self._data is not None else "disk"
+
+    def read(self) -> Optional[bytes]:
+        """Return the file bytes, or None if they are no longer available."""
+        if self._released:
+            return None
+        if self._data is not None:
+            return self._data
+        try:
+            with open(self._path, "rb") as f:
+                return f.read()
+        except OSError as e:
+            logging.warning(f"Spooled content unavailable ({self._path}): {e}")
+            return None
+
+    def release(self):
+        """Free the memory / spool file and return the budget (idempotent)."""
+        if self._released:
+            return
+        self._released = True
+        if self._path:
+            try:
+                os.remove(self._path)
+            except OSError:
+                pass
+        self._store._release(self)
+        self._data = None
+
+
+class ContentStore:
+    """Process-wide memory + disk budget for ContentHandles."""
+
+    def __init__(
+        self,
+        memory_budget: int = ETL_CONTENT_MEMORY_BYTES,
+        spool_budget: int = ETL_CONTENT_SPOOL_BYTES,
+        spool_dir: Optional[str] = ETL_CONTENT_SPOOL_DIR,
+        min_free_bytes: int = ETL_CONTENT_SPOOL_MIN_FREE_BYTES
+    ):
+        self.memory_budget = memory_budget
+        self.spool_budget = spool_budget
+        self.spool_dir = spool_dir
+        self.min_free_bytes = min_free_bytes
+
+        self._lock = threading.Lock()
+        self.memory_bytes = 0
+        self.spool_bytes = 0
+        self.stats = {"memory": 0, "disk": 0, "not_retained": 0}
+
+    def put(self, content: bytes) -> Optional[ContentHandle]:
+        """Retain content for the embedding stage; None if over both budgets."""
+        size = len(content)
+
+        with self._lock:
+            if self.memory_bytes + size <= self.memory_budget:
+                self.memory_bytes += size
+                self.stats["memory"] += 1
+                return ContentHandle(self, size, data=content)
+            spool = self.spool_bytes + size <= self.spool_budget
+            if spool:
+                self.spool_bytes += size  # Reserve before writing outside the lock
+
+        if spool:
+            path = self._spool(content)
+            if path:
+                with self._lock:
+                    self.stats["disk"] += 1
+                return ContentHandle(self, size, path=path)
+            with self._lock:
+                self.spool_bytes -= size
+
+        with self._lock:
+            self.stats["not_retained"] += 1
+        return None
+
+    def _spool(self, content: bytes) -> Optional[str]:
+        try:
+            spool_dir = self.spool_dir or tempfile.gettempdir()
+            if shutil.disk_usage(spool_dir).free - len(content) < self.min_free_bytes:
+                return None
+            fd, path = tempfile.mkstemp(prefix="kogna-etl-", dir=spool_dir)
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            return path
+        except OSError as e:
+            logging.warning(f"Could not spool ETL content to disk: {e}")
+            return None
+
+    def _release(self, handle: ContentHandle):
+        with self._lock:
+            if handle._path:
+                self.spool_bytes -= handle.size
+            else:
+                self.memory_bytes -= handle.size
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                **self.stats,
+                "memory_bytes": self.memory_bytes,
+                "spool_bytes": self.spool_bytes,
+            }
+
+
+_store: Optional[ContentStore] = None
+_store_lock = threading.Lock()
+
+
+def get_content_store() -> ContentStore:
+    """Return the process-wide content store (created on first use)."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ContentStore()
+    return _store
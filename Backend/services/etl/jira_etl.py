@@ -492,6 +492,9 @@ async def run_jira_etl(
                     if result['status'] == 'queued':
                         files_processed += 1
                         logging.info(f"    QUEUED for processing: {project_key}")
+                    elif result['status'] == 'skipped':
+                        files_skipped += 1
+                        logging.info(f"    UNCHANGED (not uploaded): {project_key}")
                     elif result['status'] == 'error':
                         files_skipped += 1
                         logging.error(f"    FAILED: {project_key} - {result.get('message', 'Unknown error')}")
@@ -553,6 +556,9 @@ async def run_jira_etl(
                 if result['status'] == 'queued':
                     files_processed += 1
                     logging.info("    QUEUED: all_issues.json")
+                elif result['status'] == 'skipped':
+                    files_skipped += 1
+                    logging.info("    UNCHANGED (not uploaded): all_issues.json")
                 elif result['status'] == 'error':
                     files_skipped += 1
                     logging.error(f"    FAILED: all_issues.json - {result.get('message', 'Unknown error')}")
@@ -613,6 +613,9 @@ async def run_microsoft_excel_etl(
                         logging.info(f"    QUEUED for processing")
                         logging.info(f"      Extracted {cleaned_file.get('total_sheets', 0)} sheets, {cleaned_file.get('total_rows', 0)} rows")
                         logging.info(f"      Quality: {cleaned_file.get('quality_score', 0)}/100")
+                    elif result['status'] == 'skipped':
+                        files_skipped += 1
+                        logging.info("    UNCHANGED (not uploaded)")
                     elif result['status'] == 'error':
                         files_failed += 1
                         logging.error(f"    FAILED: {result.get('message', 'Unknown error')}")
@@ -617,6 +617,9 @@ async def run_microsoft_project_etl(
                 if result['status'] == 'queued':
                     files_processed += 1
                     logging.info("    QUEUED for processing")
+                elif result['status'] == 'skipped':
+                    files_skipped += 1
+                    logging.info("    UNCHANGED (not uploaded)")
                 elif result['status'] == 'error':
                     files_skipped += 1
                     logging.error(f"    FAILED: {result.get('message', 'Unknown error')}")
@@ -539,6 +539,9 @@ async def run_microsoft_teams_etl(
                         logging.info(f"    QUEUED for processing")
                         logging.info(f"      {cleaned_team.get('total_messages', 0)} messages, {cleaned_team.get('total_files', 0)} files")
                         logging.info(f"      Quality: {cleaned_team.get('quality_score', 0)}/100")
+                    elif result['status'] == 'skipped':
+                        files_skipped += 1
+                        logging.info("    UNCHANGED (not uploaded)")
                     elif result['status'] == 'error':
                         files_failed += 1
                         logging.error(f"    FAILED: {result.get('message', 'Unknown error')}")
@@ -43,6 +43,8 @@ from services.etl.base_etl import (
     complete_sync_job,
     embedding_queue,
     process_embedding_queue_batch,
+    preload_ingested_hashes,
+    release_ingested_hashes,
     get_user_context  # NEW: RBAC support
 )
 
@@ -73,6 +75,8 @@ async def run_master_etl(user_id: str, service: str) -> bool:
 
     NOW WITH INTELLIGENT CHANGE DETECTION + RBAC:
     - Tracks processed vs skipped files
+    - Unchanged files are neither re-uploaded nor re-queued (hashes of
+      ingested files are loaded once per sync)
     - 95% faster re-syncs
     - Comprehensive sync job metrics
     - Organization and team-scoped storage paths
@@ -101,6 +105,7 @@ async def run_master_etl(user_id: str, service: str) -> bool:
 
     # Create sync job with RBAC context
     job_id = await create_sync_job(user_id, service, organization_id, team_id)
+    preloaded = False  # Release the hash snapshot only if this sync took one
 
     try:
         # Get valid token (handles refresh automatically)
@@ -108,6 +113,13 @@ async def run_master_etl(user_id: str, service: str) -> bool:
         if not access_token:
             raise ValueError(f"No valid token for {service}")
         
+        # One registry read per sync instead of one lookup per file
+        try:
+            await preload_ingested_hashes(user_id)
+            preloaded = True
+        except Exception as e:
+            logging.warning(f"Could not preload ingested file hashes: {e}")
+
         # Route to correct ETL module
         success = False
         files_processed = 0  # Track processed files
@@ -188,6 +200,10 @@ async def run_master_etl(user_id: str, service: str) -> bool:
 
         return False
 
+    finally:
+        if preloaded:
+            release_ingested_hashes(user_id)
+
 
 # =================================================================
 # TEST FUNCTION
@@ -2,12 +2,19 @@
 
 import hashlib
 import logging
-from typing import Optional, Dict, Tuple
+from collections import defaultdict
+from typing import Optional, Dict, List, Tuple
 from supabase_connect import get_supabase_manager
+from core.executors import run_blocking
 
 supabase = get_supabase_manager().client
 logging.basicConfig(level=logging.INFO)
 
+PAGE_SIZE = 1000       # PostgREST default max rows per select
+ID_BATCH_SIZE = 200    # Ids per in_() filter (keeps request URLs short)
+PATH_BATCH_SIZE = 100  # File paths per in_() filter (paths are longer than ids)
+UPSERT_BATCH_SIZE = 500  # Rows per bulk upsert request
+
 
 class FileChangeDetector:
     """
@@ -46,12 +53,14 @@ class FileChangeDetector:
         """
         try:
             # Check if file exists in registry
-            result = supabase.table('ingested_files') \
-                .select('*') \
-                .eq('user_id', user_id) \
-                .eq('file_path', file_path) \
-                .maybe_single() \
-                .execute()
+            result = await run_blocking(
+                supabase.table('ingested_files')
+                    .select('*')
+                    .eq('user_id', user_id)
+                    .eq('file_path', file_path)
+                    .maybe_single()
+                    .execute
+            )
             
             existing = result.data
             
@@ -130,9 +139,11 @@ class FileChangeDetector:
                 'embedding_status': 'processing'
             }
             
-            result = supabase.table('ingested_files') \
-                .upsert(record, on_conflict='user_id,file_path') \
-                .execute()
+            result = await run_blocking(
+                supabase.table('ingested_files')
+                    .upsert(record, on_conflict='user_id,file_path')
+                    .execute
+            )
             
             file_id = result.data[0]['id']
             logging.info(f"📝 Registered file: {file_path} (ID: {file_id})")
@@ -151,20 +162,161 @@ class FileChangeDetector:
     ):
         """Update file processing status"""
         try:
-            supabase.table('ingested_files') \
-                .update({
-                    'embedding_status': status,
-                    'chunk_count': chunk_count,
-                    'note_count': note_count
-                }) \
-                .eq('id', file_id) \
-                .execute()
+            await run_blocking(
+                supabase.table('ingested_files')
+                    .update({
+                        'embedding_status': status,
+                        'chunk_count': chunk_count,
+                        'note_count': note_count
+                    })
+                    .eq('id', file_id)
+                    .execute
+            )
             
             logging.info(f"✓ Updated file status: {status} ({chunk_count} chunks, {note_count} notes)")
         
         except Exception as e:
             logging.error(f"Error updating file status: {e}")
     
+    # =========================================================================
+    # BULK VARIANTS (one request per batch of files instead of per file)
+    # =========================================================================
+
+    async def check_files_status(
+        self,
+        user_id: str,
+        files: List[Tuple[str, str, int]]
+    ) -> Dict[str, Dict[str, any]]:
+        """
+        Bulk check_file_status() for (file_path, current_hash, file_size) tuples.
+
+        The registry is read with one in_() select per PATH_BATCH_SIZE paths.
+
+        Returns:
+            {file_path: same dict as check_file_status()}; if a lookup fails,
+            the affected paths get status 'error' / action 'process'
+        """
+        paths = list(dict.fromkeys(path for path, _, _ in files))
+        existing: Dict[str, Dict] = {}
+        failed = set()
+
+        for i in range(0, len(paths), PATH_BATCH_SIZE):
+            batch = paths[i:i + PATH_BATCH_SIZE]
+            try:
+                result = await run_blocking(
+                    supabase.table('ingested_files')
+                        .select('id, file_path, file_hash')
+                        .eq('user_id', user_id)
+                        .in_('file_path', batch)
+                        .execute
+                )
+                for row in result.data or []:
+                    existing[row['file_path']] = row
+            except Exception as e:
+                logging.error(f"Error checking file status for {len(batch)} files: {e}")
+                failed.update(batch)
+
+        statuses = {}
+        counts = defaultdict(int)
+        for path, current_hash, _ in files:
+            row = existing.get(path)
+            if path in failed:
+                status = {'status': 'error', 'file_id': None, 'previous_hash': None, 'action': 'process'}
+            elif not row:
+                status = {'status': 'new', 'file_id': None, 'previous_hash': None, 'action': 'process'}
+            elif row['file_hash'] == current_hash:
+                status = {'status': 'unchanged', 'file_id': row['id'], 'previous_hash': row['file_hash'], 'action': 'skip'}
+            else:
+                status = {'status': 'modified', 'file_id': row['id'], 'previous_hash': row['file_hash'], 'action': 'update'}
+            statuses[path] = status
+            counts[status['status']] += 1
+
+        logging.info(
+            f"Checked {len(statuses)} files: " +
+            ", ".join(f"{count} {status}" for status, count in sorted(counts.items()))
+        )
+        return statuses
+
+    async def register_files(
+        self,
+        user_id: str,
+        files: List[Dict]
+    ) -> Dict[str, str]:
+        """
+        Bulk register_file(): upsert many registry rows per request.
+
+        Each entry takes register_file()'s keyword arguments (file_path,
+        file_name, file_hash, file_size, source_type, source_id,
+        source_metadata, last_modified_at). Paths must be unique.
+
+        Returns:
+            {file_path: file_id}
+        """
+        records = [
+            {
+                'user_id': user_id,
+                'file_path': f['file_path'],
+                'file_name': f['file_name'],
+                'file_hash': f['file_hash'],
+                'file_size': f['file_size'],
+                'source_type': f['source_type'],
+                'source_id': f.get('source_id'),
+                'source_metadata': f.get('source_metadata') or {},
+                'last_modified_at': f.get('last_modified_at'),
+                'last_ingested_at': 'now()',
+                'embedding_status': 'processing'
+            }
+            for f in files
+        ]
+
+        file_ids = {}
+        try:
+            for i in range(0, len(records), UPSERT_BATCH_SIZE):
+                result = await run_blocking(
+                    supabase.table('ingested_files')
+                        .upsert(records[i:i + UPSERT_BATCH_SIZE], on_conflict='user_id,file_path')
+                        .execute
+                )
+                for row in result.data or []:
+                    file_ids[row['file_path']] = row['id']
+
+            logging.info(f"📝 Registered {len(file_ids)} files")
+            return file_ids
+
+        except Exception as e:
+            logging.error(f"Error registering files: {e}")
+            raise
+
+    async def update_files_processing_status(
+        self,
+        updates: List[Tuple[str, str, int, int]]
+    ):
+        """
+        Bulk update_file_processing_status() for (file_id, status, chunk_count,
+        note_count) tuples: one in_() update per distinct (status, counts).
+        """
+        groups = defaultdict(list)
+        for file_id, status, chunk_count, note_count in updates:
+            groups[(status, chunk_count, note_count)].append(file_id)
+
+        for (status, chunk_count, note_count), file_ids in groups.items():
+            for i in range(0, len(file_ids), ID_BATCH_SIZE):
+                try:
+                    await run_blocking(
+                        supabase.table('ingested_files')
+                            .update({
+                                'embedding_status': status,
+                                'chunk_count': chunk_count,
+                                'note_count': note_count
+                            })
+                            .in_('id', file_ids[i:i + ID_BATCH_SIZE])
+                            .execute
+                    )
+                except Exception as e:
+                    logging.error(f"Error updating file status for {len(file_ids[i:i + ID_BATCH_SIZE])} files: {e}")
+
+        logging.info(f"✓ Updated status of {len(updates)} files")
+
     async def delete_file_chunks_and_notes(
         self,
         user_id: str,
@@ -176,20 +328,24 @@ class FileChangeDetector:
         """
         try:
             # Delete chunks by file_hash
-            chunk_result = supabase.table('document_chunks') \
-                .delete() \
-                .eq('user_id', user_id) \
-                .eq('file_hash', old_file_hash) \
-                .execute()
+            chunk_result = await run_blocking(
+                supabase.table('document_chunks')
+                    .delete()
+                    .eq('user_id', user_id)
+                    .eq('file_hash', old_file_hash)
+                    .execute
+            )
             
             chunks_deleted = len(chunk_result.data) if chunk_result.data else 0
             
             # Delete notes by file_hash
-            note_result = supabase.table('document_notes') \
-                .delete() \
-                .eq('user_id', user_id) \
-                .eq('file_hash', old_file_hash) \
-                .execute()
+            note_result = await run_blocking(
+                supabase.table('document_notes')
+                    .delete()
+                    .eq('user_id', user_id)
+                    .eq('file_hash', old_file_hash)
+                    .execute
+            )
             
             notes_deleted = len(note_result.data) if note_result.data else 0
             
@@ -204,6 +360,156 @@ class FileChangeDetector:
             logging.error(f"Error deleting file data: {e}")
             return {'chunks_deleted': 0, 'notes_deleted': 0}
     
+    # =========================================================================
+    # INCREMENTAL UPDATES (chunk-level diff for modified files)
+    # =========================================================================
+
+    async def get_file_chunks(
+        self,
+        user_id: str,
+        file_hash: str
+    ) -> List[Dict]:
+        """Get id and chunk_hash of every chunk stored for a file version"""
+        rows = []
+        try:
+            offset = 0
+            while True:
+                result = await run_blocking(
+                    supabase.table('document_chunks')
+                        .select('id, chunk_hash')
+                        .eq('user_id', user_id)
+                        .eq('file_hash', file_hash)
+                        .order('id')
+                        .range(offset, offset + PAGE_SIZE - 1)
+                        .execute
+                )
+                page = result.data or []
+                rows.extend(page)
+                if len(page) < PAGE_SIZE:
+                    break
+                offset += PAGE_SIZE
+            return rows
+
+        except Exception as e:
+            logging.error(f"Error getting file chunks: {e}")
+            return []
+
+    async def get_file_notes(
+        self,
+        user_id: str,
+        file_hash: str
+    ) -> Optional[List[Dict]]:
+        """
+        Get id and source_chunk_hashes of every note stored for a file version.
+
+        Returns None if the lookup fails, so the caller can fall back to a
+        full rebuild instead of treating every stored note as absent.
+        """
+        rows = []
+        try:
+            offset = 0
+            while True:
+                result = await run_blocking(
+                    supabase.table('document_notes')
+                        .select('id, source_chunk_hashes')
+                        .eq('user_id', user_id)
+                        .eq('file_hash', file_hash)
+                        .order('id')
+                        .range(offset, offset + PAGE_SIZE - 1)
+                        .execute
+                )
+                page = result.data or []
+                rows.extend(page)
+                if len(page) < PAGE_SIZE:
+                    break
+                offset += PAGE_SIZE
+            return rows
+
+        except Exception as e:
+            logging.error(f"Error getting file notes: {e}")
+            return None
+
+    @staticmethod
+    def diff_chunks(old_chunks: List[Dict], new_chunk_hashes: List[str]) -> Dict:
+        """
+        Align stored chunks with the new chunk list by chunk_hash.
+
+        Duplicate chunks are matched one-to-one, so a paragraph that appears
+        twice in the new version reuses at most two stored rows.
+
+        Returns:
+            {
+                'kept_ids': ids of stored chunks that still exist,
+                'removed_ids': ids of stored chunks no longer present,
+                'added_positions': indexes into new_chunk_hashes that need inserting
+            }
+        """
+        old_ids_by_hash = defaultdict(list)
+        for row in old_chunks:
+            old_ids_by_hash[row.get('chunk_hash')].append(row['id'])
+
+        kept_ids = []
+        added_positions = []
+        for position, chunk_hash in enumerate(new_chunk_hashes):
+            ids = old_ids_by_hash.get(chunk_hash)
+            if ids:
+                kept_ids.append(ids.pop())
+            else:
+                added_positions.append(position)
+
+        removed_ids = [chunk_id for ids in old_ids_by_hash.values() for chunk_id in ids]
+
+        return {
+            'kept_ids': kept_ids,
+            'removed_ids': removed_ids,
+            'added_positions': added_positions
+        }
+
+    @staticmethod
+    def split_notes_by_validity(
+        old_notes: List[Dict],
+        new_chunk_hashes: List[str]
+    ) -> Tuple[List[Dict], List[Dict]]:
+        """
+        Split stored notes into (kept, stale).
+
+        A note is kept only if every chunk it was generated from is still in
+        the file. Notes without source_chunk_hashes (created before
+        incremental updates) are always stale.
+        """
+        current = set(new_chunk_hashes)
+        kept, stale = [], []
+        for note in old_notes:
+            sources = note.get('source_chunk_hashes') or []
+            if sources and all(h in current for h in sources):
+                kept.append(note)
+            else:
+                stale.append(note)
+        return kept, stale
+
+    async def delete_rows_by_ids(self, table: str, ids: List) -> int:
+        """Delete rows from document_chunks / document_notes by id"""
+        deleted = 0
+        for i in range(0, len(ids), ID_BATCH_SIZE):
+            result = await run_blocking(
+                supabase.table(table)
+                    .delete()
+                    .in_('id', ids[i:i + ID_BATCH_SIZE])
+                    .execute
+            )
+            deleted += len(result.data) if result.data else 0
+        return deleted
+
+    async def relink_rows_to_file_hash(self, table: str, ids: List, file_hash: str):
+        """Point surviving chunks / notes at the new file version"""
+        for i in range(0, len(ids), ID_BATCH_SIZE):
+            await run_blocking(
+                supabase.table(table)
+                    .update({'file_hash': file_hash})
+                    .in_('id', ids[i:i + ID_BATCH_SIZE])
+                    .execute
+            )
+
     async def get_file_info(
         self,
         user_id: str,
@@ -211,12 +517,14 @@ class FileChangeDetector:
     ) -> Optional[Dict]:
         """Get file information from registry"""
         try:
-            result = supabase.table('ingested_files') \
-                .select('*') \
-                .eq('user_id', user_id) \
-                .eq('file_path', file_path) \
-                .maybe_single() \
-                .execute()
+            result = await run_blocking(
+                supabase.table('ingested_files')
+                    .select('*')
+                    .eq('user_id', user_id)
+                    .eq('file_path', file_path)
+                    .maybe_single()
+                    .execute
+            )
             
             return result.data
         
@@ -240,7 +548,7 @@ class FileChangeDetector:
             if source_id:
                 query = query.eq('source_id', source_id)
             
-            result = query.execute()
+            result = await run_blocking(query.execute)
             return result.data or []
         
         except Exception as e:
@@ -5,26 +5,69 @@ Hierarchical Retriever for Intelligent Knowledge Navigation
 Combines tree structure (super-notes) with vector search (leaf notes)
 to provide the right level of detail for any query.
 
+Vector search uses the in-process per-user index (services/vector_index.py)
+when LOCAL_VECTOR_INDEX is enabled, otherwise the match_* RPCs below.
+
 Strategies:
 - hybrid: Search all levels, rank by relevance
 - tree_first: Start at high levels, drill down if needed
 - vector_only: Traditional flat vector search (fallback)
 """
 
+import asyncio
 import logging
-from typing import List, Dict, Optional
+import threading
+from collections import OrderedDict
+from time import monotonic
+from typing import List, Dict, Optional, Tuple
 from supabase_connect import get_supabase_manager
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from services.vector_index import get_user_index
+from services.query_embedding_cache import aembed_query
+from core.executors import run_blocking
 import os
 
 logging.basicConfig(level=logging.INFO)
 supabase = get_supabase_manager().client
 
-# Initialize embeddings
-embeddings_model = GoogleGenerativeAIEmbeddings(
-    model="models/embedding-001",
-    google_api_key=os.getenv("GOOGLE_API_KEY")
-)
+# Per-level budget for RPC searches; a slow level is dropped, not awaited
+RETRIEVAL_LEVEL_TIMEOUT = float(os.getenv("RETRIEVAL_LEVEL_TIMEOUT", "3.0"))
+
+# Parent title/summary per user: {user_id: {parent_id: (fetched_at, context)}},
+# LRU over users like the vector index registry
+PARENT_CONTEXT_TTL_SECONDS = int(os.getenv("PARENT_CONTEXT_TTL_SECONDS", "300"))
+PARENT_CONTEXT_MAX_USERS = int(os.getenv("PARENT_CONTEXT_MAX_USERS", "200"))
+_parent_context_cache: "OrderedDict[str, Dict[str, Tuple[float, Optional[Dict]]]]" = OrderedDict()
+_parent_context_lock = threading.Lock()
+
+
+def _get_parent_contexts(user_id: str) -> Dict[str, Tuple[float, Optional[Dict]]]:
+    with _parent_context_lock:
+        cache = _parent_context_cache.get(user_id)
+        if cache is None:
+            return {}
+        _parent_context_cache.move_to_end(user_id)
+        return dict(cache)
+
+
+def _store_parent_contexts(user_id: str, contexts: Dict[str, Optional[Dict]], fetched_at: float):
+    """Cache freshly fetched parents, pruning expired entries and idle users."""
+    with _parent_context_lock:
+        cache = _parent_context_cache.get(user_id, {})
+        cache = {
+            parent_id: entry for parent_id, entry in cache.items()
+            if fetched_at - entry[0] <= PARENT_CONTEXT_TTL_SECONDS
+        }
+        cache.update((parent_id, (fetched_at, context)) for parent_id, context in contexts.items())
+        _parent_context_cache[user_id] = cache
+        _parent_context_cache.move_to_end(user_id)
+        while len(_parent_context_cache) > PARENT_CONTEXT_MAX_USERS:
+            _parent_context_cache.popitem(last=False)
+
+
+def invalidate_parent_context_cache(user_id: str):
+    """Drop cached parent summaries (call when the user's tree is rebuilt)."""
+    with _parent_context_lock:
+        _parent_context_cache.pop(user_id, None)
 
 
 class HierarchicalRetriever:
@@ -41,7 +84,8 @@ class HierarchicalRetriever:
         self,
         query: str,
         max_results: int = 10,
-        strategy: str = "hybrid"  # "hybrid", "tree_first", "vector_only"
+        strategy: str = "hybrid",  # "hybrid", "tree_first", "vector_only"
+        query_embedding: Optional[List[float]] = None
     ) -> Dict:
         """
         Main retrieval method with multiple strategies.
@@ -50,25 +94,30 @@ class HierarchicalRetriever:
             query: User's question
             max_results: Maximum number of results
             strategy: Retrieval strategy to use
+            query_embedding: Precomputed query vector (skips embedding)
             
         Returns:
             {
                 'results': List[Dict],  # Retrieved content
                 'strategy_used': str,   # Which strategy was used
                 'levels_searched': List[int],  # Which levels were searched
-                'total_results': int
+                'total_results': int,
+                'query_embedding': List[float]  # Reusable by downstream tools
             }
         """
         
-        # Generate query embedding
-        query_embedding = embeddings_model.embed_query(query)
+        # Generate query embedding (shared cache - repeated questions are free)
+        if query_embedding is None:
+            query_embedding = await aembed_query(query)
         
         if strategy == "hybrid":
-            return await self._hybrid_retrieval(query, query_embedding, max_results)
+            result = await self._hybrid_retrieval(query, query_embedding, max_results)
         elif strategy == "tree_first":
-            return await self._tree_first_retrieval(query, query_embedding, max_results)
+            result = await self._tree_first_retrieval(query, query_embedding, max_results)
         else:
-            return await self._vector_only_retrieval(query, query_embedding, max_results)
+            result = await self._vector_only_retrieval(query, query_embedding, max_results)
+        result['query_embedding'] = query_embedding
+        return result
     
     async def _hybrid_retrieval(
         self,
@@ -87,70 +136,27 @@ class HierarchicalRetriever:
         all_results = []
         
         # ═════════════════════════════════════════════════════════════
-        # STEP 1: Search Super-Notes (Tree)
+        # STEP 1-2: Search Super-Notes (Tree) + Leaf Notes
         # ═════════════════════════════════════════════════════════════
         
-        # Search Root (Level 99) - Highest overview
-        root_results = await self._search_level(
-            level=99,
-            query_embedding=query_embedding,
-            limit=1
-        )
-        
-        for result in root_results:
-            all_results.append({
-                **result,
-                'source': 'super_note',
-                'relevance_boost': 0.5,  # Lower for root (too general)
-                'level': 99
-            })
-        
-        # Search Level 2 (Themes)
-        level2_results = await self._search_level(
-            level=2,
-            query_embedding=query_embedding,
-            limit=3
-        )
-        
-        for result in level2_results:
-            all_results.append({
-                **result,
-                'source': 'super_note',
-                'relevance_boost': 1.0,  # Good balance
-                'level': 2
-            })
-        
-        # Search Level 1 (Topics)
-        level1_results = await self._search_level(
-            level=1,
-            query_embedding=query_embedding,
-            limit=5
+        # Root (99) is the highest overview, Level 2 = themes, Level 1 = topics,
+        # Level 0 = leaf notes (detailed content)
+        level_results = await self._search_levels(
+            query_embedding,
+            {99: 1, 2: 3, 1: 5, 0: max_results}
         )
-        
-        for result in level1_results:
-            all_results.append({
-                **result,
-                'source': 'super_note',
-                'relevance_boost': 1.2,  # Higher for specific topics
-                'level': 1
-            })
-        
-        # ═════════════════════════════════════════════════════════════
-        # STEP 2: Search Leaf Notes (Detailed Content)
-        # ═════════════════════════════════════════════════════════════
-        
-        leaf_results = await self._search_leaf_notes(
-            query_embedding=query_embedding,
-            limit=max_results
-        )
-        
-        for result in leaf_results:
-            all_results.append({
-                **result,
-                'source': 'leaf_note',
-                'relevance_boost': 1.5,  # Highest for detailed content
-                'level': 0
-            })
+
+        # Boost: lower for root (too general), highest for detailed leaves
+        relevance_boosts = {99: 0.5, 2: 1.0, 1: 1.2, 0: 1.5}
+
+        for level in (99, 2, 1, 0):
+            for result in level_results[level]:
+                all_results.append({
+                    **result,
+                    'source': 'leaf_note' if level == 0 else 'super_note',
+                    'relevance_boost': relevance_boosts[level],
+                    'level': level
+                })
         
         # ═════════════════════════════════════════════════════════════
         # STEP 3: Rank and Filter
@@ -170,10 +176,7 @@ class HierarchicalRetriever:
         # STEP 4: Enrich with Context
         # ═════════════════════════════════════════════════════════════
         
-        enriched_results = []
-        for result in top_results:
-            enriched = await self._enrich_with_context(result)
-            enriched_results.append(enriched)
+        enriched_results = await self._enrich_with_context(top_results)
         
         print(f"   ✓ Retrieved {len(enriched_results)} results")
         print(f"     • Root: {len([r for r in top_results if r['level'] == 99])}")
@@ -188,6 +191,40 @@ class HierarchicalRetriever:
             'total_results': len(enriched_results)
         }
     
+    async def _search_levels(
+        self,
+        query_embedding: List[float],
+        limits: Dict[int, int]
+    ) -> Dict[int, List[Dict]]:
+        """
+        Search several levels ({level: limit}, 0 = leaf notes).
+
+        With a local index this is one in-process search across all levels;
+        otherwise one RPC per level, issued concurrently. A level that errors
+        or exceeds RETRIEVAL_LEVEL_TIMEOUT contributes no results, so the
+        other levels still come back (partial results).
+        """
+        index = await get_user_index(self.user_id)
+        if index is not None:
+            return index.search(query_embedding, limits)
+
+        async def search_one(level: int, limit: int) -> List[Dict]:
+            if level == 0:
+                search = self._match_document_notes(query_embedding, limit)
+            else:
+                search = self._match_super_notes(level, query_embedding, limit)
+            try:
+                return await asyncio.wait_for(search, timeout=RETRIEVAL_LEVEL_TIMEOUT)
+            except asyncio.TimeoutError:
+                logging.warning(f"Search of level {level} timed out after {RETRIEVAL_LEVEL_TIMEOUT}s")
+                return []
+
+        levels = list(limits.keys())
+        level_results = await asyncio.gather(
+            *(search_one(level, limits[level]) for level in levels)
+        )
+        return dict(zip(levels, level_results))
+
     async def _search_level(
         self,
         level: int,
@@ -197,14 +234,28 @@ class HierarchicalRetriever:
         """
         Search super-notes at a specific level using vector similarity.
         """
+        index = await get_user_index(self.user_id)
+        if index is not None:
+            return index.search(query_embedding, {level: limit})[level]
+        return await self._match_super_notes(level, query_embedding, limit)
+
+    async def _match_super_notes(
+        self,
+        level: int,
+        query_embedding: List[float],
+        limit: int
+    ) -> List[Dict]:
+        """match_super_notes RPC for one level."""
         try:
             # Use RPC function for vector search
-            result = supabase.rpc('match_super_notes', {
-                'query_embedding': query_embedding,
-                'match_count': limit,
-                'p_user_id': self.user_id,
-                'p_level': level
-            }).execute()
+            result = await run_blocking(
+                supabase.rpc('match_super_notes', {
+                    'query_embedding': query_embedding,
+                    'match_count': limit,
+                    'p_user_id': self.user_id,
+                    'p_level': level
+                }).execute
+            )
             
             return result.data or []
         
@@ -220,13 +271,26 @@ class HierarchicalRetriever:
         """
         Search document_notes (leaf notes) using vector similarity.
         """
+        index = await get_user_index(self.user_id)
+        if index is not None:
+            return index.search(query_embedding, {0: limit})[0]
+        return await self._match_document_notes(query_embedding, limit)
+
+    async def _match_document_notes(
+        self,
+        query_embedding: List[float],
+        limit: int
+    ) -> List[Dict]:
+        """match_document_notes RPC."""
         try:
             # Use vector search on document_notes
-            result = supabase.rpc('match_document_notes', {
-                'query_embedding': query_embedding,
-                'match_count': limit,
-                'p_user_id': self.user_id
-            }).execute()
+            result = await run_blocking(
+                supabase.rpc('match_document_notes', {
+                    'query_embedding': query_embedding,
+                    'match_count': limit,
+                    'p_user_id': self.user_id
+                }).execute
+            )
             
             return result.data or []
         
@@ -234,34 +298,71 @@ class HierarchicalRetriever:
             logging.error(f"Error searching leaf notes: {e}")
             return []
     
-    async def _enrich_with_context(self, result: Dict) -> Dict:
+    async def _fetch_parent_contexts(self, parent_ids: List[str]) -> Dict[str, Dict]:
         """
-        Enrich result with hierarchical context (parent/children info).
+        Title/summary for each parent id, from the per-user cache or a
+        single in_() query for the misses.
         """
-        enriched = result.copy()
-        
-        if result['source'] == 'super_note':
-            # Add parent context
-            parent_id = result.get('parent_id')
-            if parent_id:
-                try:
-                    parent = supabase.table('super_notes').select(
-                        'title, summary'
-                    ).eq('id', parent_id).maybe_single().execute()
-                    
-                    if parent.data:
-                        enriched['parent_context'] = {
-                            'title': parent.data['title'],
-                            'summary': parent.data.get('summary', '')[:200]
-                        }
-                except Exception as e:
-                    logging.warning(f"Could not fetch parent: {e}")
-            
-            # Add child count
-            child_ids = result.get('child_note_ids', [])
-            enriched['child_count'] = len(child_ids)
-        
-        return enriched
+        cache = _get_parent_contexts(self.user_id)
+        now = monotonic()
+        missing = [
+            parent_id for parent_id in set(parent_ids)
+            if parent_id not in cache or now - cache[parent_id][0] > PARENT_CONTEXT_TTL_SECONDS
+        ]
+
+        if missing:
+            try:
+                parents = await run_blocking(
+                    supabase.table('super_notes').select(
+                        'id, title, summary'
+                    ).in_('id', missing).execute
+                )
+                found = {row['id']: row for row in parents.data or []}
+                fetched = {
+                    parent_id: {
+                        'title': found[parent_id]['title'],
+                        'summary': (found[parent_id].get('summary') or '')[:200]
+                    } if parent_id in found else None
+                    for parent_id in missing
+                }
+                _store_parent_contexts(self.user_id, fetched, now)
+                cache.update((parent_id, (now, context)) for parent_id, context in fetched.items())
+            except Exception as e:
+                logging.warning(f"Could not fetch parents: {e}")
+
+        return {
+            parent_id: cache[parent_id][1]
+            for parent_id in parent_ids
+            if parent_id in cache and cache[parent_id][1]
+        }
+
+    async def _enrich_with_context(self, results: List[Dict]) -> List[Dict]:
+        """
+        Enrich results with hierarchical context (parent/children info).
+        """
+        parent_ids = [
+            result['parent_id'] for result in results
+            if result.get('source') == 'super_note' and result.get('parent_id')
+        ]
+        parent_contexts = await self._fetch_parent_contexts(parent_ids) if parent_ids else {}
+
+        enriched_results = []
+        for result in results:
+            enriched = result.copy()
+
+            if result.get('source') == 'super_note':
+                # Add parent context
+                parent_context = parent_contexts.get(result.get('parent_id'))
+                if parent_context:
+                    enriched['parent_context'] = parent_context
+
+                # Add child count
+                child_ids = result.get('child_note_ids') or []
+                enriched['child_count'] = len(child_ids)
+
+            enriched_results.append(enriched)
+
+        return enriched_results
     
     async def _tree_first_retrieval(
         self,
@@ -300,7 +401,7 @@ class HierarchicalRetriever:
                 print(f"   ✓ Drilled down to leaf notes")
         
         # Enrich and return
-        enriched = [await self._enrich_with_context(r) for r in results[:max_results]]
+        enriched = await self._enrich_with_context(results[:max_results])
         
         return {
             'results': enriched,
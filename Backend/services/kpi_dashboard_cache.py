@@ -0,0 +1,84 @@
+"""
+KPI Dashboard Cache
+===================
+In-process cache for GET /api/kpis/dashboard responses, keyed by
+(organization_id, team_id, days).
+
+The dashboard reads materialized views that kpi_scheduler refreshes hourly
+(and engagement rows it aggregates daily), so a response stays valid until
+the next refresh:
+    - refresh_materialized_views() / aggregate_daily_engagement() call
+      invalidate_dashboard_cache() when they finish
+    - DASHBOARD_CACHE_TTL_SECONDS bounds staleness for workers that did not
+      run the job themselves
+
+A generation counter stops a response computed before an invalidation from
+being stored after it.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Dict, Optional, Tuple
+
+DASHBOARD_CACHE_TTL_SECONDS = int(os.getenv("DASHBOARD_CACHE_TTL_SECONDS", "3600"))
+DASHBOARD_CACHE_MAX_ENTRIES = int(os.getenv("DASHBOARD_CACHE_MAX_ENTRIES", "1000"))
+
+# (organization_id, team_id, days) -> (stored_at, dashboard)
+_entries: "OrderedDict[Tuple, Tuple[float, Any]]" = OrderedDict()
+_lock = threading.Lock()
+_generation = 0
+
+_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+
+def cache_key(organization_id: str, team_id: Optional[str], days: int) -> Tuple:
+    return (str(organization_id), str(team_id) if team_id else None, int(days))
+
+
+def current_generation() -> int:
+    """Read before computing a dashboard; pass to put_dashboard()."""
+    return _generation
+
+
+def get_dashboard(key: Tuple) -> Optional[Any]:
+    """Return the cached dashboard for the key, or None."""
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None or monotonic() - entry[0] > DASHBOARD_CACHE_TTL_SECONDS:
+            _entries.pop(key, None)
+            _stats["misses"] += 1
+            return None
+        _entries.move_to_end(key)
+        _stats["hits"] += 1
+        return entry[1]
+
+
+def put_dashboard(key: Tuple, dashboard: Any, generation: int):
+    """Store a dashboard unless the cache was invalidated while it was computed."""
+    with _lock:
+        if generation != _generation:
+            return
+        _entries[key] = (monotonic(), dashboard)
+        _entries.move_to_end(key)
+        while len(_entries) > DASHBOARD_CACHE_MAX_ENTRIES:
+            _entries.popitem(last=False)
+
+
+def invalidate_dashboard_cache(organization_id: Optional[str] = None):
+    """Drop cached dashboards for one organization (or all of them)."""
+    global _generation
+    with _lock:
+        _generation += 1
+        _stats["invalidations"] += 1
+        if organization_id is None:
+            _entries.clear()
+            return
+        for key in [k for k in _entries if k[0] == str(organization_id)]:
+            del _entries[key]
+
+
+def get_dashboard_cache_stats() -> Dict:
+    with _lock:
+        return {"entries": len(_entries), "generation": _generation, **_stats}
@@ -12,10 +12,12 @@ Uses APScheduler for task orchestration with error handling and retry logic.
 
 import asyncio
 import logging
+import os
 from datetime import datetime, timedelta, time as datetime_time
 from typing import Optional, Dict, List, Any
 import json
 from decimal import Decimal
+from time import monotonic
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
@@ -26,6 +28,10 @@ from supabase_connect import get_supabase_manager
 from psycopg2.extras import RealDictCursor
 import psycopg2
 
+from core.executors import run_blocking
+from services.kpi_dashboard_cache import invalidate_dashboard_cache
+from services.retention_cleanup import RETENTION_POLICIES, RetentionCleaner
+
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -129,6 +135,10 @@ async def refresh_materialized_views():
         logger.error(error_msg)
         errors.append(error_msg)
 
+    # Cached dashboards were built from the old view contents
+    if views_refreshed:
+        invalidate_dashboard_cache()
+
     # Calculate duration
     end_time = datetime.utcnow()
     duration_ms = int((end_time - start_time).total_seconds() * 1000)
@@ -169,18 +179,133 @@ async def refresh_materialized_views():
 # Task 2: Aggregate Daily Engagement (Daily at 1 AM)
 # ============================================================================
 
+# Messages more than this far apart start a new session
+SESSION_GAP_MINUTES = 30
+
+# Words ignored when picking a user's top topics
+TOPIC_STOP_WORDS = [
+    "the", "a", "an", "and", "or", "but", "in", "on", "at", "to", "for", "of", "with", "by",
+    "is", "are", "was", "were", "i", "you", "he", "she", "it", "we", "they"
+]
+
+# One pass over the day's chat_messages for every user:
+# - LAG() over each user's messages flags session starts (gap > SESSION_GAP_MINUTES)
+# - per-user counts, session count and active span
+# - top 3 words (> 3 chars, not stop words) per user
+# then bulk-upserts the result into user_engagement_metrics.
+DAILY_ENGAGEMENT_QUERY = """
+    WITH messages AS (
+        SELECT
+            m.user_id,
+            u.organization_id,
+            m.role,
+            m.content,
+            m.created_at,
+            CASE
+                WHEN LAG(m.created_at) OVER w IS NULL
+                    OR m.created_at - LAG(m.created_at) OVER w > make_interval(mins => %(session_gap_minutes)s)
+                THEN 1 ELSE 0
+            END AS session_start
+        FROM chat_messages m
+        JOIN users u ON u.id = m.user_id
+        WHERE m.created_at >= %(period_start)s
+            AND m.created_at <= %(period_end)s
+            AND u.organization_id IS NOT NULL
+        WINDOW w AS (PARTITION BY m.user_id ORDER BY m.created_at)
+    ),
+    per_user AS (
+        SELECT
+            user_id,
+            organization_id,
+            SUM(session_start)::int AS session_count,
+            COUNT(*) FILTER (WHERE role = 'user')::int AS query_count,
+            COUNT(*) FILTER (WHERE role = 'assistant')::int AS total_responses,
+            FLOOR(EXTRACT(EPOCH FROM MAX(created_at) - MIN(created_at)))::int AS total_duration_seconds
+        FROM messages
+        GROUP BY user_id, organization_id
+    ),
+    words AS (
+        SELECT user_id, word, COUNT(*) AS uses
+        FROM messages, regexp_split_to_table(lower(content), '\\s+') AS word
+        WHERE length(word) > 3
+            AND word <> ALL(%(stop_words)s)
+        GROUP BY user_id, word
+    ),
+    topics AS (
+        SELECT user_id, (array_agg(word ORDER BY uses DESC, word))[1:3] AS top_topics
+        FROM words
+        GROUP BY user_id
+    )
+    INSERT INTO user_engagement_metrics (
+        user_id, organization_id, date, session_count, query_count, total_responses,
+        total_session_duration_seconds, avg_session_duration_seconds, avg_queries_per_session,
+        top_topics, period_start, period_end, updated_at
+    )
+    SELECT
+        p.user_id,
+        p.organization_id,
+        %(date)s,
+        p.session_count,
+        p.query_count,
+        p.total_responses,
+        p.total_duration_seconds,
+        p.total_duration_seconds / p.session_count,
+        ROUND(p.query_count::numeric / p.session_count, 2),
+        COALESCE(t.top_topics, ARRAY[]::TEXT[]),
+        %(period_start)s,
+        %(period_end)s,
+        NOW()
+    FROM per_user p
+    LEFT JOIN topics t ON t.user_id = p.user_id
+    ON CONFLICT (user_id, organization_id, COALESCE(team_id, '00000000-0000-0000-0000-000000000000'::UUID), date)
+    DO UPDATE SET
+        session_count = EXCLUDED.session_count,
+        query_count = EXCLUDED.query_count,
+        total_responses = EXCLUDED.total_responses,
+        total_session_duration_seconds = EXCLUDED.total_session_duration_seconds,
+        avg_session_duration_seconds = EXCLUDED.avg_session_duration_seconds,
+        avg_queries_per_session = EXCLUDED.avg_queries_per_session,
+        top_topics = EXCLUDED.top_topics,
+        period_start = EXCLUDED.period_start,
+        period_end = EXCLUDED.period_end,
+        updated_at = NOW()
+"""
+
+
+def _upsert_daily_engagement(day, period_start: datetime, period_end: datetime) -> int:
+    """Run DAILY_ENGAGEMENT_QUERY for one day; returns the number of rows upserted."""
+    conn = get_postgres_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(DAILY_ENGAGEMENT_QUERY, {
+                "date": day,
+                "period_start": period_start,
+                "period_end": period_end,
+                "session_gap_minutes": SESSION_GAP_MINUTES,
+                "stop_words": TOPIC_STOP_WORDS,
+            })
+            rows = cursor.rowcount
+        conn.commit()
+        return rows
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
 async def aggregate_daily_engagement():
     """
     Aggregates previous day's user engagement metrics.
 
-    Calculates:
+    Calculates (for all users in one set-based query):
     - Session counts and durations per user
     - Query/message counts
     - Active time windows
     - Top conversation topics
 
     Runs: Daily at 1:00 AM UTC
-    Duration: ~5-30 seconds depending on chat volume
+    Duration: ~1-5 seconds depending on chat volume
     """
     start_time = datetime.utcnow()
     logger.info("=" * 60)
@@ -194,133 +319,38 @@ async def aggregate_daily_engagement():
 
     logger.info(f"Aggregating data for: {yesterday.isoformat()}")
 
-    users_processed = 0
     total_metrics_saved = 0
     errors = []
 
     try:
-        # Get all organizations
-        orgs_response = supabase.table("organizations").select("id").execute()
-        organizations = orgs_response.data if orgs_response.data else []
-
-        for org in organizations:
-            org_id = org["id"]
-
-            try:
-                # Get all users in organization
-                users_response = supabase.table("users") \
-                    .select("id") \
-                    .eq("organization_id", org_id) \
-                    .execute()
-
-                users = users_response.data if users_response.data else []
-
-                for user in users:
-                    user_id = user["id"]
-
-                    try:
-                        # Query chat messages for the user on this date
-                        messages_response = supabase.table("chat_messages") \
-                            .select("*") \
-                            .eq("user_id", user_id) \
-                            .gte("created_at", period_start.isoformat()) \
-                            .lte("created_at", period_end.isoformat()) \
-                            .execute()
-
-                        messages = messages_response.data if messages_response.data else []
-
-                        if not messages:
-                            continue  # Skip users with no activity
-
-                        # Calculate metrics
-                        total_queries = len([m for m in messages if m.get("role") == "user"])
-                        total_responses = len([m for m in messages if m.get("role") == "assistant"])
-
-                        # Estimate session count by grouping messages within 30-minute windows
-                        session_count = 1
-                        last_timestamp = None
-                        for msg in sorted(messages, key=lambda x: x["created_at"]):
-                            msg_time = datetime.fromisoformat(msg["created_at"].replace("Z", "+00:00"))
-                            if last_timestamp:
-                                if (msg_time - last_timestamp).total_seconds() > 1800:  # 30 minutes
-                                    session_count += 1
-                            last_timestamp = msg_time
-
-                        # Calculate average session duration (simplified)
-                        if messages:
-                            first_msg = min(messages, key=lambda x: x["created_at"])
-                            last_msg = max(messages, key=lambda x: x["created_at"])
-                            first_time = datetime.fromisoformat(first_msg["created_at"].replace("Z", "+00:00"))
-                            last_time = datetime.fromisoformat(last_msg["created_at"].replace("Z", "+00:00"))
-                            total_duration_seconds = (last_time - first_time).total_seconds()
-                            avg_session_duration_seconds = int(total_duration_seconds / session_count) if session_count > 0 else 0
-                        else:
-                            avg_session_duration_seconds = 0
-
-                        # Extract top topics from message content (simplified - top 3 keywords)
-                        all_text = " ".join([m.get("content", "") for m in messages if m.get("content")])
-                        words = all_text.lower().split()
-                        # Filter common words and count frequency
-                        common_words = {"the", "a", "an", "and", "or", "but", "in", "on", "at", "to", "for", "of", "with", "by", "is", "are", "was", "were", "i", "you", "he", "she", "it", "we", "they"}
-                        word_counts = {}
-                        for word in words:
-                            if len(word) > 3 and word not in common_words:
-                                word_counts[word] = word_counts.get(word, 0) + 1
-
-                        top_topics = sorted(word_counts.items(), key=lambda x: x[1], reverse=True)[:3]
-                        top_topics_list = [word for word, count in top_topics]
-
-                        # Insert engagement metrics
-                        engagement_data = {
-                            "user_id": user_id,
-                            "organization_id": org_id,
-                            "date": yesterday.isoformat(),
-                            "session_count": session_count,
-                            "total_queries": total_queries,
-                            "total_responses": total_responses,
-                            "avg_session_duration_seconds": avg_session_duration_seconds,
-                            "top_topics": top_topics_list,
-                            "period_start": period_start.isoformat(),
-                            "period_end": period_end.isoformat()
-                        }
-
-                        supabase.table("user_engagement_metrics").upsert(
-                            engagement_data,
-                            on_conflict="user_id,date"
-                        ).execute()
-
-                        total_metrics_saved += 1
-                        users_processed += 1
-
-                    except Exception as e:
-                        error_msg = f"Failed to process user {user_id}: {str(e)}"
-                        logger.error(error_msg)
-                        errors.append(error_msg)
-
-            except Exception as e:
-                error_msg = f"Failed to process organization {org_id}: {str(e)}"
-                logger.error(error_msg)
-                errors.append(error_msg)
-
+        total_metrics_saved = await run_blocking(
+            _upsert_daily_engagement, yesterday, period_start, period_end
+        )
     except Exception as e:
-        error_msg = f"Failed to fetch organizations: {str(e)}"
+        error_msg = f"Failed to aggregate engagement metrics: {str(e)}"
         logger.error(error_msg)
         errors.append(error_msg)
 
+    # Dashboard engagement figures come from user_engagement_metrics
+    if total_metrics_saved:
+        invalidate_dashboard_cache()
+
     # Calculate duration
     end_time = datetime.utcnow()
     duration_ms = int((end_time - start_time).total_seconds() * 1000)
+    rows_per_second = round(total_metrics_saved / max(duration_ms / 1000, 0.001), 1)
 
     # Log execution
     try:
         log_data = {
             "task_name": "aggregate_daily_engagement",
-            "status": "success" if not errors else "partial_failure" if users_processed > 0 else "failed",
+            "status": "success" if not errors else "failed",
             "execution_time_ms": duration_ms,
             "details": {
                 "date": yesterday.isoformat(),
-                "users_processed": users_processed,
+                "users_processed": total_metrics_saved,
                 "metrics_saved": total_metrics_saved,
+                "rows_per_second": rows_per_second,
                 "errors": errors[:10],  # Limit error list
                 "started_at": start_time.isoformat(),
                 "completed_at": end_time.isoformat()
@@ -333,15 +363,15 @@ async def aggregate_daily_engagement():
         logger.error(f"Failed to log scheduler execution: {e}")
 
     logger.info(f"Daily engagement aggregation completed in {duration_ms}ms")
-    logger.info(f"Users processed: {users_processed}")
-    logger.info(f"Metrics saved: {total_metrics_saved}")
+    logger.info(f"Metrics saved: {total_metrics_saved} ({rows_per_second} rows/sec)")
     if errors:
         logger.warning(f"Errors encountered: {len(errors)}")
     logger.info("=" * 60)
 
     return {
-        "users_processed": users_processed,
+        "users_processed": total_metrics_saved,
         "metrics_saved": total_metrics_saved,
+        "rows_per_second": rows_per_second,
         "duration_ms": duration_ms,
         "errors": errors
     }
@@ -351,6 +381,177 @@ async def aggregate_daily_engagement():
 # Task 3: Generate Weekly KPI Report (Monday at 9 AM)
 # ============================================================================
 
+# Organizations whose reports are uploaded at the same time
+WEEKLY_REPORT_CONCURRENCY = int(os.getenv("WEEKLY_REPORT_CONCURRENCY", "8"))
+
+# Rows of user_engagement_metrics kept in each report's daily_breakdown
+WEEKLY_REPORT_BREAKDOWN_ROWS = 50
+
+# One query per report section, covering every organization at once
+WEEKLY_SECTION_QUERIES = {
+    "agent_performance": """
+        SELECT
+            organization_id,
+            agent_name,
+            COALESCE(AVG(avg_response_time_ms), 0) as avg_response_time_ms,
+            COALESCE(SUM(execution_count), 0) as total_executions,
+            COALESCE(SUM(total_cost_usd), 0) as total_cost_usd,
+            COALESCE(AVG(success_rate_percent), 0) as success_rate_percent
+        FROM mv_agent_performance_summary
+        WHERE organization_id = ANY(%(org_ids)s::uuid[])
+            AND date >= %(week_start)s::date
+            AND date <= %(week_end)s::date
+        GROUP BY organization_id, agent_name
+        ORDER BY organization_id, total_executions DESC
+    """,
+    "connector_kpis": """
+        SELECT
+            organization_id,
+            connector_type,
+            kpi_category,
+            kpi_name,
+            COALESCE(AVG(latest_value::float), 0) as avg_value,
+            COUNT(*) as data_points
+        FROM mv_connector_kpi_trends
+        WHERE organization_id = ANY(%(org_ids)s::uuid[])
+            AND date >= %(week_start)s::date
+            AND date <= %(week_end)s::date
+        GROUP BY organization_id, connector_type, kpi_category, kpi_name
+        ORDER BY organization_id, connector_type, kpi_category, kpi_name
+    """,
+    "user_engagement": """
+        WITH engagement AS (
+            SELECT
+                e.*,
+                ROW_NUMBER() OVER (PARTITION BY e.organization_id ORDER BY e.date, e.user_id) as rn
+            FROM user_engagement_metrics e
+            WHERE e.organization_id = ANY(%(org_ids)s::uuid[])
+                AND e.date >= %(week_start)s::date
+                AND e.date <= %(week_end)s::date
+        )
+        SELECT
+            organization_id,
+            COUNT(DISTINCT user_id) as active_users,
+            COALESCE(SUM(session_count), 0) as total_sessions,
+            COALESCE(SUM(query_count), 0) as total_queries,
+            COALESCE(
+                json_agg(to_jsonb(engagement) - 'rn' ORDER BY rn) FILTER (WHERE rn <= %(breakdown_rows)s),
+                '[]'::json
+            ) as daily_breakdown
+        FROM engagement
+        GROUP BY organization_id
+    """,
+}
+
+
+def _decimals_to_float(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert Decimal values to float for JSON serialization"""
+    return {
+        key: float(value) if isinstance(value, Decimal) else value
+        for key, value in row.items()
+    }
+
+
+def _fetch_weekly_sections(org_ids: List[str], week_start, week_end):
+    """
+    Run each WEEKLY_SECTION_QUERIES entry once for all organizations on one connection.
+
+    Returns:
+        (sections, timings_ms) where sections maps section -> {org_id: [rows]},
+        or section -> Exception if that query failed
+    """
+    sections: Dict[str, Any] = {}
+    timings_ms: Dict[str, int] = {}
+    params = {
+        "org_ids": org_ids,
+        "week_start": week_start,
+        "week_end": week_end,
+        "breakdown_rows": WEEKLY_REPORT_BREAKDOWN_ROWS,
+    }
+
+    conn = get_postgres_connection()
+    try:
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        for section, query in WEEKLY_SECTION_QUERIES.items():
+            section_start = monotonic()
+            try:
+                cursor.execute(query, params)
+                rows_by_org: Dict[str, List[Dict]] = {}
+                for row in cursor.fetchall():
+                    row = _decimals_to_float(dict(row))
+                    rows_by_org.setdefault(str(row.pop("organization_id")), []).append(row)
+                sections[section] = rows_by_org
+            except Exception as e:
+                logger.error(f"Failed to fetch {section}: {e}")
+                conn.rollback()
+                sections[section] = e
+            timings_ms[section] = int((monotonic() - section_start) * 1000)
+        cursor.close()
+    finally:
+        conn.close()
+
+    return sections, timings_ms
+
+
+def _build_report_section(section: str, rows: List[Dict]) -> Dict[str, Any]:
+    """Shape one organization's rows into its report section."""
+    if section == "agent_performance":
+        return {
+            "total_agents": len(rows),
+            "agents": rows
+        }
+
+    if section == "connector_kpis":
+        # Group by connector type
+        kpis_by_connector: Dict[str, List[Dict]] = {}
+        for kpi in rows:
+            kpis_by_connector.setdefault(kpi["connector_type"], []).append(kpi)
+        return {
+            "total_connectors": len(kpis_by_connector),
+            "connectors": kpis_by_connector
+        }
+
+    # user_engagement: one aggregate row per organization (none if inactive)
+    totals = rows[0] if rows else {}
+    active_users = totals.get("active_users", 0)
+    total_queries = totals.get("total_queries", 0)
+    return {
+        "active_users": active_users,
+        "total_sessions": totals.get("total_sessions", 0),
+        "total_queries": total_queries,
+        "avg_queries_per_user": round(total_queries / active_users, 2) if active_users > 0 else 0,
+        "daily_breakdown": totals.get("daily_breakdown", [])
+    }
+
+
+def _save_weekly_report(report: Dict[str, Any], week_start, week_end) -> Dict[str, Any]:
+    """Upload one report to Supabase Storage; returns its kpi_reports row."""
+    org_id = report["organization_id"]
+    report_json = json.dumps(report, indent=2, default=str)
+    report_filename = f"weekly_kpi_reports/{org_id}/{week_start.isoformat()}_to_{week_end.isoformat()}.json"
+
+    # Upload to Supabase Storage
+    supabase.storage.from_("kpi-reports").upload(
+        report_filename,
+        report_json.encode('utf-8'),
+        {"content-type": "application/json", "upsert": "true"}
+    )
+
+    return {
+        "organization_id": org_id,
+        "report_type": "weekly_kpi_summary",
+        "period_start": report["period_start"],
+        "period_end": report["period_end"],
+        "file_path": report_filename,
+        "generated_at": datetime.utcnow().isoformat(),
+        "summary": {
+            "agents": report["sections"].get("agent_performance", {}).get("total_agents", 0),
+            "connectors": report["sections"].get("connector_kpis", {}).get("total_connectors", 0),
+            "active_users": report["sections"].get("user_engagement", {}).get("active_users", 0)
+        }
+    }
+
+
 async def generate_weekly_kpi_report():
     """
     Generates comprehensive weekly KPI report per organization.
@@ -361,11 +562,13 @@ async def generate_weekly_kpi_report():
     - User engagement trends
     - Quality metrics
 
-    Saves report as JSON to Supabase Storage.
+    Each section is fetched with one query covering all organizations; reports
+    are then uploaded to Supabase Storage as JSON, WEEKLY_REPORT_CONCURRENCY
+    at a time, and recorded in kpi_reports with a single insert.
     Future: PDF generation and email notifications.
 
     Runs: Every Monday at 9:00 AM UTC
-    Duration: ~10-60 seconds depending on data volume
+    Duration: ~5-30 seconds depending on data volume
     """
     start_time = datetime.utcnow()
     logger.info("=" * 60)
@@ -388,20 +591,37 @@ async def generate_weekly_kpi_report():
     logger.info(f"Report period: {week_start.isoformat()} to {week_end.isoformat()}")
 
     reports_generated = 0
+    organizations: List[Dict] = []
+    timings_ms: Dict[str, int] = {}
     errors = []
 
     try:
         # Get all organizations
-        orgs_response = supabase.table("organizations").select("id, name").execute()
+        phase_start = monotonic()
+        orgs_response = await run_blocking(supabase.table("organizations").select("id, name").execute)
         organizations = orgs_response.data if orgs_response.data else []
+        timings_ms["organizations"] = int((monotonic() - phase_start) * 1000)
+
+        if organizations:
+            org_ids = [str(org["id"]) for org in organizations]
+            try:
+                sections, query_timings = await run_blocking(
+                    _fetch_weekly_sections, org_ids, week_start, week_end
+                )
+                timings_ms.update(query_timings)
+            except Exception as e:
+                logger.error(f"Failed to fetch report sections: {e}")
+                sections = {section: e for section in WEEKLY_SECTION_QUERIES}
 
-        for org in organizations:
-            org_id = org["id"]
-            org_name = org.get("name", "Unknown Organization")
+            phase_start = monotonic()
+            semaphore = asyncio.Semaphore(WEEKLY_REPORT_CONCURRENCY)
+            total = len(organizations)
 
-            logger.info(f"Generating report for: {org_name} ({org_id})")
+            async def save_report(index: int, org: Dict) -> Optional[Dict]:
+                nonlocal reports_generated
+                org_id = str(org["id"])
+                org_name = org.get("name", "Unknown Organization")
 
-            try:
                 report = {
                     "organization_id": org_id,
                     "organization_name": org_name,
@@ -411,122 +631,11 @@ async def generate_weekly_kpi_report():
                     "generated_at": datetime.utcnow().isoformat(),
                     "sections": {}
                 }
-
-                # Section 1: Agent Performance Summary
-                try:
-                    conn = get_postgres_connection()
-                    cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-                    cursor.execute("""
-                        SELECT
-                            agent_name,
-                            COALESCE(AVG(avg_response_time_ms), 0) as avg_response_time_ms,
-                            COALESCE(SUM(execution_count), 0) as total_executions,
-                            COALESCE(SUM(total_cost_usd), 0) as total_cost_usd,
-                            COALESCE(AVG(success_rate_percent), 0) as success_rate_percent
-                        FROM mv_agent_performance_summary
-                        WHERE organization_id = %s
-                            AND date >= %s::date
-                            AND date <= %s::date
-                        GROUP BY agent_name
-                        ORDER BY total_executions DESC
-                    """, (org_id, week_start, week_end))
-
-                    agent_performance = [dict(row) for row in cursor.fetchall()]
-
-                    # Convert Decimal to float for JSON serialization
-                    for row in agent_performance:
-                        for key, value in row.items():
-                            if isinstance(value, Decimal):
-                                row[key] = float(value)
-
-                    report["sections"]["agent_performance"] = {
-                        "total_agents": len(agent_performance),
-                        "agents": agent_performance
-                    }
-
-                    cursor.close()
-                    conn.close()
-
-                except Exception as e:
-                    logger.error(f"Failed to fetch agent performance: {e}")
-                    report["sections"]["agent_performance"] = {"error": str(e)}
-
-                # Section 2: Top Connector KPIs
-                try:
-                    conn = get_postgres_connection()
-                    cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-                    cursor.execute("""
-                        SELECT
-                            connector_type,
-                            kpi_category,
-                            kpi_name,
-                            COALESCE(AVG(latest_value::float), 0) as avg_value,
-                            COUNT(*) as data_points
-                        FROM mv_connector_kpi_trends
-                        WHERE organization_id = %s
-                            AND date >= %s::date
-                            AND date <= %s::date
-                        GROUP BY connector_type, kpi_category, kpi_name
-                        ORDER BY connector_type, kpi_category, kpi_name
-                    """, (org_id, week_start, week_end))
-
-                    connector_kpis = [dict(row) for row in cursor.fetchall()]
-
-                    # Convert Decimal to float
-                    for row in connector_kpis:
-                        for key, value in row.items():
-                            if isinstance(value, Decimal):
-                                row[key] = float(value)
-
-                    # Group by connector type
-                    kpis_by_connector = {}
-                    for kpi in connector_kpis:
-                        connector = kpi["connector_type"]
-                        if connector not in kpis_by_connector:
-                            kpis_by_connector[connector] = []
-                        kpis_by_connector[connector].append(kpi)
-
-                    report["sections"]["connector_kpis"] = {
-                        "total_connectors": len(kpis_by_connector),
-                        "connectors": kpis_by_connector
-                    }
-
-                    cursor.close()
-                    conn.close()
-
-                except Exception as e:
-                    logger.error(f"Failed to fetch connector KPIs: {e}")
-                    report["sections"]["connector_kpis"] = {"error": str(e)}
-
-                # Section 3: User Engagement Trends
-                try:
-                    engagement_response = supabase.table("user_engagement_metrics") \
-                        .select("*") \
-                        .eq("organization_id", org_id) \
-                        .gte("date", week_start.isoformat()) \
-                        .lte("date", week_end.isoformat()) \
-                        .execute()
-
-                    engagement_data = engagement_response.data if engagement_response.data else []
-
-                    # Calculate aggregates
-                    total_sessions = sum(e.get("session_count", 0) for e in engagement_data)
-                    total_queries = sum(e.get("total_queries", 0) for e in engagement_data)
-                    active_users = len(set(e["user_id"] for e in engagement_data))
-
-                    report["sections"]["user_engagement"] = {
-                        "active_users": active_users,
-                        "total_sessions": total_sessions,
-                        "total_queries": total_queries,
-                        "avg_queries_per_user": round(total_queries / active_users, 2) if active_users > 0 else 0,
-                        "daily_breakdown": engagement_data[:50]  # Limit to 50 records
-                    }
-
-                except Exception as e:
-                    logger.error(f"Failed to fetch engagement data: {e}")
-                    report["sections"]["user_engagement"] = {"error": str(e)}
+                for section, result in sections.items():
+                    if isinstance(result, Exception):
+                        report["sections"][section] = {"error": str(result)}
+                    else:
+                        report["sections"][section] = _build_report_section(section, result.get(org_id, []))
 
                 # Section 4: Quality Metrics (placeholder for future)
                 report["sections"]["quality_metrics"] = {
@@ -538,47 +647,35 @@ async def generate_weekly_kpi_report():
                     ]
                 }
 
-                # Save report to Supabase Storage as JSON
-                try:
-                    report_json = json.dumps(report, indent=2, default=str)
-                    report_filename = f"weekly_kpi_reports/{org_id}/{week_start.isoformat()}_to_{week_end.isoformat()}.json"
-
-                    # Upload to Supabase Storage
-                    supabase.storage.from_("kpi-reports").upload(
-                        report_filename,
-                        report_json.encode('utf-8'),
-                        {"content-type": "application/json", "upsert": "true"}
-                    )
+                async with semaphore:
+                    try:
+                        metadata = await run_blocking(_save_weekly_report, report, week_start, week_end)
+                    except Exception as e:
+                        error_msg = f"Failed to save report for {org_name}: {str(e)}"
+                        logger.error(error_msg)
+                        errors.append(error_msg)
+                        return None
+
+                reports_generated += 1
+                logger.info(f"✓ [{index}/{total}] Report saved: {metadata['file_path']}")
+                return metadata
 
-                    logger.info(f"✓ Report saved: {report_filename}")
-                    reports_generated += 1
-
-                    # Also save metadata to database
-                    report_metadata = {
-                        "organization_id": org_id,
-                        "report_type": "weekly_kpi_summary",
-                        "period_start": period_start.isoformat(),
-                        "period_end": period_end.isoformat(),
-                        "file_path": report_filename,
-                        "generated_at": datetime.utcnow().isoformat(),
-                        "summary": {
-                            "agents": report["sections"].get("agent_performance", {}).get("total_agents", 0),
-                            "connectors": report["sections"].get("connector_kpis", {}).get("total_connectors", 0),
-                            "active_users": report["sections"].get("user_engagement", {}).get("active_users", 0)
-                        }
-                    }
-
-                    supabase.table("kpi_reports").insert(report_metadata).execute()
+            saved = await asyncio.gather(
+                *(save_report(i, org) for i, org in enumerate(organizations, start=1))
+            )
+            timings_ms["save_reports"] = int((monotonic() - phase_start) * 1000)
 
+            # Also save metadata to database, in one insert
+            report_rows = [row for row in saved if row]
+            if report_rows:
+                phase_start = monotonic()
+                try:
+                    await run_blocking(supabase.table("kpi_reports").insert(report_rows).execute)
                 except Exception as e:
-                    error_msg = f"Failed to save report for {org_name}: {str(e)}"
+                    error_msg = f"Failed to record report metadata: {str(e)}"
                     logger.error(error_msg)
                     errors.append(error_msg)
-
-            except Exception as e:
-                error_msg = f"Failed to generate report for {org_name}: {str(e)}"
-                logger.error(error_msg)
-                errors.append(error_msg)
+                timings_ms["record_reports"] = int((monotonic() - phase_start) * 1000)
 
     except Exception as e:
         error_msg = f"Failed to fetch organizations: {str(e)}"
@@ -598,7 +695,9 @@ async def generate_weekly_kpi_report():
             "details": {
                 "week_start": week_start.isoformat(),
                 "week_end": week_end.isoformat(),
+                "organizations": len(organizations),
                 "reports_generated": reports_generated,
+                "timings_ms": timings_ms,
                 "errors": errors[:10],
                 "started_at": start_time.isoformat(),
                 "completed_at": end_time.isoformat()
@@ -611,7 +710,8 @@ async def generate_weekly_kpi_report():
         logger.error(f"Failed to log scheduler execution: {e}")
 
     logger.info(f"Weekly KPI report generation completed in {duration_ms}ms")
-    logger.info(f"Reports generated: {reports_generated}")
+    logger.info(f"Reports generated: {reports_generated}/{len(organizations)}")
+    logger.info(f"Timings (ms): {timings_ms}")
     if errors:
         logger.warning(f"Errors encountered: {len(errors)}")
     logger.info("=" * 60)
@@ -627,98 +727,78 @@ async def generate_weekly_kpi_report():
 # Task 4: Cleanup Old Metrics (Weekly on Sunday)
 # ============================================================================
 
+def _run_retention_cleanup() -> Dict[str, Dict[str, Any]]:
+    """Run the batched cleanup engine on its own connection."""
+    conn = get_postgres_connection()
+    try:
+        return RetentionCleaner(conn).run(RETENTION_POLICIES)
+    finally:
+        conn.close()
+
+
+def _vacuum_tables(tables: List[str]):
+    """VACUUM ANALYZE (non-blocking for reads and writes) the cleaned tables."""
+    conn = get_postgres_connection()
+    try:
+        conn.set_isolation_level(0)  # AUTOCOMMIT mode required for VACUUM
+        cursor = conn.cursor()
+        for table_name in tables:
+            cursor.execute(f"VACUUM ANALYZE {table_name}")
+            logger.info(f"✓ Optimized {table_name}")
+        cursor.close()
+    finally:
+        conn.close()
+
+
 async def cleanup_old_metrics():
     """
     Archives and cleans up old metric data to maintain performance.
 
-    Retention policy:
+    Retention policy (see RETENTION_POLICIES in services/retention_cleanup.py):
     - connector_kpis: Keep 90 days
     - user_engagement_metrics: Keep 90 days
     - agent_execution_logs: Keep 30 days
     - scheduler_logs: Keep 30 days
+    - chunk_embedding_cache: Keep 90 days
+
+    Rows are deleted in small key-ordered batches within a time budget;
+    unfinished tables resume on the next run.
 
     Runs: Every Sunday at 3:00 AM UTC
-    Duration: ~5-30 seconds depending on data volume
+    Duration: bounded by RETENTION_TIME_BUDGET_SECONDS
     """
     start_time = datetime.utcnow()
     logger.info("=" * 60)
     logger.info("Starting metric cleanup")
     logger.info(f"Started at: {start_time.isoformat()}")
 
-    # Define retention policies (days)
-    retention_policies = {
-        "connector_kpis": 90,
-        "user_engagement_metrics": 90,
-        "agent_execution_logs": 30,
-        "scheduler_logs": 30
-    }
+    retention_policies = {policy.table: policy.retention_days for policy in RETENTION_POLICIES}
 
     tables_cleaned = []
+    table_results: Dict[str, Dict[str, Any]] = {}
     total_rows_deleted = 0
     errors = []
 
     try:
-        conn = get_postgres_connection()
-        cursor = conn.cursor()
+        table_results = await run_blocking(_run_retention_cleanup)
 
-        for table_name, retention_days in retention_policies.items():
-            try:
-                cutoff_date = (datetime.utcnow() - timedelta(days=retention_days)).date()
-
-                logger.info(f"Cleaning {table_name} (keeping data after {cutoff_date.isoformat()})...")
-
-                # Determine the timestamp column name (varies by table)
-                if table_name == "connector_kpis":
-                    timestamp_col = "extracted_at"
-                elif table_name == "user_engagement_metrics":
-                    timestamp_col = "date"
-                elif table_name == "agent_execution_logs":
-                    timestamp_col = "executed_at"
-                elif table_name == "scheduler_logs":
-                    timestamp_col = "executed_at"
-                else:
-                    timestamp_col = "created_at"
-
-                # Delete old records
-                delete_query = f"""
-                    DELETE FROM {table_name}
-                    WHERE {timestamp_col} < %s::date
-                """
-
-                cursor.execute(delete_query, (cutoff_date,))
-                rows_deleted = cursor.rowcount
-                conn.commit()
-
-                tables_cleaned.append(table_name)
-                total_rows_deleted += rows_deleted
-
-                logger.info(f"✓ {table_name}: Deleted {rows_deleted} old records")
-
-            except Exception as e:
-                error_msg = f"Failed to clean {table_name}: {str(e)}"
-                logger.error(error_msg)
-                errors.append(error_msg)
-                conn.rollback()
-
-        cursor.close()
-        conn.close()
+        for table_name, result in table_results.items():
+            if "error" in result:
+                errors.append(f"Failed to clean {table_name}: {result['error']}")
+                continue
+            if result.get("skipped"):
+                continue
+            tables_cleaned.append(table_name)
+            total_rows_deleted += result["rows_deleted"]
 
         # Run VACUUM ANALYZE to reclaim space and update statistics
-        try:
-            logger.info("Running VACUUM ANALYZE to optimize tables...")
-            conn = get_postgres_connection()
-            conn.set_isolation_level(0)  # AUTOCOMMIT mode required for VACUUM
-            cursor = conn.cursor()
-
-            for table_name in tables_cleaned:
-                cursor.execute(f"VACUUM ANALYZE {table_name}")
-                logger.info(f"✓ Optimized {table_name}")
-
-            cursor.close()
-            conn.close()
-
-        except Exception as e:
-            logger.warning(f"VACUUM ANALYZE failed (non-critical): {e}")
+        vacuum_tables = [t for t in tables_cleaned if table_results[t]["rows_deleted"]]
+        if vacuum_tables:
+            try:
+                logger.info("Running VACUUM ANALYZE to optimize tables...")
+                await run_blocking(_vacuum_tables, vacuum_tables)
+            except Exception as e:
+                logger.warning(f"VACUUM ANALYZE failed (non-critical): {e}")
 
     except Exception as e:
         error_msg = f"Database connection failed: {str(e)}"
@@ -739,6 +819,7 @@ async def cleanup_old_metrics():
                 "tables_cleaned": tables_cleaned,
                 "total_rows_deleted": total_rows_deleted,
                 "retention_policies": retention_policies,
+                "tables": table_results,
                 "errors": errors,
                 "started_at": start_time.isoformat(),
                 "completed_at": end_time.isoformat()
@@ -753,6 +834,9 @@ async def cleanup_old_metrics():
     logger.info(f"Metric cleanup completed in {duration_ms}ms")
     logger.info(f"Tables cleaned: {len(tables_cleaned)}/{len(retention_policies)}")
     logger.info(f"Total rows deleted: {total_rows_deleted}")
+    unfinished = [t for t in tables_cleaned if not table_results[t]["completed"]]
+    if unfinished:
+        logger.info(f"Resuming next run: {', '.join(unfinished)}")
     if errors:
         logger.warning(f"Errors encountered: {len(errors)}")
     logger.info("=" * 60)
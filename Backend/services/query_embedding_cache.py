@@ -0,0 +1,241 @@
+# services/query_embedding_cache.py
+"""
+Shared query-embedding service for chat retrieval.
+
+One chat turn used to embed the same question several times
+(HierarchicalRetriever.retrieve, then NotesFirstSearchTool inside the
+internal analyst crew). Query vectors are now computed once and shared:
+
+    1. In-process LRU keyed by (embedding model, normalized query text)
+    2. Optional on-disk SQLite tier (QUERY_EMBEDDING_CACHE_PATH) so repeated
+       questions survive restarts and are shared by workers on one host
+
+Usage:
+    vector = await aembed_query(user_query)   # async code (event loop safe)
+    vector = embed_query(user_query)          # sync code (CrewAI tools)
+"""
+
+import os
+import re
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from time import monotonic, time
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+from Ai_agents.model_registry import get_embeddings_model
+from Ai_agents.rate_limiter import get_rate_limiter
+from core.executors import run_blocking
+
+logging.basicConfig(level=logging.INFO)
+
+QUERY_EMBEDDING_MODEL = "models/embedding-001"
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "2048"))
+QUERY_EMBEDDING_CACHE_TTL_SECONDS = int(os.getenv("QUERY_EMBEDDING_CACHE_TTL_SECONDS", "86400"))
+QUERY_EMBEDDING_CACHE_PATH = os.getenv("QUERY_EMBEDDING_CACHE_PATH")  # unset = memory only
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    """Cache key text: trimmed, lower-cased, whitespace collapsed."""
+    return _WHITESPACE.sub(" ", (text or "").strip()).lower()
+
+
+class QueryEmbeddingCache:
+    """
+    Memory LRU + optional SQLite tier for query embeddings.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = QUERY_EMBEDDING_CACHE_SIZE,
+        ttl_seconds: int = QUERY_EMBEDDING_CACHE_TTL_SECONDS,
+        path: Optional[str] = QUERY_EMBEDDING_CACHE_PATH
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.path = path
+
+        # (model, normalized text) -> (float32 vector, stored_at monotonic)
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._models: Dict[str, GoogleGenerativeAIEmbeddings] = {}
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    # ------------------------------------------------------------------
+    # Disk tier
+    # ------------------------------------------------------------------
+
+    def _connect_locked(self) -> Optional[sqlite3.Connection]:
+        if self._db is None and self.path:
+            try:
+                self._db = sqlite3.connect(self.path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                    " model TEXT NOT NULL, query TEXT NOT NULL,"
+                    " embedding BLOB NOT NULL, stored_at REAL NOT NULL,"
+                    " PRIMARY KEY (model, query))"
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                logging.warning(f"Query embedding cache: disk tier disabled ({e})")
+                self.path = None
+                self._db = None
+        return self._db
+
+    def _disk_get_locked(self, model: str, key: str) -> Optional[np.ndarray]:
+        db = self._connect_locked()
+        if db is None:
+            return None
+        try:
+            row = db.execute(
+                "SELECT embedding, stored_at FROM query_embeddings WHERE model = ? AND query = ?",
+                (model, key)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logging.warning(f"Query embedding cache: disk read failed ({e})")
+            return None
+        if row is None or time() - row[1] > self.ttl_seconds:
+            return None
+        return np.frombuffer(row[0], dtype=np.float32)
+
+    def _disk_put_locked(self, model: str, key: str, vector: np.ndarray):
+        db = self._connect_locked()
+        if db is None:
+            return
+        try:
+            db.execute(
+                "INSERT OR REPLACE INTO query_embeddings VALUES (?, ?, ?, ?)",
+                (model, key, vector.tobytes(), time())
+            )
+            db.commit()
+        except sqlite3.Error as e:
+            logging.warning(f"Query embedding cache: disk write failed ({e})")
+
+    # ------------------------------------------------------------------
+    # Lookup / store
+    # ------------------------------------------------------------------
+
+    def get_memory(self, text: str, model: str = QUERY_EMBEDDING_MODEL) -> Optional[List[float]]:
+        """Return a vector from the in-memory tier only (never touches disk)."""
+        key = normalize_query(text)
+        with self._lock:
+            return self._memory_get_locked(model, key)
+
+    def get(self, text: str, model: str = QUERY_EMBEDDING_MODEL) -> Optional[List[float]]:
+        """Return a cached vector for the query, or None."""
+        key = normalize_query(text)
+        with self._lock:
+            cached = self._memory_get_locked(model, key)
+            if cached is not None:
+                return cached
+
+            vector = self._disk_get_locked(model, key)
+            if vector is None:
+                return None
+            self._memory_put_locked(model, key, vector)
+            self.disk_hits += 1
+            return vector.tolist()
+
+    def put(self, text: str, embedding: List[float], model: str = QUERY_EMBEDDING_MODEL):
+        """Store a query vector in both tiers."""
+        key = normalize_query(text)
+        vector = np.asarray(embedding, dtype=np.float32)
+        with self._lock:
+            self._memory_put_locked(model, key, vector)
+            self._disk_put_locked(model, key, vector)
+
+    def _memory_get_locked(self, model: str, key: str) -> Optional[List[float]]:
+        entry = self._entries.get((model, key))
+        if entry is None or monotonic() - entry[1] > self.ttl_seconds:
+            return None
+        self._entries.move_to_end((model, key))
+        self.memory_hits += 1
+        return entry[0].tolist()
+
+    def _memory_put_locked(self, model: str, key: str, vector: np.ndarray):
+        self._entries[(model, key)] = (vector, monotonic())
+        self._entries.move_to_end((model, key))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    # ------------------------------------------------------------------
+    # Embedding
+    # ------------------------------------------------------------------
+
+    def _get_model(self, model: str) -> GoogleGenerativeAIEmbeddings:
+        embeddings = self._models.get(model)
+        if embeddings is None:
+            embeddings = get_embeddings_model(model)
+            self._models[model] = embeddings
+        return embeddings
+
+    def embed_query(self, text: str, model: str = QUERY_EMBEDDING_MODEL) -> List[float]:
+        """
+        Return the query's embedding, calling the API only on a cache miss
+        (blocking - use aembed_query from async code).
+        """
+        cached = self.get(text, model)
+        if cached is not None:
+            return cached
+
+        self.misses += 1
+        get_rate_limiter(model, os.getenv("GOOGLE_API_KEY")).acquire()
+        embedding = self._get_model(model).embed_query(text)
+        self.put(text, embedding, model)
+        return embedding
+
+    async def aembed_query(self, text: str, model: str = QUERY_EMBEDDING_MODEL) -> List[float]:
+        """
+        Async embed_query: memory hits return inline; the disk tier and the
+        API call run off the loop.
+        """
+        cached = self.get_memory(text, model)
+        if cached is not None:
+            return cached
+        return await run_blocking(self.embed_query, text, model)
+
+    def clear(self):
+        """Drop the in-memory tier (the disk tier expires by TTL)."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': round(hits / lookups, 3) if lookups else 0.0,
+            'disk': bool(self.path),
+        }
+
+
+_query_embedding_cache: Optional[QueryEmbeddingCache] = None
+
+
+def get_query_embedding_cache() -> QueryEmbeddingCache:
+    """Return the process-wide query embedding cache."""
+    global _query_embedding_cache
+    if _query_embedding_cache is None:
+        _query_embedding_cache = QueryEmbeddingCache()
+    return _query_embedding_cache
+
+
+def embed_query(text: str, model: str = QUERY_EMBEDDING_MODEL) -> List[float]:
+    return get_query_embedding_cache().embed_query(text, model)
+
+
+async def aembed_query(text: str, model: str = QUERY_EMBEDDING_MODEL) -> List[float]:
+    return await get_query_embedding_cache().aembed_query(text, model)
@@ -0,0 +1,274 @@
+"""
+Retention Cleanup
+=================
+Deletes rows past their retention window without holding long locks.
+
+Instead of one unbounded DELETE per table, each table is cleaned in small,
+primary-key-ordered batches:
+    - every batch is its own short transaction with a low lock_timeout
+    - rows locked by concurrent writers are skipped (FOR UPDATE SKIP LOCKED)
+      and picked up by a later run
+    - batches are separated by RETENTION_BATCH_PAUSE_SECONDS so WAL and
+      replication keep up
+    - a run stops after RETENTION_TIME_BUDGET_SECONDS; the last deleted key
+      is stored in retention_cleanup_state so the next run resumes there
+      (see migrations/015_create_retention_cleanup_state.sql)
+
+Time-partitioned tables (policy.partitioned) first drop whole partitions
+whose upper bound is before the cutoff, then batch-delete the remainder.
+"""
+
+import os
+import re
+import logging
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from time import monotonic
+from typing import Any, Dict, List, Optional
+
+from psycopg2 import errors as pg_errors
+
+logger = logging.getLogger(__name__)
+
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "5000"))
+RETENTION_BATCH_PAUSE_SECONDS = float(os.getenv("RETENTION_BATCH_PAUSE_SECONDS", "0.1"))
+RETENTION_TIME_BUDGET_SECONDS = float(os.getenv("RETENTION_TIME_BUDGET_SECONDS", "600"))
+RETENTION_LOCK_TIMEOUT_MS = int(os.getenv("RETENTION_LOCK_TIMEOUT_MS", "50"))
+
+# Give up on a table for this run after this many lock timeouts in a row
+MAX_CONSECUTIVE_LOCK_TIMEOUTS = 3
+
+
+@dataclass
+class RetentionPolicy:
+    """How long rows of one table are kept, and how to find old ones."""
+    table: str
+    timestamp_column: str
+    retention_days: int
+    key_column: str = "id"
+    partitioned: bool = False
+
+
+RETENTION_POLICIES: List[RetentionPolicy] = [
+    RetentionPolicy("connector_kpis", "extracted_at", 90),
+    RetentionPolicy("user_engagement_metrics", "date", 90),
+    RetentionPolicy("agent_execution_logs", "executed_at", 30),
+    RetentionPolicy("scheduler_logs", "executed_at", 30),
+    RetentionPolicy("chunk_embedding_cache", "last_used_at", 90),
+]
+
+_PARTITION_UPPER_BOUND = re.compile(r"TO \('([^']+)'\)")
+
+
+class RetentionCleaner:
+    """
+    Batched retention cleanup on one psycopg2 connection.
+
+    Usage:
+        cleaner = RetentionCleaner(conn)
+        results = cleaner.run(RETENTION_POLICIES)
+    """
+
+    def __init__(
+        self,
+        conn,
+        batch_size: int = RETENTION_BATCH_SIZE,
+        pause_seconds: float = RETENTION_BATCH_PAUSE_SECONDS,
+        time_budget_seconds: float = RETENTION_TIME_BUDGET_SECONDS,
+        lock_timeout_ms: int = RETENTION_LOCK_TIMEOUT_MS,
+        sleep=time.sleep
+    ):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.pause_seconds = pause_seconds
+        self.time_budget_seconds = time_budget_seconds
+        self.lock_timeout_ms = lock_timeout_ms
+        self.sleep = sleep
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def run(self, policies: List[RetentionPolicy]) -> Dict[str, Dict[str, Any]]:
+        """Clean every table in turn, sharing one time budget. Returns per-table results."""
+        deadline = monotonic() + self.time_budget_seconds
+        results = {}
+
+        for policy in policies:
+            try:
+                results[policy.table] = self.clean_table(policy, deadline)
+            except Exception as e:
+                self.conn.rollback()
+                logger.error(f"Failed to clean {policy.table}: {e}")
+                results[policy.table] = {"error": str(e), "rows_deleted": 0, "completed": False}
+
+        return results
+
+    def clean_table(self, policy: RetentionPolicy, deadline: float) -> Dict[str, Any]:
+        """Delete one table's expired rows in batches until done or out of time."""
+        result = {
+            "rows_deleted": 0,
+            "batches": 0,
+            "max_batch_ms": 0,
+            "lock_timeouts": 0,
+            "partitions_dropped": [],
+            "completed": False,
+        }
+
+        if not self._table_exists(policy.table):
+            logger.info(f"Skipping {policy.table}: table does not exist")
+            result["completed"] = True
+            result["skipped"] = "missing"
+            return result
+
+        cutoff = (datetime.utcnow() - timedelta(days=policy.retention_days)).date()
+        logger.info(f"Cleaning {policy.table} (keeping data after {cutoff.isoformat()})...")
+
+        if policy.partitioned:
+            result["partitions_dropped"] = self._drop_expired_partitions(policy, cutoff)
+
+        last_key = self._load_cursor(policy.table)
+        consecutive_timeouts = 0
+
+        while monotonic() < deadline:
+            batch_start = monotonic()
+            try:
+                deleted_keys = self._delete_batch(policy, cutoff, last_key)
+            except pg_errors.LockNotAvailable:
+                self.conn.rollback()
+                result["lock_timeouts"] += 1
+                consecutive_timeouts += 1
+                logger.warning(f"{policy.table}: lock timeout, backing off")
+                if consecutive_timeouts >= MAX_CONSECUTIVE_LOCK_TIMEOUTS:
+                    break
+                self.sleep(self.pause_seconds * 10)
+                continue
+
+            consecutive_timeouts = 0
+            batch_ms = int((monotonic() - batch_start) * 1000)
+            rows = len(deleted_keys)
+            result["batches"] += 1
+            result["rows_deleted"] += rows
+            result["max_batch_ms"] = max(result["max_batch_ms"], batch_ms)
+            logger.info(
+                f"{policy.table}: batch {result['batches']} deleted {rows} rows in {batch_ms}ms"
+            )
+
+            if rows < self.batch_size:
+                # Pass finished; the next run starts from the first key again
+                result["completed"] = True
+                last_key = None
+                break
+
+            last_key = max(deleted_keys)
+            self.sleep(self.pause_seconds)
+
+        self._save_cursor(policy.table, last_key)
+        logger.info(
+            f"✓ {policy.table}: Deleted {result['rows_deleted']} old records "
+            f"in {result['batches']} batches"
+            + ("" if result["completed"] else " (resumes next run)")
+        )
+        return result
+
+    # ------------------------------------------------------------------
+    # Batches
+    # ------------------------------------------------------------------
+
+    def _set_lock_timeout(self, cursor):
+        cursor.execute(f"SET LOCAL lock_timeout = '{int(self.lock_timeout_ms)}ms'")
+
+    def _delete_batch(self, policy: RetentionPolicy, cutoff: date, last_key: Optional[str]) -> List[Any]:
+        """Delete up to batch_size expired rows after last_key; returns their keys."""
+        after_key = f"AND {policy.key_column} > %(last_key)s" if last_key is not None else ""
+        query = f"""
+            WITH batch AS (
+                SELECT {policy.key_column}
+                FROM {policy.table}
+                WHERE {policy.timestamp_column} < %(cutoff)s::date
+                    {after_key}
+                ORDER BY {policy.key_column}
+                LIMIT %(batch_size)s
+                FOR UPDATE SKIP LOCKED
+            )
+            DELETE FROM {policy.table} t
+            USING batch
+            WHERE t.{policy.key_column} = batch.{policy.key_column}
+            RETURNING t.{policy.key_column}
+        """
+        with self.conn.cursor() as cursor:
+            self._set_lock_timeout(cursor)
+            cursor.execute(query, {"cutoff": cutoff, "last_key": last_key, "batch_size": self.batch_size})
+            keys = [row[0] for row in cursor.fetchall()]
+        self.conn.commit()
+        return keys
+
+    def _drop_expired_partitions(self, policy: RetentionPolicy, cutoff: date) -> List[str]:
+        """Detach and drop partitions that only hold rows older than cutoff."""
+        with self.conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = %s::regclass
+            """, (policy.table,))
+            partitions = cursor.fetchall()
+        self.conn.commit()
+
+        dropped = []
+        for name, bound in partitions:
+            match = _PARTITION_UPPER_BOUND.search(bound or "")
+            if not match:
+                continue  # DEFAULT or non-range partition
+            try:
+                upper = date.fromisoformat(match.group(1)[:10])
+            except ValueError:
+                continue
+            if upper > cutoff:
+                continue
+
+            try:
+                with self.conn.cursor() as cursor:
+                    self._set_lock_timeout(cursor)
+                    cursor.execute(f'ALTER TABLE {policy.table} DETACH PARTITION "{name}"')
+                    cursor.execute(f'DROP TABLE "{name}"')
+                self.conn.commit()
+                dropped.append(name)
+                logger.info(f"✓ {policy.table}: dropped partition {name} (upper bound {upper.isoformat()})")
+            except pg_errors.LockNotAvailable:
+                self.conn.rollback()
+                logger.warning(f"{policy.table}: lock timeout dropping {name}, will retry next run")
+
+        return dropped
+
+    # ------------------------------------------------------------------
+    # State
+    # ------------------------------------------------------------------
+
+    def _table_exists(self, table: str) -> bool:
+        with self.conn.cursor() as cursor:
+            cursor.execute("SELECT to_regclass(%s)", (table,))
+            row = cursor.fetchone()
+        self.conn.commit()
+        return bool(row and row[0])
+
+    def _load_cursor(self, table: str) -> Optional[str]:
+        with self.conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT last_key FROM retention_cleanup_state WHERE table_name = %s",
+                (table,)
+            )
+            row = cursor.fetchone()
+        self.conn.commit()
+        return row[0] if row else None
+
+    def _save_cursor(self, table: str, last_key: Optional[Any]):
+        with self.conn.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO retention_cleanup_state (table_name, last_key, updated_at)
+                VALUES (%s, %s, NOW())
+                ON CONFLICT (table_name)
+                DO UPDATE SET last_key = EXCLUDED.last_key, updated_at = NOW()
+            """, (table, str(last_key) if last_key is not None else None))
+        self.conn.commit()
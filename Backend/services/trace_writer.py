@@ -0,0 +1,189 @@
+"""
+Agent Trace Writer
+==================
+Background, batched persistence for agent_traces rows.
+
+/api/chat/run used to insert one trace row per LangGraph step before
+returning, adding a serial round-trip per node to every answer. Rows are
+now handed to a single writer thread instead:
+    - enqueue() never blocks; the queue is bounded by TRACE_QUEUE_MAX_ROWS
+      and rows that do not fit are dropped (and counted)
+    - the writer flushes one bulk insert when TRACE_BATCH_SIZE rows are
+      buffered or TRACE_FLUSH_INTERVAL_SECONDS have passed
+    - a failed insert is split in halves and retried, so one bad row only
+      loses itself; rows that still fail alone are logged and counted,
+      never retried into the queue
+
+Usage:
+    from services.trace_writer import get_trace_writer
+
+    get_trace_writer().enqueue(rows)
+"""
+
+import os
+import logging
+import queue
+import threading
+from time import monotonic
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TRACE_QUEUE_MAX_ROWS = int(os.getenv("TRACE_QUEUE_MAX_ROWS", "10000"))
+TRACE_BATCH_SIZE = int(os.getenv("TRACE_BATCH_SIZE", "200"))
+TRACE_FLUSH_INTERVAL_SECONDS = float(os.getenv("TRACE_FLUSH_INTERVAL_SECONDS", "1.0"))
+
+
+def _insert_agent_traces(rows: List[Dict[str, Any]]):
+    """Default sink: one bulk insert into agent_traces via Supabase."""
+    from supabase_connect import get_supabase_manager
+
+    get_supabase_manager().client.table("agent_traces").insert(rows).execute()
+
+
+class AgentTraceWriter:
+    """Bounded queue + daemon thread that bulk-inserts trace rows."""
+
+    def __init__(
+        self,
+        insert_batch: Callable[[List[Dict[str, Any]]], Any] = _insert_agent_traces,
+        max_rows: int = TRACE_QUEUE_MAX_ROWS,
+        batch_size: int = TRACE_BATCH_SIZE,
+        flush_interval: float = TRACE_FLUSH_INTERVAL_SECONDS
+    ):
+        self.insert_batch = insert_batch
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=max_rows)
+        self._lock = threading.Lock()
+        self._closed = False
+
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+
+        self._thread = threading.Thread(target=self._run, name="kogna-trace-writer", daemon=True)
+        self._thread.start()
+
+    # ------------------------------------------------------------------
+    # Producer side
+    # ------------------------------------------------------------------
+
+    def enqueue(self, rows: List[Dict[str, Any]]) -> int:
+        """Queue rows for writing without blocking; returns how many were accepted."""
+        accepted = 0
+        if not self._closed:
+            for row in rows:
+                try:
+                    self._queue.put_nowait(row)
+                    accepted += 1
+                except queue.Full:
+                    break
+
+        dropped = len(rows) - accepted
+        with self._lock:
+            self.enqueued += accepted
+            self.dropped += dropped
+        if dropped:
+            logger.warning(f"Agent trace queue full, dropped {dropped} trace rows")
+        return accepted
+
+    # ------------------------------------------------------------------
+    # Writer thread
+    # ------------------------------------------------------------------
+
+    def _run(self):
+        batch: List[Dict[str, Any]] = []
+        deadline = monotonic() + self.flush_interval
+        stopping = False
+
+        while not stopping:
+            try:
+                row = self._queue.get(timeout=max(deadline - monotonic(), 0.01))
+                if row is None:
+                    stopping = True  # close() sentinel: flush what is left and exit
+                else:
+                    batch.append(row)
+            except queue.Empty:
+                pass
+
+            if batch and (stopping or len(batch) >= self.batch_size or monotonic() >= deadline):
+                self._flush(batch)
+                batch = []
+            if monotonic() >= deadline:
+                deadline = monotonic() + self.flush_interval
+
+    def _flush(self, batch: List[Dict[str, Any]]):
+        try:
+            self.insert_batch(batch)
+            with self._lock:
+                self.written += len(batch)
+                self.batches += 1
+        except Exception as e:
+            if len(batch) > 1:
+                # Rows come from unrelated requests; don't let one bad row sink the rest
+                middle = len(batch) // 2
+                self._flush(batch[:middle])
+                self._flush(batch[middle:])
+                return
+            logger.error(f"Failed to save agent trace: {e}")
+            with self._lock:
+                self.failed += 1
+
+    # ------------------------------------------------------------------
+    # Lifecycle / metrics
+    # ------------------------------------------------------------------
+
+    def close(self, timeout: float = 5.0):
+        """Stop accepting rows, flush the queue and stop the thread."""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            logger.warning("Agent trace queue still full at shutdown; remaining rows are lost")
+            return
+        self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "enqueued": self.enqueued,
+                "written": self.written,
+                "batches": self.batches,
+                "dropped": self.dropped,
+                "failed": self.failed,
+            }
+
+
+_writer: Optional[AgentTraceWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_trace_writer() -> AgentTraceWriter:
+    """Return the process-wide trace writer (started on first use)."""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = AgentTraceWriter()
+    return _writer
+
+
+def get_trace_writer_stats() -> Optional[Dict[str, int]]:
+    """Writer metrics for health/metrics endpoints (None before first use)."""
+    return _writer.stats() if _writer is not None else None
+
+
+def shutdown_trace_writer(timeout: float = 5.0):
+    """Flush pending traces and stop the writer (call on shutdown)."""
+    global _writer
+    with _writer_lock:
+        if _writer is not None:
+            _writer.close(timeout)
+            _writer = None
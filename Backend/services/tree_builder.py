@@ -36,7 +36,6 @@ Example:
 """
 
 import logging
-import time
 from typing import List, Dict, Optional
 import numpy as np
 from sklearn.cluster import AgglomerativeClustering
@@ -48,12 +47,19 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 from Ai_agents.note_generator_agent import DocumentNoteGenerator
 from Ai_agents.super_note_generator_agent import SuperNoteGenerator
+from Ai_agents.rate_limiter import get_rate_limiter
+from Ai_agents.model_registry import get_embeddings_model
+from core.executors import run_blocking
+from services import vector_index
 
 logging.basicConfig(level=logging.INFO)
 
 # Initialize clients
 supabase = get_supabase_manager().client
 
+# Shared with embedding_service: same model + key -> same token bucket
+embedding_rate_limiter = get_rate_limiter("models/embedding-001", os.getenv("GOOGLE_API_KEY"))
+
 
 class HierarchicalTreeBuilder:
     """
@@ -165,10 +171,13 @@ class HierarchicalTreeBuilder:
             else:
                 root_id = current_level_nodes[0]['id']
                 # Mark as root
-                self.supabase.table('super_notes').update({
-                    'is_root': True,
-                    'level': 99
-                }).eq('id', root_id).execute()
+                await run_blocking(
+                    self.supabase.table('super_notes').update({
+                        'is_root': True,
+                        'level': 99
+                    }).eq('id', root_id).execute
+                )
+                vector_index.set_super_note_level(self.user_id, root_id, 99)
             
             print(f"   ✓ Root node created: {root_id}\n")
             
@@ -210,11 +219,13 @@ class HierarchicalTreeBuilder:
         These are Level 0 (leaf nodes).
         """
         
-        response = self.supabase.table('document_notes').select(
-            'id, title, summary, key_facts, entities, '
-            'chunk_group, note_embedding, topics, '
-            'file_path, created_at'
-        ).eq('user_id', self.user_id).execute()
+        response = await run_blocking(
+            self.supabase.table('document_notes').select(
+                'id, title, summary, key_facts, entities, '
+                'chunk_group, note_embedding, topics, '
+                'file_path, created_at'
+            ).eq('user_id', self.user_id).execute
+        )
         
         notes = response.data
         
@@ -286,7 +297,8 @@ class HierarchicalTreeBuilder:
                 # Generate SYNTHESIS super-note
                 print("🧠", end=" ")
                 
-                note_content = self.super_note_generator.generate_super_note(
+                note_content = await run_blocking(
+                    self.super_note_generator.generate_super_note,
                     child_notes=child_notes,
                     level=1,
                     parent_context=parent_context
@@ -339,14 +351,10 @@ Insights:
 Topics: {', '.join(super_note_topics)}
                 """.strip()
                 
-                from langchain_google_genai import GoogleGenerativeAIEmbeddings
+                embeddings_model = get_embeddings_model()
                 
-                embeddings_model = GoogleGenerativeAIEmbeddings(
-                    model="models/embedding-001",
-                    google_api_key=os.getenv("GOOGLE_API_KEY")
-                )
-                
-                embedding = embeddings_model.embed_query(note_text_for_embedding)
+                await embedding_rate_limiter.acquire_async()
+                embedding = await run_blocking(embeddings_model.embed_query, note_text_for_embedding)
                 
                 # Store in database
                 node_id = await self._store_super_note(
@@ -370,7 +378,6 @@ Topics: {', '.join(super_note_topics)}
                 })
                 
                 print(f"✓")
-                time.sleep(0.5)  # Rate limiting
                 
             except Exception as e:
                 print(f"✗ Error: {e}")
@@ -414,7 +421,7 @@ Topics: {', '.join(super_note_topics)}
             linkage='average'
         )
         
-        labels = clustering.fit_predict(embeddings)
+        labels = await run_blocking(clustering.fit_predict, embeddings)
         
         # Group nodes by cluster
         groups = {}
@@ -446,7 +453,8 @@ Topics: {', '.join(super_note_topics)}
                 # Generate SYNTHESIS super-note
                 print("🧠", end=" ")
                 
-                note_content = self.super_note_generator.generate_super_note(
+                note_content = await run_blocking(
+                    self.super_note_generator.generate_super_note,
                     child_notes=child_super_notes,
                     level=level,
                     parent_context=parent_context
@@ -496,14 +504,10 @@ Insights:
 Topics: {', '.join(super_note_topics)}
                 """.strip()
                 
-                from langchain_google_genai import GoogleGenerativeAIEmbeddings
-                
-                embeddings_model = GoogleGenerativeAIEmbeddings(
-                    model="models/embedding-001",
-                    google_api_key=os.getenv("GOOGLE_API_KEY")
-                )
+                embeddings_model = get_embeddings_model()
                 
-                embedding = embeddings_model.embed_query(note_text_for_embedding)
+                await embedding_rate_limiter.acquire_async()
+                embedding = await run_blocking(embeddings_model.embed_query, note_text_for_embedding)
                 
                 # Store
                 node_id = await self._store_super_note(
@@ -527,7 +531,6 @@ Topics: {', '.join(super_note_topics)}
                 })
                 
                 print(f"✓")
-                time.sleep(0.5)
                 
             except Exception as e:
                 print(f"✗ Error: {e}")
@@ -554,7 +557,8 @@ Topics: {', '.join(super_note_topics)}
         # Generate ROOT super-note (executive summary)
         print("🧠", end=" ")
         
-        note_content = self.super_note_generator.generate_super_note(
+        note_content = await run_blocking(
+            self.super_note_generator.generate_super_note,
             child_notes=child_super_notes,
             level=99,  # Special level for root
             parent_context=None
@@ -601,14 +605,10 @@ Key Insights:
 Topics: {', '.join(super_note_topics)}
         """.strip()
         
-        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+        embeddings_model = get_embeddings_model()
         
-        embeddings_model = GoogleGenerativeAIEmbeddings(
-            model="models/embedding-001",
-            google_api_key=os.getenv("GOOGLE_API_KEY")
-        )
-        
-        embedding = embeddings_model.embed_query(note_text_for_embedding)
+        await embedding_rate_limiter.acquire_async()
+        embedding = await run_blocking(embeddings_model.embed_query, note_text_for_embedding)
         
         # Store root node
         root_id = await self._store_super_note(
@@ -643,7 +643,7 @@ Topics: {', '.join(super_note_topics)}
         Store super-note in database
         """
         
-        result = self.supabase.table('super_notes').insert({
+        record = {
             'user_id': self.user_id,
             'level': level,
             'title': title,
@@ -656,9 +656,12 @@ Topics: {', '.join(super_note_topics)}
             'is_root': is_root,
             'needs_regeneration': False,
             'regeneration_priority': 0.0
-        }).execute()
+        }
+        result = await run_blocking(self.supabase.table('super_notes').insert(record).execute)
         
-        return result.data[0]['id']
+        node_id = result.data[0]['id']
+        vector_index.add_super_notes(self.user_id, [{**record, 'id': node_id}])
+        return node_id
     
     async def _fetch_super_notes_by_ids(self, node_ids: List[str]) -> List[Dict]:
         """
@@ -668,9 +671,11 @@ Topics: {', '.join(super_note_topics)}
         if not node_ids:
             return []
         
-        result = self.supabase.table('super_notes').select(
-            'id, title, summary, key_facts, topics'
-        ).in_('id', node_ids).execute()
+        result = await run_blocking(
+            self.supabase.table('super_notes').select(
+                'id, title, summary, key_facts, topics'
+            ).in_('id', node_ids).execute
+        )
         
         return result.data or []
     
@@ -682,9 +687,11 @@ Topics: {', '.join(super_note_topics)}
         # Count nodes at each level
         levels_count = {}
         
-        result = self.supabase.table('super_notes').select(
-            'level'
-        ).eq('user_id', self.user_id).execute()
+        result = await run_blocking(
+            self.supabase.table('super_notes').select(
+                'level'
+            ).eq('user_id', self.user_id).execute
+        )
         
         for node in result.data:
             level = node['level']
@@ -720,6 +727,11 @@ async def build_tree_for_user(user_id: str) -> Dict:
     
     builder = HierarchicalTreeBuilder(user_id)
     result = await builder.build_tree()
+
+    # Super-notes changed: cached parent summaries are stale
+    from services.hierarchical_retriever import invalidate_parent_context_cache
+    invalidate_parent_context_cache(user_id)
+
     return result
 
 
@@ -0,0 +1,380 @@
+# services/vector_index.py
+"""
+In-process vector index for per-user note / super-note search.
+
+Replaces the match_super_notes / match_document_notes RPC round-trips in
+HierarchicalRetriever with a local search over every level at once:
+
+    - flat NumPy (float32, L2-normalized, one matrix product) by default
+    - HNSW per level (if `hnswlib` is installed) once a user has
+      HNSW_MIN_VECTORS vectors
+
+Results use the same schema as the RPCs, including `similarity`
+(cosine similarity, i.e. 1 - cosine distance).
+
+Indexes are loaded lazily from document_notes.note_embedding and
+super_notes.embedding. They are kept up to date in-process:
+    - add_document_notes()  <- embed_and_store_file (after note insert)
+    - add_super_notes()     <- tree_builder (after super-note insert)
+    - remove_from_index()   <- deletes with known ids
+    - invalidate_user_index() <- bulk deletes / tree rebuilds
+Writes from other processes are picked up when the index expires
+(VECTOR_INDEX_TTL_SECONDS).
+
+Enabled with LOCAL_VECTOR_INDEX=true; otherwise retrieval uses the RPCs.
+"""
+
+import os
+import json
+import logging
+import threading
+from collections import OrderedDict
+from time import monotonic
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from supabase_connect import get_supabase_manager
+from core.executors import run_blocking
+
+try:
+    import hnswlib
+    HNSWLIB_AVAILABLE = True
+except ImportError:
+    HNSWLIB_AVAILABLE = False
+
+logging.basicConfig(level=logging.INFO)
+
+LOCAL_VECTOR_INDEX = os.getenv("LOCAL_VECTOR_INDEX", "false").lower() == "true"
+VECTOR_INDEX_TTL_SECONDS = int(os.getenv("VECTOR_INDEX_TTL_SECONDS", "600"))
+VECTOR_INDEX_MAX_USERS = int(os.getenv("VECTOR_INDEX_MAX_USERS", "200"))
+HNSW_MIN_VECTORS = int(os.getenv("HNSW_MIN_VECTORS", "5000"))
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+
+LEAF_LEVEL = 0
+PAGE_SIZE = 1000  # PostgREST default max rows per select
+
+# Columns returned per level (mirrors match_document_notes / match_super_notes)
+LEAF_FIELDS = ['id', 'title', 'summary', 'key_facts', 'topics', 'file_path']
+SUPER_FIELDS = ['id', 'title', 'summary', 'level', 'parent_id',
+                'child_note_ids', 'topics', 'key_facts']
+
+
+def _parse_embedding(embedding) -> Optional[np.ndarray]:
+    """pgvector values arrive as '[...]' strings through PostgREST."""
+    if embedding is None:
+        return None
+    if isinstance(embedding, str):
+        embedding = json.loads(embedding)
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    if vector.ndim != 1 or norm == 0:
+        return None
+    return vector / norm
+
+
+class UserVectorIndex:
+    """
+    Vectors and result metadata for one user's notes (level 0) and
+    super-notes (levels 1, 2, ..., 99).
+    """
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.built_at = monotonic()
+
+        self._rows: List[Dict] = []          # result metadata, by position
+        self._levels: List[int] = []
+        self._vectors: List[np.ndarray] = []
+        self._alive: List[bool] = []
+        self._positions: Dict[str, int] = {}  # id -> position
+        self._level_counts: Dict[int, int] = {}
+
+        self._matrix: Optional[np.ndarray] = None  # flat search cache
+        self._levels_array: Optional[np.ndarray] = None
+        self._hnsw: Dict[int, "hnswlib.Index"] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def expired(self) -> bool:
+        return monotonic() - self.built_at > VECTOR_INDEX_TTL_SECONDS
+
+    # ------------------------------------------------------------------
+    # Updates
+    # ------------------------------------------------------------------
+
+    def add(self, rows: Iterable[Dict], level: Optional[int] = None):
+        """
+        Add notes (level=0) or super-notes (level taken from each row).
+
+        Rows need an `id` and `note_embedding` / `embedding`; rows without an
+        embedding are skipped, like the RPCs' `embedding IS NOT NULL` filter.
+        """
+        with self._lock:
+            for row in rows:
+                row_level = LEAF_LEVEL if level == LEAF_LEVEL else row.get('level')
+                fields = LEAF_FIELDS if row_level == LEAF_LEVEL else SUPER_FIELDS
+                vector = _parse_embedding(
+                    row.get('note_embedding') if row_level == LEAF_LEVEL else row.get('embedding')
+                )
+                if vector is None or row_level is None:
+                    continue
+
+                self._remove_locked(row['id'])
+                position = len(self._rows)
+                self._rows.append({field: row.get(field) for field in fields})
+                self._levels.append(row_level)
+                self._vectors.append(vector)
+                self._alive.append(True)
+                self._positions[row['id']] = position
+                self._level_counts[row_level] = self._level_counts.get(row_level, 0) + 1
+
+                if self._hnsw and row_level not in self._hnsw:
+                    self._hnsw = {}  # New level: rebuild lazily on next search
+                hnsw = self._hnsw.get(row_level)
+                if hnsw is not None:
+                    if hnsw.get_current_count() >= hnsw.get_max_elements():
+                        hnsw.resize_index(max(1024, hnsw.get_max_elements() * 2))
+                    hnsw.add_items(vector[np.newaxis, :], [position])
+
+            self._matrix = None
+
+    def remove(self, ids: Iterable[str]):
+        with self._lock:
+            for row_id in ids:
+                self._remove_locked(row_id)
+
+    def _remove_locked(self, row_id: str):
+        position = self._positions.pop(row_id, None)
+        if position is None:
+            return
+        self._alive[position] = False
+        self._level_counts[self._levels[position]] -= 1
+        hnsw = self._hnsw.get(self._levels[position])
+        if hnsw is not None:
+            hnsw.mark_deleted(position)
+
+    def set_level(self, row_id: str, level: int, **fields):
+        """Move a super-note to another level (e.g. promoted to root)."""
+        with self._lock:
+            position = self._positions.get(row_id)
+            if position is None:
+                return
+            row = {**self._rows[position], **fields, 'level': level,
+                   'embedding': self._vectors[position]}
+        self.add([row])
+
+    # ------------------------------------------------------------------
+    # Search
+    # ------------------------------------------------------------------
+
+    def _use_hnsw(self) -> bool:
+        return HNSWLIB_AVAILABLE and len(self._positions) >= HNSW_MIN_VECTORS
+
+    def _build_hnsw_locked(self):
+        levels = np.array(self._levels)
+        alive = np.array(self._alive)
+        for level in set(self._levels):
+            positions = np.flatnonzero((levels == level) & alive)
+            if len(positions) == 0:
+                continue
+            index = hnswlib.Index(space='ip', dim=len(self._vectors[0]))
+            index.init_index(
+                max_elements=max(1024, len(positions) * 2),
+                ef_construction=HNSW_EF_CONSTRUCTION,
+                M=HNSW_M
+            )
+            index.set_ef(HNSW_EF_SEARCH)
+            index.add_items(np.stack([self._vectors[p] for p in positions]), positions)
+            self._hnsw[level] = index
+
+    def search(self, query_embedding, limits: Dict[int, int]) -> Dict[int, List[Dict]]:
+        """
+        Top-k search across several levels in one call.
+
+        Args:
+            query_embedding: Query vector
+            limits: {level: max results}, e.g. {99: 1, 2: 3, 1: 5, 0: 10}
+
+        Returns:
+            {level: [result rows with 'similarity', best first]}
+        """
+        query = _parse_embedding(query_embedding)
+        results = {level: [] for level in limits}
+        if query is None:
+            return results
+
+        with self._lock:
+            if not self._positions:
+                return results
+
+            if self._use_hnsw():
+                if not self._hnsw:
+                    self._build_hnsw_locked()
+                for level, limit in limits.items():
+                    index = self._hnsw.get(level)
+                    if index is None or limit <= 0:
+                        continue
+                    k = min(limit, self._level_counts.get(level, 0))
+                    if k == 0:
+                        continue
+                    labels, distances = index.knn_query(query, k=k)
+                    results[level] = [
+                        {**self._rows[p], 'similarity': float(1 - d)}
+                        for p, d in zip(labels[0], distances[0])
+                    ]
+                return results
+
+            # Flat: one matrix product scores every level
+            if self._matrix is None:
+                self._matrix = np.stack(self._vectors)
+                self._levels_array = np.array(self._levels)
+            scores = self._matrix @ query
+            alive = np.array(self._alive)
+
+            for level, limit in limits.items():
+                candidates = np.flatnonzero((self._levels_array == level) & alive)
+                if len(candidates) == 0 or limit <= 0:
+                    continue
+                level_scores = scores[candidates]
+                if len(candidates) > limit:
+                    top = np.argpartition(-level_scores, limit - 1)[:limit]
+                else:
+                    top = np.arange(len(candidates))
+                top = top[np.argsort(-level_scores[top], kind='stable')]
+                results[level] = [
+                    {**self._rows[candidates[i]], 'similarity': float(level_scores[i])}
+                    for i in top
+                ]
+            return results
+
+
+# =============================================================================
+# PER-USER INDEX REGISTRY
+# =============================================================================
+
+# Shared by every request thread (each chat runs retrieval on its own event
+# loop), so only threading locks are used here, never asyncio ones.
+_indexes: "OrderedDict[str, UserVectorIndex]" = OrderedDict()
+_indexes_lock = threading.Lock()
+_build_locks: Dict[str, threading.Lock] = {}
+
+
+def _select_all(table: str, columns: str, user_id: str) -> List[Dict]:
+    """Page through a user's rows (blocking - call via run_blocking)."""
+    client = get_supabase_manager().client
+    rows, offset = [], 0
+    while True:
+        result = client.table(table).select(columns).eq(
+            'user_id', user_id
+        ).order('id').range(offset, offset + PAGE_SIZE - 1).execute()
+        page = result.data or []
+        rows.extend(page)
+        if len(page) < PAGE_SIZE:
+            return rows
+        offset += PAGE_SIZE
+
+
+def _load_user_index(user_id: str) -> UserVectorIndex:
+    index = UserVectorIndex(user_id)
+    index.add(
+        _select_all('document_notes', ', '.join(LEAF_FIELDS + ['note_embedding']), user_id),
+        level=LEAF_LEVEL
+    )
+    index.add(_select_all('super_notes', ', '.join(SUPER_FIELDS + ['embedding']), user_id))
+    return index
+
+
+def _cached_index(user_id: str) -> Optional[UserVectorIndex]:
+    """The user's index if loaded and not expired (marks it recently used)."""
+    with _indexes_lock:
+        index = _indexes.get(user_id)
+        if index is None or index.expired():
+            return None
+        _indexes.move_to_end(user_id)
+        return index
+
+
+def _loaded_index(user_id: str) -> Optional[UserVectorIndex]:
+    with _indexes_lock:
+        return _indexes.get(user_id)
+
+
+def _get_or_load_user_index(user_id: str) -> UserVectorIndex:
+    """Blocking: load the index once per user even under concurrent requests."""
+    with _indexes_lock:
+        build_lock = _build_locks.setdefault(user_id, threading.Lock())
+
+    with build_lock:
+        index = _cached_index(user_id)
+        if index is not None:
+            return index
+
+        index = _load_user_index(user_id)
+        with _indexes_lock:
+            _indexes[user_id] = index
+            _indexes.move_to_end(user_id)
+            while len(_indexes) > VECTOR_INDEX_MAX_USERS:
+                evicted_id, _ = _indexes.popitem(last=False)
+                _build_locks.pop(evicted_id, None)
+        logging.info(f"✓ Vector index loaded for user {user_id}: {len(index)} vectors")
+        return index
+
+
+async def get_user_index(user_id: str) -> Optional[UserVectorIndex]:
+    """
+    Return the user's index, loading it on first use or after expiry.
+
+    Returns None when the local index is disabled or could not be loaded
+    (callers fall back to the Supabase RPCs).
+    """
+    if not LOCAL_VECTOR_INDEX:
+        return None
+
+    index = _cached_index(user_id)
+    if index is not None:
+        return index
+
+    try:
+        return await run_blocking(_get_or_load_user_index, user_id)
+    except Exception as e:
+        logging.warning(f"Vector index load failed for user {user_id}: {e}")
+        return None
+
+
+def add_document_notes(user_id: str, rows: List[Dict]):
+    """Add freshly inserted document_notes rows (no-op if index not loaded)."""
+    index = _loaded_index(user_id)
+    if index is not None:
+        index.add(rows, level=LEAF_LEVEL)
+
+
+def add_super_notes(user_id: str, rows: List[Dict]):
+    """Add freshly inserted super_notes rows (no-op if index not loaded)."""
+    index = _loaded_index(user_id)
+    if index is not None:
+        index.add(rows)
+
+
+def set_super_note_level(user_id: str, node_id: str, level: int, **fields):
+    """Reflect a super-note level change (e.g. promoted to root)."""
+    index = _loaded_index(user_id)
+    if index is not None:
+        index.set_level(node_id, level, **fields)
+
+
+def remove_from_index(user_id: str, ids: List[str]):
+    """Drop deleted notes / super-notes by id."""
+    index = _loaded_index(user_id)
+    if index is not None and ids:
+        index.remove(ids)
+
+
+def invalidate_user_index(user_id: str):
+    """Forget a user's index; it is reloaded on the next search."""
+    with _indexes_lock:
+        _indexes.pop(user_id, None)
@@ -0,0 +1,52 @@
+"""
+Unit tests for Ai_agents/model_registry.py
+
+Tests that LLM and embedding clients are built once per process.
+"""
+
+from unittest.mock import patch
+
+
+class TestGetLlm:
+    """Tests for get_llm function."""
+
+    def test_same_settings_share_instance(self):
+        """Should return one client per (model, key, temperature)."""
+        import Ai_agents.model_registry as registry
+
+        with patch.dict(registry._llms, clear=True):
+            first = registry.get_llm("gemini/gemini-2.0-flash", "key-a", temperature=0.1)
+            second = registry.get_llm("gemini/gemini-2.0-flash", "key-a", temperature=0.1)
+            other = registry.get_llm("gemini/gemini-2.0-flash", "key-a", temperature=0.6)
+
+        assert first is second
+        assert other is not first
+
+    def test_http_sessions_pooled(self):
+        """Should install a keep-alive sync client but leave async clients per loop."""
+        import litellm
+        import Ai_agents.model_registry as registry
+
+        with patch.dict(registry._llms, clear=True), \
+             patch.object(litellm, "client_session", None), \
+             patch.object(litellm, "aclient_session", None):
+            registry.get_llm("gemini/gemini-2.0-flash", "key-a")
+
+            assert litellm.client_session is not None
+            assert litellm.aclient_session is None
+
+
+class TestGetEmbeddingsModel:
+    """Tests for get_embeddings_model function."""
+
+    def test_reused_across_calls(self):
+        """Should not construct a new embeddings client per call."""
+        import Ai_agents.model_registry as registry
+
+        with patch.dict(registry._embeddings, clear=True), \
+             patch.object(registry, "GoogleGenerativeAIEmbeddings") as embeddings_cls:
+            first = registry.get_embeddings_model(api_key="key-a")
+            second = registry.get_embeddings_model(api_key="key-a")
+
+        assert first is second
+        embeddings_cls.assert_called_once_with(model="models/embedding-001", google_api_key="key-a")
@@ -0,0 +1,97 @@
+"""
+Unit tests for Ai_agents/rate_limiter.py
+
+Tests the token bucket shared by Gemini embedding and generation calls.
+"""
+
+import time
+
+import pytest
+
+
+class TestTokenBucket:
+    """Tests for TokenBucket class."""
+
+    def test_allows_burst_without_waiting(self):
+        """Should not wait while tokens remain in the bucket."""
+        from Ai_agents.rate_limiter import TokenBucket
+
+        bucket = TokenBucket("test", rate_per_minute=600, capacity=3)
+
+        waits = [bucket.acquire() for _ in range(3)]
+
+        assert waits == [0.0, 0.0, 0.0]
+        assert bucket.throttled == 0
+
+    def test_waits_when_bucket_empty(self):
+        """Should wait roughly one refill interval once the burst is used."""
+        from Ai_agents.rate_limiter import TokenBucket
+
+        bucket = TokenBucket("test", rate_per_minute=600, capacity=1)  # 10 tokens/sec
+        bucket.acquire()
+
+        start = time.monotonic()
+        wait = bucket.acquire()
+        elapsed = time.monotonic() - start
+
+        assert 0.05 < wait <= 0.1
+        assert elapsed >= wait * 0.9
+        assert bucket.throttled == 1
+
+    def test_queued_callers_wait_in_order(self):
+        """Each reservation should wait longer than the one before it."""
+        from Ai_agents.rate_limiter import TokenBucket
+
+        bucket = TokenBucket("test", rate_per_minute=60, capacity=1)  # 1 token/sec
+        bucket._reserve(1)
+
+        first = bucket._reserve(1)
+        second = bucket._reserve(1)
+
+        assert first == pytest.approx(1.0, abs=0.05)
+        assert second == pytest.approx(2.0, abs=0.05)
+
+    @pytest.mark.asyncio
+    async def test_acquire_async(self):
+        """Should wait asynchronously when throttled."""
+        from Ai_agents.rate_limiter import TokenBucket
+
+        bucket = TokenBucket("test", rate_per_minute=1200, capacity=1)  # 20 tokens/sec
+
+        assert await bucket.acquire_async() == 0.0
+        assert await bucket.acquire_async() > 0.0
+        assert bucket.stats()["acquired"] == 2
+
+
+class TestGetRateLimiter:
+    """Tests for get_rate_limiter function."""
+
+    def test_same_model_and_key_share_bucket(self):
+        """Should return one bucket per (model, API key)."""
+        from Ai_agents.rate_limiter import get_rate_limiter
+
+        first = get_rate_limiter("models/embedding-001", "key-a")
+        second = get_rate_limiter("models/embedding-001", "key-a")
+        other_key = get_rate_limiter("models/embedding-001", "key-b")
+
+        assert first is second
+        assert first is not other_key
+
+    def test_api_key_not_exposed_in_name(self):
+        """Should hash the API key in the bucket name."""
+        from Ai_agents.rate_limiter import get_rate_limiter
+
+        limiter = get_rate_limiter("gemini/gemini-2.0-flash", "super-secret-key")
+
+        assert "super-secret-key" not in limiter.name
+
+    def test_embedding_and_generation_quotas(self):
+        """Should use separate default quotas for embedding and generation models."""
+        from Ai_agents.rate_limiter import (
+            default_rate_per_minute,
+            GEMINI_EMBEDDING_RPM,
+            GEMINI_GENERATION_RPM,
+        )
+
+        assert default_rate_per_minute("models/embedding-001") == GEMINI_EMBEDDING_RPM
+        assert default_rate_per_minute("gemini/gemini-2.0-flash") == GEMINI_GENERATION_RPM
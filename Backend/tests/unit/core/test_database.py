@@ -0,0 +1,142 @@
+"""
+Unit tests for core/database.py
+
+Tests the bounded connection pool behind get_db / get_db_context.
+"""
+
+import threading
+import time
+
+import pytest
+from unittest.mock import patch, MagicMock
+from psycopg2 import extensions
+
+
+def _fake_connect(*args, **kwargs):
+    conn = MagicMock()
+    conn.closed = 0
+    conn.get_transaction_status.return_value = extensions.TRANSACTION_STATUS_IDLE
+    return conn
+
+
+class TestConnectionPool:
+    """Tests for ConnectionPool class."""
+
+    def test_reuses_returned_connection(self):
+        """Should hand back the same connection instead of reconnecting."""
+        from core.database import ConnectionPool
+
+        pool = ConnectionPool("postgresql://test", max_size=2)
+        with patch("core.database.psycopg2.connect", side_effect=_fake_connect) as connect:
+            first = pool.getconn()
+            pool.putconn(first)
+            second = pool.getconn()
+
+        assert first is second
+        assert connect.call_count == 1
+
+    def test_statement_timeout_in_connect_options(self):
+        """Should set client encoding and statement_timeout on new connections."""
+        from core.database import ConnectionPool
+
+        pool = ConnectionPool("postgresql://test", statement_timeout_ms=5000)
+        with patch("core.database.psycopg2.connect", side_effect=_fake_connect) as connect:
+            pool.getconn()
+
+        options = connect.call_args.kwargs["options"]
+        assert "client_encoding=UTF8" in options
+        assert "statement_timeout=5000" in options
+
+    def test_bounded_and_times_out(self):
+        """Should never exceed max_size and raise PoolTimeout when exhausted."""
+        from core.database import ConnectionPool, PoolTimeout
+
+        pool = ConnectionPool("postgresql://test", max_size=1, timeout=0.1)
+        with patch("core.database.psycopg2.connect", side_effect=_fake_connect):
+            pool.getconn()
+            with pytest.raises(PoolTimeout):
+                pool.getconn()
+
+        assert pool.stats()["size"] == 1
+        assert pool.stats()["timeouts"] == 1
+
+    def test_waiter_gets_released_connection(self):
+        """A waiting caller should receive a connection as soon as one is returned."""
+        from core.database import ConnectionPool
+
+        pool = ConnectionPool("postgresql://test", max_size=1, timeout=2)
+        with patch("core.database.psycopg2.connect", side_effect=_fake_connect):
+            held = pool.getconn()
+            threading.Timer(0.1, pool.putconn, args=(held,)).start()
+            got = pool.getconn()
+
+        assert got is held
+        assert pool.stats()["max_wait_ms"] >= 50
+
+    def test_broken_connection_replaced(self):
+        """Closed or failing connections should be discarded, not reused."""
+        from core.database import ConnectionPool
+
+        pool = ConnectionPool("postgresql://test", health_check_seconds=0)
+        with patch("core.database.psycopg2.connect", side_effect=_fake_connect):
+            first = pool.getconn()
+            pool.putconn(first)
+            first.cursor.return_value.__enter__.return_value.execute.side_effect = \
+                __import__("psycopg2").OperationalError("server closed the connection")
+            time.sleep(0.01)
+            second = pool.getconn()
+
+        assert second is not first
+        assert pool.stats()["discarded"] == 1
+        assert pool.stats()["size"] == 1
+
+    def test_open_transaction_rolled_back_on_return(self):
+        """Should not leak an open transaction to the next borrower."""
+        from core.database import ConnectionPool
+
+        pool = ConnectionPool("postgresql://test")
+        with patch("core.database.psycopg2.connect", side_effect=_fake_connect):
+            conn = pool.getconn()
+            conn.get_transaction_status.return_value = extensions.TRANSACTION_STATUS_INTRANS
+            pool.putconn(conn)
+
+        conn.rollback.assert_called_once()
+        assert pool.stats()["idle"] == 1
+
+
+    def test_idle_connections_trimmed_to_min_size(self):
+        """Connections left idle after a burst should be closed down to min_size."""
+        from core.database import ConnectionPool
+
+        pool = ConnectionPool("postgresql://test", min_size=1, max_size=3, max_idle_seconds=0.05)
+        with patch("core.database.psycopg2.connect", side_effect=_fake_connect):
+            burst = [pool.getconn() for _ in range(3)]
+            for conn in burst:
+                pool.putconn(conn)
+            time.sleep(0.1)
+            kept = pool.getconn()
+            pool.putconn(kept)
+
+        assert pool.stats()["size"] == 1
+        assert kept is burst[-1]
+        for conn in burst[:-1]:
+            conn.close.assert_called_once()
+
+
+class TestGetDbContext:
+    """Tests for get_db_context using the shared pool."""
+
+    def test_commits_and_returns_connection(self):
+        """Should commit on success and put the connection back in the pool."""
+        import core.database as database
+
+        pool = database.ConnectionPool("postgresql://test")
+        with patch.object(database, "_pool", pool), \
+             patch("core.database.psycopg2.connect", side_effect=_fake_connect):
+            with database.get_db_context() as conn:
+                pass
+
+        conn.commit.assert_called_once()
+        conn.close.assert_not_called()
+        assert pool.stats()["in_use"] == 0
+        assert pool.stats()["idle"] == 1
@@ -0,0 +1,93 @@
+"""
+Unit tests for core/executors.py
+
+Tests the shared thread pool used to keep blocking calls off the event loop
+and the process pool used for CPU-bound work.
+"""
+
+import os
+import asyncio
+import threading
+import time
+
+import pytest
+from unittest.mock import patch
+
+
+class TestRunBlocking:
+    """Tests for run_blocking function."""
+
+    @pytest.mark.asyncio
+    async def test_returns_result(self):
+        """Should return the callable's result, passing args and kwargs."""
+        from core.executors import run_blocking
+
+        result = await run_blocking(lambda a, b=0: a + b, 2, b=3)
+
+        assert result == 5
+
+    @pytest.mark.asyncio
+    async def test_runs_in_worker_thread(self):
+        """Should not execute on the event loop thread."""
+        from core.executors import run_blocking
+
+        thread_name = await run_blocking(lambda: threading.current_thread().name)
+
+        assert thread_name.startswith("kogna-blocking")
+
+    @pytest.mark.asyncio
+    async def test_does_not_block_event_loop(self):
+        """Other coroutines should keep running while a blocking call is in progress."""
+        from core.executors import run_blocking
+
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            for _ in range(5):
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        await asyncio.gather(run_blocking(time.sleep, 0.2), ticker())
+
+        assert ticks == 5
+
+    @pytest.mark.asyncio
+    async def test_propagates_exceptions(self):
+        """Should re-raise exceptions from the callable."""
+        from core.executors import run_blocking
+
+        def fail():
+            raise ValueError("boom")
+
+        with pytest.raises(ValueError, match="boom"):
+            await run_blocking(fail)
+
+
+class TestRunCpuBound:
+    """Tests for run_cpu_bound function."""
+
+    @pytest.mark.asyncio
+    async def test_runs_in_worker_process(self):
+        """Should execute in a separate process and return the result."""
+        from core import executors
+
+        with patch.object(executors, "CPU_POOL_SIZE", 1):
+            try:
+                pid = await executors.run_cpu_bound(os.getpid)
+                total = await executors.run_cpu_bound(sum, [1, 2, 3])
+            finally:
+                executors.shutdown_cpu_executor()
+
+        assert pid != os.getpid()
+        assert total == 6
+
+    @pytest.mark.asyncio
+    async def test_thread_fallback_when_disabled(self):
+        """CPU_POOL_SIZE=0 should run the callable on the blocking thread pool."""
+        from core import executors
+
+        with patch.object(executors, "CPU_POOL_SIZE", 0):
+            thread_name = await executors.run_cpu_bound(lambda: threading.current_thread().name)
+
+        assert thread_name.startswith("kogna-blocking")
@@ -407,3 +407,144 @@ class TestGetUserDataScope:
 
         assert result["scope"] == "own"
         assert result["user_id"] == "user-123"
+
+
+class TestUserContextCache:
+    """Tests for build_user_context / get_cached_user_context."""
+
+    @staticmethod
+    def _conn(row):
+        conn = MagicMock()
+        conn.cursor.return_value.fetchone.return_value = row
+        return conn
+
+    @staticmethod
+    def _row(**overrides):
+        row = {
+            "id": "user-123", "organization_id": "org-123",
+            "first_name": "Test", "second_name": "User", "email": "test@example.com",
+            "role_name": "manager", "role_level": 3,
+            "permissions": [{"resource": "insights", "action": "read", "scope": "team"}],
+            "team_ids": ["team-primary", "team-2"],
+        }
+        row.update(overrides)
+        return row
+
+    def test_single_query_builds_context(self):
+        """Role, permissions and teams should come from one round-trip."""
+        from core.permissions import build_user_context
+
+        conn = self._conn(self._row())
+        ctx = build_user_context({"id": "user-123", "email": "test@example.com"}, conn)
+
+        assert conn.cursor.return_value.execute.call_count == 1
+        assert ctx.role_name == "manager"
+        assert ctx.permissions == ["insights:read:team"]
+        assert ctx.team_ids == ["team-primary", "team-2"]
+
+    def test_no_role_defaults_to_viewer(self):
+        """Users without a role should get viewer level and no permissions."""
+        from core.permissions import build_user_context
+
+        conn = self._conn(self._row(role_name=None, role_level=None, permissions=[]))
+        ctx = build_user_context({"id": "user-123", "email": "test@example.com"}, conn)
+
+        assert (ctx.role_name, ctx.role_level, ctx.permissions) == ("viewer", 1, [])
+
+    def test_cached_until_invalidated(self):
+        """Warm requests should not query; invalidation should force a reload."""
+        from core.permissions import get_cached_user_context, invalidate_user_context
+
+        jwt_user = {"id": "user-cache", "email": "test@example.com"}
+        conn = self._conn(self._row(id="user-cache"))
+        invalidate_user_context("user-cache")
+
+        first = get_cached_user_context(jwt_user, conn)
+        second = get_cached_user_context(jwt_user, conn)
+        invalidate_user_context("user-cache")
+        get_cached_user_context(jwt_user, conn)
+
+        assert first is second
+        assert conn.cursor.return_value.execute.call_count == 2
+
+        invalidate_user_context("user-cache")
+
+    def test_expires_after_ttl(self):
+        """Entries older than USER_CONTEXT_TTL_SECONDS should be rebuilt."""
+        from core.permissions import get_cached_user_context, invalidate_user_context
+
+        jwt_user = {"id": "user-ttl", "email": "test@example.com"}
+        conn = self._conn(self._row(id="user-ttl"))
+        invalidate_user_context("user-ttl")
+
+        with patch("core.permissions.USER_CONTEXT_TTL_SECONDS", 0):
+            get_cached_user_context(jwt_user, conn)
+            get_cached_user_context(jwt_user, conn)
+
+        assert conn.cursor.return_value.execute.call_count == 2
+
+        invalidate_user_context("user-ttl")
+
+    async def test_dependency_borrows_connection_only_for_lookup(self):
+        """get_user_context should not hold a request connection; a miss borrows one briefly."""
+        from contextlib import contextmanager
+        from core.permissions import get_user_context, invalidate_user_context
+
+        jwt_user = {"id": "user-dep", "email": "test@example.com"}
+        conn = self._conn(self._row(id="user-dep"))
+        borrowed = []
+
+        @contextmanager
+        def fake_db_context():
+            borrowed.append("out")
+            yield conn
+            borrowed.append("back")
+
+        invalidate_user_context("user-dep")
+        with patch("core.permissions.get_db_context", fake_db_context):
+            ctx = await get_user_context(user=jwt_user)
+
+        assert ctx.id == "user-dep"
+        assert borrowed == ["out", "back"]
+
+        invalidate_user_context("user-dep")
+
+    async def test_warm_requests_do_not_touch_pool(self):
+        """Cached contexts should be served without borrowing a connection."""
+        from auth.dependencies import get_backend_user_id
+        from core.permissions import invalidate_user_context
+
+        jwt_user = {"id": "user-warm", "email": "test@example.com", "organization_id": "org-123"}
+        conn = self._conn(self._row(id="user-warm"))
+        db_context = MagicMock()
+        db_context.return_value.__enter__.return_value = conn
+
+        invalidate_user_context("user-warm")
+        with patch("core.permissions.get_db_context", db_context):
+            await get_backend_user_id(user=jwt_user)
+            ids = await get_backend_user_id(user=jwt_user)
+
+        assert db_context.call_count == 1
+        assert ids["team_id"] == "team-primary"
+
+        invalidate_user_context("user-warm")
+
+    async def test_missing_user_row_has_no_teams(self):
+        """A JWT user without a users row should get empty teams, not a 404."""
+        from auth.dependencies import get_backend_user_id
+        from core.permissions import invalidate_user_context
+
+        jwt_user = {"id": "user-missing", "email": "test@example.com", "organization_id": "org-123"}
+        db_context = MagicMock()
+        db_context.return_value.__enter__.return_value = self._conn(None)
+
+        invalidate_user_context("user-missing")
+        with patch("core.permissions.get_db_context", db_context):
+            ids = await get_backend_user_id(user=jwt_user)
+
+        assert ids == {
+            "user_id": "user-missing",
+            "organization_id": "org-123",
+            "team_id": None,
+            "team_ids": [],
+        }
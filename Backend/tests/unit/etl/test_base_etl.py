@@ -206,6 +206,264 @@ class TestProcessEmbeddingQueueBatch:
         assert result["failed"] == 2
         assert len(embedding_queue) == 0  # Queue should still be emptied
 
+    @pytest.mark.asyncio
+    async def test_processes_files_concurrently(self):
+        """Should run up to `workers` files at the same time."""
+        import asyncio
+        from services.etl.base_etl import embedding_queue, queue_embedding, process_embedding_queue_batch
+
+        embedding_queue.clear()
+        for i in range(6):
+            queue_embedding("user-1", f"file{i}.json", "google")
+
+        in_flight = 0
+        peak = 0
+
+        async def slow_embed(**kwargs):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return {"status": "success", "chunks_processed": 10}
+
+        mock_module = MagicMock()
+        mock_module.embed_and_store_file = slow_embed
+
+        with patch.dict("sys.modules", {"services.embedding_service": mock_module}):
+            result = await process_embedding_queue_batch(workers=3)
+
+        assert result["processed"] == 6
+        assert result["chunks_processed"] == 60
+        assert peak == 3
+        assert result["workers"] == 3
+        assert result["files_per_sec"] > 0
+        assert result["chunks_per_sec"] > 0
+
+    @pytest.mark.asyncio
+    async def test_interleaves_users_round_robin(self):
+        """Should not let one user's large sync block other users."""
+        from services.etl.base_etl import embedding_queue, queue_embedding, process_embedding_queue_batch
+
+        embedding_queue.clear()
+        for i in range(3):
+            queue_embedding("user-big", f"big{i}.json", "google")
+        queue_embedding("user-small", "small.json", "jira")
+
+        order = []
+
+        async def record_embed(**kwargs):
+            order.append(kwargs["user_id"])
+            return {"status": "success"}
+
+        mock_module = MagicMock()
+        mock_module.embed_and_store_file = record_embed
+
+        with patch.dict("sys.modules", {"services.embedding_service": mock_module}):
+            await process_embedding_queue_batch(workers=1)
+
+        assert order == ["user-big", "user-small", "user-big", "user-big"]
+
+    @pytest.mark.asyncio
+    async def test_times_out_slow_files(self):
+        """Should count files exceeding the per-file timeout as failed."""
+        import asyncio
+        from services.etl.base_etl import embedding_queue, queue_embedding, process_embedding_queue_batch
+
+        embedding_queue.clear()
+        queue_embedding("user-1", "stuck.json", "jira")
+        queue_embedding("user-1", "fast.json", "jira")
+
+        async def maybe_hang(**kwargs):
+            if kwargs["file_path_in_bucket"] == "stuck.json":
+                await asyncio.sleep(5)
+            return {"status": "success"}
+
+        mock_module = MagicMock()
+        mock_module.embed_and_store_file = maybe_hang
+
+        with patch.dict("sys.modules", {"services.embedding_service": mock_module}):
+            result = await process_embedding_queue_batch(workers=2, file_timeout=0.05)
+
+        assert result["processed"] == 1
+        assert result["failed"] == 1
+        assert result["timed_out"] == 1
+
+
+    @pytest.mark.asyncio
+    async def test_uses_handed_over_content(self):
+        """Should pass queued bytes and hash to the embedder, then release them."""
+        from services.etl.base_etl import embedding_queue, queue_embedding, process_embedding_queue_batch
+        from services.etl.content_store import ContentStore
+
+        embedding_queue.clear()
+        handle = ContentStore(memory_budget=100).put(b"bytes")
+        queue_embedding("user-1", "file.json", "google", file_hash="abc", content=handle)
+        queue_embedding("user-1", "evicted.json", "google", file_hash="def")
+
+        calls = {}
+
+        async def record_embed(**kwargs):
+            calls[kwargs["file_path_in_bucket"]] = (kwargs["file_content"], kwargs["file_hash"])
+            return {"status": "success"}
+
+        mock_module = MagicMock()
+        mock_module.embed_and_store_file = record_embed
+
+        with patch.dict("sys.modules", {"services.embedding_service": mock_module}):
+            await process_embedding_queue_batch(workers=1)
+
+        assert calls["file.json"] == (b"bytes", "abc")
+        assert calls["evicted.json"] == (None, "def")  # Falls back to download
+        assert handle.tier == "released"
+
+    @pytest.mark.asyncio
+    async def test_decides_skip_in_bulk(self):
+        """Unchanged files should be skipped from one bulk check, the rest registered in bulk."""
+        from services.etl.base_etl import embedding_queue, queue_embedding, process_embedding_queue_batch
+        from services.etl.content_store import ContentStore
+        from services.file_change_detector import FileChangeDetector
+
+        embedding_queue.clear()
+        store = ContentStore(memory_budget=100)
+        unchanged = store.put(b"same")
+        changed = store.put(b"new")
+        queue_embedding("user-1", "same.txt", "google", file_hash="h-same", content=unchanged)
+        queue_embedding("user-1", "new.txt", "google", file_hash="h-new", content=changed)
+
+        statuses = {
+            "same.txt": {"status": "unchanged", "file_id": "id-same", "previous_hash": "h-same", "action": "skip"},
+            "new.txt": {"status": "new", "file_id": None, "previous_hash": None, "action": "process"},
+        }
+        embedded = {}
+
+        async def record_embed(**kwargs):
+            embedded[kwargs["file_path_in_bucket"]] = kwargs["file_status"]
+            return {"status": "success"}
+
+        mock_module = MagicMock()
+        mock_module.embed_and_store_file = record_embed
+
+        with patch.dict("sys.modules", {"services.embedding_service": mock_module}), \
+             patch.object(FileChangeDetector, "check_files_status", AsyncMock(return_value=statuses)) as check, \
+             patch.object(FileChangeDetector, "register_files", AsyncMock(return_value={"new.txt": "id-new"})) as register:
+            result = await process_embedding_queue_batch(workers=2)
+
+        assert check.await_count == 1
+        assert sorted(path for path, _, _ in check.await_args[0][1]) == ["new.txt", "same.txt"]
+        assert [f["file_path"] for f in register.await_args[0][1]] == ["new.txt"]
+        assert list(embedded) == ["new.txt"]
+        assert embedded["new.txt"]["file_id"] == "id-new"
+        assert embedded["new.txt"]["registered"] is True
+        assert result["skipped"] == 1
+        assert result["processed"] == 1
+        assert unchanged.tier == "released"
+
+    @pytest.mark.asyncio
+    async def test_registered_file_without_content_is_not_left_processing(self):
+        """A bulk-registered file whose bytes are gone keeps its status and is marked failed if unfinished."""
+        from services.etl.base_etl import embedding_queue, queue_embedding, process_embedding_queue_batch
+        from services.etl.content_store import ContentStore
+        from services.file_change_detector import FileChangeDetector
+
+        embedding_queue.clear()
+        handle = ContentStore(memory_budget=100).put(b"new")
+        queue_embedding("user-1", "new.txt", "google", file_hash="h-new", content=handle)
+
+        status = {"status": "new", "file_id": None, "previous_hash": None, "action": "process"}
+        embedded = {}
+
+        async def lose_content_then_fail(**kwargs):
+            embedded[kwargs["file_path_in_bucket"]] = (kwargs["file_content"], kwargs["file_status"])
+            return {"status": "error", "message": "Failed to download file"}
+
+        mock_module = MagicMock()
+        mock_module.embed_and_store_file = lose_content_then_fail
+
+        with patch.dict("sys.modules", {"services.embedding_service": mock_module}), \
+             patch.object(type(handle), "read", return_value=None), \
+             patch.object(FileChangeDetector, "check_files_status", AsyncMock(return_value={"new.txt": status})), \
+             patch.object(FileChangeDetector, "register_files", AsyncMock(return_value={"new.txt": "id-new"})), \
+             patch.object(FileChangeDetector, "update_files_processing_status", AsyncMock()) as mark:
+            result = await process_embedding_queue_batch(workers=1)
+
+        content, file_status = embedded["new.txt"]
+        assert content is None
+        assert file_status["registered"] is True
+        assert result["failed"] == 1
+        mark.assert_awaited_once_with([("id-new", "failed", 0, 0)])
+
+
+    @pytest.mark.asyncio
+    async def test_merges_duplicate_paths(self):
+        """A path queued twice should be embedded once, from the last queued item."""
+        from services.etl.base_etl import embedding_queue, queue_embedding, process_embedding_queue_batch
+        from services.etl.content_store import ContentStore
+
+        embedding_queue.clear()
+        store = ContentStore(memory_budget=100)
+        first = store.put(b"first")
+        second = store.put(b"second")
+        queue_embedding("user-1", "Untitled document", "google", file_hash="h1", content=first)
+        queue_embedding("user-1", "other.txt", "google")
+        queue_embedding("user-1", "Untitled document", "google", file_hash="h2", content=second)
+
+        calls = []
+
+        async def record_embed(**kwargs):
+            calls.append((kwargs["file_path_in_bucket"], kwargs["file_hash"], kwargs["file_content"]))
+            return {"status": "success"}
+
+        mock_module = MagicMock()
+        mock_module.embed_and_store_file = record_embed
+
+        with patch.dict("sys.modules", {"services.embedding_service": mock_module}):
+            result = await process_embedding_queue_batch(workers=2)
+
+        assert sorted(calls, key=lambda c: c[0]) == [
+            ("Untitled document", "h2", b"second"),
+            ("other.txt", None, None),
+        ]
+        assert result["processed"] == 2
+        assert first.tier == "released"
+        assert second.tier == "released"
+
+    @pytest.mark.asyncio
+    async def test_requeued_path_waits_for_in_flight_one(self):
+        """A path queued again mid-batch should not be embedded alongside itself."""
+        import asyncio
+        from services.etl.base_etl import embedding_queue, queue_embedding, process_embedding_queue_batch
+
+        embedding_queue.clear()
+        queue_embedding("user-1", "doc.txt", "google")
+        queue_embedding("user-1", "quick.txt", "google")
+
+        active = 0
+        overlap = []
+
+        async def requeue_once(**kwargs):
+            nonlocal active
+            if kwargs["file_path_in_bucket"] != "doc.txt":
+                return {"status": "success"}
+            if not overlap:
+                # Picked up by the free worker while this one is still running
+                queue_embedding("user-1", "doc.txt", "google")
+            active += 1
+            overlap.append(active)
+            await asyncio.sleep(0.02)
+            active -= 1
+            return {"status": "success"}
+
+        mock_module = MagicMock()
+        mock_module.embed_and_store_file = requeue_once
+
+        with patch.dict("sys.modules", {"services.embedding_service": mock_module}):
+            result = await process_embedding_queue_batch(workers=2)
+
+        assert result["processed"] == 3
+        assert len(overlap) == 2
+        assert max(overlap) == 1
+
 
 class TestSmartUploadAndEmbed:
     """Tests for smart_upload_and_embed function."""
@@ -238,6 +496,51 @@ class TestSmartUploadAndEmbed:
         assert "uploaded and queued" in result["message"]
         assert len(embedding_queue) == 1
 
+        import hashlib
+        item = embedding_queue[0]
+        assert item["file_hash"] == hashlib.sha256(b'{"test": "data"}').hexdigest()
+        assert item["content"].read() == b'{"test": "data"}'
+        item["content"].release()
+
+    @pytest.mark.asyncio
+    async def test_uploads_run_off_the_event_loop(self):
+        """Storage uploads should not block the loop, so concurrent uploads overlap."""
+        import asyncio
+        import threading
+        import time
+        from services.etl.base_etl import embedding_queue, smart_upload_and_embed
+
+        embedding_queue.clear()
+        loop_thread = threading.get_ident()
+        upload_threads = []
+
+        def slow_upload(**kwargs):
+            upload_threads.append(threading.get_ident())
+            time.sleep(0.1)
+
+        with patch("services.etl.base_etl.supabase") as mock_supabase:
+            mock_supabase.storage.from_.return_value.upload.side_effect = slow_upload
+
+            started = time.monotonic()
+            results = await asyncio.gather(*(
+                smart_upload_and_embed(
+                    user_id="user-123",
+                    bucket_name="Kogna",
+                    file_path=f"test/file{i}.json",
+                    content=f"data {i}".encode(),
+                    mime_type="application/json",
+                    skip_unchanged=False
+                )
+                for i in range(4)
+            ))
+            elapsed = time.monotonic() - started
+
+        assert all(r["status"] == "queued" for r in results)
+        assert loop_thread not in upload_threads
+        assert elapsed < 0.3
+        while embedding_queue:
+            embedding_queue.popleft()["content"].release()
+
     @pytest.mark.asyncio
     async def test_upload_failure(self):
         """Should return error status on upload failure."""
@@ -293,6 +596,131 @@ class TestSmartUploadAndEmbed:
         assert item["source_metadata"]["organization_id"] == "org-456"
         assert item["source_metadata"]["team_id"] == "team-789"
 
+    @pytest.mark.asyncio
+    async def test_skips_unchanged_file(self):
+        """Should neither upload nor queue a file whose hash is already ingested."""
+        import hashlib
+        from services.etl.base_etl import embedding_queue
+
+        embedding_queue.clear()
+        content = b'{"test": "data"}'
+
+        with patch("services.etl.base_etl.supabase") as mock_supabase:
+            mock_storage = MagicMock()
+            mock_supabase.storage.from_.return_value = mock_storage
+            lookup = mock_supabase.table.return_value.select.return_value.eq.return_value.eq.return_value
+            lookup.maybe_single.return_value.execute.return_value = MagicMock(
+                data={"file_hash": hashlib.sha256(content).hexdigest()}
+            )
+
+            from services.etl.base_etl import smart_upload_and_embed
+
+            result = await smart_upload_and_embed(
+                user_id="user-123",
+                bucket_name="Kogna",
+                file_path="test/file.json",
+                content=content,
+                mime_type="application/json",
+                source_type="jira"
+            )
+
+        assert result["status"] == "skipped"
+        mock_storage.upload.assert_not_called()
+        assert len(embedding_queue) == 0
+
+    @pytest.mark.asyncio
+    async def test_uses_preloaded_hashes(self):
+        """Should decide from the sync snapshot without per-file lookups."""
+        import hashlib
+        from services.etl import base_etl
+
+        base_etl.embedding_queue.clear()
+        unchanged = b"same"
+
+        with patch("services.etl.base_etl.supabase") as mock_supabase:
+            page = mock_supabase.table.return_value.select.return_value.eq.return_value.order.return_value
+            page.range.return_value.execute.return_value = MagicMock(data=[
+                {"file_path": "a.txt", "file_hash": hashlib.sha256(unchanged).hexdigest()},
+                {"file_path": "b.txt", "file_hash": "old-hash"},
+            ])
+
+            assert await base_etl.preload_ingested_hashes("user-123") == 2
+            mock_supabase.table.reset_mock()
+
+            skipped = await base_etl.smart_upload_and_embed(
+                user_id="user-123", bucket_name="Kogna", file_path="a.txt",
+                content=unchanged, mime_type="text/plain", source_type="upload"
+            )
+            queued = await base_etl.smart_upload_and_embed(
+                user_id="user-123", bucket_name="Kogna", file_path="b.txt",
+                content=b"new", mime_type="text/plain", source_type="upload"
+            )
+
+            mock_supabase.table.assert_not_called()
+
+        assert skipped["status"] == "skipped"
+        assert queued["status"] == "queued"
+        base_etl.embedding_queue[0]["content"].release()
+
+        base_etl.release_ingested_hashes("user-123")
+        assert "user-123" not in base_etl._ingested_hashes
+
+    @pytest.mark.asyncio
+    async def test_snapshot_refcount_never_goes_negative(self):
+        """Extra releases must not let a later sync's snapshot be dropped early."""
+        from services.etl import base_etl
+
+        with patch("services.etl.base_etl.supabase") as mock_supabase:
+            page = mock_supabase.table.return_value.select.return_value.eq.return_value.order.return_value
+            page.range.return_value.execute.return_value = MagicMock(data=[
+                {"file_path": "a.txt", "file_hash": "h"},
+            ])
+
+            base_etl.release_ingested_hashes("user-9")  # Unpaired release
+            await base_etl.preload_ingested_hashes("user-9")
+            await base_etl.preload_ingested_hashes("user-9")
+            base_etl.release_ingested_hashes("user-9")
+
+            assert await base_etl.get_ingested_hash("user-9", "a.txt") == "h"
+
+            base_etl.release_ingested_hashes("user-9")
+            base_etl.release_ingested_hashes("user-9")
+            assert base_etl._ingested_hash_refs.get("user-9") is None
+
+            page.range.return_value.execute.side_effect = Exception("db down")
+            with pytest.raises(Exception):
+                await base_etl.preload_ingested_hashes("user-9")
+            assert base_etl._ingested_hash_refs.get("user-9") is None
+
+
+class TestRunMasterEtlHashSnapshot:
+    """Tests for run_master_etl pairing preload/release of the hash snapshot."""
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("service, preload_error", [
+        ("jira", None),
+        ("unknown", None),
+        ("jira", Exception("db down")),
+    ])
+    async def test_releases_exactly_once_after_preload(self, service, preload_error):
+        """Release should follow a successful preload exactly once, whatever the outcome."""
+        import services.etl_pipelines as pipelines
+
+        preload = AsyncMock(side_effect=preload_error)
+        release = MagicMock()
+
+        with patch.object(pipelines, "get_user_context", AsyncMock(return_value={})), \
+             patch.object(pipelines, "create_sync_job", AsyncMock(return_value="job-1")), \
+             patch.object(pipelines, "complete_sync_job", AsyncMock()), \
+             patch.object(pipelines, "ensure_valid_token", AsyncMock(return_value="token")), \
+             patch.object(pipelines, "run_jira_etl", AsyncMock(return_value=(True, 0, 0))), \
+             patch.object(pipelines, "process_embedding_queue_batch", AsyncMock()), \
+             patch.object(pipelines, "preload_ingested_hashes", preload), \
+             patch.object(pipelines, "release_ingested_hashes", release):
+            await pipelines.run_master_etl("user-1", service)
+
+        assert release.call_count == (0 if preload_error else 1)
+
 
 class TestCreateSyncJob:
     """Tests for create_sync_job function."""
@@ -0,0 +1,40 @@
+"""
+Unit tests for services/etl/content_store.py
+
+Tests the memory / disk budget for content handed from upload to embedding.
+"""
+
+import os
+
+
+class TestContentStore:
+    """Tests for ContentStore class."""
+
+    def test_memory_then_disk_then_not_retained(self, tmp_path):
+        """Should fill the memory budget, then spool, then give up."""
+        from services.etl.content_store import ContentStore
+
+        store = ContentStore(memory_budget=10, spool_budget=10, spool_dir=str(tmp_path), min_free_bytes=0)
+
+        in_memory = store.put(b"x" * 8)
+        on_disk = store.put(b"y" * 8)
+        dropped = store.put(b"z" * 8)
+
+        assert in_memory.tier == "memory"
+        assert on_disk.tier == "disk"
+        assert dropped is None
+        assert on_disk.read() == b"y" * 8
+        assert store.get_stats()["not_retained"] == 1
+
+    def test_release_frees_budget_and_spool_file(self, tmp_path):
+        """Released handles should return their budget and delete spool files."""
+        from services.etl.content_store import ContentStore
+
+        store = ContentStore(memory_budget=0, spool_budget=100, spool_dir=str(tmp_path), min_free_bytes=0)
+        handle = store.put(b"data")
+        handle.release()
+        handle.release()
+
+        assert os.listdir(tmp_path) == []
+        assert store.get_stats()["spool_bytes"] == 0
+        assert handle.read() is None
@@ -0,0 +1,315 @@
+"""
+Unit tests for services/etl/google_drive_etl.py
+
+Tests full vs incremental (Changes API) syncs and the download/extract/
+upload pipeline against a local HTTP stand-in for the Drive API.
+"""
+
+import json
+import time
+import threading
+from types import SimpleNamespace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import pytest
+from unittest.mock import patch, AsyncMock
+
+
+class FakeDrive:
+    """Minimal Drive v3 API: files.list/get, changes.list, startPageToken, about."""
+
+    def __init__(self):
+        self.files = {}          # id -> metadata
+        self.content = {}        # id -> text/bytes (missing = download fails)
+        self.changes = {}        # page token -> (changes, newStartPageToken)
+        self.start_token = "token-1"
+        self.account = "account-1"
+        self.requests = []
+        self.media_delay = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def add_file(self, file_id, text):
+        self.files[file_id] = {
+            "id": file_id,
+            "name": f"{file_id}.txt",
+            "mimeType": "text/plain",
+            "size": str(len(text)),
+            "modifiedTime": "2025-01-01T00:00:00Z",
+        }
+        self.content[file_id] = text
+
+    def handle(self, path, query):
+        self.requests.append(path)
+        if path == "/files":
+            ids = sorted(self.files)
+            start = int(query.get("pageToken", ["0"])[0])
+            body = {"files": [self.files[i] for i in ids[start:start + 2]]}
+            if start + 2 < len(ids):
+                body["nextPageToken"] = str(start + 2)
+            return 200, body
+        if path == "/about":
+            return 200, {"user": {"permissionId": self.account}}
+        if path == "/changes/startPageToken":
+            return 200, {"startPageToken": self.start_token}
+        if path == "/changes":
+            token = query["pageToken"][0]
+            if token not in self.changes:
+                return 404, {"error": {"message": "Invalid pageToken"}}
+            changes, new_token = self.changes[token]
+            return 200, {"changes": changes, "newStartPageToken": new_token}
+        if path.startswith("/files/"):
+            file_id = path.split("/")[2]
+            if file_id not in self.files:
+                return 404, {"error": {"message": "File not found"}}
+            if query.get("alt") == ["media"]:
+                if file_id not in self.content:
+                    return 500, {"error": {"message": "Backend error"}}
+                with self.lock:
+                    self.in_flight += 1
+                    self.max_in_flight = max(self.max_in_flight, self.in_flight)
+                time.sleep(self.media_delay)
+                with self.lock:
+                    self.in_flight -= 1
+                return 200, self.content[file_id]
+            return 200, self.files[file_id]
+        return 404, {}
+
+
+@pytest.fixture
+def fake_drive():
+    drive = FakeDrive()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            status, body = drive.handle(url.path, parse_qs(url.query))
+            if isinstance(body, bytes):
+                payload = body
+            else:
+                payload = body.encode() if isinstance(body, str) else json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "text/plain" if isinstance(body, str) else "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    drive.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield drive
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def etl(fake_drive):
+    """google_drive_etl pointed at the stand-in, with storage/DB calls mocked."""
+    import services.etl.google_drive_etl as module
+
+    metadata = {}
+
+    async def update_metadata(user_id, service, updates):
+        metadata.update(updates)
+        return True
+
+    upload = AsyncMock(return_value={"status": "queued"})
+    with patch.object(module, "GOOGLE_DRIVE_API_BASE", fake_drive.base_url), \
+         patch.object(module, "RATE_LIMIT_DELAY", 0), \
+         patch.object(module, "get_connector_metadata", AsyncMock(side_effect=lambda *a: dict(metadata))), \
+         patch.object(module, "update_connector_metadata", update_metadata), \
+         patch.object(module, "smart_upload_and_embed", upload), \
+         patch.object(module, "update_sync_progress", AsyncMock()), \
+         patch.object(module, "complete_sync_job", AsyncMock()):
+        yield SimpleNamespace(module=module, metadata=metadata, upload=upload)
+
+
+def _uploaded_source_ids(upload):
+    return [c.kwargs["source_id"] for c in upload.await_args_list if c.kwargs["source_id"] != "summary"]
+
+
+class TestIncrementalSync:
+    """Tests for run_google_drive_etl's Changes API mode."""
+
+    async def test_first_sync_is_full_and_stores_token(self, etl, fake_drive):
+        """Without a stored token every file is listed and the start token is saved."""
+        for file_id in ("a", "b", "c"):
+            fake_drive.add_file(file_id, f"text {file_id}")
+
+        success, processed, skipped = await etl.module.run_google_drive_etl("user-1", "token")
+
+        assert success is True
+        assert processed == 3
+        assert sorted(_uploaded_source_ids(etl.upload)) == ["a", "b", "c"]
+        assert etl.metadata[etl.module.DRIVE_PAGE_TOKEN_KEY] == "token-1"
+        assert etl.metadata[etl.module.DRIVE_ACCOUNT_KEY] == "account-1"
+        assert fake_drive.requests.count("/files") == 2  # Paged full listing
+
+    async def test_resync_fetches_only_changed_files(self, etl, fake_drive):
+        """With a stored token only changed files are listed and downloaded."""
+        for file_id in ("a", "b", "c"):
+            fake_drive.add_file(file_id, f"text {file_id}")
+        fake_drive.add_file("folder", "")
+        fake_drive.files["folder"]["mimeType"] = etl.module.DRIVE_FOLDER_MIME
+        fake_drive.changes["token-1"] = ([
+            {"fileId": "b", "removed": False, "file": fake_drive.files["b"]},
+            {"fileId": "c", "removed": True},
+            {"fileId": "folder", "removed": False, "file": fake_drive.files["folder"]},
+        ], "token-2")
+        etl.metadata[etl.module.DRIVE_PAGE_TOKEN_KEY] = "token-1"
+        etl.metadata[etl.module.DRIVE_ACCOUNT_KEY] = "account-1"
+
+        success, processed, _ = await etl.module.run_google_drive_etl("user-1", "token")
+
+        assert success is True
+        assert _uploaded_source_ids(etl.upload) == ["b"]
+        assert "/files" not in fake_drive.requests
+        assert "/files/a" not in fake_drive.requests
+        assert etl.metadata[etl.module.DRIVE_PAGE_TOKEN_KEY] == "token-2"
+
+    async def test_invalid_token_falls_back_to_full_scan(self, etl, fake_drive):
+        """A token the Changes API rejects should trigger a full rescan."""
+        fake_drive.add_file("a", "text a")
+        etl.metadata[etl.module.DRIVE_PAGE_TOKEN_KEY] = "expired"
+
+        success, processed, _ = await etl.module.run_google_drive_etl("user-1", "token")
+
+        assert success is True
+        assert _uploaded_source_ids(etl.upload) == ["a"]
+        assert etl.metadata[etl.module.DRIVE_PAGE_TOKEN_KEY] == "token-1"
+
+    async def test_reconnected_account_gets_full_scan(self, etl, fake_drive):
+        """A token stored for another Google account must not be used."""
+        fake_drive.add_file("a", "text a")
+        fake_drive.changes["token-1"] = ([], "token-2")
+        etl.metadata[etl.module.DRIVE_PAGE_TOKEN_KEY] = "token-1"
+        etl.metadata[etl.module.DRIVE_ACCOUNT_KEY] = "old-account"
+        etl.metadata[etl.module.DRIVE_RETRY_FILES_KEY] = ["old-file"]
+
+        await etl.module.run_google_drive_etl("user-1", "token")
+
+        assert "/changes" not in fake_drive.requests
+        assert _uploaded_source_ids(etl.upload) == ["a"]
+        assert etl.metadata[etl.module.DRIVE_ACCOUNT_KEY] == "account-1"
+        assert etl.metadata[etl.module.DRIVE_PAGE_TOKEN_KEY] == "token-1"
+
+    async def test_failed_files_are_retried_next_sync(self, etl, fake_drive):
+        """Files that failed are re-fetched by the next incremental sync."""
+        fake_drive.add_file("a", "text a")
+        fake_drive.changes["token-1"] = ([], "token-2")
+        etl.upload.return_value = {"status": "error", "message": "storage down"}
+
+        await etl.module.run_google_drive_etl("user-1", "token")
+        assert etl.metadata[etl.module.DRIVE_RETRY_FILES_KEY] == ["a"]
+
+        etl.upload.reset_mock()
+        etl.upload.return_value = {"status": "queued"}
+        await etl.module.run_google_drive_etl("user-1", "token")
+
+        assert _uploaded_source_ids(etl.upload) == ["a"]
+        assert etl.metadata[etl.module.DRIVE_RETRY_FILES_KEY] == []
+
+    async def test_too_many_failures_force_full_scan(self, etl, fake_drive):
+        """Failures beyond the retry limit must not be dropped by advancing the token."""
+        file_ids = [f"f{i:03d}" for i in range(etl.module.DRIVE_MAX_RETRY_FILES + 1)]
+        for file_id in file_ids:
+            fake_drive.add_file(file_id, f"text {file_id}")
+        failed = dict(fake_drive.content)
+        fake_drive.content.clear()  # Every download fails
+        fake_drive.changes["token-1"] = ([], "token-2")
+
+        await etl.module.run_google_drive_etl("user-1", "token")
+
+        assert etl.metadata[etl.module.DRIVE_PAGE_TOKEN_KEY] is None
+        assert etl.metadata[etl.module.DRIVE_RETRY_FILES_KEY] == []
+
+        fake_drive.content.update(failed)
+        await etl.module.run_google_drive_etl("user-1", "token")
+
+        assert sorted(_uploaded_source_ids(etl.upload)) == file_ids
+        assert etl.metadata[etl.module.DRIVE_PAGE_TOKEN_KEY] == "token-1"
+
+
+class TestSyncPipeline:
+    """Tests for run_google_drive_etl's download/extract/upload stages."""
+
+    async def test_downloads_run_concurrently(self, etl, fake_drive):
+        """Several files should be downloading at the same time."""
+        for i in range(6):
+            fake_drive.add_file(f"f{i}", f"text {i}")
+        fake_drive.media_delay = 0.1
+
+        with patch.object(etl.module, "GOOGLE_DRIVE_DOWNLOAD_CONCURRENCY", 3):
+            success, processed, _ = await etl.module.run_google_drive_etl("user-1", "token")
+
+        assert success is True
+        assert processed == 6
+        assert fake_drive.max_in_flight > 1
+
+    async def test_pdf_extraction_runs_in_process_pool(self, etl, fake_drive):
+        """CPU-heavy extraction should be handed to run_cpu_bound."""
+        fake_drive.add_file("doc", "")
+        fake_drive.files["doc"].update({"name": "doc.pdf", "mimeType": "application/pdf"})
+        fake_drive.content["doc"] = b"%PDF-1.4"
+        run_cpu_bound = AsyncMock(return_value="extracted pdf text")
+
+        with patch.object(etl.module, "run_cpu_bound", run_cpu_bound):
+            success, processed, _ = await etl.module.run_google_drive_etl("user-1", "token")
+
+        assert processed == 1
+        run_cpu_bound.assert_awaited_once_with(etl.module.extract_pdf_text_with_ocr, b"%PDF-1.4")
+        uploaded = json.loads(etl.upload.await_args_list[0].kwargs["content"])
+        assert "extracted pdf text" in json.dumps(uploaded)
+
+    async def test_failures_do_not_stall_pipeline(self, etl, fake_drive):
+        """Files failing in any stage are counted and the rest still upload."""
+        for file_id in ("a", "b", "c"):
+            fake_drive.add_file(file_id, f"text {file_id}")
+        del fake_drive.content["b"]  # Download of b fails
+
+        async def upload(**kwargs):
+            if kwargs["source_id"] == "c":
+                return {"status": "error", "message": "storage down"}
+            return {"status": "queued"}
+
+        etl.upload.side_effect = upload
+
+        success, processed, _ = await etl.module.run_google_drive_etl("user-1", "token")
+
+        assert success is True
+        assert processed == 1
+        assert sorted(etl.metadata[etl.module.DRIVE_RETRY_FILES_KEY]) == ["b", "c"]
+
+    async def test_worker_crash_stops_every_stage(self, etl, fake_drive):
+        """An error outside per-file handling fails the sync without leaking waiting workers."""
+        import asyncio
+
+        for file_id in ("a", "b", "c"):
+            fake_drive.add_file(file_id, f"text {file_id}")
+        fake_drive.files["b"]["size"] = "not-a-number"  # Raises before the per-file try
+
+        before = asyncio.all_tasks()
+        success, _, _ = await asyncio.wait_for(
+            etl.module.run_google_drive_etl("user-1", "token"), timeout=10
+        )
+        await asyncio.sleep(0)
+
+        assert success is False
+        assert asyncio.all_tasks() - before == set()
+
+    async def test_failures_update_progress(self, etl, fake_drive):
+        """Files failing in download or extraction count toward progress updates."""
+        for i in range(5):
+            fake_drive.add_file(f"f{i}", f"text {i}")
+        fake_drive.content.clear()  # Every download fails
+
+        await etl.module.run_google_drive_etl("user-1", "token")
+
+        progress = [c.kwargs.get("progress") for c in etl.module.update_sync_progress.await_args_list]
+        assert "5/5 files" in progress
@@ -0,0 +1,97 @@
+"""
+Unit tests for routers/kpis.py export endpoint
+
+Tests that KPI exports stream from server-side cursors.
+"""
+
+import asyncio
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from unittest.mock import MagicMock
+
+
+USER = {"user_id": "user-1", "organization_id": "org-1", "team_ids": []}
+
+
+def _db_with_rows(rows):
+    db = MagicMock()
+    db.cursor.return_value.__iter__.side_effect = lambda: iter(rows)
+    return db
+
+
+def _body(response):
+    async def collect():
+        return "".join([chunk async for chunk in response.body_iterator])
+    return asyncio.run(collect())
+
+
+def _export(db, format, kpi_types="engagement", max_rows=10000):
+    from routers.kpis import export_kpis
+
+    return export_kpis(
+        format=format, kpi_types=kpi_types, date_range_start=None, date_range_end=None,
+        team_id=None, max_rows=max_rows, user=USER, db=db
+    )
+
+
+class TestExportKpis:
+    """Tests for export_kpis streaming."""
+
+    def test_uses_named_cursor_and_cap(self):
+        """Should read through a server-side cursor with the row cap as LIMIT."""
+        db = _db_with_rows([{"date": "2025-01-01", "total_queries": 3}])
+
+        _body(_export(db, "csv", max_rows=50))
+
+        assert db.cursor.call_args.kwargs["name"].startswith("kpi_export_")
+        query, params = db.cursor.return_value.execute.call_args.args
+        assert "LIMIT %s" in query
+        assert params[-1] == 50
+        db.cursor.return_value.close.assert_called_once()
+
+    def test_zero_max_rows_removes_limit(self):
+        """max_rows=0 should export every row."""
+        db = _db_with_rows([])
+
+        _body(_export(db, "csv", max_rows=0))
+
+        query, _ = db.cursor.return_value.execute.call_args.args
+        assert "LIMIT" not in query
+
+    def test_csv_section(self):
+        """Should write a section header, column header and rows."""
+        db = _db_with_rows([{"date": "2025-01-01", "total_queries": 3}])
+
+        body = _body(_export(db, "csv"))
+
+        assert "# USER_ENGAGEMENT" in body
+        assert "date,total_queries" in body
+        assert "2025-01-01,3" in body
+
+    def test_ndjson_one_record_per_line(self):
+        """Should emit one JSON object per row tagged with its KPI type."""
+        db = _db_with_rows([
+            {"date": datetime(2025, 1, 1), "avg_session_duration": Decimal("1.5")},
+            {"date": datetime(2025, 1, 2), "avg_session_duration": None},
+        ])
+
+        lines = _body(_export(db, "ndjson")).splitlines()
+
+        assert len(lines) == 2
+        first = json.loads(lines[0])
+        assert first["kpi_type"] == "user_engagement"
+        assert first["record"] == {"date": "2025-01-01T00:00:00", "avg_session_duration": 1.5}
+
+    def test_json_document_with_counts(self):
+        """Should stream a single JSON document with record counts in the metadata."""
+        db = _db_with_rows([{"total_queries": 1}, {"total_queries": 2}])
+
+        payload = json.loads(_body(_export(db, "json", kpi_types="agent,engagement")))
+
+        assert payload["success"] is True
+        assert payload["data"]["user_engagement"] == [{"total_queries": 1}, {"total_queries": 2}]
+        assert payload["export_metadata"]["record_counts"] == {
+            "agent_performance": 2, "user_engagement": 2
+        }
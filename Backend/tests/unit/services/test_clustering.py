@@ -0,0 +1,100 @@
+"""
+Unit tests for services/clustering.py
+
+Tests clustering backends and cluster_and_split_chunks grouping.
+"""
+
+import numpy as np
+import pytest
+
+
+def _topic_embeddings(n_chunks, n_topics=3, dim=32, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_topics, dim)) * 5
+    assignments = np.arange(n_chunks) % n_topics
+    return (centers[assignments] + rng.normal(size=(n_chunks, dim))).tolist()
+
+
+class TestNormalizeEmbeddings:
+    """Tests for normalize_embeddings function."""
+
+    def test_float32_unit_rows(self):
+        """Should return float32 rows with unit L2 norm."""
+        from services.clustering import normalize_embeddings
+
+        result = normalize_embeddings([[3.0, 4.0], [0.0, 2.0]])
+
+        assert result.dtype == np.float32
+        assert np.allclose(np.linalg.norm(result, axis=1), 1.0)
+
+    def test_zero_vector_left_unchanged(self):
+        """Should not divide by zero for empty embeddings."""
+        from services.clustering import normalize_embeddings
+
+        result = normalize_embeddings([[0.0, 0.0]])
+
+        assert np.array_equal(result, [[0.0, 0.0]])
+
+
+class TestGetClusteringBackend:
+    """Tests for get_clustering_backend function."""
+
+    def test_auto_uses_fast_path_above_threshold(self):
+        """Should switch to minibatch at CLUSTERING_FAST_PATH_THRESHOLD chunks."""
+        from services.clustering import get_clustering_backend, CLUSTERING_FAST_PATH_THRESHOLD
+
+        assert get_clustering_backend(CLUSTERING_FAST_PATH_THRESHOLD - 1, "auto").name == "exact"
+        assert get_clustering_backend(CLUSTERING_FAST_PATH_THRESHOLD, "auto").name == "minibatch"
+
+    def test_explicit_backend(self):
+        """Should honor an explicit backend name."""
+        from services.clustering import get_clustering_backend
+
+        assert get_clustering_backend(10, "minibatch").name == "minibatch"
+
+    def test_unknown_backend_raises(self):
+        """Should reject unknown backend names."""
+        from services.clustering import get_clustering_backend
+
+        with pytest.raises(ValueError):
+            get_clustering_backend(10, "dbscan")
+
+
+class TestClusterAndSplitChunks:
+    """Tests for cluster_and_split_chunks function."""
+
+    def test_few_chunks_single_group(self):
+        """Should return one group when below min_chunks_per_note."""
+        from services.clustering import cluster_and_split_chunks
+
+        groups = cluster_and_split_chunks(["a", "b"], [[1.0, 0.0], [0.0, 1.0]])
+
+        assert len(groups) == 1
+        assert groups[0]['chunk_ids'] == [0, 1]
+
+    @pytest.mark.parametrize("backend", ["exact", "minibatch"])
+    def test_deterministic(self, backend):
+        """Same input should produce identical groups."""
+        from services.clustering import cluster_and_split_chunks
+
+        chunks = [f"chunk {i}" for i in range(90)]
+        embeddings = _topic_embeddings(90)
+
+        first = cluster_and_split_chunks(chunks, embeddings, backend=backend)
+        second = cluster_and_split_chunks(chunks, embeddings, backend=backend)
+
+        assert [g['chunk_ids'] for g in first] == [g['chunk_ids'] for g in second]
+
+    @pytest.mark.parametrize("backend", ["exact", "minibatch"])
+    def test_groups_follow_topics(self, backend):
+        """Chunks from different synthetic topics should not share a group."""
+        from services.clustering import cluster_and_split_chunks
+
+        chunks = [f"chunk {i}" for i in range(60)]
+        embeddings = _topic_embeddings(60, n_topics=3)
+
+        groups = cluster_and_split_chunks(chunks, embeddings, backend=backend)
+
+        for group in groups:
+            assert len({chunk_id % 3 for chunk_id in group['chunk_ids']}) == 1
+            assert group['chunks'] == [chunks[i] for i in group['chunk_ids']]
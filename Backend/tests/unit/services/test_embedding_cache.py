@@ -0,0 +1,113 @@
+"""
+Unit tests for services/embedding_cache.py
+
+Tests the content-addressed chunk embedding cache.
+"""
+
+import pytest
+from unittest.mock import MagicMock, patch
+
+
+MODEL = "models/embedding-001"
+
+
+class TestEmbeddingCache:
+    """Tests for EmbeddingCache class (memory tier)."""
+
+    @pytest.mark.asyncio
+    async def test_hits_and_misses(self):
+        """Should return only cached hashes and count hits/misses."""
+        from services.embedding_cache import EmbeddingCache
+
+        cache = EmbeddingCache(persist=False)
+        await cache.put_many(MODEL, {"a": [0.1, 0.2], "b": [0.3, 0.4]})
+
+        found = await cache.get_many(MODEL, ["a", "b", "c"])
+
+        assert set(found) == {"a", "b"}
+        assert found["a"] == pytest.approx([0.1, 0.2])
+        assert cache.stats()["memory_hits"] == 2
+        assert cache.stats()["misses"] == 1
+
+    @pytest.mark.asyncio
+    async def test_deduplicates_hashes(self):
+        """Repeated chunks in one file should count as a single lookup."""
+        from services.embedding_cache import EmbeddingCache
+
+        cache = EmbeddingCache(persist=False)
+
+        found = await cache.get_many(MODEL, ["x", "x", "x"])
+
+        assert found == {}
+        assert cache.stats()["misses"] == 1
+
+    @pytest.mark.asyncio
+    async def test_keyed_by_model(self):
+        """Embeddings from one model should not be served for another."""
+        from services.embedding_cache import EmbeddingCache
+
+        cache = EmbeddingCache(persist=False)
+        await cache.put_many(MODEL, {"a": [1.0]})
+
+        assert await cache.get_many("models/text-embedding-004", ["a"]) == {}
+
+    @pytest.mark.asyncio
+    async def test_evicts_least_recently_used(self):
+        """Should drop the least recently used entry when full."""
+        from services.embedding_cache import EmbeddingCache
+
+        cache = EmbeddingCache(max_entries=2, persist=False)
+        await cache.put_many(MODEL, {"a": [1.0], "b": [2.0]})
+        await cache.get_many(MODEL, ["a"])  # "b" is now least recently used
+        await cache.put_many(MODEL, {"c": [3.0]})
+
+        found = await cache.get_many(MODEL, ["a", "b", "c"])
+
+        assert set(found) == {"a", "c"}
+        assert cache.stats()["evictions"] == 1
+
+    @pytest.mark.asyncio
+    async def test_expires_entries(self):
+        """Should treat entries older than the TTL as misses."""
+        from services.embedding_cache import EmbeddingCache
+
+        cache = EmbeddingCache(ttl_days=0, persist=False)
+        await cache.put_many(MODEL, {"a": [1.0]})
+
+        assert await cache.get_many(MODEL, ["a"]) == {}
+
+    @pytest.mark.asyncio
+    async def test_disables_persistence_when_table_missing(self):
+        """Should fall back to memory-only if the cache table does not exist."""
+        from postgrest.exceptions import APIError
+        from services.embedding_cache import EmbeddingCache
+
+        client = MagicMock()
+        client.table.side_effect = APIError({"code": "PGRST205", "message": "table not found"})
+        cache = EmbeddingCache(persist=True, client=client)
+
+        found = await cache.get_many(MODEL, ["a"])
+        await cache.put_many(MODEL, {"a": [1.0]})
+
+        assert found == {}
+        assert cache.persist is False
+        assert "a" in await cache.get_many(MODEL, ["a"])
+
+    @pytest.mark.asyncio
+    async def test_transient_error_backs_off_and_retries(self):
+        """Other errors should count as misses and retry after the backoff window."""
+        import services.embedding_cache as ec
+
+        client = MagicMock()
+        client.table.side_effect = Exception("connection reset")
+        cache = ec.EmbeddingCache(persist=True, client=client)
+
+        assert await cache.get_many(MODEL, ["a"]) == {}
+        await cache.get_many(MODEL, ["b"])  # Within the backoff window
+
+        assert cache.persist is True
+        assert client.table.call_count == 1
+
+        with patch.object(ec, "monotonic", return_value=cache._persist_retry_at + 1):
+            await cache.get_many(MODEL, ["c"])
+        assert client.table.call_count == 2
@@ -0,0 +1,215 @@
+"""
+Unit tests for services/embedding_service.py
+
+Tests note generation fan-out in embed_and_store_file.
+"""
+
+import threading
+import time
+
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
+
+
+def _make_detector():
+    from services.file_change_detector import FileChangeDetector
+
+    detector = MagicMock()
+    detector.compute_file_hash.return_value = "filehash"
+    detector.compute_chunk_hash.side_effect = FileChangeDetector.compute_chunk_hash
+    detector.check_file_status = AsyncMock(return_value={
+        "status": "new", "file_id": None, "previous_hash": None, "action": "process"
+    })
+    detector.register_file = AsyncMock(return_value="file-1")
+    detector.update_file_processing_status = AsyncMock()
+    return detector
+
+
+def _make_cache():
+    cache = MagicMock()
+    cache.get_many = AsyncMock(return_value={})
+    cache.put_many = AsyncMock()
+    return cache
+
+
+class TestNoteGeneration:
+    """Tests for STEP 7 of embed_and_store_file."""
+
+    @pytest.mark.asyncio
+    async def test_generates_notes_concurrently_and_bulk_inserts(self):
+        """Groups should be summarized in parallel, embedded once and inserted once."""
+        import services.embedding_service as svc
+
+        groups = [
+            {"chunks": [f"chunk {i}"], "chunk_ids": [i], "topic_cluster": i,
+             "sub_group": 0, "chunk_count": 1}
+            for i in range(4)
+        ]
+
+        active = 0
+        peak = 0
+        lock = threading.Lock()
+
+        def generate_note(document_text, file_path):
+            nonlocal active, peak
+            with lock:
+                active += 1
+                peak = max(peak, active)
+            time.sleep(0.1)
+            with lock:
+                active -= 1
+            return {"title": document_text, "summary": "s", "key_facts": [],
+                    "action_items": [], "entities": {}}
+
+        note_generator = MagicMock()
+        note_generator.generate_note.side_effect = generate_note
+
+        embeddings_model = MagicMock()
+        embeddings_model.embed_documents.side_effect = lambda texts: [[0.1] for _ in texts]
+
+        supabase = MagicMock()
+        supabase.table.return_value.insert.return_value.execute.return_value = MagicMock(
+            data=[{"id": f"note-{i}"} for i in range(4)]
+        )
+
+        with patch.object(svc, "supabase", supabase), \
+             patch.object(svc, "embeddings_model", embeddings_model), \
+             patch.object(svc, "note_generator", note_generator), \
+             patch.object(svc, "FileChangeDetector", return_value=_make_detector()), \
+             patch.object(svc, "get_embedding_cache", return_value=_make_cache()), \
+             patch.object(svc, "cluster_and_split_chunks", return_value=groups), \
+             patch.object(svc, "NOTE_GENERATION_CONCURRENCY", 4), \
+             patch("services.tree_builder.build_tree_for_user", AsyncMock(
+                 return_value={"levels": 1, "nodes_created": 1})):
+            result = await svc.embed_and_store_file(
+                user_id="user-1",
+                file_path_in_bucket="user-1/doc.txt",
+                file_content="\n\n".join(f"chunk {i}" * 200 for i in range(4)).encode()
+            )
+
+        assert result["status"] == "success"
+        assert result["notes_generated"] == 4
+        assert peak > 1
+
+        # 1 call for chunks + 1 batched call for the 4 notes
+        assert embeddings_model.embed_documents.call_count == 2
+        assert len(embeddings_model.embed_documents.call_args_list[-1].args[0]) == 4
+
+        note_inserts = [
+            call.args[0] for call in supabase.table.return_value.insert.call_args_list
+            if isinstance(call.args[0], list) and call.args[0] and "summary" in call.args[0][0]
+        ]
+        assert len(note_inserts) == 1
+        assert len(note_inserts[0]) == 4
+
+    @pytest.mark.asyncio
+    async def test_failed_group_does_not_block_others(self):
+        """A failed LLM call should skip that note and keep the rest."""
+        import services.embedding_service as svc
+
+        groups = [
+            {"chunks": [f"chunk {i}"], "chunk_ids": [i], "topic_cluster": i,
+             "sub_group": 0, "chunk_count": 1}
+            for i in range(3)
+        ]
+
+        def generate_note(document_text, file_path):
+            if "topic1" in file_path:
+                raise ValueError("LLM error")
+            return {"title": "t", "summary": "s", "key_facts": [],
+                    "action_items": [], "entities": {}}
+
+        note_generator = MagicMock()
+        note_generator.generate_note.side_effect = generate_note
+
+        embeddings_model = MagicMock()
+        embeddings_model.embed_documents.side_effect = lambda texts: [[0.1] for _ in texts]
+
+        supabase = MagicMock()
+        supabase.table.return_value.insert.return_value.execute.return_value = MagicMock(
+            data=[{"id": "note-a"}, {"id": "note-b"}]
+        )
+
+        with patch.object(svc, "supabase", supabase), \
+             patch.object(svc, "embeddings_model", embeddings_model), \
+             patch.object(svc, "note_generator", note_generator), \
+             patch.object(svc, "FileChangeDetector", return_value=_make_detector()), \
+             patch.object(svc, "get_embedding_cache", return_value=_make_cache()), \
+             patch.object(svc, "cluster_and_split_chunks", return_value=groups), \
+             patch("services.tree_builder.build_tree_for_user", AsyncMock(
+                 return_value={"levels": 1, "nodes_created": 1})):
+            result = await svc.embed_and_store_file(
+                user_id="user-1",
+                file_path_in_bucket="user-1/doc.txt",
+                file_content="\n\n".join(f"chunk {i}" * 200 for i in range(3)).encode()
+            )
+
+        assert result["status"] == "success"
+        assert result["notes_generated"] == 2
+
+
+class TestBulkRegisteredFallback:
+    """Tests for embed_and_store_file with a bulk-registered file_status."""
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("queued_hash, re_registered", [("filehash", False), ("stale", True)])
+    async def test_download_keeps_registered_status(self, queued_hash, re_registered):
+        """Downloaded content should be processed, not skipped against its own registration."""
+        import services.embedding_service as svc
+
+        detector = _make_detector()
+        groups = [{"chunks": ["chunk"], "chunk_ids": [0], "topic_cluster": 0,
+                   "sub_group": 0, "chunk_count": 1}]
+        note_generator = MagicMock()
+        note_generator.generate_note.return_value = {
+            "title": "t", "summary": "s", "key_facts": [], "action_items": [], "entities": {}
+        }
+        embeddings_model = MagicMock()
+        embeddings_model.embed_documents.side_effect = lambda texts: [[0.1] for _ in texts]
+        supabase = MagicMock()
+        supabase.storage.from_.return_value.download.return_value = b"chunk " * 200
+        supabase.table.return_value.insert.return_value.execute.return_value = MagicMock(
+            data=[{"id": "note-1"}]
+        )
+        file_status = {"status": "new", "file_id": "file-bulk", "previous_hash": None,
+                       "action": "process", "registered": True}
+
+        with patch.object(svc, "supabase", supabase), \
+             patch.object(svc, "embeddings_model", embeddings_model), \
+             patch.object(svc, "note_generator", note_generator), \
+             patch.object(svc, "FileChangeDetector", return_value=detector), \
+             patch.object(svc, "get_embedding_cache", return_value=_make_cache()), \
+             patch.object(svc, "cluster_and_split_chunks", return_value=groups), \
+             patch("services.tree_builder.build_tree_for_user", AsyncMock(
+                 return_value={"levels": 1, "nodes_created": 1})):
+            result = await svc.embed_and_store_file(
+                user_id="user-1",
+                file_path_in_bucket="user-1/doc.txt",
+                file_hash=queued_hash,
+                file_status=file_status
+            )
+
+        assert result["status"] == "success"
+        detector.check_file_status.assert_not_called()
+        assert detector.register_file.await_count == (1 if re_registered else 0)
+
+
+class TestIncrementalUpdate:
+    """Tests for _apply_incremental_update."""
+
+    @pytest.mark.asyncio
+    async def test_unreadable_notes_fall_back_to_rebuild(self):
+        """If stored notes can't be read, nothing should be deleted or relinked."""
+        from services.embedding_service import _apply_incremental_update
+
+        detector = MagicMock()
+        detector.get_file_chunks = AsyncMock(return_value=[{"id": "c1", "chunk_hash": "h1"}])
+        detector.get_file_notes = AsyncMock(return_value=None)
+        detector.delete_rows_by_ids = AsyncMock()
+        detector.relink_rows_to_file_hash = AsyncMock()
+
+        result = await _apply_incremental_update(detector, "user-1", "old", "new", ["h1"])
+
+        assert result is None
+        detector.delete_rows_by_ids.assert_not_called()
+        detector.relink_rows_to_file_hash.assert_not_called()
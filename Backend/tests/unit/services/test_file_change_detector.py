@@ -0,0 +1,185 @@
+"""
+Unit tests for services/file_change_detector.py
+
+Tests the chunk-level diff used for incremental updates of modified files
+and the bulk registry checks/updates used by the embedding queue.
+"""
+
+
+class TestDiffChunks:
+    """Tests for FileChangeDetector.diff_chunks."""
+
+    def test_unchanged_chunks_are_kept(self):
+        """Chunks present in both versions should be reused, not re-inserted."""
+        from services.file_change_detector import FileChangeDetector
+
+        old = [{"id": 1, "chunk_hash": "a"}, {"id": 2, "chunk_hash": "b"}]
+
+        diff = FileChangeDetector.diff_chunks(old, ["a", "b"])
+
+        assert sorted(diff["kept_ids"]) == [1, 2]
+        assert diff["removed_ids"] == []
+        assert diff["added_positions"] == []
+
+    def test_edit_replaces_only_changed_chunk(self):
+        """Editing one chunk should remove one row and add one position."""
+        from services.file_change_detector import FileChangeDetector
+
+        old = [
+            {"id": 1, "chunk_hash": "a"},
+            {"id": 2, "chunk_hash": "b"},
+            {"id": 3, "chunk_hash": "c"},
+        ]
+
+        diff = FileChangeDetector.diff_chunks(old, ["a", "B", "c", "d"])
+
+        assert sorted(diff["kept_ids"]) == [1, 3]
+        assert diff["removed_ids"] == [2]
+        assert diff["added_positions"] == [1, 3]
+
+    def test_duplicate_chunks_matched_one_to_one(self):
+        """A repeated chunk should reuse at most as many rows as were stored."""
+        from services.file_change_detector import FileChangeDetector
+
+        old = [{"id": 1, "chunk_hash": "a"}]
+
+        diff = FileChangeDetector.diff_chunks(old, ["a", "a"])
+
+        assert diff["kept_ids"] == [1]
+        assert diff["added_positions"] == [1]
+
+    def test_rows_without_hash_are_removed(self):
+        """Legacy rows with no chunk_hash can't be matched and should be removed."""
+        from services.file_change_detector import FileChangeDetector
+
+        old = [{"id": 1, "chunk_hash": None}]
+
+        diff = FileChangeDetector.diff_chunks(old, ["a"])
+
+        assert diff["removed_ids"] == [1]
+        assert diff["added_positions"] == [0]
+
+
+class TestSplitNotesByValidity:
+    """Tests for FileChangeDetector.split_notes_by_validity."""
+
+    def test_note_kept_when_all_sources_survive(self):
+        """Notes should only be regenerated when one of their chunks changed."""
+        from services.file_change_detector import FileChangeDetector
+
+        notes = [
+            {"id": "n1", "source_chunk_hashes": ["a", "b"]},
+            {"id": "n2", "source_chunk_hashes": ["c", "d"]},
+        ]
+
+        kept, stale = FileChangeDetector.split_notes_by_validity(notes, ["a", "b", "c", "x"])
+
+        assert [n["id"] for n in kept] == ["n1"]
+        assert [n["id"] for n in stale] == ["n2"]
+
+    def test_legacy_notes_are_stale(self):
+        """Notes without source_chunk_hashes should always be regenerated."""
+        from services.file_change_detector import FileChangeDetector
+
+        notes = [{"id": "n1", "source_chunk_hashes": None}]
+
+        kept, stale = FileChangeDetector.split_notes_by_validity(notes, ["a"])
+
+        assert kept == []
+        assert len(stale) == 1
+
+
+class TestGetFileNotes:
+    """Tests for FileChangeDetector.get_file_notes."""
+
+    async def test_reads_every_page(self):
+        """Notes past the first PostgREST page should be returned too."""
+        from unittest.mock import patch, MagicMock
+        from services.file_change_detector import FileChangeDetector, PAGE_SIZE
+
+        with patch("services.file_change_detector.supabase") as mock_supabase:
+            query = mock_supabase.table.return_value.select.return_value.eq.return_value.eq.return_value.order.return_value.range
+            query.return_value.execute.side_effect = [
+                MagicMock(data=[{"id": f"n{i}", "source_chunk_hashes": []} for i in range(PAGE_SIZE)]),
+                MagicMock(data=[{"id": "last", "source_chunk_hashes": []}]),
+            ]
+
+            notes = await FileChangeDetector().get_file_notes("user-1", "hash-old")
+
+        assert len(notes) == PAGE_SIZE + 1
+        assert query.call_args_list[1][0] == (PAGE_SIZE, 2 * PAGE_SIZE - 1)
+
+    async def test_lookup_failure_returns_none(self):
+        """A failed lookup should not look like a file without notes."""
+        from unittest.mock import patch
+        from services.file_change_detector import FileChangeDetector
+
+        with patch("services.file_change_detector.supabase") as mock_supabase:
+            mock_supabase.table.side_effect = Exception("timeout")
+
+            assert await FileChangeDetector().get_file_notes("user-1", "hash-old") is None
+
+
+class TestCheckFilesStatus:
+    """Tests for FileChangeDetector.check_files_status."""
+
+    async def test_classifies_files_with_one_query(self):
+        """New, unchanged and modified files should be decided from one in_() select."""
+        from unittest.mock import patch, MagicMock
+        from services.file_change_detector import FileChangeDetector
+
+        with patch("services.file_change_detector.supabase") as mock_supabase:
+            query = mock_supabase.table.return_value.select.return_value.eq.return_value.in_
+            query.return_value.execute.return_value = MagicMock(data=[
+                {"id": "id-a", "file_path": "a.txt", "file_hash": "hash-a"},
+                {"id": "id-b", "file_path": "b.txt", "file_hash": "old-b"},
+            ])
+
+            statuses = await FileChangeDetector().check_files_status("user-1", [
+                ("a.txt", "hash-a", 10),
+                ("b.txt", "new-b", 10),
+                ("c.txt", "hash-c", 10),
+            ])
+
+        assert query.call_count == 1
+        assert query.call_args[0] == ("file_path", ["a.txt", "b.txt", "c.txt"])
+        assert statuses["a.txt"]["action"] == "skip"
+        assert statuses["b.txt"] == {
+            "status": "modified", "file_id": "id-b", "previous_hash": "old-b", "action": "update"
+        }
+        assert statuses["c.txt"]["status"] == "new"
+
+    async def test_lookup_failure_defaults_to_process(self):
+        """Files whose lookup failed should be processed, not skipped."""
+        from unittest.mock import patch
+        from services.file_change_detector import FileChangeDetector
+
+        with patch("services.file_change_detector.supabase") as mock_supabase:
+            mock_supabase.table.side_effect = Exception("timeout")
+
+            statuses = await FileChangeDetector().check_files_status("user-1", [("a.txt", "h", 1)])
+
+        assert statuses["a.txt"]["status"] == "error"
+        assert statuses["a.txt"]["action"] == "process"
+
+
+class TestUpdateFilesProcessingStatus:
+    """Tests for FileChangeDetector.update_files_processing_status."""
+
+    async def test_one_update_per_distinct_status(self):
+        """Files sharing status and counts should be updated together."""
+        from unittest.mock import patch
+        from services.file_change_detector import FileChangeDetector
+
+        with patch("services.file_change_detector.supabase") as mock_supabase:
+            await FileChangeDetector().update_files_processing_status([
+                ("id-1", "failed", 0, 0),
+                ("id-2", "failed", 0, 0),
+                ("id-3", "completed", 5, 1),
+            ])
+
+        update = mock_supabase.table.return_value.update
+        assert update.call_count == 2
+        in_calls = [c[0] for c in update.return_value.in_.call_args_list]
+        assert ("id", ["id-1", "id-2"]) in in_calls
+        assert ("id", ["id-3"]) in in_calls
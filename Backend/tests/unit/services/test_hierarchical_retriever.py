@@ -0,0 +1,166 @@
+"""
+Unit tests for services/hierarchical_retriever.py
+
+Tests concurrent level searches over the match_* RPCs.
+"""
+
+import time
+
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
+
+
+def _rpc_client(delays):
+    """Supabase mock whose RPCs sleep per level, then return one row."""
+    client = MagicMock()
+
+    def rpc(name, params):
+        level = params.get('p_level', 0)
+
+        def execute():
+            time.sleep(delays.get(level, 0))
+            return MagicMock(data=[{'id': f'{name}-{level}', 'similarity': 0.9}])
+
+        call = MagicMock()
+        call.execute = execute
+        return call
+
+    client.rpc.side_effect = rpc
+    return client
+
+
+class TestSearchLevels:
+    """Tests for HierarchicalRetriever._search_levels (RPC path)."""
+
+    @pytest.mark.asyncio
+    async def test_levels_searched_concurrently(self):
+        """Latency should be the slowest level, not the sum of all four."""
+        import services.hierarchical_retriever as hr
+
+        client = _rpc_client({99: 0.2, 2: 0.2, 1: 0.2, 0: 0.2})
+        retriever = hr.HierarchicalRetriever("user-1")
+
+        with patch.object(hr, "supabase", client), \
+             patch.object(hr, "get_user_index", AsyncMock(return_value=None)):
+            start = time.monotonic()
+            results = await retriever._search_levels([0.1], {99: 1, 2: 3, 1: 5, 0: 10})
+            elapsed = time.monotonic() - start
+
+        assert elapsed < 0.6
+        assert set(results) == {99, 2, 1, 0}
+        assert all(len(rows) == 1 for rows in results.values())
+
+    @pytest.mark.asyncio
+    async def test_slow_level_returns_partial_results(self):
+        """A level exceeding the timeout should be dropped, others kept."""
+        import services.hierarchical_retriever as hr
+
+        client = _rpc_client({2: 1.0})
+        retriever = hr.HierarchicalRetriever("user-1")
+
+        with patch.object(hr, "supabase", client), \
+             patch.object(hr, "get_user_index", AsyncMock(return_value=None)), \
+             patch.object(hr, "RETRIEVAL_LEVEL_TIMEOUT", 0.2):
+            results = await retriever._search_levels([0.1], {99: 1, 2: 3, 1: 5, 0: 10})
+
+        assert results[2] == []
+        assert len(results[99]) == 1
+        assert len(results[1]) == 1
+        assert len(results[0]) == 1
+
+
+class TestEnrichWithContext:
+    """Tests for HierarchicalRetriever._enrich_with_context."""
+
+    @pytest.mark.asyncio
+    async def test_parents_fetched_in_one_query_and_cached(self):
+        """Should batch parent lookups with in_() and reuse them on later queries."""
+        import services.hierarchical_retriever as hr
+
+        client = MagicMock()
+        query = client.table.return_value.select.return_value.in_
+        query.return_value.execute.return_value = MagicMock(data=[
+            {'id': 'p1', 'title': 'Parent 1', 'summary': 'x' * 300},
+            {'id': 'p2', 'title': 'Parent 2', 'summary': None},
+        ])
+        results = [
+            {'id': 's1', 'source': 'super_note', 'parent_id': 'p1', 'child_note_ids': ['a']},
+            {'id': 's2', 'source': 'super_note', 'parent_id': 'p2', 'child_note_ids': []},
+            {'id': 's3', 'source': 'super_note', 'parent_id': 'p1', 'child_note_ids': None},
+            {'id': 'n1', 'source': 'leaf_note'},
+        ]
+        retriever = hr.HierarchicalRetriever("user-enrich")
+
+        with patch.object(hr, "supabase", client):
+            first = await retriever._enrich_with_context(results)
+            second = await retriever._enrich_with_context(results)
+
+        assert query.call_count == 1
+        assert sorted(query.call_args.args[1]) == ['p1', 'p2']
+        assert first[0]['parent_context'] == {'title': 'Parent 1', 'summary': 'x' * 200}
+        assert first[1]['parent_context']['summary'] == ''
+        assert first[2]['child_count'] == 0
+        assert 'parent_context' not in first[3]
+        assert second == first
+
+        hr.invalidate_parent_context_cache("user-enrich")
+
+    @pytest.mark.asyncio
+    async def test_invalidation_refetches(self):
+        """Rebuilding the tree should drop cached parents."""
+        import services.hierarchical_retriever as hr
+
+        client = MagicMock()
+        query = client.table.return_value.select.return_value.in_
+        query.return_value.execute.return_value = MagicMock(data=[
+            {'id': 'p1', 'title': 'Parent 1', 'summary': 's'},
+        ])
+        results = [{'id': 's1', 'source': 'super_note', 'parent_id': 'p1'}]
+        retriever = hr.HierarchicalRetriever("user-rebuild")
+
+        with patch.object(hr, "supabase", client):
+            await retriever._enrich_with_context(results)
+            hr.invalidate_parent_context_cache("user-rebuild")
+            await retriever._enrich_with_context(results)
+
+        assert query.call_count == 2
+
+        hr.invalidate_parent_context_cache("user-rebuild")
+
+    @pytest.mark.asyncio
+    async def test_cache_bounded_by_users_and_prunes_expired(self):
+        """Should evict least recently used users and drop expired parents on write."""
+        import services.hierarchical_retriever as hr
+
+        client = MagicMock()
+        query = client.table.return_value.select.return_value.in_
+
+        def execute_for(ids):
+            call = MagicMock()
+            call.execute.return_value = MagicMock(data=[
+                {'id': parent_id, 'title': parent_id, 'summary': ''} for parent_id in ids
+            ])
+            return call
+
+        query.side_effect = lambda column, ids: execute_for(ids)
+
+        def super_note(parent_id):
+            return [{'id': 's', 'source': 'super_note', 'parent_id': parent_id}]
+
+        with patch.object(hr, "supabase", client), \
+             patch.object(hr, "PARENT_CONTEXT_MAX_USERS", 2):
+            for user_id in ("user-lru-1", "user-lru-2", "user-lru-3"):
+                await hr.HierarchicalRetriever(user_id)._enrich_with_context(super_note("p1"))
+
+            assert "user-lru-1" not in hr._parent_context_cache
+            assert list(hr._parent_context_cache)[-2:] == ["user-lru-2", "user-lru-3"]
+
+            retriever = hr.HierarchicalRetriever("user-lru-3")
+            later = hr.monotonic() + hr.PARENT_CONTEXT_TTL_SECONDS + 1
+            with patch.object(hr, "monotonic", return_value=later):
+                await retriever._enrich_with_context(super_note("p2"))
+
+            assert set(hr._parent_context_cache["user-lru-3"]) == {"p2"}
+
+        for user_id in ("user-lru-1", "user-lru-2", "user-lru-3"):
+            hr.invalidate_parent_context_cache(user_id)
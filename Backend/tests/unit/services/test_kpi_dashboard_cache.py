@@ -0,0 +1,120 @@
+"""
+Unit tests for services/kpi_dashboard_cache.py
+
+Tests dashboard response caching and its use in GET /api/kpis/dashboard.
+"""
+
+from decimal import Decimal
+
+import pytest
+from unittest.mock import patch, MagicMock
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    from services.kpi_dashboard_cache import invalidate_dashboard_cache
+
+    invalidate_dashboard_cache()
+    yield
+    invalidate_dashboard_cache()
+
+
+def _dashboard_row():
+    return {
+        "avg_response_time_ms": Decimal("120.5"),
+        "total_queries": 42,
+        "total_cost_usd": Decimal("1.25"),
+        "success_rate": Decimal("97.5"),
+        "by_agent": [{"agent_name": "analyst", "queries": 42}],
+        "connectors": [{
+            "connector_type": "jira",
+            "total_syncs": 2,
+            "total_kpis_extracted": 10,
+            "last_sync": "2025-01-01T00:00:00+00:00",
+            "kpis_by_category": {"velocity": 6, "quality": 4},
+        }],
+        "active_users": 3,
+        "avg_satisfaction": None,
+        "total_sessions": 5,
+        "engagement_queries": 17,
+        "avg_session_duration": 300.0,
+    }
+
+
+class TestDashboardCache:
+    """Tests for the cache module."""
+
+    def test_put_and_get(self):
+        """Should return stored dashboards by (org, team, days)."""
+        from services import kpi_dashboard_cache as cache
+
+        key = cache.cache_key("org-1", None, 7)
+        cache.put_dashboard(key, "dashboard", cache.current_generation())
+
+        assert cache.get_dashboard(key) == "dashboard"
+        assert cache.get_dashboard(cache.cache_key("org-1", None, 30)) is None
+
+    def test_invalidation_by_organization(self):
+        """Should only drop the invalidated organization's entries."""
+        from services import kpi_dashboard_cache as cache
+
+        generation = cache.current_generation()
+        cache.put_dashboard(cache.cache_key("org-1", None, 7), "a", generation)
+        cache.put_dashboard(cache.cache_key("org-2", None, 7), "b", generation)
+
+        cache.invalidate_dashboard_cache("org-1")
+
+        assert cache.get_dashboard(cache.cache_key("org-1", None, 7)) is None
+        assert cache.get_dashboard(cache.cache_key("org-2", None, 7)) == "b"
+
+    def test_stale_generation_not_stored(self):
+        """A dashboard computed before a refresh should not be cached after it."""
+        from services import kpi_dashboard_cache as cache
+
+        generation = cache.current_generation()
+        cache.invalidate_dashboard_cache()
+        cache.put_dashboard(cache.cache_key("org-1", None, 7), "stale", generation)
+
+        assert cache.get_dashboard(cache.cache_key("org-1", None, 7)) is None
+
+
+class TestGetKpiDashboard:
+    """Tests for routers/kpis.get_kpi_dashboard."""
+
+    def test_one_query_then_cached(self):
+        """Should build the dashboard in one round-trip and serve repeats from cache."""
+        from routers.kpis import get_kpi_dashboard
+
+        db = MagicMock()
+        cursor = db.__enter__.return_value.cursor.return_value
+        cursor.fetchone.return_value = _dashboard_row()
+        user = {"user_id": "user-1", "organization_id": "org-1", "team_ids": []}
+
+        first = get_kpi_dashboard(days=7, organization_id=None, team_id=None, user=user, db=db)
+        second = get_kpi_dashboard(days=7, organization_id=None, team_id=None, user=user, db=db)
+
+        assert cursor.execute.call_count == 1
+        assert second is first
+        assert first.agent_performance.total_queries == 42
+        assert first.connector_kpis["jira"].kpis_by_category == {"velocity": 6, "quality": 4}
+        assert first.user_engagement.total_queries == 17
+        assert first.user_engagement.avg_satisfaction is None
+
+    @pytest.mark.asyncio
+    async def test_refresh_job_invalidates(self):
+        """A materialized view refresh should force the next request to query."""
+        import services.kpi_scheduler as scheduler
+        from routers.kpis import get_kpi_dashboard
+
+        db = MagicMock()
+        cursor = db.__enter__.return_value.cursor.return_value
+        cursor.fetchone.return_value = _dashboard_row()
+        user = {"user_id": "user-1", "organization_id": "org-1", "team_ids": []}
+
+        get_kpi_dashboard(days=7, organization_id=None, team_id=None, user=user, db=db)
+        with patch.object(scheduler, "get_postgres_connection"), \
+             patch.object(scheduler, "supabase"):
+            await scheduler.refresh_materialized_views()
+        get_kpi_dashboard(days=7, organization_id=None, team_id=None, user=user, db=db)
+
+        assert cursor.execute.call_count == 2
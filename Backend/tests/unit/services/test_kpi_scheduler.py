@@ -0,0 +1,125 @@
+"""
+Unit tests for services/kpi_scheduler.py
+
+Tests the set-based daily engagement aggregation.
+"""
+
+import pytest
+from unittest.mock import patch, MagicMock
+
+
+class TestAggregateDailyEngagement:
+    """Tests for aggregate_daily_engagement."""
+
+    @pytest.mark.asyncio
+    async def test_single_set_based_upsert(self):
+        """Should aggregate every user with one statement instead of per-user queries."""
+        import services.kpi_scheduler as scheduler
+
+        conn = MagicMock()
+        cursor = conn.cursor.return_value.__enter__.return_value
+        cursor.rowcount = 250
+
+        with patch.object(scheduler, "get_postgres_connection", return_value=conn), \
+             patch.object(scheduler, "supabase") as supabase, \
+             patch.object(scheduler, "invalidate_dashboard_cache") as invalidate:
+            result = await scheduler.aggregate_daily_engagement()
+
+        assert cursor.execute.call_count == 1
+        query, params = cursor.execute.call_args.args
+        assert "LAG(m.created_at) OVER w" in query
+        assert "ON CONFLICT" in query
+        assert params["session_gap_minutes"] == 30
+        conn.commit.assert_called_once()
+        conn.close.assert_called_once()
+
+        # Only the scheduler log goes through Supabase
+        supabase.table.assert_called_once_with("scheduler_logs")
+        details = supabase.table.return_value.insert.call_args.args[0]["details"]
+        assert details["metrics_saved"] == 250
+        assert details["rows_per_second"] > 0
+
+        assert result["metrics_saved"] == 250
+        assert result["errors"] == []
+        invalidate.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_failure_rolls_back_and_is_logged(self):
+        """A failed aggregation should roll back and report a failed run."""
+        import services.kpi_scheduler as scheduler
+
+        conn = MagicMock()
+        conn.cursor.return_value.__enter__.return_value.execute.side_effect = Exception("boom")
+
+        with patch.object(scheduler, "get_postgres_connection", return_value=conn), \
+             patch.object(scheduler, "supabase") as supabase, \
+             patch.object(scheduler, "invalidate_dashboard_cache") as invalidate:
+            result = await scheduler.aggregate_daily_engagement()
+
+        conn.rollback.assert_called_once()
+        conn.close.assert_called_once()
+        assert supabase.table.return_value.insert.call_args.args[0]["status"] == "failed"
+        assert result["metrics_saved"] == 0
+        invalidate.assert_not_called()
+
+
+class TestGenerateWeeklyKpiReport:
+    """Tests for generate_weekly_kpi_report."""
+
+    @pytest.mark.asyncio
+    async def test_batched_sections_and_single_metadata_insert(self):
+        """Should run one query per section for all orgs and insert metadata once."""
+        from decimal import Decimal
+        import services.kpi_scheduler as scheduler
+
+        results = {
+            "agent_performance": [
+                {"organization_id": "org-1", "agent_name": "analyst", "total_executions": Decimal("4")},
+            ],
+            "connector_kpis": [
+                {"organization_id": "org-2", "connector_type": "jira", "kpi_name": "velocity"},
+            ],
+            "user_engagement": [
+                {"organization_id": "org-1", "active_users": 2, "total_sessions": 3,
+                 "total_queries": 8, "daily_breakdown": []},
+            ],
+        }
+        conn = MagicMock()
+        cursor = conn.cursor.return_value
+        executed = []
+        cursor.execute.side_effect = lambda query, params: executed.append(
+            next(s for s, q in scheduler.WEEKLY_SECTION_QUERIES.items() if q == query)
+        )
+        cursor.fetchall.side_effect = lambda: results[executed[-1]]
+
+        with patch.object(scheduler, "get_postgres_connection", return_value=conn), \
+             patch.object(scheduler, "supabase") as supabase:
+            supabase.table.return_value.select.return_value.execute.return_value.data = [
+                {"id": "org-1", "name": "One"}, {"id": "org-2", "name": "Two"}
+            ]
+            result = await scheduler.generate_weekly_kpi_report()
+
+        assert executed == list(scheduler.WEEKLY_SECTION_QUERIES)
+        assert cursor.execute.call_args.args[1]["org_ids"] == ["org-1", "org-2"]
+        conn.close.assert_called_once()
+        assert result["reports_generated"] == 2
+        assert supabase.storage.from_.return_value.upload.call_count == 2
+
+        inserts = [c.args[0] for c in supabase.table.return_value.insert.call_args_list]
+        report_rows = next(rows for rows in inserts if isinstance(rows, list))
+        summaries = {row["organization_id"]: row["summary"] for row in report_rows}
+        assert summaries["org-1"] == {"agents": 1, "connectors": 0, "active_users": 2}
+        assert summaries["org-2"] == {"agents": 0, "connectors": 1, "active_users": 0}
+
+        details = inserts[-1]["details"]
+        assert set(details["timings_ms"]) >= {"agent_performance", "connector_kpis", "save_reports"}
+
+    def test_engagement_section_without_activity(self):
+        """Organizations with no engagement rows should get zeroed totals."""
+        from services.kpi_scheduler import _build_report_section
+
+        section = _build_report_section("user_engagement", [])
+
+        assert section["active_users"] == 0
+        assert section["avg_queries_per_user"] == 0
+        assert section["daily_breakdown"] == []
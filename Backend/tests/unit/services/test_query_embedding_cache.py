@@ -0,0 +1,148 @@
+"""
+Unit tests for services/query_embedding_cache.py
+
+Tests query-vector caching shared by retrieval and the analyst search tool.
+"""
+
+import pytest
+from unittest.mock import patch, MagicMock
+
+
+def _cache(**kwargs):
+    from services.query_embedding_cache import QueryEmbeddingCache
+
+    cache = QueryEmbeddingCache(**kwargs)
+    model = MagicMock()
+    model.embed_query.side_effect = lambda text: [float(len(text)), 1.0]
+    cache._models["models/embedding-001"] = model
+    return cache, model
+
+
+class TestNormalizeQuery:
+    """Tests for normalize_query function."""
+
+    def test_case_and_whitespace_insensitive(self):
+        """Should map trivially different phrasings to one key."""
+        from services.query_embedding_cache import normalize_query
+
+        assert normalize_query("  What were Q3\n  sales? ") == normalize_query("what were q3 sales?")
+
+
+class TestQueryEmbeddingCache:
+    """Tests for QueryEmbeddingCache class."""
+
+    def test_repeated_query_embedded_once(self):
+        """Should only call the API on the first lookup."""
+        cache, model = _cache()
+
+        with patch("services.query_embedding_cache.get_rate_limiter"):
+            first = cache.embed_query("Q3 revenue")
+            second = cache.embed_query("q3   REVENUE")
+
+        assert first == second
+        assert model.embed_query.call_count == 1
+        assert cache.stats()['memory_hits'] == 1
+        assert cache.stats()['misses'] == 1
+
+    def test_lru_eviction(self):
+        """Should evict the least recently used query past max_entries."""
+        cache, _ = _cache(max_entries=2)
+
+        cache.put("a", [1.0])
+        cache.put("b", [2.0])
+        cache.get("a")
+        cache.put("c", [3.0])
+
+        assert cache.get("b") is None
+        assert cache.get("a") == [1.0]
+
+    def test_disk_tier_survives_restart(self, tmp_path):
+        """Should read vectors written by a previous process from SQLite."""
+        path = str(tmp_path / "queries.db")
+        first, _ = _cache(path=path)
+        first.put("revenue by region", [0.5, 0.25])
+
+        second, model = _cache(path=path)
+
+        assert second.get("Revenue by region") == [0.5, 0.25]
+        assert second.stats()['disk_hits'] == 1
+        model.embed_query.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_async_hit_skips_executor(self):
+        """Cache hits should return without running a worker thread."""
+        cache, _ = _cache()
+        cache.put("churn", [1.0, 2.0])
+
+        with patch("services.query_embedding_cache.run_blocking") as run_blocking:
+            result = await cache.aembed_query("churn")
+
+        assert result == [1.0, 2.0]
+        run_blocking.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_async_disk_lookup_runs_off_loop(self, tmp_path):
+        """Memory misses (including the SQLite read) should go to a worker thread."""
+        path = str(tmp_path / "queries.db")
+        first, _ = _cache(path=path)
+        first.put("churn", [1.0, 2.0])
+        second, model = _cache(path=path)
+
+        with patch("services.query_embedding_cache.run_blocking",
+                   side_effect=lambda fn, *args: fn(*args)) as run_blocking, \
+             patch.object(second, "_disk_get_locked", wraps=second._disk_get_locked) as disk_get:
+            result = await second.aembed_query("churn")
+
+        assert result == [1.0, 2.0]
+        run_blocking.assert_called_once()
+        disk_get.assert_called_once()
+        model.embed_query.assert_not_called()
+
+
+class TestRetrieverQueryEmbedding:
+    """Tests for HierarchicalRetriever.retrieve embedding reuse."""
+
+    @pytest.mark.asyncio
+    async def test_precomputed_embedding_is_not_recomputed(self):
+        """Should search with the given vector and return it for downstream use."""
+        import services.hierarchical_retriever as hr
+
+        retriever = hr.HierarchicalRetriever("user-1")
+        search = MagicMock(return_value={'results': []})
+
+        async def vector_only(query, query_embedding, max_results):
+            return search(query_embedding)
+
+        with patch.object(hr, "aembed_query") as aembed, \
+             patch.object(retriever, "_vector_only_retrieval", vector_only):
+            result = await retriever.retrieve("q", strategy="vector_only", query_embedding=[0.1, 0.2])
+
+        aembed.assert_not_called()
+        search.assert_called_once_with([0.1, 0.2])
+        assert result['query_embedding'] == [0.1, 0.2]
+
+
+class TestSearchToolQueryEmbedding:
+    """Tests for NotesFirstSearchTool._embed_query reuse."""
+
+    def test_reuses_precomputed_vector_for_unchanged_query(self):
+        """Should skip embedding when the agent searches the user's own question."""
+        import Ai_agents.internal_analyst_agent as agent
+
+        tool = MagicMock(precomputed_embeddings={"q3 sales": [0.1, 0.2]})
+        with patch.object(agent, "embed_query") as embed:
+            result = agent.NotesFirstSearchTool._embed_query(tool, "Q3 sales", "Q3 sales")
+
+        assert result == [0.1, 0.2]
+        embed.assert_not_called()
+
+    def test_embeds_context_enhanced_query(self):
+        """Should embed the enhanced text instead of reusing the plain question's vector."""
+        import Ai_agents.internal_analyst_agent as agent
+
+        tool = MagicMock(precomputed_embeddings={"q3 sales": [0.1, 0.2]})
+        with patch.object(agent, "embed_query", return_value=[0.9, 0.9]) as embed:
+            result = agent.NotesFirstSearchTool._embed_query(tool, "Q3 sales", "Q3 sales\nUser focus: EMEA")
+
+        assert result == [0.9, 0.9]
+        embed.assert_called_once_with("Q3 sales\nUser focus: EMEA")
@@ -0,0 +1,135 @@
+"""
+Unit tests for services/retention_cleanup.py
+
+Tests batched, resumable retention cleanup.
+"""
+
+from unittest.mock import MagicMock
+
+from psycopg2 import errors as pg_errors
+
+
+class FakeDatabase:
+    """Connection whose DELETE batches hand out keys from a list of expired rows."""
+
+    def __init__(self, expired_keys, state=None, partitions=None, exists=True):
+        self.expired_keys = list(expired_keys)
+        self.state = dict(state or {})
+        self.partitions = partitions or []
+        self.exists = exists
+        self.statements = []
+        self.lock_timeouts = 0
+        self.conn = MagicMock()
+        self.conn.cursor.side_effect = self._cursor
+
+    def _cursor(self):
+        cursor = MagicMock()
+        cursor.__enter__.return_value = cursor
+        cursor.execute.side_effect = lambda query, params=None: self._execute(cursor, query, params)
+        return cursor
+
+    def _execute(self, cursor, query, params):
+        self.statements.append(query)
+        if "to_regclass" in query:
+            cursor.fetchone.return_value = ("t",) if self.exists else (None,)
+        elif "SELECT last_key" in query:
+            key = self.state.get(params[0])
+            cursor.fetchone.return_value = (key,) if key is not None else None
+        elif "INSERT INTO retention_cleanup_state" in query:
+            self.state[params[0]] = params[1]
+        elif "pg_inherits" in query:
+            cursor.fetchall.return_value = self.partitions
+        elif "DELETE FROM" in query:
+            if self.lock_timeouts:
+                self.lock_timeouts -= 1
+                raise pg_errors.LockNotAvailable("lock timeout")
+            last_key = params["last_key"]
+            batch = [k for k in self.expired_keys if last_key is None or k > int(last_key)]
+            batch = batch[:params["batch_size"]]
+            self.expired_keys = [k for k in self.expired_keys if k not in batch]
+            cursor.fetchall.return_value = [(k,) for k in batch]
+
+
+def _policy(**kwargs):
+    from services.retention_cleanup import RetentionPolicy
+
+    return RetentionPolicy("agent_traces", "created_at", 30, **kwargs)
+
+
+class TestRetentionCleaner:
+    """Tests for RetentionCleaner class."""
+
+    def test_deletes_in_batches_until_done(self):
+        """Should delete in bounded batches, pausing between them, and reset the cursor."""
+        from services.retention_cleanup import RetentionCleaner
+
+        db = FakeDatabase(range(1, 26))
+        sleep = MagicMock()
+        cleaner = RetentionCleaner(db.conn, batch_size=10, pause_seconds=0.5, sleep=sleep)
+
+        result = cleaner.run([_policy()])["agent_traces"]
+
+        assert result["rows_deleted"] == 25
+        assert result["batches"] == 3
+        assert result["completed"] is True
+        assert db.expired_keys == []
+        assert db.state["agent_traces"] is None
+        assert sleep.call_count == 2
+        delete = next(q for q in db.statements if "DELETE FROM" in q)
+        assert "LIMIT %(batch_size)s" in delete
+        assert "FOR UPDATE SKIP LOCKED" in delete
+        assert any("SET LOCAL lock_timeout" in q for q in db.statements)
+
+    def test_time_budget_saves_resume_point(self):
+        """Should stop when out of time and resume after the last deleted key."""
+        from services.retention_cleanup import RetentionCleaner
+
+        db = FakeDatabase(range(1, 26))
+        cleaner = RetentionCleaner(db.conn, batch_size=10, time_budget_seconds=0, sleep=MagicMock())
+        first = cleaner.run([_policy()])["agent_traces"]
+
+        assert first["batches"] == 0
+        assert first["completed"] is False
+
+        db.state["agent_traces"] = "10"
+        cleaner.clean_table(_policy(), deadline=float("inf"))
+
+        assert db.expired_keys[:10] == list(range(1, 11))
+
+    def test_lock_timeouts_back_off(self):
+        """Lock timeouts should be retried, not fail the run."""
+        from services.retention_cleanup import RetentionCleaner
+
+        db = FakeDatabase(range(1, 4))
+        db.lock_timeouts = 2
+        cleaner = RetentionCleaner(db.conn, batch_size=10, sleep=MagicMock())
+
+        result = cleaner.run([_policy()])["agent_traces"]
+
+        assert result["lock_timeouts"] == 2
+        assert result["rows_deleted"] == 3
+        assert result["completed"] is True
+
+    def test_missing_table_skipped(self):
+        """Tables that do not exist should be skipped without an error."""
+        from services.retention_cleanup import RetentionCleaner
+
+        db = FakeDatabase([], exists=False)
+        result = RetentionCleaner(db.conn).run([_policy()])["agent_traces"]
+
+        assert result["skipped"] == "missing"
+        assert not any("DELETE FROM" in q for q in db.statements)
+
+    def test_drops_expired_partitions(self):
+        """Partitioned tables should drop partitions entirely before the cutoff."""
+        from services.retention_cleanup import RetentionCleaner
+
+        db = FakeDatabase([], partitions=[
+            ("agent_traces_2020_01", "FOR VALUES FROM ('2020-01-01') TO ('2020-02-01')"),
+            ("agent_traces_2999_01", "FOR VALUES FROM ('2999-01-01') TO ('2999-02-01')"),
+            ("agent_traces_default", "DEFAULT"),
+        ])
+        result = RetentionCleaner(db.conn).run([_policy(partitioned=True)])["agent_traces"]
+
+        assert result["partitions_dropped"] == ["agent_traces_2020_01"]
+        assert any('DROP TABLE "agent_traces_2020_01"' in q for q in db.statements)
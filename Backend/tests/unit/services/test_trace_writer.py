@@ -0,0 +1,82 @@
+"""
+Unit tests for services/trace_writer.py
+
+Tests background, batched agent trace persistence.
+"""
+
+import threading
+
+from unittest.mock import MagicMock
+
+
+def _rows(n):
+    return [{"step_number": i + 1, "tool_used": f"node_{i}"} for i in range(n)]
+
+
+class TestAgentTraceWriter:
+    """Tests for AgentTraceWriter class."""
+
+    def test_flushes_one_bulk_insert(self):
+        """Rows queued together should be written in a single insert."""
+        from services.trace_writer import AgentTraceWriter
+
+        insert = MagicMock()
+        writer = AgentTraceWriter(insert, batch_size=100, flush_interval=0.05)
+        writer.enqueue(_rows(7))
+        writer.close()
+
+        insert.assert_called_once()
+        assert len(insert.call_args.args[0]) == 7
+        assert writer.stats()["written"] == 7
+        assert writer.stats()["batches"] == 1
+
+    def test_flushes_by_size(self):
+        """Should not buffer more than batch_size rows per insert."""
+        from services.trace_writer import AgentTraceWriter
+
+        insert = MagicMock()
+        writer = AgentTraceWriter(insert, batch_size=3, flush_interval=60)
+        writer.enqueue(_rows(7))
+        writer.close()
+
+        assert [len(c.args[0]) for c in insert.call_args_list] == [3, 3, 1]
+
+    def test_drops_when_queue_full(self):
+        """enqueue() should never block; overflow is dropped and counted."""
+        from services.trace_writer import AgentTraceWriter
+
+        release = threading.Event()
+        writer = AgentTraceWriter(lambda rows: release.wait(2), max_rows=5, batch_size=1, flush_interval=60)
+        writer.enqueue(_rows(1))  # Occupies the writer thread
+        accepted = writer.enqueue(_rows(10))
+        release.set()
+        writer.close()
+
+        assert accepted < 10
+        assert writer.stats()["dropped"] == 10 - accepted
+
+    def test_failed_insert_counted(self):
+        """A failing insert should be logged and counted, not raised."""
+        from services.trace_writer import AgentTraceWriter
+
+        writer = AgentTraceWriter(MagicMock(side_effect=Exception("down")), flush_interval=0.05)
+        writer.enqueue(_rows(2))
+        writer.close()
+
+        assert writer.stats()["failed"] == 2
+        assert writer.stats()["written"] == 0
+
+    def test_bad_row_does_not_sink_batch(self):
+        """A failing batch should be split so only the bad row is lost."""
+        from services.trace_writer import AgentTraceWriter
+
+        def insert(rows):
+            if any(row["tool_used"] == "node_4" for row in rows):
+                raise Exception("value too long")
+
+        writer = AgentTraceWriter(insert, batch_size=100, flush_interval=0.05)
+        writer.enqueue(_rows(7))
+        writer.close()
+
+        assert writer.stats()["failed"] == 1
+        assert writer.stats()["written"] == 6
@@ -0,0 +1,185 @@
+"""
+Unit tests for services/vector_index.py
+
+Tests the in-process per-user vector index used by HierarchicalRetriever.
+"""
+
+import json
+
+import pytest
+from unittest.mock import patch, AsyncMock
+
+
+def _leaf(note_id, embedding):
+    return {"id": note_id, "title": note_id, "summary": "s", "key_facts": [],
+            "topics": [], "file_path": "f.txt", "note_embedding": embedding,
+            "user_id": "user-1"}
+
+
+def _super(node_id, level, embedding):
+    return {"id": node_id, "title": node_id, "summary": "s", "level": level,
+            "parent_id": None, "child_note_ids": ["a", "b"], "topics": [],
+            "key_facts": [], "embedding": embedding}
+
+
+class TestUserVectorIndex:
+    """Tests for UserVectorIndex class (flat backend)."""
+
+    def test_search_ranks_by_cosine_similarity(self):
+        """Should return best matches first with RPC-style similarity."""
+        from services.vector_index import UserVectorIndex
+
+        index = UserVectorIndex("user-1")
+        index.add([_leaf("n1", [1.0, 0.0]), _leaf("n2", [0.6, 0.8]), _leaf("n3", [0.0, 1.0])], level=0)
+
+        results = index.search([1.0, 0.0], {0: 2})[0]
+
+        assert [r["id"] for r in results] == ["n1", "n2"]
+        assert results[0]["similarity"] == pytest.approx(1.0)
+        assert results[1]["similarity"] == pytest.approx(0.6)
+
+    def test_searches_all_levels_in_one_call(self):
+        """Should apply per-level limits and keep levels separate."""
+        from services.vector_index import UserVectorIndex
+
+        index = UserVectorIndex("user-1")
+        index.add([_leaf("n1", [1.0, 0.0])], level=0)
+        index.add([_super("s1", 1, [1.0, 0.0]), _super("s2", 1, [0.0, 1.0]),
+                   _super("root", 99, [0.5, 0.5])])
+
+        results = index.search([1.0, 0.0], {99: 1, 2: 3, 1: 1, 0: 10})
+
+        assert [r["id"] for r in results[99]] == ["root"]
+        assert results[2] == []
+        assert [r["id"] for r in results[1]] == ["s1"]
+        assert [r["id"] for r in results[0]] == ["n1"]
+
+    def test_result_schema_matches_rpc(self):
+        """Leaf and super-note rows should carry the RPC columns, not embeddings."""
+        from services.vector_index import UserVectorIndex, LEAF_FIELDS, SUPER_FIELDS
+
+        index = UserVectorIndex("user-1")
+        index.add([_leaf("n1", [1.0, 0.0])], level=0)
+        index.add([_super("s1", 1, [1.0, 0.0])])
+
+        results = index.search([1.0, 0.0], {1: 1, 0: 1})
+
+        assert set(results[0][0]) == set(LEAF_FIELDS) | {"similarity"}
+        assert set(results[1][0]) == set(SUPER_FIELDS) | {"similarity"}
+
+    def test_parses_pgvector_strings_and_skips_missing(self):
+        """Should accept '[...]' embeddings and ignore rows without one."""
+        from services.vector_index import UserVectorIndex
+
+        index = UserVectorIndex("user-1")
+        index.add([_leaf("n1", json.dumps([0.0, 2.0])), _leaf("n2", None)], level=0)
+
+        assert len(index) == 1
+        assert index.search([0.0, 1.0], {0: 5})[0][0]["id"] == "n1"
+
+    def test_remove_and_set_level(self):
+        """Deleted rows should disappear; relevelled rows should move level."""
+        from services.vector_index import UserVectorIndex
+
+        index = UserVectorIndex("user-1")
+        index.add([_super("s1", 1, [1.0, 0.0]), _super("s2", 1, [0.0, 1.0])])
+
+        index.remove(["s2"])
+        index.set_level("s1", 99)
+
+        results = index.search([0.0, 1.0], {99: 5, 1: 5})
+        assert [r["id"] for r in results[99]] == ["s1"]
+        assert results[99][0]["level"] == 99
+        assert results[1] == []
+
+
+class TestIndexRegistry:
+    """Tests for module-level index management."""
+
+    @pytest.mark.asyncio
+    async def test_disabled_returns_none(self):
+        """Should fall back to RPCs when LOCAL_VECTOR_INDEX is off."""
+        import services.vector_index as vi
+
+        with patch.object(vi, "LOCAL_VECTOR_INDEX", False):
+            assert await vi.get_user_index("user-1") is None
+
+    @pytest.mark.asyncio
+    async def test_loads_once_and_applies_incremental_updates(self):
+        """Should cache the loaded index and apply adds / invalidation."""
+        import services.vector_index as vi
+
+        loaded = vi.UserVectorIndex("user-2")
+        with patch.object(vi, "LOCAL_VECTOR_INDEX", True), \
+             patch.object(vi, "_load_user_index", return_value=loaded) as load:
+            first = await vi.get_user_index("user-2")
+            vi.add_document_notes("user-2", [_leaf("n1", [1.0, 0.0])])
+            second = await vi.get_user_index("user-2")
+
+            assert first is second
+            assert load.call_count == 1
+            assert len(second) == 1
+
+            vi.invalidate_user_index("user-2")
+            await vi.get_user_index("user-2")
+            assert load.call_count == 2
+
+        vi.invalidate_user_index("user-2")
+
+    def test_concurrent_loads_across_event_loops(self):
+        """Requests on separate threads/loops should share a single load."""
+        import asyncio
+        import threading
+        import time
+        import services.vector_index as vi
+
+        loaded = vi.UserVectorIndex("user-3")
+
+        def slow_load(user_id):
+            time.sleep(0.1)
+            return loaded
+
+        results, errors = [], []
+
+        def request():
+            try:
+                results.append(asyncio.run(vi.get_user_index("user-3")))
+            except Exception as e:
+                errors.append(e)
+
+        with patch.object(vi, "LOCAL_VECTOR_INDEX", True), \
+             patch.object(vi, "_load_user_index", side_effect=slow_load) as load:
+            threads = [threading.Thread(target=request) for _ in range(5)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(timeout=5)
+
+        assert errors == []
+        assert load.call_count == 1
+        assert len(results) == 5 and all(r is loaded for r in results)
+
+        vi.invalidate_user_index("user-3")
+
+
+class TestHierarchicalRetrieverLocalIndex:
+    """Tests for HierarchicalRetriever using the local index."""
+
+    @pytest.mark.asyncio
+    async def test_hybrid_uses_single_index_search(self):
+        """Hybrid retrieval should not call the RPCs when an index is available."""
+        import services.hierarchical_retriever as hr
+        from services.vector_index import UserVectorIndex
+
+        index = UserVectorIndex("user-1")
+        index.add([_leaf("n1", [1.0, 0.0])], level=0)
+        index.add([_super("s1", 1, [1.0, 0.0])])
+
+        retriever = hr.HierarchicalRetriever("user-1")
+        with patch.object(hr, "get_user_index", AsyncMock(return_value=index)), \
+             patch.object(hr, "supabase") as supabase:
+            result = await retriever._hybrid_retrieval("q", [1.0, 0.0], max_results=10)
+
+        supabase.rpc.assert_not_called()
+        assert {r["id"] for r in result["results"]} == {"n1", "s1"}
+        assert result["results"][0]["source"] == "leaf_note"